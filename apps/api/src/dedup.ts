@@ -8,24 +8,33 @@
  *
  * §D1 没有被破例：worker 依旧一行 SQL 都不碰，它只是从文件而不是 payload 里拿到
  * 那份它算不出来的输入。
+ *
+ * 两个入口：`rebuildGroups` 全量重算（端点、换阈值），`groupNewVectors` 只给
+ * embedding backfill 新写的向量找组 —— 新增 64 张图不该付 22 万行全量的分钟级代价。
  */
+import type { DedupEngine, DedupMode } from '@pictoria/contracts'
 import type { CairnQ } from 'cairnq'
 import type { getDb } from './db.js'
 import fs from 'node:fs/promises'
 import path from 'node:path'
 import {
   DEDUP_CHUNK_SIZE,
+  DEDUP_PAIR_BYTES,
   DEDUP_THRESHOLD,
   dedupTask,
   GPU_QUEUE,
 } from '@pictoria/contracts'
 import {
+  addToGroups,
+  assignFromComponents,
   assignFromPairs,
+  assignIncremental,
   exportVectorMatrix,
   replaceAllGroups,
 } from '@pictoria/db'
 import process from 'node:process'
 import { dedupMatrixPath, isDedupMatrix, pictoriaDir } from './paths.js'
+import { callTask } from './sidecar.js'
 
 type SqliteHandle = ReturnType<typeof getDb>['sqlite']
 type Log = Pick<Console, 'info' | 'warn'>
@@ -41,30 +50,115 @@ export { DEDUP_THRESHOLD }
 const REBUILD_TIMEOUT_MS = 30 * 60_000
 
 /**
- * 序列化全量重建。
+ * 全量重建默认回传什么（`DedupMode`）。环境变量而不是端点参数：group-duplicates
+ * 的查询参数受 `docs/openapi.baseline.json` 的契约约束，而这是部署级的选择 ——
+ * 一个变体特别多的库才需要把 O(对数) 的结果换成 O(行数)。
+ */
+const DEDUP_MODE: DedupMode = process.env.PICTORIA_DEDUP_MODE === 'components' ? 'components' : 'pairs'
+
+/**
+ * 全量重建用哪个引擎找近邻对（`DedupEngine`），理由同 `DEDUP_MODE`。百万级的库
+ * 才值得换 `'lsh'`；增量挂载总是精确的 —— 它只算新行对全库，本来就是线性的，
+ * 而 LSH 每次都要给全库重算签名，小增量反而更贵。
+ */
+const DEDUP_ENGINE: DedupEngine = process.env.PICTORIA_DEDUP_ENGINE === 'lsh' ? 'lsh' : 'exact'
+
+/**
+ * 序列化全量重建和增量挂载。
  *
  * 重建以一次整体的 canonical 指针替换收尾，所以两个并发的重建就是"后写者赢"外加
  * 一次白烧的 GPU（一次被双击的 /v2/cmd/group-duplicates，或者这个端点撞上调度器
- * 写完向量后的自动重组）。形状承自已删除的 `services/dedup.py::rebuild_lock`。
+ * 写完向量后的自动重组）。增量挂载也排在同一条线上：它依据的"现有分组"不能在
+ * 它算的时候被一次全量换掉。形状承自已删除的 `services/dedup.py::rebuild_lock`。
  */
 let inFlight: Promise<number> | null = null
 
-/** 端点用它做"忙不忙"的判断 —— 和 Python 侧 `rebuild_lock.locked()` 同义。 */
+/**
+ * 正在跑或排着队的**全量**重建有几个。和 `inFlight` 分开记：增量挂载一次只有
+ * 几十行、秒级，端点不该因为撞上它就拒掉一次全量 —— 全量排在它后面等几秒即可。
+ */
+let fullRebuilds = 0
+
+/**
+ * 端点用它做"忙不忙"的判断 —— 和 Python 侧 `rebuild_lock.locked()` 同义，只是
+ * 只算全量：被双击的 group-duplicates 第二下报忙，而不是排成第二次全量。
+ */
 export function isRebuilding(): boolean {
-  return inFlight !== null
+  return fullRebuilds > 0
 }
 
+/**
+ * 库里现有分组是用哪个阈值算的 —— 本进程最近一次全量重建的阈值，还没重建过时为
+ * `null`。增量挂载必须沿用它：拿别的阈值挂进来的新图和老分组不是一回事。
+ *
+ * 只记在内存里是有意的：进程起来之后的第一次 `groupNewVectors` 走全量，顺带收掉
+ * 上一个进程写了向量、却没来得及分组的那些（被杀在 `onDrained` 之前）。
+ */
+let groupedThreshold: number | null = null
+
 /**
  * 从头重算每个 post 的分组，返回被归组的成员数。
  *
  * 已经有一次在跑时**等它**而不是跳过：触发这一次的那些新向量同样值得一次重组，
  * 只是可以等在流程后面（Python 侧 `group_near_duplicates` 的同款选择）。
+ *
+ * `mode` 缺省取 `PICTORIA_DEDUP_MODE`。`'components'` 让 worker 回传连通分量标签
+ * 而不是近邻对（见 `DedupMode`）：结果从 O(对数) 降到 O(行数)，代价是分组变成传递
+ * 的。之后的增量挂载照旧贪心 —— 它只往现有 canonical 下挂，不关心那些组是怎么来的。
  */
 export async function rebuildGroups(
   sqlite: SqliteHandle,
   tasks: CairnQ,
-  { threshold = DEDUP_THRESHOLD, log = console }: { threshold?: number, log?: Log } = {},
+  { threshold = DEDUP_THRESHOLD, mode = DEDUP_MODE, log = console }: { threshold?: number, mode?: DedupMode, log?: Log } = {},
+): Promise<number> {
+  return counted(() => serialized(() => doRebuild(sqlite, tasks, threshold, log, mode)))
+}
+
+/**
+ * 只为 `postIds` 这些新写的向量找组，返回新归组的成员数。
+ *
+ * worker 只算这几行对全库的 `X_new @ X.T`；现有分组原样保留，新 post 挂到
+ * 老 canonical 下或自成一组（`assignIncremental`）。本进程还没全量重建过时退回
+ * 全量 —— 见 `groupedThreshold`。
+ *
+ * 增量失败（包括超时）时把 `groupedThreshold` 清掉：调度器在调用之前就清空了
+ * 它手里的 id，这几十个 post 没有别人记得，于是下一次调用（下一次 embedding
+ * 待办清空）走全量，把它们连同其它漏网的一并收掉 —— 与增量之前"每次清空都全量"
+ * 的行为一致，只是只在出过错之后才付这个代价。
+ */
+export async function groupNewVectors(
+  sqlite: SqliteHandle,
+  tasks: CairnQ,
+  postIds: number[],
+  { log = console }: { log?: Log } = {},
 ): Promise<number> {
+  return serialized(async () => {
+    if (groupedThreshold === null)
+      return counted(() => doRebuild(sqlite, tasks, DEDUP_THRESHOLD, log, DEDUP_MODE))
+    try {
+      return await doIncremental(sqlite, tasks, postIds, groupedThreshold, log)
+    }
+    catch (err) {
+      groupedThreshold = null
+      log.warn(`[dedup] 增量分组失败，${postIds.length} 个新 post 留给下一次全量重建`)
+      throw err
+    }
+  })
+}
+
+/** 全量重建从排队到结束都算进 `fullRebuilds`。 */
+async function counted(run: () => Promise<number>): Promise<number> {
+  fullRebuilds++
+  try {
+    return await run()
+  }
+  finally {
+    fullRebuilds--
+  }
+}
+
+/** 两个入口共用的串行化：等前一轮跑完再开始，理由见 `inFlight`。 */
+async function serialized(start: () => Promise<number>): Promise<number> {
   while (inFlight) {
     try {
       await inFlight
@@ -73,7 +167,7 @@ export async function rebuildGroups(
       // 上一轮失败与这一轮无关 —— 它的错误已经由它自己的调用方处理了
     }
   }
-  const run = doRebuild(sqlite, tasks, threshold, log)
+  const run = start()
   inFlight = run
   try {
     return await run
@@ -88,49 +182,170 @@ async function doRebuild(
   tasks: CairnQ,
   threshold: number,
   log: Log,
+  mode: DedupMode,
 ): Promise<number> {
-  // 每次一个新文件名，不复用固定路径。超时的那一轮**不会**停掉 worker（cairnq 的
-  // `pollWait` 明说了 waitTimeoutMs 只是不再等），它还 mmap 着这个文件 —— 固定路径
-  // 下一轮的 `openSync(file, 'w')` 在 Windows 上会撞 EBUSY 撞到重建根本起不来。
   const started = Date.now()
-  const file = dedupMatrixPath(`${process.pid}-${started}`)
-  const dir = pictoriaDir()
-  await fs.mkdir(dir, { recursive: true })
-  // 上一次超时留下的（删不掉的那个）在这里回收。删不掉就跳过 —— 说明还有人拿着它。
-  // 本轮的文件此刻还不存在（下面的 exportVectorMatrix 才创建），所以不必排除它。
-  await sweepStaleMatrices(dir, log)
-
-  try {
-    // 导出也在 try 里：它中途失败（磁盘满）会留下一个半截的 1 GB 文件，
-    // 而 finally 是唯一会去删它的地方。
+  return withMatrix(log, async (file, track) => {
     const { ids, count, dim } = exportVectorMatrix(sqlite, file)
     // 少于两条向量就没有"对"可言。仍然要 replaceAllGroups —— 库被清空之后
     // 残留的分组指针得跟着清掉，而不是留在那儿指向已经不存在的东西。
     if (count < 2) {
       replaceAllGroups(sqlite, [])
+      groupedThreshold = threshold
       return 0
     }
 
     log.info(`[dedup] 导出 ${count} 条向量（${dim} 维，${(count * dim * 4 / 1e9).toFixed(2)} GB），提交 GPU`)
     // 不设 key：`conflict: 'reuse'` 会把上一次的结果原样还回来，而矩阵文件的
     // 内容每次都不同。串行化由上面的 inFlight 负责，不需要队列帮忙去重。
-    const { pairs } = await tasks.call(dedupTask, {
+    const result = await callTask(tasks, dedupTask, {
       matrixPath: file,
       count,
       dim,
       threshold,
       chunkSize: DEDUP_CHUNK_SIZE,
+      mode,
+      engine: DEDUP_ENGINE,
     }, { queue: GPU_QUEUE, waitTimeoutMs: REBUILD_TIMEOUT_MS })
 
-    const assignments = assignFromPairs(ids, pairs)
+    let assignments: Array<[number, number]>
+    let found: string
+    if (result.mode === 'components') {
+      track(result.labelsPath)
+      const { labels, loosest } = await readComponents(result.labelsPath, result.count, result.components)
+      assignments = assignFromComponents(ids, labels)
+      found = `${result.components} 个分量（最稀疏的边密度 ${loosest.toFixed(2)}）`
+    }
+    else {
+      track(result.pairsPath)
+      const { pairs, weakest } = await readPairs(result.pairsPath, result.count)
+      assignments = assignFromPairs(ids, pairs)
+      found = `${pairs.length} 对近邻（最弱相似度 ${weakest.toFixed(4)}）`
+    }
     replaceAllGroups(sqlite, assignments)
+    groupedThreshold = threshold
 
     const canonicals = new Set(assignments.map(([, c]) => c))
     log.info(
-      `[dedup] ${assignments.length} 个成员归入 ${canonicals.size} 个 canonical`
+      `[dedup] ${found}，${assignments.length} 个成员归入 ${canonicals.size} 个 canonical`
+      + `（threshold=${threshold}，${DEDUP_ENGINE}，${((Date.now() - started) / 1000).toFixed(1)}s）`,
+    )
+    return assignments.length
+  })
+}
+
+async function doIncremental(
+  sqlite: SqliteHandle,
+  tasks: CairnQ,
+  postIds: number[],
+  threshold: number,
+  log: Log,
+): Promise<number> {
+  const started = Date.now()
+  return withMatrix(log, async (file, track) => {
+    // 导出仍然是全库：新行要和每一张老图比。省下的是 GPU 那一侧的 n 倍。
+    const { ids, count, dim, newFrom } = exportVectorMatrix(sqlite, file, { tail: postIds })
+    if (newFrom === count || count < 2)
+      return 0
+
+    const result = await callTask(tasks, dedupTask, {
+      matrixPath: file,
+      count,
+      dim,
+      threshold,
+      chunkSize: DEDUP_CHUNK_SIZE,
+      newFrom,
+    }, { queue: GPU_QUEUE, waitTimeoutMs: REBUILD_TIMEOUT_MS })
+    if (result.mode !== 'pairs')
+      throw new Error(`增量 dedup 要的是近邻对，worker 回了 ${result.mode}`)
+    track(result.pairsPath)
+    const { pairs } = await readPairs(result.pairsPath, result.count)
+
+    const grouped = sqlite.prepare<[number], { canonical_post_id: number | null }>(
+      'SELECT canonical_post_id FROM posts WHERE id = ?',
+    )
+    const assignments = assignIncremental(ids, newFrom, pairs, id => grouped.get(id)?.canonical_post_id != null)
+    addToGroups(sqlite, assignments)
+    log.info(
+      `[dedup] 增量：${count - newFrom} 条新向量，${assignments.length} 个归组`
       + `（threshold=${threshold}，${((Date.now() - started) / 1000).toFixed(1)}s）`,
     )
     return assignments.length
+  })
+}
+
+/**
+ * 读 worker 写的近邻对文件（格式见 `DedupResult`），顺带取最弱那一对的相似度 ——
+ * 它贴着阈值有多近，是调 `DEDUP_THRESHOLD` 时最想看的那个数。
+ */
+async function readPairs(file: string, count: number): Promise<{ pairs: Array<[number, number]>, weakest: number }> {
+  const buf = await fs.readFile(file)
+  if (buf.length !== count * DEDUP_PAIR_BYTES)
+    throw new Error(`近邻对文件 ${buf.length} 字节，应为 ${count * DEDUP_PAIR_BYTES}（${count} 条）`)
+  const pairs: Array<[number, number]> = Array.from({ length: count })
+  let weakest = 1
+  for (let k = 0, at = 0; k < count; k++, at += DEDUP_PAIR_BYTES) {
+    pairs[k] = [buf.readInt32LE(at), buf.readInt32LE(at + 4)]
+    weakest = Math.min(weakest, buf.readFloatLE(at + 8))
+  }
+  return { pairs, weakest }
+}
+
+/**
+ * 读分量模式的标签文件（格式见 `DedupComponentsResult`）。
+ *
+ * 顺带算每个分量的边密度 `edges / (k(k-1)/2)` 并取最小的那个：1 是一整团互为近邻，
+ * 越低越像一条被传递串起来的链 —— 正是分量模式比贪心多收进来的那种组。
+ */
+async function readComponents(
+  file: string,
+  count: number,
+  components: number,
+): Promise<{ labels: Int32Array, loosest: number }> {
+  const buf = await fs.readFile(file)
+  const expected = (count + 2 * components) * 4
+  if (buf.length !== expected)
+    throw new Error(`分量文件 ${buf.length} 字节，应为 ${expected}（${count} 行、${components} 个分量）`)
+  const words = new Int32Array(count + 2 * components)
+  for (let k = 0; k < words.length; k++)
+    words[k] = buf.readInt32LE(k * 4)
+  const labels = words.subarray(0, count)
+  const sizes = new Map<number, number>()
+  for (const root of labels)
+    sizes.set(root, (sizes.get(root) ?? 0) + 1)
+  let loosest = 1
+  for (let c = 0; c < components; c++) {
+    const k = sizes.get(words[count + 2 * c]!) ?? 0
+    const edges = words[count + 2 * c + 1]!
+    if (k > 1)
+      loosest = Math.min(loosest, edges / (k * (k - 1) / 2))
+  }
+  return { labels, loosest }
+}
+
+/**
+ * 给 `run` 一个本轮专用的临时矩阵路径，跑完（成功失败都一样）删掉它，连同 `run`
+ * 用 `track` 登记的文件（worker 写在旁边的近邻对）。
+ */
+async function withMatrix(
+  log: Log,
+  run: (file: string, track: (extra: string) => void) => Promise<number>,
+): Promise<number> {
+  // 每次一个新文件名，不复用固定路径。超时的那一轮**不会**停掉 worker（cairnq 的
+  // `pollWait` 明说了 waitTimeoutMs 只是不再等），它还 mmap 着这个文件 —— 固定路径
+  // 下一轮的 `openSync(file, 'w')` 在 Windows 上会撞 EBUSY 撞到重建根本起不来。
+  const file = dedupMatrixPath(`${process.pid}-${Date.now()}`)
+  const dir = pictoriaDir()
+  await fs.mkdir(dir, { recursive: true })
+  // 上一次超时留下的（删不掉的那个）在这里回收。删不掉就跳过 —— 说明还有人拿着它。
+  // 本轮的文件此刻还不存在（`run` 里的 exportVectorMatrix 才创建），所以不必排除它。
+  await sweepStaleMatrices(dir, log)
+
+  const files = [file]
+  try {
+    // 导出也在 try 里：它中途失败（磁盘满）会留下一个半截的 1 GB 文件，
+    // 而 finally 是唯一会去删它的地方。
+    return await run(file, extra => files.push(extra))
   }
   finally {
     // 1 GB 的临时文件，成功失败都不留下。
@@ -138,8 +353,10 @@ async function doRebuild(
     // ⚠️ 删不掉不能往外抛。超时那一路 worker 还 mmap 着它，Windows 上 `fs.rm` 会
     // 得到 EBUSY（`force: true` 只吞 ENOENT），抛出去就把真正的 `TaskTimeout` 换成
     // 一个看不懂的文件错误。留给下一轮的 `sweepStaleMatrices` 收。
-    await fs.rm(file, { force: true }).catch((err: unknown) =>
-      log.warn(`[dedup] 临时矩阵删不掉，留给下一轮回收：${file}（${String(err)}）`))
+    for (const f of files) {
+      await fs.rm(f, { force: true }).catch((err: unknown) =>
+        log.warn(`[dedup] 临时文件删不掉，留给下一轮回收：${f}（${String(err)}）`))
+    }
   }
 }
 
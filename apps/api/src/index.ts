@@ -3,11 +3,11 @@ import { serve } from '@hono/node-server'
 import { OpenAPIHono } from '@hono/zod-openapi'
 import { compress } from 'hono/compress'
 import { cors } from 'hono/cors'
-import { rebuildGroups } from './dedup.js'
+import { groupNewVectors } from './dedup.js'
 import { SILVA_SCORERS } from '@pictoria/contracts'
 import { getDb, migrate } from './db.js'
 import { httpError } from './openapi.js'
-import { startBasicsBackfill, startEmbeddingBackfill, startSilvaBackfill, startTaggerBackfill, startWaifuBackfill, wakeAllBackfills } from './scheduler.js'
+import { startAnalyzeBackfill, startBasicsBackfill, startSilvaBackfill, startTagVocabBackfill, wakeAllBackfills } from './scheduler.js'
 import { startAutoSync } from './sync.js'
 import { getTasks } from './tasks.js'
 import { annotationQueuesRoutes } from './routes/annotation-queues.js'
@@ -137,22 +137,23 @@ if (process.env.PICTORIA_SCHEDULER !== '0') {
     const { sqlite } = getDb()
     // basics 排在最前：其余 worker 的输入（尺寸、缩略图）都由它产出。
     startBasicsBackfill(sqlite, tasks)
-    for (const scorer of SILVA_SCORERS)
-      startSilvaBackfill(sqlite, tasks, { scorer })
-    startWaifuBackfill(sqlite, tasks)
-    startTaggerBackfill(sqlite, tasks)
-    // embedding 的待办清空之后要重建近重复分组 —— 新图不经过这一步就永远不会被
+    startSilvaBackfill(sqlite, tasks, { scorers: SILVA_SCORERS })
+    // tagger 建出的新 tag 紧跟着进词表，文搜图按 tag 名搜时不再跑前向。
+    startTagVocabBackfill(sqlite, tasks)
+    // embedding / tagger / waifu 共用一次解码（analyze）。
+    // embedding 的待办清空之后要给新图找近重复分组 —— 新图不经过这一步就永远不会被
     // 认成任何一张老图的重复（形状承自已删除的 EMBEDDING_WORKER.on_backfill_complete）。
-    startEmbeddingBackfill(sqlite, tasks, {
-      onDrained: async () => {
-        await rebuildGroups(sqlite, tasks).catch((err: unknown) =>
-          console.warn(`[dedup] 重建失败：${String(err)}`))
+    // 只算新向量对全库的那一条（`groupNewVectors`），进程起来后的第一次走全量。
+    startAnalyzeBackfill(sqlite, tasks, {
+      onDrained: async (postIds) => {
+        await groupNewVectors(sqlite, tasks, postIds).catch((err: unknown) =>
+          console.warn(`[dedup] 分组失败：${String(err)}`))
       },
     })
     // 磁盘变化和定时轮询都会触发一次对账，然后把 backfill 循环叫醒 ——
     // 形状承自已删除的 app.py 里的 watchdog + 10 分钟 poller。
     startAutoSync(sqlite, () => wakeAllBackfills())
-    console.warn('[pictoria-api] backfill 调度已启动：basics, silva, silva_luna, waifu, tagger, embedding')
+    console.warn('[pictoria-api] backfill 调度已启动：basics, silva, silva_luna, tag-vocab, analyze（embedding + tagger + waifu）')
     console.warn('[pictoria-api] 文件监视 + 10 分钟轮询已启动')
   })().catch((err: unknown) => {
     // ⚠️ 这个 catch 不能省。上面整段是 fire-and-forget，而 `getTasks()` 会 reject
@@ -106,12 +106,47 @@ export function dedupMatrixPath(tag: string): string {
  * `dedup-vectors.f32`（无 tag 的旧固定名）也要认：改成带 tag 的命名之前，超时 /
  * 被杀的重建会以这个名字留下约 1 GB 的残留，而删它的旧代码路径已经不在了 ——
  * 不认的话它就永远躺在 `.pictoria/` 里。
+ *
+ * 只认前缀不认扩展名：worker 把近邻对写在 `<矩阵>.pairs`（先写 `.tmp` 再改名），
+ * 同一个前缀，同一轮回收（同 `isRescoreFile`）。
  */
 export function isDedupMatrix(name: string): boolean {
-  return name === 'dedup-vectors.f32'
-    || (name.startsWith(DEDUP_MATRIX_PREFIX) && name.endsWith(DEDUP_MATRIX_EXT))
+  return name === 'dedup-vectors.f32' || name.startsWith(DEDUP_MATRIX_PREFIX)
+}
+
+/**
+ * 全库重打 SILVA 分时落地的临时矩阵，理由同 `dedupMatrixPath`。
+ *
+ * 前缀和 dedup 的分开：两边各回收各的，一边的 sweep 不会去删另一边正在用的文件。
+ * worker 把分数写在 `<矩阵>.scores.f32`（先写 `.tmp` 再改名），都是同一个前缀，
+ * 所以 `isRescoreFile` 只认前缀。
+ */
+const RESCORE_MATRIX_PREFIX = 'rescore-vectors-'
+
+export function rescoreMatrixPath(tag: string): string {
+  return path.resolve(pictoriaDir(), `${RESCORE_MATRIX_PREFIX}${tag}${DEDUP_MATRIX_EXT}`)
+}
+
+/** 这个文件名是不是某一轮重打分的矩阵或分数文件 —— `rescore.ts` 拿它回收残留。 */
+export function isRescoreFile(name: string): boolean {
+  return name.startsWith(RESCORE_MATRIX_PREFIX)
+}
+
+/**
+ * 单张图零样本打标时落地的一行矩阵（`zero-shot-tags` 只收矩阵文件）。几 KB，
+ * 调用方用完就删；万一进程在中途被杀，留下的也只是同样大小的一个文件。
+ */
+export function zeroShotMatrixPath(tag: string): string {
+  return path.resolve(pictoriaDir(), `zero-shot-vectors-${tag}${DEDUP_MATRIX_EXT}`)
 }
 
+/**
+ * 超过阈值的任务 payload / result 落地的目录（`sidecar.ts`，Python 侧
+ * `handlers.sidecar_dir()`）。单独一层子目录：文件名是内容哈希，认不出前缀，
+ * 整个目录归 `sidecar.ts` 回收。
+ */
+export const sidecarDir = once(() => path.resolve(pictoriaDir(), 'sidecar'))
+
 /**
  * `target` 是否落在 `root` 之内（含 `root` 自身）。
  *
@@ -0,0 +1,147 @@
+/**
+ * 全库重打 SILVA 分的编排 —— 导出、worker、回读分数文件、落库。
+ *
+ * 头重新发布之后每个 post 都要新分数，而 `startSilvaBackfill` 只看"还没有分的"，
+ * 逐批走队列也是 3500 次往返。这里借 dedup 的形状（见 `dedup.ts`）：全库向量导成
+ * 一个裸 float32 文件，worker mmap 读、大块过头，把分数写成旁边的第二个裸文件；
+ * TS 用导出时那份 ids 把行号翻回 post id，按 scorer 逐列 upsert。
+ *
+ * §D1 照旧：worker 只碰文件，一行 SQL 都不碰。
+ */
+import type { SilvaScorer } from '@pictoria/contracts'
+import type { CairnQ } from 'cairnq'
+import type { getDb } from './db.js'
+import fs from 'node:fs/promises'
+import path from 'node:path'
+import {
+  GPU_QUEUE,
+  SILVA_RESCORE_CHUNK_SIZE,
+  SILVA_SCORERS,
+  silvaRescoreTask,
+} from '@pictoria/contracts'
+import {
+  exportVectorMatrix,
+  postExists,
+  upsertAestheticScores,
+} from '@pictoria/db'
+import process from 'node:process'
+import { isRescoreFile, pictoriaDir, rescoreMatrixPath } from './paths.js'
+import { callTask } from './sidecar.js'
+
+type SqliteHandle = ReturnType<typeof getDb>['sqlite']
+type Log = Pick<Console, 'info' | 'warn'>
+
+/**
+ * 一次重打分最多等多久。head forward 在 CPU 上是每秒几万行的量级，22 万行一分钟
+ * 以内；10 分钟是给 worker 前面排着的 GPU 批次留的。超时只是不再等，任务照常跑完。
+ */
+const RESCORE_TIMEOUT_MS = 10 * 60_000
+
+/** 同 `dedup.ts` 的 `inFlight`：两次并发的全库重打分只会让后写者白烧一遍。 */
+let inFlight: Promise<number> | null = null
+
+export function isRescoring(): boolean {
+  return inFlight !== null
+}
+
+/**
+ * 用 `scorers` 重打全库每个有向量的 post，返回写入的分数条数。
+ *
+ * 已经有一轮在跑时等它跑完再来，理由同 `rebuildGroups`。
+ */
+export async function rescoreSilva(
+  sqlite: SqliteHandle,
+  tasks: CairnQ,
+  { scorers = [...SILVA_SCORERS], log = console }: { scorers?: SilvaScorer[], log?: Log } = {},
+): Promise<number> {
+  while (inFlight) {
+    try {
+      await inFlight
+    }
+    catch {
+      // 上一轮的失败归上一轮的调用方
+    }
+  }
+  const run = doRescore(sqlite, tasks, scorers, log)
+  inFlight = run
+  try {
+    return await run
+  }
+  finally {
+    inFlight = null
+  }
+}
+
+async function doRescore(
+  sqlite: SqliteHandle,
+  tasks: CairnQ,
+  scorers: SilvaScorer[],
+  log: Log,
+): Promise<number> {
+  const started = Date.now()
+  // 每轮新名字，理由同 `dedup.ts`：超时那一轮的 worker 可能还 mmap 着上一个文件。
+  const file = rescoreMatrixPath(`${process.pid}-${started}`)
+  const dir = pictoriaDir()
+  await fs.mkdir(dir, { recursive: true })
+  await sweepStaleFiles(dir, log)
+
+  let scoresPath: string | null = null
+  try {
+    const { ids, count, dim } = exportVectorMatrix(sqlite, file)
+    if (count === 0)
+      return 0
+
+    log.info(`[rescore] 导出 ${count} 条向量（${dim} 维），重打 ${scorers.join(', ')}`)
+    // 不设 key，理由同 dedup：矩阵每次都不同，`conflict: 'reuse'` 只会还回旧结果。
+    const result = await callTask(tasks, silvaRescoreTask, {
+      matrixPath: file,
+      count,
+      dim,
+      scorers,
+      chunkSize: SILVA_RESCORE_CHUNK_SIZE,
+    }, { queue: GPU_QUEUE, waitTimeoutMs: RESCORE_TIMEOUT_MS })
+    scoresPath = result.scoresPath
+
+    const width = result.scorers.length
+    const buf = await fs.readFile(scoresPath)
+    if (buf.length !== count * width * 4)
+      throw new Error(`分数文件 ${buf.length} 字节，应为 ${count * width * 4}（${count}x${width} float32）`)
+
+    // 导出到现在隔着一次 worker 往返，期间被删的 post 还在 ids 里；它们的分数会撞
+    // `REFERENCES posts(id)` 让整列回滚，所以先按存活 id 过滤（同 `replaceAllGroups`）。
+    const live = ids.flatMap((id, row) => postExists(sqlite, id) ? [row] : [])
+    let written = 0
+    result.scorers.forEach((scorer, col) => {
+      const rows = live.map(row => ({ postId: ids[row]!, score: buf.readFloatLE((row * width + col) * 4) }))
+      upsertAestheticScores(sqlite, scorer, rows)
+      written += rows.length
+    })
+    log.info(`[rescore] 写入 ${written} 条分数（${((Date.now() - started) / 1000).toFixed(1)}s）`)
+    return written
+  }
+  finally {
+    // 删不掉不往外抛，理由同 `dedup.ts`：留给下一轮的 sweep。
+    for (const f of scoresPath ? [file, scoresPath] : [file]) {
+      await fs.rm(f, { force: true }).catch((err: unknown) =>
+        log.warn(`[rescore] 临时文件删不掉，留给下一轮回收：${f}（${String(err)}）`))
+    }
+  }
+}
+
+/** 回收 `.pictoria/` 下上几轮残留的矩阵、分数文件。还占着的删不掉，跳过。 */
+async function sweepStaleFiles(dir: string, log: Log): Promise<void> {
+  let names: string[]
+  try {
+    names = await fs.readdir(dir)
+  }
+  catch {
+    return
+  }
+  for (const name of names) {
+    if (!isRescoreFile(name))
+      continue
+    await fs.rm(path.join(dir, name), { force: true })
+      .then(() => log.info(`[rescore] 回收了残留的临时文件 ${name}`))
+      .catch(() => {})
+  }
+}
@@ -11,15 +11,21 @@ import {
   captionTask,
   DANBOORU_LISTING_LIMIT,
   danbooruImportTask,
+  decodeVectorBatch,
   embeddingTask,
-  encodeVectorBlob,
+  encodeVectorBatch,
   GPU_QUEUE,
+  INTERACTIVE_QUEUE,
   IO_QUEUE,
+  SILVA_SCORERS,
   silvaTask,
   taggerTask,
   urlDownloadTask,
   urlScanTask,
   waifuTask,
+  workerStatsTask,
+  ZERO_SHOT_RATING_PROMPTS,
+  zeroShotTagsTask,
 } from '@pictoria/contracts'
 import {
   ensureCanonicalTagGroups,
@@ -30,6 +36,7 @@ import {
   getWaifuScore,
   isImagePath,
   listImportedDanbooruIds,
+  listTagsWithCounts,
   persistPostsWithTags,
   persistAutoTagsForPost,
   ratingToInt,
@@ -40,14 +47,18 @@ import {
 } from '@pictoria/db'
 import { Buffer } from 'node:buffer'
 import fs from 'node:fs'
+import fsp from 'node:fs/promises'
 import os from 'node:os'
 import path from 'node:path'
+import process from 'node:process'
 import { DEDUP_THRESHOLD, isRebuilding, rebuildGroups } from '../dedup.js'
 import { getDb } from '../db.js'
 import { OK, RESP_400, domainError, postNotFound, queryFlag, zodErrorHook } from '../openapi.js'
+import { isRescoring, rescoreSilva } from '../rescore.js'
 import { PostDetailPublic, Result, toPostDetail } from '../schemas.js'
+import { callTask } from '../sidecar.js'
 import { wakeAllBackfills } from '../scheduler.js'
-import { targetDir } from '../paths.js'
+import { pictoriaDir, targetDir, zeroShotMatrixPath } from '../paths.js'
 import { startSync } from '../sync.js'
 import { translateTag } from '../tag-i18n.js'
 import { getTasks } from '../tasks.js'
@@ -150,6 +161,43 @@ commandsRoutes.openapi(
   },
 )
 
+/**
+ * 全库重打 SILVA 分（头重新发布之后用）。形状同 group-duplicates：忙就报忙，否则
+ * fire-and-forget，结果打进日志。不给 `scorer` 就两个头一起重打 —— 一次导出、一次
+ * worker 往返，多一个头只是多一次 head forward。
+ */
+commandsRoutes.openapi(
+  createRoute({
+    method: 'post',
+    path: '/v2/cmd/rescore-silva',
+    operationId: 'v2RescoreSilva',
+    summary: 'RescoreSilva',
+    description: 'Recompute the SILVA scores of every post from its stored SigLIP2 vector.',
+    request: {
+      query: z.object({
+        scorer: z.enum(SILVA_SCORERS).nullable().optional()
+          .openapi({ param: { name: 'scorer', in: 'query', required: false } }),
+      }),
+    },
+    responses: {
+      201: { description: 'Document created, URL follows', content: { 'application/json': { schema: Result } } },
+      ...RESP_400,
+    },
+  }),
+  async (c) => {
+    const { scorer } = c.req.valid('query')
+    // 同 group-duplicates：先 await，忙检查和启动才落在同一个同步片段里。
+    const tasks = await getTasks()
+    if (isRescoring())
+      return c.json({ msg: 'SILVA rescoring already running' }, 201)
+
+    const scorers = scorer == null ? [...SILVA_SCORERS] : [scorer]
+    void rescoreSilva(getDb().sqlite, tasks, { scorers })
+      .catch((err: unknown) => console.warn(`[rescore] 重打分失败：${String(err)}`))
+    return c.json({ msg: `SILVA rescoring started (${scorers.join(', ')}).` }, 201)
+  },
+)
+
 /**
  * waifu 质量分：算一张、存一张、返回它。
  *
@@ -182,7 +230,7 @@ commandsRoutes.openapi(
       return c.json(existing)
 
     const tasks: CairnQ = await getTasks()
-    const result = await tasks.call(waifuTask, {
+    const result = await callTask(tasks, waifuTask, {
       items: [{ postId, path: guard.path }],
     }, oneShot(`waifu:one:${postId}`))
     upsertWaifuScores(sqlite, result.scores)
@@ -194,6 +242,20 @@ commandsRoutes.openapi(
   },
 )
 
+/** post 的 SigLIP2 向量；还没有就先算一个落库。算不出来（读不进这张图）返回 null。 */
+async function ensureVector(tasks: CairnQ, postId: number, imagePath: string): Promise<Buffer | null> {
+  const { sqlite } = getDb()
+  let blobs = fetchEmbeddingBlobs(sqlite, [postId])
+  if (!blobs.has(postId)) {
+    const embedded = await callTask(tasks, embeddingTask, {
+      items: [{ postId, path: imagePath }],
+    }, oneShot(`embedding:one:${postId}`))
+    upsertVectors(sqlite, decodeVectorBatch(embedded.embeddings))
+    blobs = fetchEmbeddingBlobs(sqlite, [postId])
+  }
+  return blobs.get(postId) ?? null
+}
+
 /**
  * SILVA / SILVA-Luna：两个蒸馏头共用这一段，只有 scorer 名不同。
  *
@@ -213,24 +275,14 @@ function silvaOneShot(scorer: 'silva' | 'silva_luna') {
       return c.json(existing)
 
     const tasks: CairnQ = await getTasks()
-    let blobs = fetchEmbeddingBlobs(sqlite, [postId])
-    if (!blobs.has(postId)) {
-      const embedded = await tasks.call(embeddingTask, {
-        items: [{ postId, path: guard.path }],
-      }, oneShot(`embedding:one:${postId}`))
-      upsertVectors(sqlite, embedded.embeddings.map(e => ({
-        postId: e.postId,
-        embedding: Buffer.from(e.embedding, 'base64'),
-      })))
-      blobs = fetchEmbeddingBlobs(sqlite, [postId])
-    }
+    const blob = await ensureVector(tasks, postId, guard.path)
     // 向量算不出来 = 这张图读不进来。和 waifu 一样报 400。
-    if (!blobs.has(postId))
+    if (!blob)
       return domainError(`Post ${postId} is not an image.`, 'NotAnImageError', 400)
 
-    const result = await tasks.call(silvaTask, {
-      scorer,
-      items: [{ postId, embedding: encodeVectorBlob(blobs.get(postId)!) }],
+    const result = await callTask(tasks, silvaTask, {
+      scorers: [scorer],
+      embeddings: encodeVectorBatch([{ postId, blob }]),
     }, oneShot(`${scorer}:one:${postId}`))
     upsertAestheticScores(sqlite, scorer, result.scores)
 
@@ -273,6 +325,82 @@ commandsRoutes.openapi(
   silvaOneShot('silva_luna'),
 )
 
+/**
+ * 零样本打标的候选 tag：库里用得最多的这么多个。全部 tag（十几万）也算得动，
+ * 但 worker 每次都要从词表里抽出 `tags × 1152` 的标签矩阵，一张图不值得几百 MB。
+ */
+const ZERO_SHOT_CANDIDATE_TAGS = 5000
+/** 每张图最多回几个 tag、概率下限。SigLIP 的 sigmoid 偏保守，阈值放得很低。 */
+const ZERO_SHOT_TOP_K = 32
+const ZERO_SHOT_THRESHOLD = 0.05
+
+const ZeroShotTags = z
+  .object({
+    tags: z.array(z.object({ name: z.string(), probability: z.number() })),
+    rating: z.string(),
+  })
+  .openapi('ZeroShotTags')
+
+/**
+ * 零样本 tag / rating 推荐：拿已存的 SigLIP2 向量对 tag 词表打分，不打开图片、
+ * 不落库 —— 结果是"推荐"，由人决定收不收。没有向量时同 SILVA，先算向量。
+ *
+ * 任务只收矩阵文件，所以这里把一行向量写成 `.pictoria/` 下的临时文件，用完即删。
+ */
+commandsRoutes.openapi(
+  createRoute({
+    method: 'get',
+    path: '/v2/cmd/zero-shot-tags/{post_id}',
+    operationId: 'v2GetZeroShotTags',
+    summary: 'GetZeroShotTags',
+    description: 'Suggest tags and a rating for one post from its SigLIP2 embedding (zero-shot, not persisted).',
+    request: { params: z.object({ post_id: postIdParam }) },
+    responses: {
+      200: { description: OK, content: { 'application/json': { schema: ZeroShotTags } } },
+      ...RESP_400,
+    },
+  }),
+  async (c) => {
+    const { post_id: postId } = c.req.valid('param')
+    const guard = requireImage(postId)
+    if (!guard.ok)
+      return guard.response as never
+
+    const tasks: CairnQ = await getTasks()
+    const blob = await ensureVector(tasks, postId, guard.path)
+    if (!blob)
+      return domainError(`Post ${postId} is not an image.`, 'NotAnImageError', 400) as never
+
+    const candidates = listTagsWithCounts(getDb().sqlite)
+      .sort((a, b) => b.count - a.count)
+      .slice(0, ZERO_SHOT_CANDIDATE_TAGS)
+      .map(t => t.name)
+    const file = zeroShotMatrixPath(`${process.pid}-${postId}-${Date.now()}`)
+    await fsp.mkdir(pictoriaDir(), { recursive: true })
+    await fsp.writeFile(file, blob)
+    try {
+      // 不设 key：候选 tag 随库变化，旧结果不能当缓存。
+      const result = await callTask(tasks, zeroShotTagsTask, {
+        matrixPath: file,
+        count: 1,
+        dim: blob.length / 4,
+        tags: candidates,
+        ratingPrompts: { ...ZERO_SHOT_RATING_PROMPTS },
+        topK: ZERO_SHOT_TOP_K,
+        threshold: ZERO_SHOT_THRESHOLD,
+        chunkSize: 1,
+      }, { queue: GPU_QUEUE, waitTimeoutMs: 300_000, maxAttempts: 1 })
+      return c.json({
+        tags: (result.tags[0] ?? []).map(([i, p]) => ({ name: candidates[i]!, probability: p })),
+        rating: result.ratings[0] ?? '',
+      })
+    }
+    finally {
+      await fsp.rm(file, { force: true }).catch(() => {})
+    }
+  },
+)
+
 /**
  * 自动标签：跑 WDTagger，标签和 rating 落库，返回最新详情。
  *
@@ -301,7 +429,7 @@ commandsRoutes.openapi(
       return postNotFound(postId) as never
 
     const tasks: CairnQ = await getTasks()
-    const result = await tasks.call(taggerTask, {
+    const result = await callTask(tasks, taggerTask, {
       items: [{ postId, path: `${targetDir()}/${post.fullPath}` }],
     }, oneShot(`tagger:one:${postId}`))
 
@@ -349,7 +477,7 @@ commandsRoutes.openapi(
       return postNotFound(postId) as never
 
     const tasks: CairnQ = await getTasks()
-    const result = await tasks.call(captionTask, {
+    const result = await callTask(tasks, captionTask, {
       imagePath: `${targetDir()}/${post.fullPath}`,
     }, { queue: IO_QUEUE, waitTimeoutMs: 120_000, pollMs: 20, maxPollMs: 50, maxAttempts: 1 })
 
@@ -472,7 +600,7 @@ commandsRoutes.openapi(
     const saveDir = path.resolve(targetDir(), filePathStr)
 
     const tasks: CairnQ = await getTasks()
-    const result = await tasks.call(danbooruImportTask, {
+    const result = await callTask(tasks, danbooruImportTask, {
       tags,
       limit: DANBOORU_LISTING_LIMIT,
       fullScan,
@@ -585,7 +713,7 @@ async function importOnce(url: string, status: typeof urlImportStatus): Promise<
   const { sqlite } = getDb()
   const tasks: CairnQ = await getTasks()
 
-  const scan = await tasks.call(urlScanTask, { url }, {
+  const scan = await callTask(tasks, urlScanTask, { url }, {
     queue: IO_QUEUE,
     waitTimeoutMs: 30 * 60_000,
     pollMs: 200,
@@ -608,7 +736,7 @@ async function importOnce(url: string, status: typeof urlImportStatus): Promise<
   if (!fresh.length)
     return
 
-  const result = await tasks.call(urlDownloadTask, {
+  const result = await callTask(tasks, urlDownloadTask, {
     items: fresh,
     saveDir: path.resolve(targetDir(), scan.filePath),
     filePathStr: scan.filePath,
@@ -674,3 +802,42 @@ commandsRoutes.openapi(
   }),
   c => c.json(urlImportStatus),
 )
+
+/**
+ * worker 进程内的计数器：隔离区、常驻模型、提示词缓存、tag 词表（`WorkerStatsResult`）。
+ *
+ * 这些数字只活在 worker 进程里、从不落库，所以只能现问。走交互队列，不排在 backfill
+ * 批次后面；worker 没起来时这里等满 10 秒后报错，而不是一直挂着。
+ */
+const WorkerStats = z
+  .object({
+    quarantine: z.record(z.string(), z.unknown()),
+    models: z.record(z.string(), z.unknown()),
+    textEmbedCache: z.record(z.string(), z.unknown()).nullable(),
+    tagVocab: z.record(z.string(), z.unknown()).nullable(),
+  })
+  .openapi('WorkerStats')
+
+commandsRoutes.openapi(
+  createRoute({
+    method: 'get',
+    path: '/v2/cmd/worker-stats',
+    operationId: 'v2WorkerStats',
+    summary: 'WorkerStats',
+    description: 'In-process counters of the Python worker: quarantine, resident models, text-embed cache and tag vocabulary.',
+    responses: {
+      200: { description: OK, content: { 'application/json': { schema: WorkerStats } } },
+    },
+  }),
+  async (c) => {
+    const tasks = await getTasks()
+    const stats = await callTask(tasks, workerStatsTask, {}, {
+      queue: INTERACTIVE_QUEUE,
+      waitTimeoutMs: 10_000,
+      maxAttempts: 1,
+      pollMs: 20,
+      maxPollMs: 50,
+    })
+    return c.json(stats)
+  },
+)
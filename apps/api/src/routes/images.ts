@@ -22,6 +22,7 @@ import { Readable } from 'node:stream'
 import { getDb } from '../db.js'
 import { RESP_400, httpError, zodErrorHook } from '../openapi.js'
 import { presignGetObject } from '../s3.js'
+import { callTask } from '../sidecar.js'
 import { resolveInside, targetDir, thumbnailsDir } from '../paths.js'
 import { getTasks } from '../tasks.js'
 
@@ -121,7 +122,7 @@ async function ensureThumbnail(originalPath: string, thumbPath: string): Promise
   if (fs.existsSync(thumbPath))
     return null
   const tasks = await getTasks()
-  const result = await tasks.call(thumbnailTask, {
+  const result = await callTask(tasks, thumbnailTask, {
     originalPath,
     thumbnailPath: thumbPath,
   }, {
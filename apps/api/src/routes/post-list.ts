@@ -12,6 +12,7 @@ import { getDb } from '../db.js'
 import { PostFilterWithOrderSchema, TextSearchRequestSchema as TextSearchRequest } from '../filter-schema.js'
 import { OK, RESP_400, domainError, zodErrorHook } from '../openapi.js'
 import { PostSimplePublic, toPostDetail, toPostSimple } from '../schemas.js'
+import { callTask } from '../sidecar.js'
 import { translateTag } from '../tag-i18n.js'
 import { getTasks } from '../tasks.js'
 
@@ -145,7 +146,7 @@ postListRoutes.openapi(
       return c.json([])
 
     const tasks = await getTasks()
-    const { embedding, scale, bias } = await tasks.call(textEmbedTask, { prompt }, {
+    const { embedding, scale, bias } = await callTask(tasks, textEmbedTask, { prompt }, {
       queue: INTERACTIVE_QUEUE,
       // 同一个 prompt 复用同一个任务：连打字带防抖也会重复提交同一串。
       key: `text-embed:${prompt}`,
@@ -13,6 +13,7 @@ import { OK, RESP_400, domainError, postNotFound, queryFlag, zodErrorHook } from
 import { PostDetailPublic, toPostDetail } from '../schemas.js'
 import { targetDir, thumbnailsDir } from '../paths.js'
 import { deletePostFiles } from '../post-files.js'
+import { callTask } from '../sidecar.js'
 import { translateTag } from '../tag-i18n.js'
 import { getTasks } from '../tasks.js'
 
@@ -296,7 +297,7 @@ postWritesRoutes.openapi(
 
     const base = targetDir()
     const tasks = await getTasks()
-    const result = await tasks.call(rotateTask, {
+    const result = await callTask(tasks, rotateTask, {
       originalPath: path.resolve(base, post.fullPath),
       thumbnailPath: path.resolve(thumbnailsDir(), post.fullPath),
       clockwise,
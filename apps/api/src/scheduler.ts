@@ -16,26 +16,29 @@
 import type { CairnQ } from 'cairnq'
 import type { getDb } from './db.js'
 import {
+  ANALYZE_MODELS,
+  analyzeTask,
   BASICS_TASK_BATCH,
   BASICS_WORKER_KEY,
   basicsTask,
+  decodeVectorBatch,
   EMBEDDING_TASK_BATCH,
+  EMBEDDING_VECTOR_ENCODING,
   EMBEDDING_WORKER_KEY,
-  embeddingTask,
-  encodeVectorBlob,
+  encodeVectorBatch,
   GPU_QUEUE,
   IO_QUEUE,
   SILVA_TASK_BATCH,
+  SILVA_VECTOR_ENCODING,
   silvaTask,
-  TAGGER_TASK_BATCH,
+  TAG_VOCAB_TASK_BATCH,
+  tagVocabTask,
   TAGGER_WORKER_KEY,
-  taggerTask,
-  WAIFU_TASK_BATCH,
   WAIFU_WORKER_KEY,
-  waifuTask,
+  type AnalyzeModel,
   type SilvaScorer,
+  type TagVocabPayload,
 } from '@pictoria/contracts'
-import { Buffer } from 'node:buffer'
 import {
   ensureCanonicalTagGroups,
   listBasicsPending,
@@ -43,6 +46,7 @@ import {
   listEmbeddingPending,
   listSilvaPending,
   listTaggerPending,
+  listTagsAfterRowid,
   listWaifuPending,
   persistTaggerResults,
   recordFailures,
@@ -50,8 +54,11 @@ import {
   upsertBasics,
   upsertVectors,
   upsertWaifuScores,
+  type PendingImage,
 } from '@pictoria/db'
 import { targetDir } from './paths.js'
+import { callTask } from './sidecar.js'
+import { translatedLangs } from './tag-i18n.js'
 
 /** better-sqlite3 的连接类型，从 `getDb()` 借出来 —— apps/api 不直接依赖那个包。 */
 type SqliteHandle = ReturnType<typeof getDb>['sqlite']
@@ -175,15 +182,20 @@ function loop(name: string, tick: () => Promise<boolean>, log: Log): BackfillHan
  * `_resolve_items`），整批都这样时回来的就是空 scores + 空 failures。当成"干了活"
  * 就是一个不睡觉的死循环 —— 待办查询按 id 排序，下一轮选出的还是同一批。
  *
- * 五个 worker 共用这一条规则。写在各自的 tick 里意味着加第六个 worker 时要重新推导
- * 一遍，而推错的表现是 CPU 空转。
+ * 所有循环共用这一条规则。写在各自的 tick 里意味着加一个循环时要重新推导一遍，
+ * 而推错的表现是 CPU 空转。
  */
 function progressed(...produced: Array<{ length: number }>): boolean {
   return produced.some(p => p.length > 0)
 }
 
 /**
- * SILVA / SILVA-Luna：输入是已存的向量，输出一个标量。
+ * SILVA / SILVA-Luna：输入是已存的向量，每个头输出一个标量。
+ *
+ * 所有头共用**一个**循环：一批取的是"至少缺一个头的分"的 post，这批里缺哪些头
+ * 就让 worker 跑哪些头。同一批向量只过一次队列、解码一次 —— 原来每个头一个循环，
+ * 两个头就是同样的 64 条向量发两遍。已经有分的 (post, 头) 顺带重算一遍也无妨，
+ * 同一个头算出来的就是同一个数。
  *
  * 失败不拉黑 —— 能取到向量就应该能打分，所以失败是暂时的/代码的问题，值得下一轮
  * 重试，而不是把这批数据永久跳过（与 Python 侧的 `blacklist_policy = never` 同义）。
@@ -191,177 +203,164 @@ function progressed(...produced: Array<{ length: number }>): boolean {
 export function startSilvaBackfill(
   sqlite: SqliteHandle,
   tasks: CairnQ,
-  { scorer, log = console }: { scorer: SilvaScorer, log?: Log },
+  { scorers, log = console }: { scorers: readonly SilvaScorer[], log?: Log },
 ): BackfillHandle {
-  return loop(scorer, async () => {
-    const pending = listSilvaPending(sqlite, scorer, SILVA_TASK_BATCH)
+  return loop('silva', async () => {
+    // 每个头各取前 SILVA_TASK_BATCH 个就够：并集里最小的那一批，一定落在各自的前一批里。
+    const pendingBy = new Map(scorers.map(s => [s, new Set(listSilvaPending(sqlite, s, SILVA_TASK_BATCH))]))
+    const pending = [...new Set([...pendingBy.values()].flatMap(ids => [...ids]))]
+      .sort((a, b) => a - b)
+      .slice(0, SILVA_TASK_BATCH)
     if (!pending.length)
       return false
+    const wanted = scorers.filter(s => pending.some(pid => pendingBy.get(s)!.has(pid)))
 
     const blobs = fetchEmbeddingBlobs(sqlite, pending)
-    const items = pending
+    const embeddings = encodeVectorBatch(pending
       .filter(pid => blobs.has(pid))
-      .map(pid => ({ postId: pid, embedding: encodeVectorBlob(blobs.get(pid)!) }))
+      .map(pid => ({ postId: pid, blob: blobs.get(pid)! })), SILVA_VECTOR_ENCODING)
     // 待办查询说它们有向量，取的时候却没有 —— 两次查询之间被删了。
-    if (!items.length)
+    if (!embeddings.postIds.length)
       return false
 
-    const result = await tasks.call(silvaTask, { scorer, items }, {
+    const result = await callTask(tasks, silvaTask, { scorers: wanted, embeddings }, {
       queue: GPU_QUEUE,
       // 同一批重复提交拿回同一个在跑的任务（或超时后已完成的结果），而不是第二次 GPU 计算
-      key: batchKey(scorer, items.map(i => i.postId)),
+      key: batchKey(wanted.join('+'), embeddings.postIds),
       conflict: 'reuse-succeeded',
       waitTimeoutMs: CALL_TIMEOUT_MS,
     })
-    upsertAestheticScores(sqlite, scorer, result.scores)
-    log.info(`[${scorer}] 落库 ${result.scores.length} 条，起始 id ${items[0]!.postId}`)
+    for (const scorer of wanted)
+      upsertAestheticScores(sqlite, scorer, result.scores.filter(r => r.scorer === scorer))
+    log.info(`[silva] ${wanted.join(', ')} 落库 ${result.scores.length} 条，起始 id ${embeddings.postIds[0]}`)
     return progressed(result.scores)
   }, log)
 }
 
 /**
- * waifu：输入是图片本身。
+ * embedding / tagger / waifu：三个图像模型共用一个循环，每张图只解码一次（`analyzeTask`）。
  *
- * 与 silva 的关键差别是失败**要**拉黑：一张读不出来的图不会自己变好，不拉黑的话
- * 待办查询每一轮都会重选它，永远卡在同一批上（Python 侧的
- * `blacklist_policy = "ladder"`）。
- */
-export function startWaifuBackfill(
-  sqlite: SqliteHandle,
-  tasks: CairnQ,
-  { log = console }: { log?: Log } = {},
-): BackfillHandle {
-  const root = targetDir()
-  return loop('waifu', async () => {
-    const items = listWaifuPending(sqlite, root, WAIFU_TASK_BATCH)
-    if (!items.length)
-      return false
-
-    const result = await tasks.call(waifuTask, { items }, {
-      queue: GPU_QUEUE,
-      key: batchKey('waifu', items.map(i => i.postId)),
-      conflict: 'reuse-succeeded',
-      waitTimeoutMs: CALL_TIMEOUT_MS,
-    })
-    upsertWaifuScores(sqlite, result.scores)
-    recordFailures(sqlite, WAIFU_WORKER_KEY, result.failures)
-    log.info(
-      `[waifu] 落库 ${result.scores.length} 条`
-      + (result.failures.length ? `，拉黑 ${result.failures.length} 条` : '')
-      + `，起始 id ${items[0]!.postId}`,
-    )
-    // 整批都失败时仍然算"干了活"：黑名单已经写下，下一轮的待办查询不会再选它们。
-    return progressed(result.scores, result.failures)
-  }, log)
-}
-
-/**
- * tagger：算在 Python，落库在 TS —— 三个 worker 里落库最复杂的一个。
+ * 三个独立循环各自打开、解码同一张原图，20 万张的首次导入就是每张三次全分辨率解码。
+ * 这里每一批取"至少缺一个模型产物"的 post（各模型的待办查询各取前一批，取并集里
+ * id 最小的 `EMBEDDING_TASK_BATCH` 个 —— 批大小受最大的那个模型约束），只让 worker
+ * 跑这批里确实有人缺的模型。
  *
- * worker 只回传标签名和 rating 字符串。哪个标签属于哪个组、rating 能不能覆盖已有值，
- * 都是 schema 的知识，留在拥有 schema 的这一侧。
- */
-export function startTaggerBackfill(
-  sqlite: SqliteHandle,
-  tasks: CairnQ,
-  { log = console }: { log?: Log } = {},
-): BackfillHandle {
-  const root = targetDir()
-  return loop('tagger', async () => {
-    const items = listTaggerPending(sqlite, root, TAGGER_TASK_BATCH)
-    if (!items.length)
-      return false
-
-    const result = await tasks.call(taggerTask, { items }, {
-      queue: GPU_QUEUE,
-      key: batchKey('tagger', items.map(i => i.postId)),
-      conflict: 'reuse-succeeded',
-      waitTimeoutMs: CALL_TIMEOUT_MS,
-    })
-
-    const groups = ensureCanonicalTagGroups(sqlite)
-    // 落库后仍然没有 is_auto 行的那些 —— tagger 产出的标签全部被同名手工标签遮住了。
-    // 重跑只会得到同样的结果，所以和读不出来的图一样拉黑。
-    const shadowed = persistTaggerResults(sqlite, result.results, groups)
-    recordFailures(sqlite, TAGGER_WORKER_KEY, [
-      ...result.failures,
-      ...shadowed.map(postId => ({ postId, error: 'all auto tags shadowed by manual tags' })),
-    ])
-    log.info(
-      `[tagger] 落库 ${result.results.length} 条`
-      + (result.failures.length || shadowed.length
-        ? `，拉黑 ${result.failures.length + shadowed.length} 条（${shadowed.length} 条被手工标签遮住）`
-        : '')
-      + `，起始 id ${items[0]!.postId}`,
-    )
-    return progressed(result.results, result.failures)
-  }, log)
-}
-
-/**
- * embedding：SigLIP 2 检索向量。
- *
- * 唯一带**后置钩子**的 worker，形状承自已删除的 `EMBEDDING_WORKER.on_backfill_complete`：
- * 写进新向量之后要重建近重复分组，否则新图永远不会被认成任何一张老图的重复。
+ * 落库按模型**各自的待办集合**过滤：一张图缺 tagger 但已有向量时，它的向量照样算
+ * 出来（同一次前向的副产品），但不重写 —— 每个模型落库的行与原来的独立循环完全
+ * 相同。失败语义也不变：读不出来的图、tagger 的空结果、被手工标签遮住的，都拉黑
+ * 进各自模型的桶（Python 侧的 `blacklist_policy = "ladder"`），否则待办查询会每一轮
+ * 重选它们。
  *
- * 触发时机是**待办清空的那一刻**，不是每一批之后 —— 一次重建是全库分块矩阵乘，
- * 分钟级；每 16 张图触发一次等于让 GPU 什么正事都干不成。Python 侧 `run_all_backfill`
- * 跑完整轮才 fire 一次，这里的"清空即一轮结束"是它的等价物。
+ * embedding 带**后置钩子**，形状承自已删除的 `EMBEDDING_WORKER.on_backfill_complete`：
+ * 写进新向量之后要给新图找近重复分组。触发时机是 embedding 待办**清空的那一刻**，
+ * 不是每一批之后；tagger / waifu 还有待办不影响它。
  */
-export function startEmbeddingBackfill(
+export function startAnalyzeBackfill(
   sqlite: SqliteHandle,
   tasks: CairnQ,
   { log = console, onDrained }: {
     log?: Log
-    /** 待办清空、且这一轮确实写进过向量时调用，参数是这一轮写了多少条。 */
-    onDrained?: (written: number) => Promise<void>
+    /**
+     * embedding 待办清空、且这一轮确实写进过向量时调用，参数是这一轮写过向量的
+     * post id（近重复分组只需为它们增量计算）。
+     */
+    onDrained?: (postIds: number[]) => Promise<void>
   } = {},
 ): BackfillHandle {
   const root = targetDir()
   let writtenSinceIdle = 0
-  return loop('embedding', async () => {
-    const items = listEmbeddingPending(sqlite, root, EMBEDDING_TASK_BATCH)
-    if (!items.length) {
-      if (writtenSinceIdle && onDrained) {
-        const written = writtenSinceIdle
-        // 先清零再 await：重组是分钟级的，期间新写进来的向量属于**下一轮**，
-        // 不该被这一次的计数吞掉。
-        writtenSinceIdle = 0
-        log.info(`[embedding] 待办清空，本轮写入 ${written} 条，触发近重复重组`)
-        await onDrained(written)
-      }
-      return false
+  let idsSinceIdle: number[] = []
+  return loop('analyze', async () => {
+    const pendingBy = new Map<AnalyzeModel, Map<number, PendingImage>>([
+      ['embedding', byPostId(listEmbeddingPending(sqlite, root, EMBEDDING_TASK_BATCH))],
+      ['tagger', byPostId(listTaggerPending(sqlite, root, EMBEDDING_TASK_BATCH))],
+      ['waifu', byPostId(listWaifuPending(sqlite, root, EMBEDDING_TASK_BATCH))],
+    ])
+    if (!pendingBy.get('embedding')!.size && writtenSinceIdle && onDrained) {
+      const postIds = idsSinceIdle
+      // 先清零再 await：重组期间新写进来的向量属于**下一轮**，不该被这一次吞掉。
+      // 这一次失败了也不把 id 放回来 —— `groupNewVectors` 会让下一次走全量，全量
+      // 本来就覆盖它们。
+      writtenSinceIdle = 0
+      idsSinceIdle = []
+      log.info(`[analyze] embedding 待办清空，本轮写入 ${postIds.length} 条，触发近重复分组`)
+      await onDrained(postIds)
     }
 
-    const result = await tasks.call(embeddingTask, { items }, {
+    const all = new Map<number, PendingImage>()
+    for (const pending of pendingBy.values()) {
+      for (const [pid, item] of pending) all.set(pid, item)
+    }
+    const items = [...all.values()].sort((a, b) => a.postId - b.postId).slice(0, EMBEDDING_TASK_BATCH)
+    if (!items.length)
+      return false
+    const wanted = ANALYZE_MODELS.filter(m => items.some(i => pendingBy.get(m)!.has(i.postId)))
+    const wants = (model: AnalyzeModel) => (row: { postId: number }) => pendingBy.get(model)!.has(row.postId)
+
+    const result = await callTask(tasks, analyzeTask, {
+      models: wanted,
+      items,
+      vectorEncoding: EMBEDDING_VECTOR_ENCODING,
+    }, {
       queue: GPU_QUEUE,
-      key: batchKey('embedding', items.map(i => i.postId)),
+      key: batchKey(`analyze:${wanted.join('+')}`, items.map(i => i.postId)),
       conflict: 'reuse-succeeded',
       waitTimeoutMs: CALL_TIMEOUT_MS,
     })
-    // 用真正写进去的条数，不是回来的条数：算完的这段时间里 post 可能已经被 sync
-    // 删掉了，那种会被 upsertVectors 跳过。拿回来的条数计数会让"这一轮写过向量"
-    // 在一批全被跳过时也成立，白触发一次分钟级的重组。
-    const written = upsertVectors(sqlite, result.embeddings.map(e => ({
-      postId: e.postId,
-      embedding: Buffer.from(e.embedding, 'base64'),
-    })))
-    recordFailures(sqlite, EMBEDDING_WORKER_KEY, result.failures)
-    writtenSinceIdle += written
-    log.info(
-      `[embedding] 落库 ${written} 条`
-      + (written < result.embeddings.length ? `（${result.embeddings.length - written} 条的 post 已被删除）` : '')
-      + (result.failures.length ? `，拉黑 ${result.failures.length} 条` : '')
-      + `，起始 id ${items[0]!.postId}`,
-    )
-    return progressed(result.embeddings, result.failures)
+
+    const done: string[] = []
+    const produced: Array<{ length: number }> = []
+    if (result.embeddings) {
+      // 用真正写进去的条数，不是回来的条数：算完的这段时间里 post 可能已经被 sync
+      // 删掉了，那种会被 upsertVectors 跳过。拿回来的条数计数会让"这一轮写过向量"
+      // 在一批全被跳过时也成立，白触发一次近重复分组。
+      const vectors = decodeVectorBatch(result.embeddings).filter(wants('embedding'))
+      const failures = (result.failures.embedding ?? []).filter(wants('embedding'))
+      const written = upsertVectors(sqlite, vectors)
+      recordFailures(sqlite, EMBEDDING_WORKER_KEY, failures)
+      writtenSinceIdle += written
+      // 含被 upsertVectors 跳过的（post 已删）：导出时查不到向量，自然不占行。
+      idsSinceIdle.push(...vectors.map(v => v.postId))
+      done.push(`embedding ${written}` + (failures.length ? `（拉黑 ${failures.length}）` : ''))
+      produced.push(vectors, failures)
+    }
+    if (result.results) {
+      const rows = result.results.filter(wants('tagger'))
+      const failures = (result.failures.tagger ?? []).filter(wants('tagger'))
+      const groups = ensureCanonicalTagGroups(sqlite)
+      // 落库后仍然没有 is_auto 行的那些 —— tagger 产出的标签全部被同名手工标签遮住了。
+      // 重跑只会得到同样的结果，所以和读不出来的图一样拉黑。
+      const shadowed = persistTaggerResults(sqlite, rows, groups)
+      recordFailures(sqlite, TAGGER_WORKER_KEY, [
+        ...failures,
+        ...shadowed.map(postId => ({ postId, error: 'all auto tags shadowed by manual tags' })),
+      ])
+      const blocked = failures.length + shadowed.length
+      done.push(`tagger ${rows.length}` + (blocked ? `（拉黑 ${blocked}，${shadowed.length} 条被手工标签遮住）` : ''))
+      produced.push(rows, failures)
+    }
+    if (result.scores) {
+      const scores = result.scores.filter(wants('waifu'))
+      const failures = (result.failures.waifu ?? []).filter(wants('waifu'))
+      upsertWaifuScores(sqlite, scores)
+      recordFailures(sqlite, WAIFU_WORKER_KEY, failures)
+      done.push(`waifu ${scores.length}` + (failures.length ? `（拉黑 ${failures.length}）` : ''))
+      produced.push(scores, failures)
+    }
+    log.info(`[analyze] 落库 ${done.join('，')}，起始 id ${items[0]!.postId}`)
+    // 整批都失败时仍然算"干了活"：黑名单已经写下，下一轮的待办查询不会再选它们。
+    return progressed(...produced)
   }, log)
 }
 
+function byPostId(items: PendingImage[]): Map<number, PendingImage> {
+  return new Map(items.map(i => [i.postId, i]))
+}
+
 /**
  * basics：sha256 / arthash / 尺寸 / 调色板 / 主色，外加缩略图。
  *
- * 六个 worker 里唯一不碰模型的一个，所以它走 IO 队列（并发 4）而不是 GPU 队列。
+ * 唯一不碰模型的循环，所以它走 IO 队列（并发 4）而不是 GPU 队列。
  * 失败**要**拉黑，而且有两种：读不出来的文件，以及解码成功但取不出调色板的
  * （退化的纯色图）。后者其余字段照常落库，只有 `dominant_color` 留 NULL ——
  * 而那正是待办查询的条件之一，不拉黑就会每一轮重选它。
@@ -377,7 +376,7 @@ export function startBasicsBackfill(
     if (!items.length)
       return false
 
-    const result = await tasks.call(basicsTask, { items }, {
+    const result = await callTask(tasks, basicsTask, { items }, {
       queue: IO_QUEUE,
       key: batchKey('basics', items.map(i => i.postId)),
       conflict: 'reuse-succeeded',
@@ -393,3 +392,37 @@ export function startBasicsBackfill(
     return progressed(result.rows, result.failures)
   }, log)
 }
+
+/**
+ * tag 词表：新建的 tag 预先算好文本向量，文搜图按 tag 名搜时直接查表。
+ *
+ * 游标是 `tags.rowid`，存在 worker 的词表目录里（`TagVocabResult.through`），不在
+ * 这个进程里：API 重启后从上次停下的地方接着发，而不是把十几万个 tag 从头再过一遍；
+ * 换模型时词表目录重建、游标跟着归零，这边不用感知。库里不加列、不加迁移。
+ *
+ * 进程里只缓存一份 `through`，第一轮发一个空块去问。游标在任务成功之后才前移：
+ * 一块失败了，下一轮重发的还是同一块。
+ */
+export function startTagVocabBackfill(
+  sqlite: SqliteHandle,
+  tasks: CairnQ,
+  { log = console }: { log?: Log } = {},
+): BackfillHandle {
+  let through: number | null = null
+  return loop('tag-vocab', async () => {
+    const langs = translatedLangs()
+    // 不设 key：worker 侧按内容去重，重发同一块就是一次空转。
+    const call = (payload: TagVocabPayload) => callTask(tasks, tagVocabTask, payload, { queue: GPU_QUEUE, waitTimeoutMs: CALL_TIMEOUT_MS })
+    through ??= (await call({ tags: [], langs })).through
+
+    const rows = listTagsAfterRowid(sqlite, through, TAG_VOCAB_TASK_BATCH)
+    if (!rows.length)
+      return false
+
+    const result = await call({ tags: rows.map(r => r.name), langs, through: rows.at(-1)!.rowid })
+    through = result.through
+    if (result.added)
+      log.info(`[tag-vocab] ${rows.length} 个 tag 新编码 ${result.added} 条，词表共 ${result.rows} 行`)
+    return true
+  }, log)
+}
@@ -0,0 +1,151 @@
+/**
+ * 任务 payload / result 的旁路文件通道 —— 所有 `tasks.call` 都走这里的 `callTask`。
+ *
+ * dedup 和重打分早就把矩阵按路径传了，但其它任务的大数据仍然是 `tasks.sqlite` 里
+ * 的 JSON 行：embedding 批次的向量、danbooru 导入的 `importedIds`、tagger 的整批
+ * 结果。那个库一次只有一个写者，每行提交写一次、完成写一次，再在表里躺满保留期。
+ * 现在 JSON 超过 `SIDECAR_THRESHOLD` 字节的一侧写成 `.pictoria/sidecar/<sha256>.json`，
+ * 队列里只放引用（`SidecarRef`，形状和 worker 的 `worker/sidecar.py` 共用）。
+ *
+ * ## 什么时候删
+ *
+ * worker 从不删，删全在这边，时机是"任务被确认"：
+ *
+ * - **payload 文件**：`call` 成功返回就删。在那之前删不得 —— 超时只是不再等，任务
+ *   照样会跑；失败会重试，重试要重读同一个文件。内容寻址意味着两个同时在跑的相同
+ *   payload 共用一个文件，所以按进程内引用计数删。
+ * - **result 文件**：读完就删，**除非这次调用带了 key**。`'reuse-succeeded'` 会在
+ *   保留期内把同一个成功结果（也就是同一个引用）再还一次，文件先删了那次就读不到。
+ *   带 key 的结果文件留给下面的按龄回收，和 succeeded 行一起过期。
+ * - 其余（超时、进程被杀、失败任务的 payload）由 `sweepSidecars` 按 mtime 收：超过
+ *   `RETENTION.failed` 的一律删。取最长的那档保留期，是因为排队中的任务也要读
+ *   payload，而它排多久没有上限可言；一天没被取走的任务，文件丢了也该报错了。
+ */
+import type { SidecarEnvelope, SidecarRef } from '@pictoria/contracts'
+import type { CairnQ, defineTask } from 'cairnq'
+import { Buffer } from 'node:buffer'
+import { createHash, randomUUID } from 'node:crypto'
+import fs from 'node:fs/promises'
+import path from 'node:path'
+import process from 'node:process'
+import { SIDECAR_KEY } from '@pictoria/contracts'
+import { isInside, sidecarDir } from './paths.js'
+import { RETENTION } from './tasks.js'
+
+type TaskDef<P, R> = ReturnType<typeof defineTask<P, R>>
+type CallOptions = NonNullable<Parameters<CairnQ['call']>[2]>
+
+/**
+ * JSON 超过这么多字节就走文件。与 worker 读同一个环境变量、同一个默认值：
+ * 一条文本 embedding（约 6 KB）、一个缩略图结果留在行里，64 张图的 embedding 批次
+ * （约 300 KB base64）和整份 `importedIds` 走文件。
+ */
+const SIDECAR_THRESHOLD = Number(process.env.PICTORIA_SIDECAR_THRESHOLD ?? 256 * 1024)
+
+/** 回收最多多久扫一次。扫的是一个小目录，频率只是为了不在每次 call 上都 readdir。 */
+const SWEEP_INTERVAL_MS = 10 * 60_000
+
+/** 本进程里还有几个调用在用这个 payload 文件（内容寻址，可能不止一个）。 */
+const livePayloads = new Map<string, number>()
+let lastSweep = 0
+
+function isSidecar(value: unknown): value is SidecarEnvelope {
+  return typeof value === 'object' && value !== null && SIDECAR_KEY in value && Object.keys(value).length === 1
+}
+
+/**
+ * `tasks.call` 的替身：参数、返回值、抛错都一样，只是大的一侧走文件。
+ *
+ * 所有调用点都必须经过它 —— worker 的每个 handler 都套了 `with_sidecars`，绕过
+ * 这里直接 `tasks.call` 的话，大结果回来的是一个没人解开的引用。
+ */
+export async function callTask<P, R>(tasks: CairnQ, task: TaskDef<P, R>, payload: P, opts: CallOptions): Promise<R> {
+  void sweepSidecars()
+  const ref = await spill(payload)
+  let result: R | SidecarEnvelope
+  let acknowledged = false
+  try {
+    result = await tasks.call(task, (ref ? { [SIDECAR_KEY]: ref } : payload) as P, opts)
+    acknowledged = true
+  }
+  finally {
+    if (ref)
+      release(ref.path, acknowledged)
+  }
+  if (!isSidecar(result))
+    return result
+  const value = await readSidecar(result[SIDECAR_KEY]) as R
+  if (!opts.key)
+    await fs.rm(result[SIDECAR_KEY].path, { force: true }).catch(() => {})
+  return value
+}
+
+/** 大于阈值就写文件并返回引用，否则返回 `null`、原样内联。 */
+async function spill(value: unknown): Promise<SidecarRef | null> {
+  const data = Buffer.from(JSON.stringify(value))
+  if (data.length <= SIDECAR_THRESHOLD)
+    return null
+  const sha256 = createHash('sha256').update(data).digest('hex')
+  const file = path.resolve(sidecarDir(), `${sha256}.json`)
+  livePayloads.set(file, (livePayloads.get(file) ?? 0) + 1)
+  try {
+    // 已经有了就只刷新 mtime，让按龄回收从这一次算起。
+    const now = new Date()
+    await fs.utimes(file, now, now)
+  }
+  catch {
+    await fs.mkdir(sidecarDir(), { recursive: true })
+    const tmp = `${file}.${randomUUID()}.tmp`
+    await fs.writeFile(tmp, data)
+    await fs.rename(tmp, file)
+  }
+  return { path: file, sha256, bytes: data.length }
+}
+
+/**
+ * 这次调用不再需要 payload 文件了。`acknowledged` 为真（任务成功）且没有别的
+ * 调用在用时删掉；否则只减计数，文件留给回收 —— 任务可能还在跑或要重试。
+ */
+function release(file: string, acknowledged: boolean): void {
+  const left = (livePayloads.get(file) ?? 1) - 1
+  if (left > 0) {
+    livePayloads.set(file, left)
+    return
+  }
+  livePayloads.delete(file)
+  if (acknowledged)
+    void fs.rm(file, { force: true }).catch(() => {})
+}
+
+async function readSidecar(ref: SidecarRef): Promise<unknown> {
+  const file = path.resolve(ref.path)
+  if (!isInside(file, sidecarDir()))
+    throw new Error(`sidecar path escapes ${sidecarDir()}: ${ref.path}`)
+  const data = await fs.readFile(file)
+  if (data.length !== ref.bytes || createHash('sha256').update(data).digest('hex') !== ref.sha256)
+    throw new Error(`sidecar ${path.basename(file)} does not match its reference`)
+  return JSON.parse(data.toString('utf8'))
+}
+
+/** 删掉超龄的旁路文件（含写到一半的 `.tmp`）。最多每 `SWEEP_INTERVAL_MS` 一次。 */
+async function sweepSidecars(now = Date.now()): Promise<void> {
+  if (now - lastSweep < SWEEP_INTERVAL_MS)
+    return
+  lastSweep = now
+  const dir = sidecarDir()
+  let names: string[]
+  try {
+    names = await fs.readdir(dir)
+  }
+  catch {
+    return
+  }
+  for (const name of names) {
+    const file = path.join(dir, name)
+    if (livePayloads.has(file))
+      continue
+    const stat = await fs.stat(file).catch(() => null)
+    if (stat && now - stat.mtimeMs > RETENTION.failed)
+      await fs.rm(file, { force: true }).catch(() => {})
+  }
+}
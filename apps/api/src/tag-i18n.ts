@@ -80,6 +80,11 @@ function table(lang: string): Record<string, string> {
   return loaded
 }
 
+/** 有翻译表的语言，给 tag 词表任务决定要不要一并编码显示名（`scheduler.ts`）。 */
+export function translatedLangs(): string[] {
+  return [...supportedLangs()].sort()
+}
+
 /**
  * DB tag 名的本地化显示名，未知时返回 `null`。
  *
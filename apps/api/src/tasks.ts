@@ -34,7 +34,7 @@ import { tasksDbPath } from './paths.js'
  * 一个 interval（默认 1h）再扫，不会在启动高峰期扫（上游有意如此）。
  */
 const HOUR_MS = 3_600_000
-const RETENTION = { succeeded: HOUR_MS, failed: 24 * HOUR_MS, canceled: 24 * HOUR_MS } as const
+export const RETENTION = { succeeded: HOUR_MS, failed: 24 * HOUR_MS, canceled: 24 * HOUR_MS } as const
 
 let handle: CairnQ | null = null
 
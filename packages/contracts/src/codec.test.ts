@@ -1,10 +1,21 @@
 import { describe, expect, it } from 'vitest'
-import { decodeVector, encodeVector } from './codec.js'
+import { Buffer } from 'node:buffer'
+import { decodeVector, decodeVectorBatch, encodeVector, encodeVectorBatch } from './codec.js'
 
 // 定值向量 —— Python 侧 `worker/codec.py` 的测试钉的是同一组数字和同一个 base64
 // 字符串。两边任何一侧改了字节序或编码，这里和那里会同时红。
 const FIXTURE = new Float32Array([0, 1, -1, 0.5, -0.5, 3.4028235e38, 1.1754944e-38])
 const FIXTURE_B64 = 'AAAAAAAAgD8AAIC/AAAAPwAAAL///39/AACAAA=='
+// 同一组数字末尾补一个 2，切成两条 4 维向量 —— Python 侧 `BATCH_B64` 是同一个串。
+const BATCH_ROWS = [new Float32Array([0, 1, -1, 0.5]), new Float32Array([-0.5, 3.4028235e38, 1.1754944e-38, 2])]
+const BATCH_B64 = 'AAAAAAAAgD8AAIC/AAAAPwAAAL///39/AACAAAAAAEA='
+// 降精度的定值 —— Python 侧 `REDUCED` / `REDUCED_B64` 是同一组数和同样的串。
+const REDUCED = [new Float32Array([0.1, -0.25, 0.5, 1.0]), new Float32Array([3.0, -1.5, 0.0078125, -3.0])]
+const REDUCED_B64 = { f16: 'Zi4AtAA4ADwAQgC+ACAAwg==', i8: 'BAIBPAaDwTwN4EB/f8AAgQ==' } as const
+
+function blob(vec: Float32Array): Buffer {
+  return Buffer.from(vec.buffer, vec.byteOffset, vec.byteLength)
+}
 
 describe('向量编解码', () => {
   it('定值向量的 base64 与 Python 侧逐字符相同', () => {
@@ -41,3 +52,55 @@ describe('向量编解码', () => {
     expect([...b]).toEqual([4, 5, 6])
   })
 })
+
+describe('向量批次编解码', () => {
+  it('定值批次的 base64 与 Python 侧逐字符相同', () => {
+    const batch = encodeVectorBatch(BATCH_ROWS.map((v, i) => ({ postId: i + 1, blob: blob(v) })))
+    expect(batch).toEqual({ postIds: [1, 2], vectors: BATCH_B64, encoding: 'f32' })
+  })
+
+  it('解回来每条一个 BLOB，逐位相同', () => {
+    const rows = decodeVectorBatch({ postIds: [7, 9], vectors: BATCH_B64 })
+    expect(rows.map(r => r.postId)).toEqual([7, 9])
+    rows.forEach((r, i) => expect(r.embedding.equals(blob(BATCH_ROWS[i]!))).toBe(true))
+  })
+
+  it('空批次是空串', () => {
+    expect(encodeVectorBatch([])).toEqual({ postIds: [], vectors: '', encoding: 'f32' })
+    expect(decodeVectorBatch({ postIds: [], vectors: '' })).toEqual([])
+  })
+
+  it('定值批次在 f16 / i8 下与 Python 侧逐字符相同', () => {
+    for (const encoding of ['f16', 'i8'] as const) {
+      const batch = encodeVectorBatch(REDUCED.map((v, i) => ({ postId: i + 1, blob: blob(v) })), encoding)
+      expect(batch).toEqual({ postIds: [1, 2], vectors: REDUCED_B64[encoding], encoding })
+    }
+  })
+
+  it('降精度解码放宽回 float32，误差在一个量化步以内', () => {
+    for (const encoding of ['f16', 'i8'] as const) {
+      const rows = decodeVectorBatch({ postIds: [1, 2], vectors: REDUCED_B64[encoding], encoding })
+      rows.forEach(({ embedding }, i) => {
+        expect(embedding.byteLength).toBe(16)
+        const peak = Math.max(...REDUCED[i]!.map(Math.abs))
+        for (let j = 0; j < 4; j++)
+          expect(Math.abs(embedding.readFloatLE(j * 4) - REDUCED[i]![j]!)).toBeLessThanOrEqual(peak / 254)
+      })
+    }
+    // i8 每条一个缩放：每行的峰值原样回来，小的那行不会被大的那行压扁
+    const [a, b] = decodeVectorBatch({ postIds: [1, 2], vectors: REDUCED_B64.i8, encoding: 'i8' })
+    expect(a!.embedding.readFloatLE(12)).toBe(1)
+    expect(b!.embedding.readFloatLE(0)).toBe(3)
+  })
+
+  it('f16 的溢出、非规格化与正好一半时取偶，和 NumPy 逐位相同', () => {
+    const edge = new Float32Array([65504, 65520, 1e-8, 6.1e-5, 5.96e-8, 2.98e-8, 3e-8, -0.33333334, 1 / 3, 1e5])
+    expect(encodeVectorBatch([{ postId: 1, blob: blob(edge) }], 'f16').vectors).toBe('/3sAfAAA/wMBAAAAAQBVtVU1AHw=')
+  })
+
+  it('长度除不尽就抛，而不是错位', () => {
+    expect(() => decodeVectorBatch({ postIds: [1, 2, 3], vectors: BATCH_B64 })).toThrow()
+    expect(() => decodeVectorBatch({ postIds: [], vectors: BATCH_B64 })).toThrow()
+    expect(() => decodeVectorBatch({ postIds: [1, 2, 3], vectors: REDUCED_B64.f16, encoding: 'f16' })).toThrow()
+  })
+})
@@ -14,6 +14,10 @@
  *   （Python 的 repr 给的是最短往返表示，而 JS 的 Number→String 规则不同），
  *   两侧对不齐时表现为分数末位漂移，正是最难查的那种不一致。
  *
+ * 一批向量（silva 的输入、embedding 的输出）不是每条一个 base64 串，而是整批首尾相接
+ * 拼成**一个**：`VectorBatch`。Python 侧一次 `frombuffer` + `reshape` 就是模型要的
+ * `[N, dim]` 矩阵，不必逐条解码再 `np.stack`；这边也只做一次 base64。
+ *
  * Python 侧的对应实现在 `worker/codec.py`（`np.frombuffer` / `base64.b64encode`），
  * 两边由 `packages/contracts/src/codec.test.ts` 里的定值向量钉住。
  */
@@ -34,3 +38,152 @@ export function decodeVector(b64: string): Float32Array {
 export function encodeVectorBlob(blob: Buffer): string {
   return blob.toString('base64')
 }
+
+/**
+ * 一批向量在线上的精度。缺省 `f32`，逐位无损。
+ *
+ * * `f16`：IEEE 半精度，就近舍入到偶数 —— 字节数减半；
+ * * `i8`：每条向量各自一个缩放（`max|x| / 127`）的对称 int8。布局是先 N 个 float32
+ *   缩放、再 N×dim 个 int8 —— 约四分之一的字节，外加每条 4 字节。
+ *
+ * 两种都在解码时放宽回 float32。量化两侧都用 double 算（`x / scale` 再舍入到偶数），
+ * 所以 Python 和这里产出同一串码；定值测试钉的就是这件事。Python 侧的同名元组在
+ * `worker/codec.py`。
+ */
+export const VECTOR_ENCODINGS = ['f32', 'f16', 'i8'] as const
+
+export type VectorEncoding = typeof VECTOR_ENCODINGS[number]
+
+/** 一批向量：`vectors` 是 `postIds.length` 条向量按 `encoding` 编码、首尾相接之后的 base64。 */
+export interface VectorBatch {
+  postIds: number[]
+  vectors: string
+  /** 缺省是 `f32`。 */
+  encoding?: VectorEncoding
+}
+
+const I8_MAX = 127
+
+/** 就近舍入、正好一半时取偶 —— 与 NumPy 的 `rint` 同规则，`Math.round` 是向上取。 */
+function roundHalfEven(x: number): number {
+  const r = Math.round(x)
+  return Math.abs(x % 1) === 0.5 && r % 2 !== 0 ? r - 1 : r
+}
+
+const f32Scratch = new Float32Array(1)
+const u32Scratch = new Uint32Array(f32Scratch.buffer)
+
+/** float32 → IEEE 半精度的位，就近舍入到偶数（溢出成 ±Inf，过小成 ±0）。 */
+function toHalfBits(value: number): number {
+  f32Scratch[0] = value
+  const x = u32Scratch[0]!
+  const sign = (x >>> 16) & 0x8000
+  const exp = ((x >>> 23) & 0xFF) - 127 + 15
+  const mant = x & 0x7FFFFF
+  if (((x >>> 23) & 0xFF) === 0xFF)
+    return sign | 0x7C00 | (mant ? 0x200 : 0)
+  if (exp >= 0x1F)
+    return sign | 0x7C00
+  if (exp <= 0) {
+    if (exp < -10)
+      return sign
+    // 非规格化：补上隐含的 1，右移到 2^-24 的刻度上
+    const full = mant | 0x800000
+    const shift = 14 - exp
+    const half = full >>> shift
+    const rem = full & ((1 << shift) - 1)
+    const mid = 1 << (shift - 1)
+    return sign | (rem > mid || (rem === mid && (half & 1)) ? half + 1 : half)
+  }
+  const half = (exp << 10) | (mant >>> 13)
+  const rem = mant & 0x1FFF
+  // 进位可能溢进指数位，那正是正确的结果（舍入到下一个 2 的幂，或到 Inf）
+  return sign | (rem > 0x1000 || (rem === 0x1000 && (half & 1)) ? half + 1 : half)
+}
+
+function fromHalfBits(h: number): number {
+  const sign = h & 0x8000 ? -1 : 1
+  const exp = (h >>> 10) & 0x1F
+  const mant = h & 0x3FF
+  if (exp === 0)
+    return sign * mant * 2 ** -24
+  if (exp === 0x1F)
+    return mant ? Number.NaN : sign * Infinity
+  return sign * (1 + mant / 1024) * 2 ** (exp - 15)
+}
+
+/** 一条 float32 BLOB → 数组。逐个 `readFloatLE`：SQLite 给的 Buffer 不保证 4 字节对齐。 */
+function readFloats(blob: Buffer): number[] {
+  const out = Array.from<number>({ length: blob.length / 4 })
+  for (let i = 0; i < out.length; i++) out[i] = blob.readFloatLE(i * 4)
+  return out
+}
+
+function packRows(blobs: Buffer[], encoding: VectorEncoding): Buffer {
+  if (encoding === 'f32')
+    return Buffer.concat(blobs)
+  const rows = blobs.map(readFloats)
+  const dim = rows[0]?.length ?? 0
+  if (encoding === 'f16') {
+    const out = Buffer.alloc(rows.length * dim * 2)
+    rows.forEach((row, i) => row.forEach((v, j) => out.writeUInt16LE(toHalfBits(v), (i * dim + j) * 2)))
+    return out
+  }
+  const out = Buffer.alloc(rows.length * (4 + dim))
+  const codes = rows.length * 4
+  rows.forEach((row, i) => {
+    const peak = row.reduce((m, v) => Math.max(m, Math.abs(v)), 0)
+    const scale = peak > 0 ? Math.fround(peak / I8_MAX) : 1
+    out.writeFloatLE(scale, i * 4)
+    row.forEach((v, j) =>
+      out.writeInt8(Math.max(-I8_MAX, Math.min(I8_MAX, roundHalfEven(v / scale))), codes + i * dim + j))
+  })
+  return out
+}
+
+/** 一组 SQLite BLOB（float32）→ `VectorBatch`。顺序即 `postIds` 的顺序。 */
+export function encodeVectorBatch(
+  rows: ReadonlyArray<{ postId: number, blob: Buffer }>,
+  encoding: VectorEncoding = 'f32',
+): VectorBatch {
+  return {
+    postIds: rows.map(r => r.postId),
+    vectors: packRows(rows.map(r => r.blob), encoding).toString('base64'),
+    encoding,
+  }
+}
+
+/**
+ * `VectorBatch` → 每条一个 float32 BLOB，可以直接交给 `upsertVectors`。
+ *
+ * `f32` 切出来的是同一块内存上的视图，不逐条复制；`f16` / `i8` 放宽成新的 float32。
+ * 长度对不上就抛 —— 和 Python 侧检查宽度而不是推断宽度同理：差一个字节的批次会
+ * 错位成一批看起来正常的噪声。
+ */
+export function decodeVectorBatch(batch: VectorBatch): Array<{ postId: number, embedding: Buffer }> {
+  const encoding = batch.encoding ?? 'f32'
+  const buf = Buffer.from(batch.vectors, 'base64')
+  const count = batch.postIds.length
+  // 每条向量的字节数（i8 不含它那 4 字节缩放）和每个分量的字节数
+  const perValue = encoding === 'f32' ? 4 : encoding === 'f16' ? 2 : 1
+  const rowBytes = count ? (buf.byteLength - (encoding === 'i8' ? 4 * count : 0)) / count : 0
+  if ((count === 0 && buf.byteLength !== 0) || !Number.isInteger(rowBytes) || rowBytes < 0 || rowBytes % perValue !== 0)
+    throw new Error(`向量批次 ${buf.byteLength} 字节，无法均分成 ${count} 条 ${encoding} 向量`)
+  if (encoding === 'f32')
+    return batch.postIds.map((postId, i) => ({ postId, embedding: buf.subarray(i * rowBytes, (i + 1) * rowBytes) }))
+
+  const dim = rowBytes / perValue
+  return batch.postIds.map((postId, i) => {
+    const embedding = Buffer.alloc(dim * 4)
+    if (encoding === 'f16') {
+      for (let j = 0; j < dim; j++)
+        embedding.writeFloatLE(fromHalfBits(buf.readUInt16LE((i * dim + j) * 2)), j * 4)
+    }
+    else {
+      const scale = buf.readFloatLE(i * 4)
+      for (let j = 0; j < dim; j++)
+        embedding.writeFloatLE(buf.readInt8(4 * count + i * dim + j) * scale, j * 4)
+    }
+    return { postId, embedding }
+  })
+}
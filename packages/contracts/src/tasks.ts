@@ -11,21 +11,38 @@
  * 于是每个 payload 都必须自带 worker 需要的全部输入（路径、向量），每个 result 都是
  * 纯数据 —— worker 不碰 `pictoria.sqlite`，一行都不读、一行都不写。
  */
+import type { VectorBatch, VectorEncoding } from './codec.js'
 import { defineTask } from 'cairnq'
 
+/**
+ * 大 payload / result 的旁路文件引用（Python 侧 `worker/sidecar.py`）。
+ *
+ * 任何任务的 JSON 超过阈值时，真正的内容写进 `.pictoria/sidecar/<sha256>.json`，
+ * 队列行里只剩 `{ $sidecar: SidecarRef }`。两个方向同一个形状：TS 写 payload、
+ * 读 result，worker 反过来。读的一方先核对 `bytes` 和 `sha256` 再解析。
+ * 下面每个任务的 Payload / Result 类型描述的都是**解开之后**的内容 ——
+ * 引用只存在于 `apps/api/src/sidecar.ts` 的 `callTask` 和 worker 的
+ * `with_sidecars` 之间，业务代码看不到。
+ */
+export const SIDECAR_KEY = '$sidecar'
+
+export interface SidecarRef {
+  /** 绝对路径，必须落在图库根之内（worker 用 `_resolve_inside` 校验）。 */
+  path: string
+  sha256: string
+  bytes: number
+}
+
+export interface SidecarEnvelope {
+  [SIDECAR_KEY]: SidecarRef
+}
+
 /**
  * GPU 队列。worker 端 `concurrency=1`，替代原来的 `processors/gpu_pressure.py`
  * —— 一次只有一个批次在显存里，排队由 cairnq 负责。
  */
 export const GPU_QUEUE = 'gpu'
 
-/** 一条待打分的输入：post 的 id 加上它已存的 SigLIP2 向量（base64 float32）。 */
-export interface ScoreItem {
-  postId: number
-  /** base64 编码的 float32 向量，见 `codec.ts` 里为什么不是 JSON 数组。 */
-  embedding: string
-}
-
 /**
  * 两个蒸馏头的名字。**跨进程契约的一部分** —— TS 排活、Python worker 按这个名字
  * 加载权重，两侧对不上的表现是任务提交成功后被 worker 以 `unknown scorer` 拒掉。
@@ -39,13 +56,21 @@ export const SILVA_SCORERS = ['silva', 'silva_luna'] as const
 export type SilvaScorer = typeof SILVA_SCORERS[number]
 
 export interface SilvaPayload {
-  /** 哪一个蒸馏头。两个头共用一条代码路径，只有权重不同。 */
-  scorer: SilvaScorer
-  items: ScoreItem[]
+  /**
+   * 跑哪几个蒸馏头。头之间共用一条代码路径，只有权重不同，所以一批向量过一次队列、
+   * 解码一次，就能把要的头都跑完 —— 不必每个头各发一遍同样的 64 条向量。
+   *
+   * 旧版发的是单个 `scorer: string`。升级时还躺在 `tasks.sqlite` 里的那种任务，
+   * worker 照样认；这边不再发。
+   */
+  scorers: SilvaScorer[]
+  /** 待打分的 post 和它们已存的 SigLIP2 向量，整批一个 base64，见 `codec.ts`。 */
+  embeddings: VectorBatch
 }
 
 export interface SilvaResult {
-  scores: Array<{ postId: number, score: number }>
+  /** 每个 (post, scorer) 一行，按 post 排，post 内按 `scorers` 的顺序。 */
+  scores: Array<{ postId: number, scorer: SilvaScorer, score: number }>
 }
 
 /**
@@ -67,6 +92,53 @@ export const silvaTask = defineTask<SilvaPayload, SilvaResult>('silva')
  */
 export const SILVA_TASK_BATCH = 64
 
+/**
+ * silva 输入向量走哪种线上精度（见 `codec.ts` 的 `VECTOR_ENCODINGS`）。
+ *
+ * `scripts/bench_codec.py` 在单位向量上量得：`f16` 每条 3072 B（`f32` 的一半），
+ * 1 - cos 不超过 1e-7，已经是 float32 自己的噪声量级；`i8` 每条 1541 B，1 - cos
+ * 平均 3e-5、最大 7e-5。缺省仍是 `f32`：64 条一批的 payload 本来就只有 384 KB，
+ * 换精度省下的是队列行的体积，代价是分数和逐位无损的那条路径不再逐位相同。
+ */
+export const SILVA_VECTOR_ENCODING: VectorEncoding = 'f32'
+
+/**
+ * 全库重打 SILVA 分：头重新发布之后，每个 post 都要一个新分数。
+ *
+ * 走 `silvaTask` 的话是 22 万 / 64 ≈ 3500 次排队往返、约 1.3 GB 的 base64，而每一次
+ * 真正的计算只有毫秒。这里换成 dedup 的文件形状：TS 导出同一个裸 float32 矩阵，
+ * worker mmap 读、大块过一遍要的头，分数写成矩阵旁边的**第二个裸文件**，不走队列。
+ */
+export interface SilvaRescorePayload {
+  /** 裸 float32 矩阵文件，同 `DedupPayload.matrixPath`。 */
+  matrixPath: string
+  count: number
+  dim: number
+  scorers: SilvaScorer[]
+  /** 一次 head forward 吃多少行。 */
+  chunkSize: number
+}
+
+export interface SilvaRescoreResult {
+  /**
+   * 分数文件的绝对路径：`(count, scorers.length)` 的裸 float32，C 序，小端。
+   * 第 i 行对应矩阵第 i 行（也就是导出时那份 ids 的第 i 个），第 j 列是 `scorers[j]`。
+   * 读完由 TS 删掉。
+   */
+  scoresPath: string
+  /** 去重后的 scorer，顺序即列序。 */
+  scorers: SilvaScorer[]
+  count: number
+}
+
+export const silvaRescoreTask = defineTask<SilvaRescorePayload, SilvaRescoreResult>('silva-rescore')
+
+/**
+ * 每块 8192 行：一块的输入是 8192 × 1152 × 4 ≈ 38 MB，head 里最宽的一层也在同一量级。
+ * 再大买不到吞吐 —— 矩阵乘早就吃满了 —— 只会让峰值内存跟着涨。
+ */
+export const SILVA_RESCORE_CHUNK_SIZE = 8192
+
 /** 一条待打分的图片：post id 加上磁盘上的绝对路径。 */
 export interface ImageItem {
   postId: number
@@ -148,11 +220,13 @@ export const TAGGER_WORKER_KEY = 'tagger'
 
 export interface EmbeddingPayload {
   items: ImageItem[]
+  /** 结果向量走哪种线上精度，缺省 `f32`。TS 落库前会放宽回 float32。 */
+  vectorEncoding?: VectorEncoding
 }
 
 export interface EmbeddingResult {
-  /** `embedding` 是 base64 的 float32，和 silva 输入用的是同一个编码。 */
-  embeddings: Array<{ postId: number, embedding: string }>
+  /** 成功的那些，整批一个 base64 —— 和 silva 的输入是同一个编码。 */
+  embeddings: VectorBatch
   failures: WorkerFailure[]
 }
 
@@ -169,9 +243,54 @@ export const embeddingTask = defineTask<EmbeddingPayload, EmbeddingResult>('embe
 /** so400m 是比 CLIP-L/14 更大的 ViT，bf16 下 16 张正好放进 12 GB。与 Python 侧同值。 */
 export const EMBEDDING_TASK_BATCH = 16
 
+/**
+ * embedding 结果走哪种线上精度。缺省 `f32`，而且应该一直是：这些向量要**落库**，
+ * 是图搜图、文搜图和 dedup 的唯一来源 —— 在线上丢的精度落进 vec0 就再也拿不回来。
+ * 误差量级见 `SILVA_VECTOR_ENCODING`。
+ */
+export const EMBEDDING_VECTOR_ENCODING: VectorEncoding = 'f32'
+
 /** `post_process_failures.worker` 里 embedding 用的桶名。注意带表名后缀。 */
 export const EMBEDDING_WORKER_KEY = 'embedding:siglip2'
 
+/** analyze 能一次喂到的三个图像模型，名字与各自独立的任务类型相同。与 Python 侧 `ANALYZE_MODELS` 同值。 */
+export const ANALYZE_MODELS = ['embedding', 'tagger', 'waifu'] as const
+
+export type AnalyzeModel = typeof ANALYZE_MODELS[number]
+
+export interface AnalyzePayload {
+  /** 要跑哪几个模型。至少一个，重复的会被去掉。 */
+  models: AnalyzeModel[]
+  items: ImageItem[]
+  /** 同 `EmbeddingPayload.vectorEncoding`。 */
+  vectorEncoding?: VectorEncoding
+}
+
+export interface AnalyzeResult {
+  /** 只在请求了 `embedding` 时出现，形状同 `EmbeddingResult.embeddings`。 */
+  embeddings?: EmbeddingResult['embeddings']
+  /** 只在请求了 `tagger` 时出现，形状同 `TaggerBatchResult.results`。 */
+  results?: TaggerResult[]
+  /** 只在请求了 `waifu` 时出现，形状同 `WaifuResult.scores`。 */
+  scores?: WaifuResult['scores']
+  /**
+   * 按模型分开的失败，每个请求了的模型都有一项。
+   *
+   * 读不出来的图在每个模型下都出现一次；空标签只算 tagger 的失败 —— 同一张图的
+   * 向量和分数照常回传。TS 按模型各自写进对应的 `post_process_failures` 桶。
+   */
+  failures: Partial<Record<AnalyzeModel, WorkerFailure[]>>
+}
+
+/**
+ * 一次解码、多个模型：embedding + tagger + waifu 共用同一次图片读取。
+ *
+ * 三个独立任务各自打开、解码同一张原图，20 万张的首次导入就是每张三次全分辨率解码。
+ * 这里每张只解一次，像素依次交给请求的每个模型；失败语义与各自的降级阶梯相同。
+ * 批大小受最大的那个模型约束，取 `EMBEDDING_TASK_BATCH`。
+ */
+export const analyzeTask = defineTask<AnalyzePayload, AnalyzeResult>('analyze')
+
 /**
  * 近重复分组的一次全量重算。
  *
@@ -196,18 +315,66 @@ export interface DedupPayload {
   threshold: number
   /** 一次矩阵乘吃多少行。每块物化一个 `(chunk, count)` 的相似度块。 */
   chunkSize: number
+  /**
+   * 增量模式：`[newFrom, count)` 是新行（`exportVectorMatrix` 的 `tail`）。worker
+   * 只算 `X_new @ X.T`，只回传至少有一端是新行的对。缺省或 0 为全量。
+   */
+  newFrom?: number
+  /**
+   * 回传什么。缺省 `'pairs'`：近邻对文件，分配在 TS 做（贪心、一层、不传递）。
+   * `'components'`：worker 在 NumPy 里对近邻对做 union-find，只回传每行的连通分量
+   * 标签 —— 结果是 O(行数) 而不是 O(对数)。分量是**传递**的：一串首尾并不相近的
+   * 近邻链会落进同一组。只用于全量（`newFrom` 为 0）。
+   */
+  mode?: DedupMode
+  /**
+   * 找近邻对的引擎。缺省 `'exact'`：全量两两比对，O(n²·d)，22 万行在 30xx 上是
+   * 分钟级，到百万行就是小时级。`'lsh'`：随机超平面签名分桶，只对同桶的候选算精确
+   * 余弦 —— 近似线性，回传的每一对都是真近邻，但会以很小的概率漏掉一对
+   * （默认参数下恰在阈值上的一对约 0.04%，Python 侧 `lsh_recall`）。
+   */
+  engine?: DedupEngine
 }
 
-export interface DedupResult {
+export type DedupMode = 'pairs' | 'components'
+
+export type DedupEngine = 'exact' | 'lsh'
+
+export type DedupResult = DedupPairsResult | DedupComponentsResult
+
+export interface DedupPairsResult {
+  mode: 'pairs'
   /**
-   * 上三角邻接：`[i, j]` 且 `i < j`，都是**行下标**而不是 post id。
+   * 近邻对文件的绝对路径（矩阵旁边的 `<矩阵>.pairs`）。每对一条 `DEDUP_PAIR_BYTES`
+   * 字节的小端记录：`int32 i, int32 j, float32 相似度`，且 `i < j`。
    *
-   * 回传下标而不是 id，是因为 worker 手里根本没有 id —— 矩阵文件里只有向量。
-   * 翻译由持有 ids 数组的 TS 侧做，这也让 worker 的输出与库完全无关。
+   * i、j 是**行下标**而不是 post id，因为 worker 手里根本没有 id —— 矩阵文件里只有
+   * 向量。翻译由持有 ids 数组的 TS 侧做，这也让 worker 的输出与库完全无关。
+   * 走文件而不是 JSON：变体多的库近邻对上百万，一行 result 装不下。读完由 TS 删掉。
    */
-  pairs: Array<[number, number]>
+  pairsPath: string
+  /** 记录条数。 */
+  count: number
 }
 
+export interface DedupComponentsResult {
+  mode: 'components'
+  /**
+   * 标签文件的绝对路径（矩阵旁边的 `<矩阵>.labels`），全是小端 int32：先是 `count`
+   * 个行标签 —— 该行所在分量里最小的行下标，孤立的行就是它自己；再是 `components`
+   * 条 `(root, edges)` 记录，每个非孤立分量一条，root 升序，edges 是分量内的近邻对数。
+   * 读完由 TS 删掉。
+   */
+  labelsPath: string
+  /** 行数，等于 payload 的 `count`。 */
+  count: number
+  /** 非孤立分量的个数。 */
+  components: number
+}
+
+/** `DedupResult.pairsPath` 里一条记录的字节数。与 Python 侧 `PAIR_DTYPE.itemsize` 同值。 */
+export const DEDUP_PAIR_BYTES = 12
+
 export const dedupTask = defineTask<DedupPayload, DedupResult>('dedup')
 
 /**
@@ -221,6 +388,96 @@ export const DEDUP_THRESHOLD = 0.01
 /** 每块 1024 行 —— 即使 N=170k，一个 `(1024, N)` 的块也远在 1 GB 以内。 */
 export const DEDUP_CHUNK_SIZE = 1024
 
+/**
+ * 预先算好 tag 词表的 SigLIP 文本向量，文搜图遇到 tag 名直接查表、不跑前向。
+ *
+ * 每个 tag 编码三种写法：原名（`green_eyes`）、空格形式（`green eyes`，人实际会
+ * 敲的那种）、以及 `langs` 里每种语言的显示名（`server/data/tag.<lang>.json`）。
+ * 结果落在 `.pictoria/tag-vocab/` 下的一个只追加的 float32 矩阵 + 一个索引文件，
+ * worker 自己 memmap 着读 —— 向量不回传，TS 这边也用不着。
+ */
+export interface TagVocabPayload {
+  /**
+   * 要确保在词表里的 tag 名。已经在的 worker 会跳过，所以重发是便宜的。
+   * 调度器只发 `tags.rowid` 大于词表 `through` 的；空数组只是问一下 `through`。
+   */
+  tags: string[]
+  /** 同时编码哪些语言的显示名。没有表的语言 worker 会记一条 warning 后跳过。 */
+  langs: string[]
+  /** 这一块最后一个 tag 的 `rowid`。编码成功后 worker 把它记进词表目录。 */
+  through?: number
+}
+
+export interface TagVocabResult {
+  /** 这一次新编码的文本条数（不是 tag 数 —— 一个 tag 对应多条写法）。 */
+  added: number
+  /** 词表现在的总行数。 */
+  rows: number
+  /**
+   * 词表已经覆盖到的 `tags.rowid`：调度器的游标。跟词表存在同一个目录里，
+   * 换模型时词表重建、它也归零，于是全部 tag 会自动重发一遍。
+   */
+  through: number
+}
+
+export const tagVocabTask = defineTask<TagVocabPayload, TagVocabResult>('tag-vocab')
+
+/** 一次任务带多少个 tag。首次全量时十几万个 tag 分成这么大的块，一块几秒的前向。 */
+export const TAG_VOCAB_TASK_BATCH = 2048
+
+/**
+ * 零样本打标：用已存的 SigLIP 2 图像向量直接给全库推荐 tag 和 rating。
+ *
+ * WDTagger 要把每张图解码、过一遍 ViT-L；而每个 post 的 SigLIP 2 向量早就在库里，
+ * 文本塔和图像塔又在同一个空间 —— 于是全库对一份标签词表打分就是一次分块的
+ * `(posts × dim) @ (dim × labels)`，再套 SigLIP 自己的 `sigmoid(scale · cos + bias)`。
+ * 一张图都不用打开，全库重打分钟级。
+ *
+ * 输入的形状和 dedup 一样：向量落成文件、payload 只带路径，结果按**行下标**回来。
+ * 标签一侧用 worker 的 tag 词表（见 `tagVocabTask`），缺的先补编码。
+ * 质量是 SigLIP 零样本的质量，不是专门训练过的 tagger —— 所以叫"推荐"，带着概率。
+ */
+export interface ZeroShotTagsPayload {
+  /** 裸 float32 矩阵文件，同 `DedupPayload.matrixPath`。 */
+  matrixPath: string
+  count: number
+  dim: number
+  /** 候选 tag 名（下划线形式）。worker 用空格形式去打分。 */
+  tags: string[]
+  /** rating 值 → 描述它的提示词。每个 post 取概率最高的那个，不设阈值。 */
+  ratingPrompts: Record<string, string>
+  /** 每个 post 最多回几个 tag。 */
+  topK: number
+  /** sigmoid 概率下限，低于它的 tag 不回。 */
+  threshold: number
+  /** 一次矩阵乘吃多少行 post。 */
+  chunkSize: number
+}
+
+export interface ZeroShotTagsResult {
+  /** 与矩阵行一一对应：`[tag 在 payload.tags 里的下标, 概率]`，概率从高到低。 */
+  tags: Array<Array<[number, number]>>
+  /** 与矩阵行一一对应：`ratingPrompts` 的键；没给 rating 提示词时为空串。 */
+  ratings: string[]
+}
+
+export const zeroShotTagsTask = defineTask<ZeroShotTagsPayload, ZeroShotTagsResult>('zero-shot-tags')
+
+/**
+ * 一次 `zero-shot-tags` 最多带多少行 post。每行的建议都以 JSON 回到同一个结果里，
+ * 全库一次发过去就是几百 MB 的一行；超过的由调用方切块。与 worker 的
+ * `ZERO_SHOT_MAX_POSTS` 同值，worker 会拒绝更大的。
+ */
+export const ZERO_SHOT_MAX_POSTS = 4096
+
+/** 默认的 rating 提示词。键与 tagger 的 rating 字符串同一套。 */
+export const ZERO_SHOT_RATING_PROMPTS: Readonly<Record<string, string>> = Object.freeze({
+  general: 'a safe for work illustration',
+  sensitive: 'a suggestive illustration',
+  questionable: 'a lewd illustration with partial nudity',
+  explicit: 'an explicit pornographic illustration',
+})
+
 /**
  * 交互队列。**和 GPU backfill 队列分开**，由 worker 进程里第二个 `Worker` 实例
  * 伺候，poll 间隔紧得多。
@@ -252,6 +509,84 @@ export interface TextEmbedResult {
  */
 export const textEmbedTask = defineTask<TextEmbedPayload, TextEmbedResult>('text-embed')
 
+/** worker 进程内隔离区（解码失败过的文件）的计数。进程重启即清零。 */
+export interface QuarantineStats {
+  /** 当前记住的坏文件数。 */
+  size: number
+  capacity: number
+  /** 批次前被直接判失败、没再进 GPU 批次的次数。 */
+  hits: number
+  misses: number
+  added: number
+  evicted: number
+}
+
+/** 模型的一次加载或卸载。 */
+export interface ModelEvent {
+  kind: 'load' | 'evict'
+  name: string
+  nbytes: number
+  /** `load`：加载耗时；`evict`：卸载前驻留了多久。单位秒。 */
+  seconds: number
+  /** `miss` / `budget` / `idle` / `requires <name>` / `manual` / `clear`。 */
+  reason: string
+  /** Unix 时间戳（秒）。 */
+  at: number
+}
+
+/** worker 里常驻模型的现状（`ai/registry.py`）。 */
+export interface ModelRegistryStats {
+  /** 0 = 不限。 */
+  budgetBytes: number
+  /** 0 = 不按空闲卸载。 */
+  idleSeconds: number
+  residentBytes: number
+  resident: { name: string, bytes: number, idleSeconds: number }[]
+  /** 最近的加载 / 卸载事件，旧的在前。 */
+  events: ModelEvent[]
+}
+
+/** text-embed 的提示词缓存（`worker/text_cache.py`）。内存一级、`.pictoria/` 下的文件一级。 */
+export interface TextEmbedCacheStats {
+  /** 缓存按模型分目录；换了 `MODEL_ID` 旧目录会被删掉。 */
+  modelId: string
+  memoryEntries: number
+  memoryHits: number
+  /** 内存没有、磁盘命中（典型情况是 worker 重启之后）。 */
+  diskHits: number
+  /** 两级都没有，真的跑了一次前向。 */
+  misses: number
+}
+
+/** tag 词表（`worker/tag_vocab.py`）。 */
+export interface TagVocabStats {
+  modelId: string
+  rows: number
+  /** 文搜图直接查表命中的次数。 */
+  hits: number
+  /** 同 `TagVocabResult.through`。 */
+  through: number
+}
+
+export type WorkerStatsPayload = Record<string, never>
+
+export interface WorkerStatsResult {
+  quarantine: QuarantineStats
+  models: ModelRegistryStats
+  /** 本进程还没收到过 text-embed 时为 null。 */
+  textEmbedCache: TextEmbedCacheStats | null
+  /** 同上；本进程还没打开过词表时为 null。 */
+  tagVocab: TagVocabStats | null
+}
+
+/**
+ * 读 worker 进程内的计数器。
+ *
+ * 这些数字只活在 worker 进程里、从不落库（§D1 也不允许它落库），所以只能现问。
+ * 走交互队列：不碰模型，不该排在某一批 backfill 后面。
+ */
+export const workerStatsTask = defineTask<WorkerStatsPayload, WorkerStatsResult>('worker-stats')
+
 /**
  * IO 队列 —— 不碰 GPU 的活。
  *
@@ -13,7 +13,7 @@ export { waifuScoreDistribution } from './repositories/scores.js'
 export type { WaifuBucketCount } from './repositories/scores.js'
 export { addAgg, emptyAgg, folderScoreAggregates } from './repositories/folders.js'
 export type { FolderScoreAgg } from './repositories/folders.js'
-export { addTagToPost, createTag, deleteTag, deleteTags, getTag, getTagGroup, listTagGroups, listTagsWithCounts, removeTagFromPost, updateTagGroup } from './repositories/tags.js'
+export { addTagToPost, createTag, deleteTag, deleteTags, getTag, getTagGroup, listTagGroups, listTagsAfterRowid, listTagsWithCounts, removeTagFromPost, updateTagGroup } from './repositories/tags.js'
 export type { TagGroupRow, TagRow, TagWithCount } from './repositories/tags.js'
 export { aggregateStats, countByColumn, countByScorerBucket, countByTag, countPosts } from './queries/counts.js'
 export type { AggregateStats, BucketCount, TagCount } from './queries/counts.js'
@@ -31,7 +31,7 @@ export { PairGraph, sampleGroups, samplePairs, samplePostIds, Sampler } from './
 export type { Block } from './repositories/sampling.js'
 export { aestheticWorkerKey, ensureCanonicalTagGroups, listBasicsPending, upsertBasics, fetchEmbeddingBlobs, listEmbeddingPending, listSilvaPending, listTaggerPending, listWaifuPending, notFailedClause, persistTaggerResults, ratingToInt, recordFailures, TAG_GROUP_COLORS, upsertAestheticScores, upsertVectors, upsertWaifuScores } from './repositories/backfill.js'
 export type { BasicsPending, BasicsRowIn, PendingImage, TaggerRow } from './repositories/backfill.js'
-export { assignFromPairs, exportVectorMatrix, replaceAllGroups } from './repositories/dedup.js'
+export { addToGroups, assignFromComponents, assignFromPairs, assignIncremental, exportVectorMatrix, replaceAllGroups } from './repositories/dedup.js'
 export { getAestheticScore, getPostPath, getWaifuScore, isImagePath, persistAutoTagsForPost } from './repositories/commands.js'
 export type { CommandPost } from './repositories/commands.js'
 export { listImportedDanbooruIds, persistPostsWithTags } from './repositories/import-persist.js'
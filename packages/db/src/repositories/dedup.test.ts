@@ -13,7 +13,7 @@ import Database from 'better-sqlite3'
 import * as sqliteVec from 'sqlite-vec'
 import { afterAll, beforeAll, beforeEach, describe, expect, it } from 'vitest'
 import { MIGRATIONS_DIR, runMigrations } from '../migrate.js'
-import { assignFromPairs, exportVectorMatrix, replaceAllGroups } from './dedup.js'
+import { addToGroups, assignFromComponents, assignFromPairs, assignIncremental, exportVectorMatrix, replaceAllGroups } from './dedup.js'
 
 const here = path.dirname(fileURLToPath(import.meta.url))
 
@@ -106,6 +106,49 @@ describe('贪心分配', () => {
   })
 })
 
+describe('分量分配', () => {
+  it('每行指向分量里最小的那行，根自己不出现', () => {
+    // 0-3-5 一条链，2-4 一对，1 孤立
+    const ids = [10, 20, 30, 40, 50, 60]
+    expect(assignFromComponents(ids, [0, 1, 2, 0, 2, 0])).toEqual([[40, 10], [50, 30], [60, 10]])
+  })
+
+  it('与贪心不同，分量会传递', () => {
+    // 同"组只有一层"那个例子：0-1、1-2 近而 0-2 不近。贪心留下 3，分量把它收进来
+    expect(assignFromComponents([1, 2, 3], Int32Array.from([0, 0, 0]))).toEqual([[2, 1], [3, 1]])
+  })
+
+  it('成链或越界的标签直接拒绝', () => {
+    expect(() => assignFromComponents([1, 2, 3], [0, 0, 1])).toThrow('不是它所在分量的最小行')
+    expect(() => assignFromComponents([1, 2], [1, 1])).toThrow('不是它所在分量的最小行')
+    expect(() => assignFromComponents([1, 2], [0])).toThrow('不一致')
+  })
+})
+
+describe('增量分配', () => {
+  it('新行挂到老 canonical 下，老成员不当种子', () => {
+    // 下标 0、1 是老行：1 已经是别人的成员。新行 2 只和 1 近 → 自己当种子认领 3；
+    // 新行 4 和老的 canonical 0 近 → 挂到 0 下
+    const ids = [10, 11, 20, 21, 22]
+    const grouped = new Set([11])
+    const out = assignIncremental(ids, 2, [[1, 2], [2, 3], [0, 4]], id => grouped.has(id))
+    expect(out.sort()).toEqual([[21, 20], [22, 10]].sort())
+  })
+
+  it('与全量贪心在"新图 id 更大"时一致', () => {
+    const ids = [1, 2, 3, 4, 5]
+    const pairs: Array<[number, number]> = [[0, 1], [0, 3], [1, 4], [3, 4]]
+    const full = assignFromPairs(ids, pairs)
+    const settled = new Map(assignFromPairs(ids, pairs.filter(([, j]) => j < 3)))
+    const incremental = assignIncremental(ids, 3, pairs.filter(([, j]) => j >= 3), id => settled.has(id))
+    expect([...settled, ...incremental].sort()).toEqual(full.sort())
+  })
+
+  it('两端都是老行的对被忽略', () => {
+    expect(assignIncremental([1, 2, 3], 2, [[0, 1]], () => false)).toEqual([])
+  })
+})
+
 describe('向量导出', () => {
   it('按 post_id 升序写出裸 float32，行序与返回的 ids 平行', () => {
     for (const id of [30, 10, 20]) {
@@ -129,9 +172,22 @@ describe('向量导出', () => {
 
   it('空库导出零字节', () => {
     const file = path.join(tmpDir, 'empty.f32')
-    expect(exportVectorMatrix(sqlite, file)).toEqual({ ids: [], count: 0, dim: 0 })
+    expect(exportVectorMatrix(sqlite, file)).toEqual({ ids: [], count: 0, dim: 0, newFrom: 0 })
     expect(fs.readFileSync(file).length).toBe(0)
   })
+
+  it('tail 里的 post 追加在末尾，从 newFrom 开始', () => {
+    for (const id of [10, 20, 30, 40]) {
+      insertPost(id)
+      insertVector(id)
+    }
+    const file = path.join(tmpDir, 'tail.f32')
+    // 999 没有向量：跳过，不占行
+    const { ids, count, newFrom } = exportVectorMatrix(sqlite, file, { tail: [40, 20, 999] })
+    expect(ids).toEqual([10, 30, 20, 40])
+    expect([count, newFrom]).toEqual([4, 2])
+    expect(fs.readFileSync(file).subarray(2 * 1152 * 4, 3 * 1152 * 4)).toEqual(unitBlob(20))
+  })
 })
 
 describe('原子换组', () => {
@@ -159,6 +215,14 @@ describe('原子换组', () => {
     expect([canonicalOf(1), canonicalOf(2), canonicalOf(3)]).toEqual([null, null, 1])
   })
 
+  it('增量写入只加指针，不清旧的；挂不到成员上', () => {
+    for (const id of [1, 2, 3, 4]) insertPost(id)
+    replaceAllGroups(sqlite, [[2, 1]])
+    // 2 此刻是成员：挂到它下面会成链，那一组丢弃
+    addToGroups(sqlite, [[3, 1], [4, 2]])
+    expect([canonicalOf(1), canonicalOf(2), canonicalOf(3), canonicalOf(4)]).toEqual([null, 1, 1, null])
+  })
+
   it('member 在计算期间被删掉时那条 UPDATE 是空操作', () => {
     for (const id of [1, 2]) insertPost(id)
     // 999 是快照里有、现在没了的成员：UPDATE 匹配 0 行，天然无害，不需要过滤。
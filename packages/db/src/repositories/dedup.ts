@@ -6,11 +6,17 @@
  * 只是多一个 `canonical_post_id` 指针（所以 Danbooru 去重不会重新下载）。一个簇里
  * id 最小的那个是 canonical，其余都指向它；组只有一层，永远不成链。
  *
- * 只有一条代码路径：**全量重建**（`exportVectorMatrix` → worker 矩阵乘 →
- * `assignFromPairs` → `replaceAllGroups`）。逐个 vec0 KNN 在 17 万行的表上约 1 秒
- * 一条，17 万条不可行（实测约 48 小时），所以只能一次性把全部向量喂给一次分块
- * `X @ X.T`。新图不走增量挂载，而是在 embedding backfill 排空后触发一次重建
- * （见 `apps/api/src/index.ts` 的 `onDrained`）—— 重建是确定性的，增量不是。
+ * 两条代码路径，都是把向量导出成矩阵文件交给 worker（逐个 vec0 KNN 在 17 万行的
+ * 表上约 1 秒一条，17 万条不可行，实测约 48 小时）：
+ *
+ * - **全量重建**：`exportVectorMatrix` → worker 分块 `X @ X.T` → `assignFromPairs`
+ *   → `replaceAllGroups`。确定性的，阈值变了、进程刚起来时走这条。分量模式下 worker
+ *   自己做 union-find，分配换成 `assignFromComponents`。
+ * - **增量挂载**：embedding backfill 排空后只为新写的向量算 `X_new @ X.T`
+ *   （`exportVectorMatrix` 的 `tail` → `assignIncremental` → `addToGroups`）。
+ *   现有分组原样保留，新图只往里挂。新图的 id 都比老图大时（正常导入就是这样），
+ *   结果与全量重建一致；不一致的边角（一张老 post 很晚才补上向量）由下一次全量
+ *   重建纠正。
  */
 import type BetterSqlite3 from 'better-sqlite3'
 import { closeSync, openSync, writeSync } from 'node:fs'
@@ -28,14 +34,34 @@ import { SIGLIP2_TABLE } from './vectors.js'
  *
  * 逐行写而不是先在内存里拼一个大 Buffer —— 1 GB 的 Buffer 会顶到 Node 的堆上限，
  * 而 better-sqlite3 的 iterate 本来就是流式的。
+ *
+ * `tail` 给增量挂载用：这些 post 的行不在升序主体里，而是按 id 升序追加在文件
+ * 末尾，从 `newFrom` 行开始（worker 只为这几行做矩阵乘）。它们本来就是少数（一轮
+ * backfill 的新向量），所以逐个点查；不在库里的（期间被删了）直接跳过。不给
+ * `tail` 时 `newFrom === count`。
  */
 export function exportVectorMatrix(
   sqlite: BetterSqlite3.Database,
   filePath: string,
-): { ids: number[], count: number, dim: number } {
+  { tail = [] }: { tail?: Iterable<number> } = {},
+): { ids: number[], count: number, dim: number, newFrom: number } {
   const ids: number[] = []
+  const tailIds = [...new Set(tail)].sort((a, b) => a - b)
+  const skip = new Set(tailIds)
   let dim = 0
+  let newFrom = 0
   const fd = openSync(filePath, 'w')
+  const write = (postId: number, blob: Buffer): void => {
+    const width = blob.length / 4
+    // 宽度不一致的行会让 worker 那边的 reshape 静默错位 —— 与其算出一堆噪声，
+    // 不如在这里就停下（同 `codec.py` 里检查宽度而不是推断宽度的理由）。
+    if (dim === 0)
+      dim = width
+    else if (width !== dim)
+      throw new Error(`post ${postId} 的向量是 ${width} 维，与前面的 ${dim} 维不一致`)
+    writeSync(fd, blob)
+    ids.push(postId)
+  }
   try {
     // join posts：vec0 不参与 FK 级联，孤儿向量（post 已删、向量还在）会跟着进矩阵。
     // 后果不是多算几行而已 —— `assignFromPairs` 取组内最小 id 当 canonical，孤儿一旦
@@ -52,22 +78,24 @@ export function exportVectorMatrix(
       )
       .iterate()
     for (const row of rows) {
-      const blob = row.embedding
-      const width = blob.length / 4
-      // 宽度不一致的行会让 worker 那边的 reshape 静默错位 —— 与其算出一堆噪声，
-      // 不如在这里就停下（同 `codec.py` 里检查宽度而不是推断宽度的理由）。
-      if (dim === 0)
-        dim = width
-      else if (width !== dim)
-        throw new Error(`post ${row.post_id} 的向量是 ${width} 维，与前面的 ${dim} 维不一致`)
-      writeSync(fd, blob)
-      ids.push(Number(row.post_id))
+      const postId = Number(row.post_id)
+      if (!skip.has(postId))
+        write(postId, row.embedding)
+    }
+    newFrom = ids.length
+    const one = sqlite.prepare<[number], { embedding: Buffer }>(
+      `SELECT v.embedding FROM ${SIGLIP2_TABLE} v JOIN posts p ON p.id = v.post_id WHERE v.post_id = ?`,
+    )
+    for (const postId of tailIds) {
+      const row = one.get(postId)
+      if (row)
+        write(postId, row.embedding)
     }
   }
   finally {
     closeSync(fd)
   }
-  return { ids, count: ids.length, dim }
+  return { ids, count: ids.length, dim, newFrom }
 }
 
 /**
@@ -113,6 +141,111 @@ export function assignFromPairs(
   return out
 }
 
+/**
+ * 连通分量标签 → `(member_id, canonical_id)`，`assignFromPairs` 的另一半。
+ *
+ * `labels[r]` 是 worker 的 union-find 给第 r 行的标签：它所在分量里最小的行下标
+ * （`DedupComponentsResult`）。最小行即最小 id，所以标签行就是 canonical，其余
+ * 每行直接指向它 —— 组仍然只有一层。和贪心不同的是分量会传递：0-1、1-2 近而 0-2
+ * 不近时，三个都归 0。
+ *
+ * 标签同样跨了进程边界，按输入对待：指向更大下标、或指向一个自己不是根的行，
+ * 都说明文件不对，直接抛错，而不是写出一条链。
+ */
+export function assignFromComponents(
+  ids: number[],
+  labels: ArrayLike<number>,
+): Array<[number, number]> {
+  if (labels.length !== ids.length)
+    throw new Error(`标签 ${labels.length} 个，与 ${ids.length} 行不一致`)
+  const out: Array<[number, number]> = []
+  for (let idx = 0; idx < labels.length; idx++) {
+    const root = labels[idx]!
+    if (root === idx)
+      continue
+    if (!(root >= 0 && root < idx) || labels[root] !== root)
+      throw new Error(`第 ${idx} 行的标签 ${root} 不是它所在分量的最小行`)
+    out.push([ids[idx]!, ids[root]!])
+  }
+  return out
+}
+
+/**
+ * 增量版的 `assignFromPairs`：只为 `[newFrom, ids.length)` 这些新行决定归属。
+ *
+ * 同一个贪心，只是老行的状态不是从零开始，而是库里现有的分组 —— `isGrouped(id)`
+ * 为真的老 post 是别人的成员，不能当种子；其余老 post（canonical 或独立的）是种子，
+ * 按行序认领还没被认领的新邻居。剩下的新行再按行序轮流当种子，只认领下标更大的
+ * 新行。老行之间的关系不在 `pairs` 里（worker 只回传含新行的对），也不会被改动。
+ *
+ * 只返回新 post 的 `(member_id, canonical_id)`，交给 `addToGroups`。
+ */
+export function assignIncremental(
+  ids: number[],
+  newFrom: number,
+  pairs: Array<[number, number]>,
+  isGrouped: (postId: number) => boolean,
+): Array<[number, number]> {
+  const adjacency = new Map<number, number[]>()
+  for (const [i, j] of pairs) {
+    // 规整的理由同 `assignFromPairs`。两端都是老行的对不该出现，出现了也不归这里管。
+    const [lo, hi] = i < j ? [i, j] : [j, i]
+    if (lo === hi || hi < newFrom)
+      continue
+    const bucket = adjacency.get(lo)
+    if (bucket)
+      bucket.push(hi)
+    else adjacency.set(lo, [hi])
+  }
+
+  const claimed = new Map<number, number>() // 新行下标 -> canonical 下标
+  const seeds = [...adjacency.keys()].sort((a, b) => a - b)
+  for (const idx of seeds) {
+    if (claimed.has(idx) || (idx < newFrom && isGrouped(ids[idx]!)))
+      continue
+    for (const j of adjacency.get(idx)!) {
+      if (!claimed.has(j))
+        claimed.set(j, idx)
+    }
+  }
+
+  const out: Array<[number, number]> = []
+  for (const [member, canonical] of claimed)
+    out.push([ids[member]!, ids[canonical]!])
+  return out
+}
+
+/**
+ * 把增量挂载的结果写进现有分组，不动其它指针。
+ *
+ * canonical 的存活探测同 `replaceAllGroups`：算的这段时间里它可能被删了。
+ * 另外要求它此刻**仍是** canonical（自己没有 `canonical_post_id`）—— 组只有一层，
+ * 挂到一个成员上就成了链。
+ */
+export function addToGroups(
+  sqlite: BetterSqlite3.Database,
+  assignments: Array<[number, number]>,
+): void {
+  const set = sqlite.prepare(
+    'UPDATE posts SET canonical_post_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+  )
+  const head = sqlite.prepare<[number], { canonical_post_id: number | null }>(
+    'SELECT canonical_post_id FROM posts WHERE id = ?',
+  )
+  sqlite.transaction(() => {
+    const live = new Set<number>()
+    for (const c of new Set(assignments.map(([, c]) => c))) {
+      const row = head.get(c)
+      if (row && row.canonical_post_id === null)
+        live.add(c)
+    }
+    for (const [member, canonical] of assignments) {
+      if (live.has(canonical))
+        set.run(canonical, member)
+    }
+  })()
+}
+
 /**
  * 一次事务内换掉全部分组指针。
  *
@@ -62,6 +62,26 @@ export function listTagsWithCounts(
   }))
 }
 
+/**
+ * `rowid` 大于 `after` 的 tag 名，按 `rowid` 升序，给 tag 词表的增量编码用。
+ *
+ * 不按 `created_at` 翻页：它只到秒，tagger 一批新建的几十个 tag 共享同一个时间戳，
+ * 同一秒里后建、名字却排在游标前面的 tag 会被永远跳过。`rowid` 随插入递增；唯一的
+ * 例外是删掉当前最大 `rowid` 的 tag 后紧接着新建，新 tag 会拿回那个号 —— 它只是
+ * 没进词表，第一次按它搜时照常跑一次前向。
+ */
+export function listTagsAfterRowid(
+  sqlite: BetterSqlite3.Database,
+  after: number,
+  limit: number,
+): Array<{ rowid: number, name: string }> {
+  return sqlite
+    .prepare<[number, number], { rowid: number, name: string }>(
+      'SELECT rowid, name FROM tags WHERE rowid > ? ORDER BY rowid LIMIT ?',
+    )
+    .all(after, limit)
+}
+
 export function listTagGroups(sqlite: BetterSqlite3.Database): TagGroupRow[] {
   return sqlite
     .prepare<[], TagGroupRow>('SELECT id, name, color FROM tag_groups ORDER BY id')
@@ -0,0 +1,118 @@
+"""Benchmark the payload vector codec: layouts, then reduced-precision encodings.
+
+For each batch size (64 = ``SILVA_TASK_BATCH``, 4096 = a large batch by
+default) times both directions over real-width SigLIP 2 vectors:
+
+* ``per-row`` — the old path: ``encode_vector`` per row into a JSON-ready list,
+                and ``decode_vector`` per row followed by ``np.stack``;
+* ``batch``   — ``encode_batch`` / ``decode_batch``: one ``tobytes`` + b64 and
+                one ``frombuffer`` + ``reshape``;
+* ``matrix``  — ``encode_batch`` handed the ``[N, D]`` array itself, skipping
+                the ``np.stack`` a list of rows needs.
+
+Then, per wire encoding (``f32`` / ``f16`` / ``i8``), the payload size, encode
+and decode time, and the cosine error the round trip introduces (``1 - cos``
+between each vector and its decoded self, mean and max).
+
+The vectors are random unit vectors unless ``--vectors`` names a raw float32
+``(N, 1152)`` file — the matrix ``dedup`` exports is exactly that, and real
+SigLIP vectors are what the error numbers should be read off. Pure NumPy, no
+model needed.
+
+Run from the server/ dir:
+    uv run python scripts/bench_codec.py
+    uv run python scripts/bench_codec.py --sizes 16,64,1024,4096 --repeat 20
+    uv run python scripts/bench_codec.py --vectors path/to/vectors.f32
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR / "src"))
+
+import numpy as np
+
+from worker.codec import SIGLIP2_DIM, VECTOR_ENCODINGS, decode_batch, decode_vector, encode_batch, encode_vector
+
+
+def _best_ms(fn, repeat: int) -> tuple[float, float]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), statistics.median(times)
+
+
+def _print(name: str, best: float, median: float) -> None:
+    print(f"  {name:<15} best {best:8.2f} ms   median {median:8.2f} ms")
+
+
+def bench_layouts(matrix: np.ndarray, repeat: int) -> None:
+    n = len(matrix)
+    rows = list(matrix)
+    ids = list(range(n))
+
+    per_row = [{"postId": i, "embedding": encode_vector(v)} for i, v in zip(ids, rows, strict=True)]
+    batch = {"postIds": ids, "vectors": encode_batch(rows)}
+    if not np.array_equal(decode_batch(batch["vectors"], n), matrix):
+        sys.exit("batch round trip is not bit-exact")
+
+    cases = {
+        "encode per-row": lambda: [{"postId": i, "embedding": encode_vector(v)} for i, v in zip(ids, rows, strict=True)],
+        "encode batch": lambda: {"postIds": ids, "vectors": encode_batch(rows)},
+        "encode matrix": lambda: {"postIds": ids, "vectors": encode_batch(matrix)},
+        "decode per-row": lambda: np.stack([decode_vector(r["embedding"]) for r in per_row]),
+        "decode batch": lambda: decode_batch(batch["vectors"], len(batch["postIds"])),
+    }
+    print(f"N={n} layouts  json: per-row {len(json.dumps(per_row)) / 1e6:.2f} MB, batch {len(json.dumps(batch)) / 1e6:.2f} MB")
+    for name, fn in cases.items():
+        _print(name, *_best_ms(fn, repeat))
+
+
+def bench_encodings(matrix: np.ndarray, repeat: int) -> None:
+    n = len(matrix)
+    unit = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    print(f"N={n} encodings")
+    for encoding in VECTOR_ENCODINGS:
+        b64 = encode_batch(matrix, encoding)
+        decoded = decode_batch(b64, n, encoding=encoding)
+        cos = (unit * decoded).sum(axis=1, dtype=np.float64) / np.linalg.norm(decoded, axis=1)
+        err = 1.0 - cos
+        print(
+            f"  {encoding:<4} {len(b64) / n:6.0f} B/vector   1-cos mean {err.mean():.1e} max {err.max():.1e}   max |dx| {np.abs(decoded - matrix).max():.1e}",
+        )
+        _print("  encode", *_best_ms(lambda e=encoding: encode_batch(matrix, e), repeat))
+        _print("  decode", *_best_ms(lambda b=b64, e=encoding: decode_batch(b, n, encoding=e), repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="64,4096", help="comma-separated batch sizes")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--vectors", type=Path, default=None, help=f"raw float32 (N, {SIGLIP2_DIM}) file to sample from")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    if args.vectors:
+        pool = np.fromfile(args.vectors, dtype=np.float32).reshape(-1, SIGLIP2_DIM)
+        print(f"vectors: {len(pool)} from {args.vectors}")
+    else:
+        pool = np.random.default_rng(0).standard_normal((max(sizes), SIGLIP2_DIM))
+        pool = (pool / np.linalg.norm(pool, axis=1, keepdims=True)).astype(np.float32)
+        print("vectors: random unit (pass --vectors for real SigLIP 2 ones)")
+    for n in sizes:
+        matrix = np.ascontiguousarray(pool[:n])
+        bench_layouts(matrix, args.repeat)
+        bench_encodings(matrix, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
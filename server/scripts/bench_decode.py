@@ -0,0 +1,130 @@
+"""Benchmark the model-input decode: full-resolution vs reduced (draft/reduce).
+
+Builds a mixed-format fixture set (large JPEG, PNG and WebP, some RGBA, some
+palette) in a temp dir, then decodes it through ``ai.image_io.decode_images``
+twice — once with ``PICTORIA_REDUCED_DECODE=0`` (decode whole, BICUBIC down)
+and once with the reduced path (JPEG ``draft()``, ``reduce()`` before BICUBIC
+for the rest). Each run is a fresh child process so peak RSS is its own.
+
+Run from the server/ dir:
+    uv run python scripts/bench_decode.py                       # 448, 24 images
+    uv run python scripts/bench_decode.py --min-side 384 --count 48 --size 8000
+
+Peak RSS is ``VmHWM`` on Linux, ``ru_maxrss`` on macOS, and unavailable on
+Windows; the timings are printed either way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR / "src"))
+
+# Reads PICTORIA_REDUCED_DECODE at import; the parent sets it per child.
+from ai.image_io import DECODE_WORKERS, REDUCED_DECODE, close_images, decode_images
+
+FORMATS = (("jpg", "RGB"), ("png", "RGB"), ("webp", "RGB"), ("png", "RGBA"), ("png", "P"), ("jpg", "L"))
+
+
+def build_fixtures(out: Path, count: int, size: int) -> list[Path]:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        ext, mode = FORMATS[i % len(FORMATS)]
+        w, h = (size, size * 3 // 4) if i % 2 else (size * 3 // 4, size)
+        # Smooth gradient plus noise: compresses like a real illustration rather
+        # than like pure noise (which makes PNG/WebP unrealistically large).
+        base = np.linspace(0, 255, w, dtype=np.float32)[None, :, None] + np.linspace(0, 64, h, dtype=np.float32)[:, None, None]
+        pixels = np.clip(base + rng.normal(0, 8, (h, w, 1)), 0, 255).astype(np.uint8).repeat(4, axis=2)
+        image = Image.fromarray(pixels, "RGBA").convert(mode) if mode != "P" else Image.fromarray(pixels[..., :3], "RGB").quantize(64)
+        path = out / f"{i:03d}.{ext}"
+        image.save(path, quality=90) if ext in {"jpg", "webp"} else image.save(path)
+        paths.append(path)
+    return paths
+
+
+def peak_rss() -> int | None:
+    """This process's peak RSS in bytes, or None where it cannot be read."""
+    # VmHWM first: Linux carries ru_maxrss across fork+exec, so a child would
+    # report the parent's fixture-building peak instead of its own.
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def run_child(paths: list[Path], min_side: int, batch: int) -> None:
+    started = time.perf_counter()
+    for start in range(0, len(paths), batch):
+        chunk = paths[start : start + batch]
+        close_images(decode_images(chunk, min_side), chunk)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"workers": DECODE_WORKERS, "reduced": REDUCED_DECODE, "seconds": elapsed, "peak_rss": peak_rss()}))
+
+
+def spawn(fixtures: Path, ext: str, min_side: int, batch: int, *, reduced: bool) -> dict:
+    env = {**os.environ, "PICTORIA_REDUCED_DECODE": "1" if reduced else "0"}
+    cmd = [sys.executable, __file__, "--child", str(fixtures), "--ext", ext, "--min-side", str(min_side), "--batch", str(batch)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout  # noqa: S603 — our own interpreter and script
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _row(label: str, count: int, r: dict) -> str:
+    rss = f"{r['peak_rss'] / 2**20:.0f} MiB" if r["peak_rss"] is not None else "n/a"
+    return f"{label:<16}{r['seconds']:>10.2f}{count / r['seconds']:>10.1f}{rss:>12}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-side", type=int, default=448, help="model input (shorter side) to decode for")
+    parser.add_argument("--count", type=int, default=24, help="fixture images to generate")
+    parser.add_argument("--size", type=int, default=4096, help="longer side of each fixture, px")
+    parser.add_argument("--batch", type=int, default=8, help="images per decode_images call")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--ext", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(sorted(args.child.glob(f"*.{args.ext}")), args.min_side, args.batch)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="pictoria-bench-") as tmp:
+        fixtures = Path(tmp)
+        print(f"Building {args.count} fixtures at {args.size}px ({', '.join(f'{e}/{m}' for e, m in FORMATS)}) ...")
+        counts: dict[str, int] = defaultdict(int)
+        for path in build_fixtures(fixtures, args.count, args.size):
+            counts[path.suffix[1:]] += 1
+        # One child per (format, mode): peak RSS is per process, so a PNG run
+        # would otherwise hide whatever the JPEG run saved.
+        results = {(ext, reduced): spawn(fixtures, ext, args.min_side, args.batch, reduced=reduced) for ext in counts for reduced in (False, True)}
+
+    print(f"\nmin_side={args.min_side}  batch={args.batch}  workers={next(iter(results.values()))['workers']}")
+    print(f"{'format / mode':<16}{'seconds':>10}{'img/s':>10}{'peak RSS':>12}")
+    for (ext, reduced), r in results.items():
+        print(_row(f"{ext} {'reduced' if reduced else 'full'}", counts[ext], r))
+
+
+if __name__ == "__main__":
+    main()
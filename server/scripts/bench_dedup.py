@@ -0,0 +1,173 @@
+"""Benchmark the tiled CPU dedup engine as the library grows.
+
+For each size (10k, 50k and 200k rows by default) this writes a synthetic
+``(N, 1152)`` float32 matrix file to a temp dir. The rows are unit vectors,
+with ``--dup-rate`` of them planted as near copies of an earlier row so the
+pair path does real work. The copies sit at cosine distances spread evenly up
+to ``--threshold``, so some are right at the edge, where LSH misses first.
+``cpu_near_pairs`` then runs on a memmap of that file, just as
+``handle_dedup`` does. Each size runs in a fresh process so its peak memory is
+its own. For every size it reports:
+
+* wall time, and GFLOP/s over the upper-triangle work (``N^2 * dim`` multiply-adds,
+  i.e. ``2 * N(N+1)/2 * dim`` FLOPs);
+* peak NumPy heap (``tracemalloc``), which is the tiles and blocks the
+  engine allocates. It should stay flat as N grows;
+* peak RSS (``ru_maxrss``), which also counts the memmap's page-cache pages
+  as they are touched. That share is file-backed and reclaimable, but it is
+  what ``top`` shows;
+* pairs found against pairs planted (a planted copy at the very edge can
+  round to just outside the threshold).
+
+With ``--lsh`` it then runs ``lsh_near_pairs`` on the same file and reports
+its time and recall: the share of the exact engine's pairs it also found,
+next to what ``lsh_recall`` predicts for a pair right at the threshold. It
+also counts the candidates the LSH engine checks, which is what blows up when
+the rows are not spread evenly. ``--common`` gives every row a shared
+direction so that two unrelated rows sit at that mean cosine, as real SigLIP
+vectors do (around 0.5), instead of the isotropic default of 0.
+
+200k rows is ~46 TFLOP. Expect minutes per core. BLAS threads follow
+``OPENBLAS_NUM_THREADS`` / ``MKL_NUM_THREADS``.
+
+Run from the server/ dir:
+    uv run python scripts/bench_dedup.py
+    uv run python scripts/bench_dedup.py --sizes 10000,50000 --tile 2048
+    uv run python scripts/bench_dedup.py --sizes 10000,50000 --lsh
+    uv run python scripts/bench_dedup.py --sizes 20000 --lsh --common 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR / "src"))
+
+import numpy as np
+
+from worker.codec import SIGLIP2_DIM
+from worker.dedup import (
+    LSH_BITS,
+    LSH_TABLES,
+    cpu_near_pairs,
+    load_matrix,
+    lsh_candidates,
+    lsh_near_pairs,
+    lsh_recall,
+)
+
+#: Rows generated per write, so building a 200k file never holds it all.
+_GEN_CHUNK = 8192
+
+
+def write_matrix(path: Path, n: int, dup_rate: float, threshold: float, common: float = 0.0, seed: int = 0) -> int:  # noqa: PLR0913, PLR0917
+    """Write ``n`` unit rows to ``path``; return how many are planted near copies."""
+    rng = np.random.default_rng(seed)
+    shared = rng.standard_normal(SIGLIP2_DIM)
+    shared *= np.sqrt(SIGLIP2_DIM * common) / np.linalg.norm(shared)
+    planted = 0
+    with path.open("wb") as f:
+        for start in range(0, n, _GEN_CHUNK):
+            rows = rng.standard_normal((min(_GEN_CHUNK, n - start), SIGLIP2_DIM))
+            # ``common`` of each row's squared norm along one shared direction:
+            # still |x| ~ sqrt(dim), and two unrelated rows meet at cosine ``common``.
+            rows = (rows * np.sqrt(1 - common) + shared).astype(np.float32)
+            # A planted row copies its predecessor plus noise scaled to land at a
+            # cosine distance drawn from [0, threshold]: |x| = sqrt(dim) for a
+            # Gaussian row, so noise of norm s puts it at 1 - 1/sqrt(1 + s^2/dim).
+            dup = rng.random(len(rows)) < dup_rate
+            dup[0] = False
+            dup[1:] &= ~dup[:-1]  # never copy a copy, so each plant is exactly one pair
+            idx = np.flatnonzero(dup)
+            distance = rng.uniform(0, threshold, size=(len(idx), 1))
+            scale = np.sqrt((1 / (1 - distance)) ** 2 - 1)
+            noise = rng.standard_normal((len(idx), SIGLIP2_DIM)) * scale
+            rows[idx] = rows[idx - 1] + noise.astype(np.float32)
+            planted += len(idx)
+            rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+            rows.tofile(f)
+    return planted
+
+
+def run_one(n: int, tile: int, threshold: float, dup_rate: float, *, common: float, lsh: bool) -> None:  # noqa: PLR0913
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "vectors.f32"
+        planted = write_matrix(path, n, dup_rate, threshold, common)
+        matrix = load_matrix(path, n, SIGLIP2_DIM)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        pairs, _ = cpu_near_pairs(matrix, threshold, tile)
+        elapsed = time.perf_counter() - started
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if lsh:
+            started = time.perf_counter()
+            approx, _ = lsh_near_pairs(matrix, threshold, tile)
+            lsh_elapsed = time.perf_counter() - started
+            candidates = sum(len(i) for i, _ in lsh_candidates(matrix, tile))
+
+    flops = n * (n + 1) * SIGLIP2_DIM  # 2 FLOPs per multiply-add over the upper triangle
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"N={n:>7}  {elapsed:8.1f} s  {flops / elapsed / 1e9:7.1f} GFLOP/s"
+        f"   heap peak {heap_peak / 1e6:7.1f} MB   RSS peak {rss_mb:7.0f} MB"
+        f"   matrix {n * SIGLIP2_DIM * 4 / 1e6:7.0f} MB   pairs {len(pairs)} (planted {planted})",
+        flush=True,
+    )
+    if lsh:
+        exact = {(i, j) for i, j in pairs.tolist()}
+        hit = sum((i, j) in exact for i, j in approx.tolist())
+        print(
+            f"   lsh {LSH_TABLES}x{LSH_BITS} bits  {lsh_elapsed:8.1f} s  ({elapsed / lsh_elapsed:5.1f}x)"
+            f"   recall {hit / max(len(exact), 1):.4f} ({hit}/{len(exact)})"
+            f"   at-threshold odds {lsh_recall(threshold):.4f}"
+            f"   candidates {candidates} ({candidates / n:.1f}/row, {candidates / (n * (n - 1) / 2):.2e} of all pairs)",
+            flush=True,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,50000,200000", help="comma-separated row counts")
+    parser.add_argument("--tile", type=int, default=1024, help="tile edge (DEDUP_CHUNK_SIZE on the TS side)")
+    parser.add_argument("--threshold", type=float, default=0.01, help="cosine distance (DEDUP_THRESHOLD)")
+    parser.add_argument("--dup-rate", type=float, default=0.01, help="fraction of rows planted as near copies")
+    parser.add_argument("--common", type=float, default=0.0, help="mean cosine of two unrelated rows")
+    parser.add_argument("--lsh", action="store_true", help="also run the LSH engine and report its recall")
+    parser.add_argument("--one", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one is not None:
+        run_one(args.one, args.tile, args.threshold, args.dup_rate, common=args.common, lsh=args.lsh)
+        return
+    for n in (int(s) for s in args.sizes.split(",")):
+        # One process per size: ru_maxrss is a high-water mark and never comes down.
+        cmd = [
+            sys.executable,
+            __file__,
+            "--one",
+            str(n),
+            "--tile",
+            str(args.tile),
+            "--threshold",
+            str(args.threshold),
+            "--dup-rate",
+            str(args.dup_rate),
+            "--common",
+            str(args.common),
+            *(["--lsh"] if args.lsh else []),
+        ]
+        subprocess.run(cmd, check=True)  # noqa: S603 — our own interpreter and script
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark text-embed latency: one forward per prompt vs coalesced batches.
+
+Fires N prompts at once (N = 1, 8, 32 by default) the way a burst of
+searches reaches the interactive Worker, and reports per-prompt latency for:
+
+* ``serial``    — the old path: ``concurrency=1``, one forward per prompt, so
+                  the last prompt waits for every forward ahead of it;
+* ``coalesced`` — ``worker.coalesce.Coalescer`` in front of the same forward,
+                  with the handler's window and batch cap.
+
+Run from the server/ dir:
+    uv run python scripts/bench_text_embed.py                    # real SigLIP 2
+    uv run python scripts/bench_text_embed.py --simulate 12,0.3  # no model: 12 ms + 0.3 ms/prompt
+
+``--simulate`` stands in a forward that sleeps ``base + per_item * n`` ms, for
+machines without the weights; the numbers then show the scheduling, not the GPU.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR / "src"))
+
+from worker.coalesce import Coalescer
+from worker.handlers import TEXT_EMBED_MAX_BATCH, TEXT_EMBED_WINDOW_S
+
+PROMPTS = [
+    "a girl with silver hair under cherry blossoms",
+    "雨の夜の城市 neon",
+    "cat sleeping on a windowsill",
+    "水彩风格的海边",
+    "mecha, dramatic lighting",
+    "夕焼けの教室",
+    "portrait, oil painting",
+    "snowy forest at dawn",
+]
+
+
+def make_forward(simulate: str | None):
+    if simulate is None:
+        from ai.siglip_embed import calculate_text_features  # noqa: PLC0415  # lazy: only without --simulate
+
+        def _real(prompts: list[str]) -> list[object]:
+            return list(calculate_text_features(prompts).cpu().numpy())
+
+        _real(["warm-up"])
+        return _real
+
+    base_ms, per_item_ms = (float(x) for x in simulate.split(","))
+
+    def _fake(prompts: list[str]) -> list[object]:
+        time.sleep((base_ms + per_item_ms * len(prompts)) / 1000)
+        return [None] * len(prompts)
+
+    return _fake
+
+
+async def _serial(forward, prompts: list[str]) -> list[float]:
+    lock = asyncio.Lock()
+    started = time.perf_counter()
+
+    async def _one(prompt: str) -> float:
+        async with lock:
+            await asyncio.to_thread(forward, [prompt])
+        return time.perf_counter() - started
+
+    return await asyncio.gather(*[_one(p) for p in prompts])
+
+
+async def _coalesced(forward, prompts: list[str], window_s: float) -> list[float]:
+    coalescer = Coalescer(forward, window_s=window_s, max_batch=TEXT_EMBED_MAX_BATCH)
+    started = time.perf_counter()
+
+    async def _one(prompt: str) -> float:
+        await coalescer.submit(prompt)
+        return time.perf_counter() - started
+
+    return await asyncio.gather(*[_one(p) for p in prompts])
+
+
+def _summary(latencies: list[float]) -> str:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))]
+    return f"{statistics.median(ms):>9.1f}{p95:>9.1f}{ms[-1]:>9.1f}"
+
+
+async def run(args: argparse.Namespace) -> None:
+    forward = make_forward(args.simulate)
+    print(f"window={args.window_ms} ms  max_batch={TEXT_EMBED_MAX_BATCH}  forward={'simulated ' + args.simulate if args.simulate else 'SigLIP 2'}")
+    print(f"{'prompts':>8} {'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for n in args.concurrency:
+        prompts = [PROMPTS[i % len(PROMPTS)] + f" #{i}" for i in range(n)]
+        for mode in ("serial", "coalesced"):
+            runs: list[float] = []
+            for _ in range(args.repeat):
+                if mode == "serial":
+                    runs += await _serial(forward, prompts)
+                else:
+                    runs += await _coalesced(forward, prompts, args.window_ms / 1000)
+            print(f"{n:>8} {mode:<10}{_summary(runs)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--window-ms", type=float, default=TEXT_EMBED_WINDOW_S * 1000)
+    parser.add_argument("--repeat", type=int, default=5, help="bursts per (concurrency, mode)")
+    parser.add_argument("--simulate", metavar="BASE_MS,PER_ITEM_MS", help="fake forward instead of the model")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
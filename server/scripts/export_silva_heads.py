@@ -0,0 +1,65 @@
+"""Export the published SILVA heads to ``.npz`` for the torch-free scorer.
+
+The worker does this on its own the first time a head is used with no ``.npz``
+on disk — and keeps torch imported from then on. Run this once per library to
+do it ahead of time (the worker then never imports torch for SILVA), or with
+``--force`` after a head was re-published on the Hub (an existing ``.npz`` is
+otherwise kept as-is).
+
+Heads go to ``<library>/.pictoria/silva/``, the library being the worker's
+(``$PICTORIA_TARGET_DIR``, or ``--target_dir``); ``$PICTORIA_SILVA_NPZ_DIR``
+overrides that as it does for the worker.
+
+Run from the server/ dir:
+    uv run python scripts/export_silva_heads.py                 # every SILVA scorer
+    uv run python scripts/export_silva_heads.py silva --force   # re-export one
+
+Prints each head's parity against the torch forward on random unit vectors.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR / "src"))
+
+import numpy as np
+
+from ai.silva_head import NPZ_DIRNAME, SilvaHead, npz_path, set_npz_dir
+from ai.silva_scorer import _REPO_IDS, export, load_torch_head
+from worker.main import target_dir
+
+
+def _parity(scorer: str, path: Path) -> float:
+    import torch  # noqa: PLC0415  # lazy: only needed for the comparison
+
+    x = np.random.default_rng(0).standard_normal((256, 1152)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    with torch.inference_mode():
+        expected = load_torch_head(scorer)(torch.from_numpy(x))["calibrated_score"].numpy()
+    return float(np.abs(SilvaHead.load(path).score(x) - expected).max())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scorers", nargs="*", default=list(_REPO_IDS), choices=list(_REPO_IDS))
+    parser.add_argument("--force", action="store_true", help="re-export even if the .npz exists")
+    parser.add_argument("--target_dir", type=Path, default=None, help="image library root (default: the worker's)")
+    args = parser.parse_args()
+    root = args.target_dir.resolve() if args.target_dir else target_dir()
+    set_npz_dir(root / ".pictoria" / NPZ_DIRNAME)
+    for scorer in args.scorers:
+        path = npz_path(scorer)
+        if path.exists() and not args.force:
+            print(f"{scorer}: {path} exists (use --force to re-export)")
+        else:
+            export(scorer, path)
+            print(f"{scorer}: exported to {path} ({path.stat().st_size / 2**20:.1f} MiB)")
+        print(f"{scorer}: max |numpy - torch| = {_parity(scorer, path):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,20 @@ from functools import cache
 from transformers import AutoModel, AutoProcessor
 
 from ai.hf_loader import load_local_first
+from ai.registry import REGISTRY
 from ai.torch_runtime import patch_features_to_tensor
 
 device = "cuda"
 
+#: Registry name; ``ai.waifu_scorer`` declares it as a requirement.
+MODEL_NAME = "clip-vit-l"
+
 
-@cache
 def get_clip_model() -> AutoModel:
+    return REGISTRY.get(MODEL_NAME, _load_clip_model)
+
+
+def _load_clip_model() -> AutoModel:
     model = load_local_first(
         AutoModel.from_pretrained,
         "openai/clip-vit-large-patch14",
@@ -0,0 +1,169 @@
+"""The decode stage in front of every image model — parallel, and shrunk early.
+
+SigLIP, WDTagger and the waifu CLIP path all used to open their inputs with a
+serial ``Image.open`` per image inside the batch function, so a batch of 32
+large PNGs was seconds of single-threaded decode before one forward pass. And
+every image stayed at full resolution until the HF processor / timm transform
+threw almost all of it away: 32 decoded 16k scans held at once is tens of GB,
+for a model that looks at 384x384.
+
+:func:`decode_images` fixes both. Images decode on a shared pool
+(``PICTORIA_DECODE_WORKERS`` threads by default, or processes with
+``PICTORIA_DECODE_POOL=process``), and each one is downscaled to the model's
+input resolution *inside* the worker that decoded it — so a full-size buffer
+only lives for as long as that one decode, and peak host memory is bounded by
+``workers`` originals plus ``batch`` model-sized images rather than ``batch``
+originals.
+
+No torch here: a process-pool child imports this module to unpickle the task,
+and it should not pay for the ML stack to do it.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+# Same PIL settings as the rest of the worker — no pixel cap (16k scans are
+# routine), truncated files decode as far as they go. Imported for the side
+# effect so a process-pool child gets them too, not just this process.
+import utils  # noqa: F401
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+ImageInput = Image.Image | Path | str
+
+#: Decode pool size. Decoding is CPU-bound and PIL releases the GIL inside its
+#: codecs, so threads scale; past ~8 the GPU is the bottleneck again.
+DECODE_WORKERS = int(os.environ.get("PICTORIA_DECODE_WORKERS", str(min(8, os.cpu_count() or 4))))
+
+#: ``thread`` (default) or ``process``. Processes sidestep the few codecs that
+#: hold the GIL, at the cost of pickling every decoded image back — which is
+#: cheap only *because* it has already been shrunk to model size.
+DECODE_POOL = os.environ.get("PICTORIA_DECODE_POOL", "thread")
+
+#: Set to ``0`` to decode at full resolution and resize afterwards — the
+#: pre-draft behaviour, kept for ``scripts/bench_decode.py`` and as a kill switch.
+REDUCED_DECODE = os.environ.get("PICTORIA_REDUCED_DECODE", "1") != "0"
+
+#: ``resize``'s ``reducing_gap``: shrink with an integer box ``reduce()`` until
+#: within this factor of the target, then BICUBIC the rest. At 3 the result is
+#: indistinguishable from a full BICUBIC pass and an order of magnitude cheaper
+#: on a 16k scan.
+REDUCING_GAP = 3.0
+
+_pool: Executor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Executor:
+    global _pool  # noqa: PLW0603 — one pool per process, created on first use
+    with _pool_lock:
+        if _pool is None:
+            if DECODE_POOL == "process":
+                # spawn, not fork: by the time the first batch decodes, this
+                # process holds a CUDA context, and a forked child inherits it broken.
+                _pool = ProcessPoolExecutor(max_workers=DECODE_WORKERS, mp_context=get_context("spawn"))
+            else:
+                _pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+        return _pool
+
+
+def fit_size(size: tuple[int, int], min_side: int) -> tuple[int, int]:
+    """The smallest size, same aspect, whose shorter side is still ``>= min_side``.
+
+    Shorter side rather than longer: SigLIP squashes to a square, CLIP resizes
+    the shorter side then centre-crops, WDTagger pads to square first — covering
+    the shorter side covers every one of them. Never upscales.
+    """
+    w, h = size
+    if min(w, h) <= min_side:
+        return w, h
+    # Integer ceil-division: float scaling lands 224 on 224.0000001 and rounds up.
+    if w <= h:
+        return min_side, -(-h * min_side // w)
+    return -(-w * min_side // h), min_side
+
+
+def load_image(src: ImageInput, min_side: int | None = None) -> Image.Image:
+    """Decode one image, shrunk so its shorter side is ``min_side`` (if larger).
+
+    A JPEG opened here is decoded at reduced scale: ``draft()`` asks libjpeg for
+    the smallest 1/2, 1/4 or 1/8 DCT scale that still covers the target, so a
+    16k scan bound for a 448 model never exists at full size in memory. Other
+    formats have no reduced decode; they load whole and shrink through
+    ``reduce()`` (via ``reducing_gap``) before the final BICUBIC step.
+
+    Palette and 1-bit images are widened first: PIL can only resize those with
+    nearest-neighbour, and a palette image with transparency keeps it as alpha
+    so each model's own RGB handling (white fill for WDTagger/waifu) still sees it.
+    EXIF stays in ``info`` across the resize, so the waifu path's rotation
+    still applies.
+    """
+    image = Image.open(src) if isinstance(src, Path | str) else src
+    try:
+        if min_side is not None and REDUCED_DECODE and image is not src and image.format == "JPEG":
+            # Before load(): draft only reconfigures a decoder that has not run yet.
+            image.draft(None, fit_size(image.size, min_side))
+        image.load()
+        if min_side is None:
+            return image
+        target = fit_size(image.size, min_side)
+        if target == image.size:
+            return image
+        if image.mode == "P":
+            work = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        elif image.mode == "1":
+            work = image.convert("L")
+        else:
+            work = image
+        resized = work.resize(target, Image.Resampling.BICUBIC, reducing_gap=REDUCING_GAP if REDUCED_DECODE else None)
+    except BaseException:
+        if image is not src:
+            image.close()
+        raise
+    if image is not src:
+        image.close()
+    return resized
+
+
+def decode_images(images: Sequence[ImageInput], min_side: int | None = None) -> list[Image.Image]:
+    """:func:`load_image` over a batch, in parallel on the shared decode pool.
+
+    Order is preserved. Images that arrive already decoded (``handle_analyze``
+    shares one decode across models) are only resized, on the calling thread:
+    there is nothing to parallelize, and a process pool would pickle them for
+    nothing. If any image fails, the ones that did decode are closed and the
+    first error is raised — the ladder above expects a batch to fail whole and
+    isolates the bad one itself.
+    """
+    if not images:
+        return []
+    pool = _get_pool()
+    futures = [None if isinstance(img, Image.Image) else pool.submit(load_image, img, min_side) for img in images]
+    decoded: list[Image.Image] = []
+    error: BaseException | None = None
+    for img, future in zip(images, futures, strict=True):
+        try:
+            decoded.append(load_image(img, min_side) if future is None else future.result())
+        except Exception as exc:
+            error = error or exc
+    if error is not None:
+        close_images(decoded, images)
+        raise error
+    return decoded
+
+
+def close_images(decoded: Sequence[Image.Image], original: Sequence[ImageInput]) -> None:
+    """Close every image in ``decoded`` that is not one of the caller's own."""
+    caller_owned = {id(img) for img in original if isinstance(img, Image.Image)}
+    for image in decoded:
+        if id(image) not in caller_owned:
+            image.close()
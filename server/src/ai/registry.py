@@ -0,0 +1,289 @@
+"""Which models stay resident, and for how long.
+
+Every loader used to be an unbounded ``@cache``: once the worker had run each
+task once, SigLIP 2, CLIP-L (under the waifu head) and WD-ViT-L all stayed on
+the GPU until the process died — several GB of VRAM held for a backfill that
+finished hours ago, or for a task type this library never runs again.
+
+:data:`REGISTRY` replaces those caches. A loader goes through
+:meth:`ModelRegistry.get`, which loads on first use and then tracks two
+things per model: its footprint (bytes of unique tensor storage, measured
+after the load) and when it was last used. Two rules evict:
+
+* **budget** — after a load pushes the resident total over
+  ``PICTORIA_MODEL_BUDGET_MB``, least-recently-used models go until it fits
+  again. The one just loaded is never the victim; a model bigger than the
+  whole budget still loads and simply stands alone. Size the budget for the
+  largest set one task uses *together* (``analyze``: SigLIP + WD + waifu), or
+  that task will reload on every batch.
+* **idle** — :meth:`ModelRegistry.evict_idle` drops anything unused for
+  ``PICTORIA_MODEL_IDLE_MINUTES``. The worker calls it periodically.
+
+Eviction drops the registry's reference and empties the CUDA cache. A caller
+still holding the model (a batch mid-forward on another queue) keeps it alive
+until it lets go; the memory comes back then.
+
+Every load and eviction is kept as a :class:`ModelEvent` (with its timing) and
+logged, and :meth:`ModelRegistry.stats` is what ``worker-stats`` reports.
+
+No torch at import: ``worker.handlers`` imports this for stats, and that must
+not pull in the ML stack.
+"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Literal, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+log = logging.getLogger("ai.registry")
+
+T = TypeVar("T")
+
+#: Resident-model budget in bytes; 0 means unbounded (the old behaviour).
+MODEL_BUDGET_BYTES = int(os.environ.get("PICTORIA_MODEL_BUDGET_MB", "0")) * 2**20
+
+#: Unload a model unused for this long; 0 disables idle eviction.
+MODEL_IDLE_SECONDS = float(os.environ.get("PICTORIA_MODEL_IDLE_MINUTES", "30")) * 60
+
+#: How many load / evict events :meth:`ModelRegistry.stats` keeps.
+EVENT_HISTORY = 256
+
+
+@dataclass(frozen=True)
+class ModelEvent:
+    kind: Literal["load", "evict"]
+    name: str
+    nbytes: int
+    #: Load time for ``load``; time the model had been resident for ``evict``.
+    seconds: float
+    reason: str
+    at: float = field(default_factory=time.time)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    nbytes: int
+    loaded_at: float
+    last_used: float
+    requires: tuple[str, ...]
+
+
+def _storages(obj: object) -> dict[int, int]:
+    """``{storage pointer: bytes}`` for every tensor ``obj`` holds.
+
+    ``obj`` itself if it is a module, else the modules among its attributes —
+    one level is enough for the wrappers in use here (``WaifuScorer.clip`` /
+    ``.mlp``, ``Tagger.model``). Keyed by storage so tied weights count once.
+
+    A model that reports its own ``nbytes`` (the NumPy SILVA heads) is taken at
+    its word — measuring it must not import torch.
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return {id(obj): nbytes}
+
+    import torch  # noqa: PLC0415  # lazy: defer the ML stack
+
+    attrs = getattr(obj, "__dict__", {}).values()
+    modules = [obj] if isinstance(obj, torch.nn.Module) else [v for v in attrs if isinstance(v, torch.nn.Module)]
+    found: dict[int, int] = {}
+    for module in modules:
+        for tensor in (*module.parameters(), *module.buffers()):
+            storage = tensor.untyped_storage()
+            found[storage.data_ptr()] = storage.nbytes()
+    return found
+
+
+def _release_memory() -> None:
+    gc.collect()
+    # Only if something already imported it: evicting a NumPy head from a
+    # process that never touched torch should not be what loads it.
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class ModelRegistry:
+    """LRU-with-budget plus idle eviction over named, lazily loaded models.
+
+    Thread-safe: loads happen under ``asyncio.to_thread`` on two queues at once
+    (the GPU backfill and the interactive text encoder). Two locks:
+
+    * ``_lock`` guards the bookkeeping only and is never held across a
+      ``loader()`` call, so a cache hit, :meth:`stats` or :meth:`evict_idle`
+      never waits behind a 30-second weight load of some other model.
+    * a per-name gate (``_loading``) makes concurrent ``get`` calls for the
+      *same* model load it once — the second caller waits on the gate, then
+      finds the entry. That is what the WD tagger's private lock used to do.
+      Different models load concurrently; a loader may ``get`` what it
+      ``requires`` without deadlocking since that is another name's gate.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = 0,
+        idle_seconds: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading: dict[str, threading.Lock] = {}
+        self.events: deque[ModelEvent] = deque(maxlen=EVENT_HISTORY)
+
+    def get(self, name: str, loader: Callable[[], T], *, requires: tuple[str, ...] = ()) -> T:
+        """The model called ``name``, loading it with ``loader`` if not resident.
+
+        ``requires`` names registry models this one holds a reference to (the
+        waifu head holds CLIP): their tensors are not counted again here, and
+        evicting one of them evicts this model too, since it would keep the
+        dependency alive otherwise.
+        """
+        with self._lock:
+            if (value := self._hit(name)) is not None:
+                return value
+            gate = self._loading.setdefault(name, threading.Lock())
+
+        with gate:
+            # Whoever held the gate before us may have loaded it already.
+            with self._lock:
+                if (value := self._hit(name)) is not None:
+                    return value
+
+            started = time.perf_counter()
+            value = loader()
+            seconds = time.perf_counter() - started
+            own = _storages(value)
+
+            with self._lock:
+                shared = {ptr for dep in requires if dep in self._entries for ptr in _storages(self._entries[dep].value)}
+                nbytes = sum(n for ptr, n in own.items() if ptr not in shared)
+                now = self._clock()
+                self._entries[name] = _Entry(value, nbytes, now, now, requires)
+                self._loading.pop(name, None)
+                self._record(ModelEvent("load", name, nbytes, seconds, "miss"))
+                evicted = self._enforce_budget(keep=name)
+        if evicted:
+            _release_memory()
+        return value
+
+    def evict(self, name: str, reason: str = "manual") -> bool:
+        """Unload ``name`` (and whatever requires it). False if it was not resident."""
+        with self._lock:
+            if name not in self._entries:
+                return False
+            self._drop(name, reason)
+        _release_memory()
+        return True
+
+    def evict_idle(self) -> list[str]:
+        """Unload every model unused for :attr:`idle_seconds`; returns their names."""
+        if self.idle_seconds <= 0:
+            return []
+        with self._lock:
+            cutoff = self._clock() - self.idle_seconds
+            idle = [name for name, e in self._entries.items() if e.last_used <= cutoff]
+            dropped = [gone for name in idle if name in self._entries for gone in self._drop(name, "idle")]
+        if dropped:
+            _release_memory()
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in list(self._entries):
+                if name in self._entries:
+                    self._drop(name, "clear")
+        _release_memory()
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            return {
+                "budgetBytes": self.budget_bytes,
+                "idleSeconds": self.idle_seconds,
+                "residentBytes": sum(e.nbytes for e in self._entries.values()),
+                "resident": [{"name": name, "bytes": e.nbytes, "idleSeconds": now - e.last_used} for name, e in self._entries.items()],
+                "events": [asdict(ev) for ev in self.events],
+            }
+
+    def _enforce_budget(self, *, keep: str) -> bool:
+        """Evict LRU models until the budget fits (lock held); True if any went.
+
+        The caller releases memory after leaving the lock — ``gc.collect`` is
+        not something every other thread should queue behind.
+        """
+        if self.budget_bytes <= 0:
+            return False
+        evicted = False
+        while self.resident_bytes > self.budget_bytes:
+            victim = next((n for n in self._entries if n != keep and keep not in self._dependents(n)), None)
+            if victim is None:
+                break
+            self._drop(victim, "budget")
+            evicted = True
+        return evicted
+
+    def _hit(self, name: str) -> Any:
+        """The resident value for ``name``, touched, or None (lock held)."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        self._touch(name)
+        return entry.value
+
+    def _touch(self, name: str) -> None:
+        """Mark ``name`` and what it requires as just used: a waifu batch runs
+        CLIP through the scorer's own reference, never through ``get``."""
+        entry = self._entries[name]
+        entry.last_used = self._clock()
+        self._entries.move_to_end(name)
+        for dep in entry.requires:
+            if dep in self._entries:
+                self._touch(dep)
+
+    def _dependents(self, name: str) -> list[str]:
+        return [n for n, e in self._entries.items() if name in e.requires]
+
+    def _drop(self, name: str, reason: str) -> list[str]:
+        """Remove ``name`` and its dependents (lock held); returns what went."""
+        gone: list[str] = []
+        for dependent in self._dependents(name):
+            if dependent in self._entries:
+                gone += self._drop(dependent, f"requires {name}")
+        entry = self._entries.pop(name)
+        self._record(ModelEvent("evict", name, entry.nbytes, self._clock() - entry.loaded_at, reason))
+        return [*gone, name]
+
+    def _record(self, event: ModelEvent) -> None:
+        self.events.append(event)
+        log.info(
+            "%s %s: %.0f MB, %.2fs (%s); resident %.0f MB",
+            event.kind,
+            event.name,
+            event.nbytes / 2**20,
+            event.seconds,
+            event.reason,
+            sum(e.nbytes for e in self._entries.values()) / 2**20,
+        )
+
+
+#: The one registry every model loader goes through.
+REGISTRY = ModelRegistry(MODEL_BUDGET_BYTES, MODEL_IDLE_SECONDS)
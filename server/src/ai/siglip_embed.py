@@ -10,8 +10,7 @@ text tower). It shares no weights with the SigLIP **v1** so400m used by the
 aesthetic scorer, so the two load as independent models on the GPU.
 """
 
-import contextlib
-from collections.abc import Iterable, Sequence
+from collections.abc import Sequence
 from functools import cache
 from pathlib import Path
 
@@ -21,14 +20,21 @@ from PIL import Image
 from transformers import AutoModel, AutoProcessor
 
 from ai.hf_loader import load_local_first
+from ai.image_io import ImageInput, close_images, decode_images
+from ai.registry import REGISTRY
 from ai.torch_runtime import DEVICE, DTYPE, patch_features_to_tensor, to_rgb
 
 MODEL_ID = "google/siglip2-so400m-patch14-384"
 EMBED_DIM = 1152
+#: The processor squashes every image to this square; decoding any larger is waste.
+IMAGE_SIZE = 384
 
 
-@cache
 def get_model() -> AutoModel:
+    return REGISTRY.get("siglip2", _load_model)
+
+
+def _load_model() -> AutoModel:
     model = load_local_first(AutoModel.from_pretrained, MODEL_ID, device_map=DEVICE)
     model = model.to(dtype=DTYPE)
     model.eval()
@@ -41,9 +47,6 @@ def get_processor() -> AutoProcessor:
     return load_local_first(AutoProcessor.from_pretrained, MODEL_ID)
 
 
-ImageInput = Image.Image | Path | str
-
-
 def calculate_image_features(image: ImageInput) -> torch.Tensor:
     if isinstance(image, Path | str):
         image = Image.open(image)
@@ -67,26 +70,32 @@ def calculate_image_features_batch(images: Sequence[ImageInput]) -> torch.Tensor
     """Encode a batch of images in a single GPU forward; returns ``(N, 1152)``."""
     if not images:
         return torch.empty(0, device=DEVICE)
-    pil_images = [to_rgb(Image.open(img)) if isinstance(img, Path | str) else to_rgb(img) for img in images]
+    return encode_pixel_values(preprocess_images(images))
+
+
+def preprocess_images(images: Sequence[ImageInput]) -> torch.Tensor:
+    """The CPU half of :func:`calculate_image_features_batch`: decode + processor.
+
+    Decoding goes through the shared pool in ``ai.image_io``, already shrunk to
+    :data:`IMAGE_SIZE`. Returns the ``(N, 3, 384, 384)`` pixel tensor on the host,
+    not the device, so it can be built on a worker thread while the previous
+    batch's forward runs (``worker.ladder.run_pipelined``).
+    """
+    decoded = decode_images(images, IMAGE_SIZE)
     try:
-        model = get_model()
-        processor = get_processor()
-        inputs = processor(images=pil_images, return_tensors="pt").to(DEVICE)
-        pixel_values = inputs.pixel_values.to(dtype=DTYPE)
-        with torch.inference_mode():
-            # .float(): see calculate_image_features — bf16 can't go to numpy.
-            features = model.get_image_features(pixel_values=pixel_values).float()
-            return F.normalize(features, p=2, dim=-1)
+        return get_processor()(images=[to_rgb(img) for img in decoded], return_tensors="pt").pixel_values
     finally:
-        _close_opened(pil_images, images)
+        close_images(decoded, images)
 
 
-def _close_opened(pil_images: list[Image.Image], original: Iterable[ImageInput]) -> None:
-    for opened, src in zip(pil_images, original, strict=True):
-        if opened is src:
-            continue
-        with contextlib.suppress(Exception):
-            opened.close()
+def encode_pixel_values(pixel_values: torch.Tensor) -> torch.Tensor:
+    """The GPU half of :func:`calculate_image_features_batch`; returns ``(N, 1152)``."""
+    model = get_model()
+    pixel_values = pixel_values.to(DEVICE, dtype=DTYPE)
+    with torch.inference_mode():
+        # .float(): see calculate_image_features — bf16 can't go to numpy.
+        features = model.get_image_features(pixel_values=pixel_values).float()
+        return F.normalize(features, p=2, dim=-1)
 
 
 def calculate_text_features(text: str | list[str]) -> torch.Tensor:
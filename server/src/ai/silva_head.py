@@ -0,0 +1,173 @@
+"""The SILVA heads in plain NumPy — scoring without torch.
+
+A SILVA head is ~7 MB: ``LayerNorm → [Linear/GELU | residual block]* → ordinal
+head → calibration LUT`` over a ``[N, 1152]`` batch of stored vectors. Running it
+through torch meant the ``silva`` task paid torch's import (~3 s and a few
+hundred MB of RSS, see ``ai/__init__.py``) plus the ``silva`` package, for a
+forward that is a handful of small matmuls. :class:`SilvaHead` is that forward
+in NumPy, reading the head from an ``.npz`` exported once from the published
+weights; it matches ``calibrated_score`` of the torch model to ~1e-6.
+
+This module must not import torch. :func:`export_head` takes the torch model
+as an argument and only reads tensors off it, so the one process that exports
+is the only one that ever loads the torch head. That process is
+``scripts/export_silva_heads.py`` if it was run — or else the worker itself:
+the first ``silva`` task on a library with no ``.npz`` yet imports torch and the
+``silva`` package to export, and that worker keeps them in memory until it
+restarts. The scorer is torch-free *after* an export, not before; run the
+script once per library to keep the worker that way from its first task.
+
+The ``.npz`` files live in the library's ``.pictoria/silva/``, next to its
+other derived data: the worker calls :func:`set_npz_dir` at startup.
+``PICTORIA_SILVA_NPZ_DIR`` overrides that, e.g. to share one export between
+several libraries.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+#: Subdirectory of the library's ``.pictoria/`` the worker keeps heads in.
+NPZ_DIRNAME = "silva"
+
+_npz_dir: Path | None = None
+
+_SQRT_HALF = np.float32(np.sqrt(0.5))
+
+
+def set_npz_dir(directory: Path) -> None:
+    """Where exported heads live — ``<library>/.pictoria/silva``, set by the worker at startup."""
+    global _npz_dir  # noqa: PLW0603 — process-wide config, set once at startup
+    _npz_dir = directory
+
+
+def npz_dir() -> Path:
+    """``$PICTORIA_SILVA_NPZ_DIR`` if set, else the directory :func:`set_npz_dir` gave."""
+    override = os.environ.get("PICTORIA_SILVA_NPZ_DIR")
+    if override:
+        return Path(override)
+    if _npz_dir is None:
+        msg = "SILVA head directory not configured (set_npz_dir or $PICTORIA_SILVA_NPZ_DIR)"
+        raise RuntimeError(msg)
+    return _npz_dir
+
+
+def npz_path(scorer: str) -> Path:
+    return npz_dir() / f"{scorer}.npz"
+
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    """Abramowitz & Stegun 7.1.26 — |error| < 1.5e-7, far inside the parity bound.
+
+    NumPy has no ``erf``, and torch's default ``GELU`` is the exact erf form,
+    not the tanh approximation, so the approximation has to be of ``erf`` itself.
+    """
+    sign = np.sign(x)
+    a = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * a)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-a * a))
+
+
+def _gelu(x: np.ndarray) -> np.ndarray:
+    return 0.5 * x * (1.0 + _erf(x * _SQRT_HALF))
+
+
+def _layer_norm(x: np.ndarray, weight: np.ndarray, bias: np.ndarray, eps: float) -> np.ndarray:
+    mean = x.mean(axis=-1, keepdims=True)
+    var = x.var(axis=-1, keepdims=True)
+    return (x - mean) / np.sqrt(var + eps) * weight + bias
+
+
+def _softplus(x: np.ndarray) -> np.ndarray:
+    return np.logaddexp(0.0, x)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def export_head(head: Any, path: Path, *, repo_id: str) -> None:
+    """Write a torch ``EmbeddingAestheticModel``'s weights and layout to ``path``.
+
+    The trunk's layout (which entries are ``Linear``, ``GELU`` or residual
+    blocks; dropout is inference-time identity and skipped) goes in as a JSON
+    ``layers`` entry, so :class:`SilvaHead` needs no ``config.json`` and no
+    knowledge of the ``silva`` package's class names beyond this export.
+    """
+    state = {k: v.detach().float().cpu().numpy() for k, v in head.state_dict().items()}
+    layers: list[list[Any]] = []
+    for i, module in enumerate(head.trunk):
+        kind = type(module).__name__
+        if kind == "Linear":
+            layers.append(["linear", f"trunk.{i}"])
+        elif kind == "GELU":
+            layers.append(["gelu"])
+        elif kind == "_ResidualBlock":
+            layers.append(["residual", f"trunk.{i}", float(module.norm.eps)])
+        elif kind != "Dropout":
+            msg = f"unsupported SILVA trunk layer {kind} at trunk.{i}"
+            raise ValueError(msg)
+    meta = {"repoId": repo_id, "layers": layers, "normEps": float(head.norm.eps)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, __meta__=np.array(json.dumps(meta)), **state)
+    tmp.replace(path)
+
+
+class SilvaHead:
+    """A SILVA head's inference forward over ``[N, D]`` float32 embeddings."""
+
+    def __init__(self, weights: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+        self.w = weights
+        self.repo_id: str = meta["repoId"]
+        self.layers: list[list[Any]] = meta["layers"]
+        self.norm_eps: float = meta["normEps"]
+        # The ordinal thresholds are a function of parameters only; fold them once.
+        self.thresholds = (weights["head.base_threshold"] + np.cumsum(_softplus(weights["head.raw_deltas"]))).astype(np.float32)
+        self.calibrated = bool(weights["cal_fitted"])
+        self.nbytes = sum(int(v.nbytes) for v in weights.values())
+
+    @classmethod
+    def load(cls, path: Path) -> SilvaHead:
+        with np.load(path) as data:
+            meta = json.loads(str(data["__meta__"]))
+            weights = {k: data[k] for k in data.files if k != "__meta__"}
+        return cls(weights, meta)
+
+    def _linear(self, x: np.ndarray, name: str) -> np.ndarray:
+        return x @ self.w[f"{name}.weight"].T + self.w[f"{name}.bias"]
+
+    def latent(self, x: np.ndarray) -> np.ndarray:
+        """The ordinal head's scalar latent, ``[N]``."""
+        w = self.w
+        h = _layer_norm(x.astype(np.float32, copy=False), w["norm.weight"], w["norm.bias"], self.norm_eps)
+        for layer in self.layers:
+            kind = layer[0]
+            if kind == "linear":
+                h = self._linear(h, layer[1])
+            elif kind == "gelu":
+                h = _gelu(h)
+            else:  # residual
+                name, eps = layer[1], layer[2]
+                r = _layer_norm(h, w[f"{name}.norm.weight"], w[f"{name}.norm.bias"], eps)
+                r = _gelu(self._linear(r, f"{name}.fc1"))
+                h = h + self._linear(r, f"{name}.fc2")
+        return self._linear(h, "head.latent")[:, 0]
+
+    def score(self, x: np.ndarray) -> np.ndarray:
+        """``calibrated_score`` — or the raw ``score`` when no LUT is baked."""
+        latent = self.latent(x)
+        if not self.calibrated:
+            return _sigmoid(latent[:, None] - self.thresholds).mean(axis=-1)
+        xp, fp = self.w["cal_lat_knots"], self.w["cal_score_knots"]
+        idx = np.clip(np.searchsorted(xp, latent, side="left"), 1, len(xp) - 1)
+        x0, x1 = xp[idx - 1], xp[idx]
+        y0, y1 = fp[idx - 1], fp[idx]
+        t = np.clip((latent - x0) / np.maximum(x1 - x0, 1e-12), 0.0, 1.0)
+        return y0 + t * (y1 - y0)
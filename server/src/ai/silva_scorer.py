@@ -19,6 +19,10 @@ end-to-end scorer (it falls back to the raw score when no LUT is baked).
 
 Net effect: scoring skips image decode + the SigLIP2 backbone entirely — it is a
 tiny head forward over a ``[B, 1152]`` tensor of already-computed embeddings.
+Small enough that it does not need torch either: the forward runs in NumPy
+(:mod:`ai.silva_head`) over weights exported once to ``.npz``. Only that export
+loads the published torch head; this module imports neither torch nor
+``silva`` unless it has to export.
 
 Outputs ``[0, 1]``; the frontend multiplies by 10 for display.
 
@@ -31,20 +35,22 @@ carry both scores and be sorted or filtered by either.
 
 from __future__ import annotations
 
-from functools import cache
+import logging
 from typing import TYPE_CHECKING
 
 import numpy as np
-import torch
 
-from ai.torch_runtime import DEVICE
+from ai.registry import REGISTRY
+from ai.silva_head import SilvaHead, export_head, npz_path
 from scorers import SILVA, SILVA_LUNA
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
+    from pathlib import Path
 
     from silva import EmbeddingAestheticModel
 
+log = logging.getLogger("ai.silva_scorer")
 
 SCORER_NAME = SILVA.name
 LUNA_SCORER_NAME = SILVA_LUNA.name
@@ -57,11 +63,42 @@ _REPO_IDS: dict[str, str] = {
 }
 
 
-@cache
-def _load_head(scorer: str) -> EmbeddingAestheticModel:
-    from silva import EmbeddingAestheticModel  # noqa: PLC0415  # lazy: defer ML stack load
+def load_torch_head(scorer: str) -> EmbeddingAestheticModel:
+    """The published torch head, on CPU. Only the export (and its parity test) needs it."""
+    from silva import EmbeddingAestheticModel  # noqa: PLC0415  # lazy: defer the ML stack
 
-    return EmbeddingAestheticModel.from_pretrained(_REPO_IDS[scorer]).to(DEVICE).eval()
+    return EmbeddingAestheticModel.from_pretrained(_REPO_IDS[scorer]).eval()
+
+
+def export(scorer: str, path: Path | None = None) -> Path:
+    """Export ``scorer``'s published head to ``.npz`` (default :func:`~ai.silva_head.npz_path`)."""
+    path = path or npz_path(scorer)
+    export_head(load_torch_head(scorer), path, repo_id=_REPO_IDS[scorer])
+    log.info("exported %s head to %s", scorer, path)
+    return path
+
+
+def load_head(scorer: str) -> SilvaHead:
+    """``scorer``'s NumPy head, resident in :data:`~ai.registry.REGISTRY` under ``silva:<scorer>``.
+
+    Exports it first if this library has no ``.npz`` for it yet (see
+    :mod:`ai.silva_head` for what that costs).
+    """
+
+    def _load() -> SilvaHead:
+        path = npz_path(scorer)
+        if not path.exists():
+            # First use in this library: one torch load, then never again — but
+            # torch stays imported in this process until it restarts.
+            log.warning(
+                "no exported %s head at %s; exporting now, which imports torch (run scripts/export_silva_heads.py ahead of time to avoid this)",
+                scorer,
+                path,
+            )
+            export(scorer, path)
+        return SilvaHead.load(path)
+
+    return REGISTRY.get(f"silva:{scorer}", _load)
 
 
 def score_embeddings(
@@ -80,8 +117,4 @@ def score_embeddings(
         arr = arr[None, :]
     if arr.size == 0:
         return []
-    head = _load_head(scorer)
-    with torch.inference_mode():
-        x = torch.from_numpy(arr).to(DEVICE)
-        scores = head(x)["calibrated_score"]
-        return scores.float().cpu().reshape(-1).tolist()
+    return load_head(scorer).score(arr).astype(np.float64).tolist()
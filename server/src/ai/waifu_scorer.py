@@ -1,10 +1,60 @@
-from functools import cache
+from __future__ import annotations
 
-from waifu_scorer.predict import WaifuScorer
+from typing import TYPE_CHECKING
 
+import torch
+from waifu_scorer.predict import WaifuScorer, convert_to_rgb, normalized, rotate_image_straight
+
+from ai.clip import MODEL_NAME as CLIP_MODEL_NAME
 from ai.clip import get_clip_model, get_processor
+from ai.image_io import close_images, decode_images
+from ai.registry import REGISTRY
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from ai.image_io import ImageInput
+
+#: CLIP ViT-L/14 resizes the shorter side to this, then centre-crops.
+INPUT_SIZE = 224
 
 
-@cache
 def get_waifu_scorer() -> WaifuScorer:
+    # The scorer holds the CLIP backbone, so it is evicted whenever CLIP is.
+    return REGISTRY.get("waifu", _load_waifu_scorer, requires=(CLIP_MODEL_NAME,))
+
+
+def _load_waifu_scorer() -> WaifuScorer:
     return WaifuScorer(clip_model=get_clip_model(), clip_processor=get_processor())
+
+
+def preprocess_images(images: Sequence[ImageInput]) -> torch.Tensor:
+    """The CPU half of a waifu score: decode, fill/rotate, CLIP processor.
+
+    ``WaifuScorer`` only fills transparency and applies the EXIF rotation when it
+    opens a *path* itself; a PIL image is used as-is. Both get the same handling
+    here, so an image decoded once and shared across models (``handle_analyze``)
+    scores the same as the file would. Decoding goes through the shared pool,
+    shrunk to :data:`INPUT_SIZE`. Returns the host-side pixel tensor so it can be
+    built while the previous batch's forward runs.
+    """
+    scorer = get_waifu_scorer()
+    decoded = decode_images(images, INPUT_SIZE)
+    try:
+        pil = [rotate_image_straight(convert_to_rgb(img)) for img in decoded]
+        return scorer.preprocess(images=pil, return_tensors="pt")["pixel_values"]
+    finally:
+        close_images(decoded, images)
+
+
+def score_pixel_values(pixel_values: torch.Tensor) -> list[float]:
+    """The GPU half: CLIP image features → MLP head, one ``[0, 10]`` float per row.
+
+    ``WaifuScorer.encode_images`` plus ``inference``, minus the processor call
+    that :func:`preprocess_images` already made. ``get_clip_model`` patches
+    ``get_image_features`` to return the bare tensor, so no unwrap here.
+    """
+    scorer = get_waifu_scorer()
+    with torch.inference_mode():
+        features = scorer.clip.get_image_features(pixel_values=pixel_values.to(scorer.device))
+        return scorer.inference(normalized(features).float())
@@ -2,19 +2,25 @@
 
 Persists tagger output (tags + group assignment + post links) for single
 posts and batches; both paths share the canonical-tag-group resolution and
-the same upsert SQL. The model itself is loaded once, on first use, behind
-a thread lock (workers call ``get_tagger`` from ``asyncio.to_thread``).
+the same upsert SQL. The model itself is loaded on first use and kept resident by
+``ai.registry`` (workers call ``get_tagger`` from ``asyncio.to_thread``).
+
+``preprocess_images`` / ``tag_tensors`` are ``Tagger.tag`` cut in two at the
+host/device boundary, so the worker can prepare one batch while the previous
+one is on the GPU (``worker.ladder.run_pipelined``).
 """
 
 from __future__ import annotations
 
-import threading
-from functools import cache
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
 
+    import torch
     import wdtagger
+    from PIL import Image
 
 TAG_GROUP_COLORS: dict[str, str] = {
     "general": "#006192",
@@ -25,16 +31,60 @@ TAG_GROUP_COLORS: dict[str, str] = {
 
 
 # ─── wdtagger model loader (lazy) ──────────────────────────────────────
-@cache
-def _get_tagger() -> wdtagger.Tagger:
+#: wd-vit-large-tagger-v3's input square. The image is padded to a square of
+#: its longer side first, so covering the shorter side covers this too.
+INPUT_SIZE = 448
+
+
+def _load_tagger() -> wdtagger.Tagger:
     import wdtagger  # noqa: PLC0415  # lazy: defer ML stack load until first use
 
     return wdtagger.Tagger(model_repo="SmilingWolf/wd-vit-large-tagger-v3")
 
 
-_tagger_lock = threading.Lock()
+def get_tagger() -> wdtagger.Tagger:
+    from ai.registry import REGISTRY  # noqa: PLC0415
+
+    return REGISTRY.get("wd-tagger", _load_tagger)
+
+
+def preprocess_images(images: Sequence[Image.Image | Path | str]) -> torch.Tensor:
+    """The CPU half of ``Tagger.tag``: RGB, pad to square, timm transform, BGR swap.
+
+    Decoding goes through the shared pool in ``ai.image_io``, shrunk to
+    :data:`INPUT_SIZE` before the pad.
+    """
+    import torch  # noqa: PLC0415  # lazy: defer ML stack load until first use
+    from wdtagger import pil_ensure_rgb, pil_pad_square  # noqa: PLC0415
+
+    from ai.image_io import close_images, decode_images  # noqa: PLC0415
+
+    tagger = get_tagger()
+    decoded = decode_images(images, INPUT_SIZE)
+    try:
+        pil = [pil_pad_square(pil_ensure_rgb(img)) for img in decoded]
+        return torch.stack([tagger.transform(img) for img in pil])[:, [2, 1, 0]]
+    finally:
+        close_images(decoded, images)
+
+
+def tag_tensors(
+    inputs: torch.Tensor,
+    general_threshold: float = 0.35,
+    character_threshold: float = 0.9,
+) -> list[wdtagger.Result]:
+    """The GPU half of ``Tagger.tag``: forward, sigmoid, threshold into ``Result`` objects.
 
+    Thresholds default to ``Tagger.tag``'s own, so the two halves together
+    produce the same tags the one-shot call does.
+    """
+    import torch  # noqa: PLC0415  # lazy: defer ML stack load until first use
+    from wdtagger import Result, get_tags  # noqa: PLC0415
 
-def get_tagger():
-    with _tagger_lock:
-        return _get_tagger()
+    tagger = get_tagger()
+    with torch.inference_mode():
+        probs = torch.sigmoid(tagger.model.forward(inputs.to(tagger.torch_device))).cpu()
+    return [
+        Result(*get_tags(probs=p, labels=tagger.labels, gen_threshold=general_threshold, char_threshold=character_threshold))
+        for p in probs
+    ]
@@ -0,0 +1,134 @@
+"""Memory-budget admission for decodes on the ``io`` queue.
+
+A fixed concurrency is the wrong unit for image work. Four thumbnails of a
+1200px illustration are a few MB; four ``basics`` rows over 16k x 16k scans are
+~2 GB of decoded pixels *each* once the thumbnail and arthash copies are
+counted, and ``handle_basics`` fans a 32-item batch out on top of the queue's
+own concurrency. So the ``io`` handlers reserve an estimate of each image's
+decoded footprint against one process-wide byte budget before they decode:
+small images run as wide as the budget allows, huge ones serialize.
+
+The estimate comes from the header alone (``Image.open`` parses it without
+decoding), so admission costs one small read per image, not a decode.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from pathlib import Path
+
+log = logging.getLogger("worker.admission")
+
+#: Bytes of decoded pixels the ``io`` handlers may hold at once, across every
+#: in-flight task. ``PICTORIA_DECODE_BUDGET_MB`` overrides; the default fits a
+#: 16k x 16k RGB scan with its working copies and still leaves room on a 16 GB box.
+DECODE_BUDGET_BYTES = int(os.environ.get("PICTORIA_DECODE_BUDGET_MB", "4096")) * 2**20
+
+#: Decoded copies an ``io`` handler holds at its peak, relative to the image
+#: itself: the decode plus the rotated image (``rotate``) or the thumbnail /
+#: arthash / palette working copies (``basics``).
+WORKING_COPIES = 2
+
+#: Floor for any estimate, header-readable or not — a file that will fail to
+#: decode still costs a thread and an open file while it does.
+MIN_FOOTPRINT = 1 * 2**20
+
+# PIL's in-memory pixel size. Multi-band 8-bit modes are padded to 4 bytes
+# (RGB is stored as RGBX), which is why RGB is 4, not 3.
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "LA": 4, "PA": 4, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+
+def estimate_footprint(path: Path) -> int:
+    """Peak decoded bytes for one image, from its header.
+
+    An unreadable header estimates :data:`MIN_FOOTPRINT`: the decode is about
+    to fail anyway, and the handler reports it the usual way.
+    """
+    from PIL import Image  # noqa: PLC0415  # lazy: PIL is not free to import
+
+    # For the side effect: the same uncapped pixel limit the io handlers decode
+    # with. Without it the first header read of a fresh worker rejects any scan
+    # over PIL's default cap.
+    import utils  # noqa: F401, PLC0415
+
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            mode = img.mode
+    except (Image.DecompressionBombError, OSError, ValueError):
+        return MIN_FOOTPRINT
+    return max(MIN_FOOTPRINT, width * height * _BYTES_PER_PIXEL.get(mode, 4) * WORKING_COPIES)
+
+
+class MemoryBudget:
+    """A byte-counting semaphore with FIFO admission.
+
+    FIFO rather than first-fit: with first-fit a stream of thumbnails keeps
+    slipping past a waiting 16k scan forever. A reservation larger than the
+    whole budget is clamped to it — so it still runs, just alone.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiters: deque[tuple[int, asyncio.Future[None]]] = deque()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        nbytes = min(max(nbytes, 1), self.capacity)
+        if self._waiters or self.in_use + nbytes > self.capacity:
+            future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            entry = (nbytes, future)
+            self._waiters.append(entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Admitted, then cancelled before resuming: hand it back.
+                    self._release(nbytes)
+                else:
+                    if entry in self._waiters:
+                        self._waiters.remove(entry)
+                    # Leaving the head of the queue may unblock the next one.
+                    self._wake()
+                raise
+        else:
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    def _release(self, nbytes: int) -> None:
+        self.in_use -= nbytes
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.capacity:
+            nbytes, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_use += nbytes
+            future.set_result(None)
+
+
+#: The one budget every ``io`` handler draws from.
+DECODE_BUDGET = MemoryBudget(DECODE_BUDGET_BYTES)
+
+
+@asynccontextmanager
+async def admit(path: Path) -> AsyncIterator[None]:
+    """Hold :data:`DECODE_BUDGET` for ``path``'s estimated footprint."""
+    nbytes = await asyncio.to_thread(estimate_footprint, path)
+    if nbytes >= DECODE_BUDGET.capacity:
+        log.info("%s needs ~%d MB, over the whole decode budget; running it alone", path, nbytes >> 20)
+    async with DECODE_BUDGET.reserve(nbytes):
+        yield
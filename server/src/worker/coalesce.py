@@ -0,0 +1,91 @@
+"""Micro-batching for small requests that arrive together.
+
+``text-embed`` is one prompt per task, and with the interactive Worker at
+``concurrency=1`` a burst of searches — several users, or a UI that searches
+per keystroke — ran as that many sequential forwards, each mostly launch
+overhead for a 64-token input. A :class:`Coalescer` lets concurrent callers
+each ``await submit(item)`` while it runs them as *one* batch call: the first
+item opens a short window (a few ms), everything that arrives inside it joins
+the batch, and each caller gets its own result back.
+
+One batch runs at a time. Items that arrive while a batch is on the GPU are
+not idle either: they are the next batch, and their window counts from their
+own arrival, so a burst costs at most one window plus the forwards it needs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+log = logging.getLogger("worker.coalesce")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Coalescer(Generic[T, R]):
+    """Gather concurrent :meth:`submit` calls into batched ``batch_fn`` calls.
+
+    ``batch_fn`` runs on a worker thread (it is a forward pass) and must return
+    one result per item, in order. If it raises — or returns the wrong number of
+    results — every caller in that batch gets the exception. ``window_s`` is how long the oldest waiting item may be
+    held for company; ``max_batch`` flushes early once that many are waiting.
+    """
+
+    def __init__(self, batch_fn: Callable[[list[T]], Sequence[R]], *, window_s: float, max_batch: int) -> None:
+        self.batch_fn = batch_fn
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._pending: list[tuple[T, asyncio.Future[R], float]] = []
+        self._drainer: asyncio.Task[None] | None = None
+        self._wakeup: asyncio.Future[None] | None = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.monotonic()))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        elif len(self._pending) >= self.max_batch and self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+        return await future
+
+    async def _drain(self) -> None:
+        while self._pending:
+            delay = self._pending[0][2] + self.window_s - time.monotonic()
+            if delay > 0 and len(self._pending) < self.max_batch:
+                self._wakeup = asyncio.get_running_loop().create_future()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup, delay)
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            await self._run(batch)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future[R], float]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.to_thread(self.batch_fn, [item for item, _, _ in batch])
+            if len(results) != len(batch):
+                # Raising out of the zip below would kill the drainer and leave
+                # every caller here (and everyone queued behind) awaiting forever.
+                msg = f"batch_fn returned {len(results)} results for {len(batch)} items"
+                raise ValueError(msg)  # noqa: TRY301
+        except Exception as exc:
+            log.warning("batch of %d failed: %s", len(batch), exc)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future, _), result in zip(batch, results, strict=True):
+            # A caller whose task was cancelled (the HTTP request went away)
+            # has a cancelled future; its row is simply dropped.
+            if not future.done():
+                future.set_result(result)
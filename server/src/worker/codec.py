@@ -6,18 +6,45 @@ plus decimal round-tripping is lossy in a way that shows up as last-digit
 score drift). The fixture in ``test_codec.py`` and the one in
 ``codec.test.ts`` are the same seven numbers and the same base64 string, so a
 change to byte order or encoding on either side turns both red.
+
+A batch of vectors travels as one blob, not one string per row:
+:func:`encode_batch` packs ``(N, dim)`` float32 into a single base64 string
+and :func:`decode_batch` turns it back with one ``frombuffer`` + ``reshape``.
+Per-row strings cost a ``tobytes``, a b64 call and a Python object each way
+per vector, and then an ``np.stack`` to get the matrix the model wanted anyway.
+
+A batch may also travel at reduced precision, named by its ``encoding``:
+
+* ``f32`` — the default, bit-exact;
+* ``f16`` — IEEE half, round-to-nearest-even: half the bytes;
+* ``i8``  — per-vector symmetric int8: ``N`` float32 scales (``max|x| / 127``)
+  followed by the ``N x dim`` int8 codes, a quarter of the bytes plus 4 per row.
+
+Either decodes back to float32 for the model. The quantisation runs in float64
+on both sides so Python and TS produce the same codes (the golden fixtures pin
+that), and decoding is ``code * scale`` rounded once to float32, which both
+sides compute exactly.
 """
 
 from __future__ import annotations
 
 import base64
+from typing import TYPE_CHECKING
 
 import numpy as np
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
 #: SigLIP 2 embedding width. A payload row that decodes to anything else is a
 #: protocol error, not a recoverable input — see :func:`decode_vector`.
 SIGLIP2_DIM = 1152
 
+#: Wire encodings a vector batch may use; same names as ``VECTOR_ENCODINGS`` in ``codec.ts``.
+VECTOR_ENCODINGS = ("f32", "f16", "i8")
+
+_I8_MAX = 127
+
 
 def encode_vector(vec: np.ndarray) -> str:
     """``float32`` array → base64. Native little-endian, matching the TS side."""
@@ -36,3 +63,64 @@ def decode_vector(b64: str, *, dim: int = SIGLIP2_DIM) -> np.ndarray:
         msg = f"expected a {dim}-d vector, decoded {arr.size} floats"
         raise ValueError(msg)
     return arr
+
+
+def check_encoding(encoding: str) -> str:
+    """``encoding`` if it is one of :data:`VECTOR_ENCODINGS`; raises otherwise."""
+    if encoding not in VECTOR_ENCODINGS:
+        msg = f"unknown vector encoding {encoding!r}"
+        raise ValueError(msg)
+    return encoding
+
+
+def _batch_bytes(count: int, dim: int, encoding: str) -> int:
+    if encoding == "f16":
+        return count * dim * 2
+    if encoding == "i8":
+        return count * 4 + count * dim
+    return count * dim * 4
+
+
+def encode_batch(rows: np.ndarray | Sequence[np.ndarray], encoding: str = "f32") -> str:
+    """``(N, dim)`` float32 → one base64 string, rows back to back, in ``encoding``.
+
+    Takes either a matrix or a list of rows (what the ladder hands back); an
+    empty batch is the empty string.
+    """
+    check_encoding(encoding)
+    if len(rows) == 0:
+        return ""
+    matrix = np.ascontiguousarray(rows if isinstance(rows, np.ndarray) else np.stack(rows), dtype=np.float32)
+    if encoding == "f16":
+        raw = matrix.astype("<f2").tobytes()
+    elif encoding == "i8":
+        peak = np.abs(matrix).max(axis=1)
+        scales = np.where(peak > 0, peak.astype(np.float64) / _I8_MAX, 1.0).astype(np.float32)
+        codes = np.rint(matrix.astype(np.float64) / scales.astype(np.float64)[:, None])
+        raw = scales.tobytes() + np.clip(codes, -_I8_MAX, _I8_MAX).astype(np.int8).tobytes()
+    else:
+        raw = matrix.tobytes()
+    return base64.b64encode(raw).decode()
+
+
+def decode_batch(b64: str, count: int, *, dim: int = SIGLIP2_DIM, encoding: str = "f32") -> np.ndarray:
+    """One base64 string → ``(count, dim)`` float32.
+
+    ``f32`` is a read-only view over the decoded bytes, no per-row copies; the
+    reduced encodings are widened into one new array. The byte size is checked
+    for the encoding, same reason as :func:`decode_vector`: a blob a row short
+    or a row too wide would otherwise reshape into the wrong rows.
+    """
+    check_encoding(encoding)
+    raw = base64.b64decode(b64)
+    expected = _batch_bytes(count, dim, encoding)
+    if len(raw) != expected:
+        msg = f"expected {count} {dim}-d {encoding} vectors ({expected} bytes), decoded {len(raw)} bytes"
+        raise ValueError(msg)
+    if encoding == "f16":
+        return np.frombuffer(raw, dtype="<f2").astype(np.float32).reshape(count, dim)
+    if encoding == "i8":
+        scales = np.frombuffer(raw, dtype=np.float32, count=count)
+        codes = np.frombuffer(raw, dtype=np.int8, offset=count * 4).reshape(count, dim)
+        return codes.astype(np.float32) * scales[:, None]
+    return np.frombuffer(raw, dtype=np.float32).reshape(count, dim)
@@ -10,59 +10,465 @@ every vector in memory at once. 223k by 1152 float32 is 1.0 GB, 1.3 GB base64'd,
 which no single JSON row will hold. A raw float32 file threads that needle
 without breaking §D1: the worker still opens no database, it just reads the
 input it cannot compute.
+
+Past a few hundred thousand rows the exact pass gets slow, since it grows as
+``n^2``. ``lsh_near_pairs`` is the opt-in approximate engine: hash the rows
+into buckets, then check exactly only within them.
 """
 
 from __future__ import annotations
 
+import importlib.util
+import math
+import shutil
+import sys
+from functools import cache
+from pathlib import Path
 from typing import TYPE_CHECKING
 
 import numpy as np
 
 if TYPE_CHECKING:
-    from pathlib import Path
+    from collections.abc import Iterator
+
+#: Suffix of the pairs file written next to the matrix.
+PAIRS_SUFFIX = ".pairs"
+
+#: One little-endian record per near pair: the two row indices (``i < j``) and
+#: their cosine similarity. 12 bytes; ``DEDUP_PAIR_BYTES`` on the TS side.
+PAIR_DTYPE = np.dtype([("i", "<i4"), ("j", "<i4"), ("sim", "<f4")])
+
+
+def pairs_path(matrix_path: Path) -> Path:
+    return matrix_path.with_name(matrix_path.name + PAIRS_SUFFIX)
+
+
+def write_pairs(pairs: np.ndarray, sims: np.ndarray, out: Path) -> None:
+    """Write ``(k, 2)`` pairs and their ``k`` similarities to ``out`` as ``PAIR_DTYPE`` records.
+
+    Written to a temporary name and renamed, like the rescore scores file, so
+    a reader never sees half of it.
+    """
+    records = np.empty(len(pairs), dtype=PAIR_DTYPE)
+    records["i"] = pairs[:, 0]
+    records["j"] = pairs[:, 1]
+    records["sim"] = sims
+    tmp = out.with_name(out.name + ".tmp")
+    records.tofile(tmp)
+    tmp.replace(out)
+
+
+#: Suffix of the labels file the ``components`` mode writes instead of pairs.
+LABELS_SUFFIX = ".labels"
+
+
+def labels_path(matrix_path: Path) -> Path:
+    return matrix_path.with_name(matrix_path.name + LABELS_SUFFIX)
+
+
+def connected_components(n: int, pairs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Union-find over ``n`` rows joined by ``(k, 2)`` ``pairs``, in array ops.
+
+    Returns ``(labels, roots, edges)``: ``labels[r]`` is the smallest row of
+    ``r``'s component (a singleton is its own label), and ``edges[c]`` is how
+    many pairs fall inside the component labelled ``roots[c]``. Only
+    components with at least one pair are listed; ``roots`` ascends.
+
+    Each round hooks every edge's larger root under its smaller one
+    (``np.minimum.at``), then compresses paths by pointer jumping until every
+    row points straight at a root. A label only ever decreases and stays in
+    its component, so the root that survives is the component's minimum. The
+    round count grows with the log of the longest chain, not with ``k``.
+    """
+    labels = np.arange(n, dtype=np.int32)
+    if not len(pairs):
+        return labels, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    i, j = pairs[:, 0], pairs[:, 1]
+    while True:
+        li, lj = labels[i], labels[j]
+        if np.array_equal(li, lj):
+            break
+        lo = np.minimum(li, lj)
+        np.minimum.at(labels, li, lo)
+        np.minimum.at(labels, lj, lo)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    roots, edges = np.unique(labels[i], return_counts=True)
+    return labels, roots.astype(np.int32), edges.astype(np.int32)
+
+
+def write_components(labels: np.ndarray, roots: np.ndarray, edges: np.ndarray, out: Path) -> None:
+    """Write ``labels`` then ``(root, edges)`` per component to ``out``, all little-endian int32.
+
+    Temporary name and rename, as in :func:`write_pairs`.
+    """
+    tmp = out.with_name(out.name + ".tmp")
+    with tmp.open("wb") as f:
+        labels.astype("<i4").tofile(f)
+        np.stack([roots, edges], axis=1).astype("<i4").tofile(f)
+    tmp.replace(out)
 
 
 def find_near_pairs(
     matrix: np.ndarray,
     threshold: float,
     chunk_size: int,
-) -> list[list[int]]:
-    """Upper-triangle near pairs ``[[i, j], ...]`` with ``i < j``.
+    new_from: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Upper-triangle near pairs as an int32 ``(k, 2)`` array with ``i < j``, and their similarities.
 
     A pair is near when the two rows are within ``threshold`` cosine *distance*.
-    Runs on CUDA in fp16 when available, else CPU in fp32. Only the upper
-    triangle is kept so the greedy assignment on the TS side stays
-    one-directional (and so each pair crosses the boundary once, not twice).
-    """
-    import torch  # noqa: PLC0415  # lazy: defer the ML stack load until a rebuild runs
+    Runs on CUDA in fp16 when available, else on the tiled CPU engine in fp32
+    (:func:`cpu_near_pairs`). Only the upper triangle is kept so the greedy
+    assignment on the TS side stays one-directional (and so each pair crosses
+    the boundary once, not twice).
+
+    ``new_from`` makes the pass incremental: rows ``[new_from, n)`` are new,
+    the rows before them were grouped by an earlier pass, and only pairs with
+    at least one new row come back. Only the new rows are multiplied against
+    the library: ``X[new_from:] @ X.T``, so 64 new images cost 64 rows of
+    work instead of ``n``. ``0`` is the full pass.
 
+    The hits of each block are filtered and offset with array ops and joined
+    once at the end, so a library full of variant sets costs a few arrays
+    rather than one Python list per pair.
+    """
     n = matrix.shape[0]
-    if n < 2:  # noqa: PLR2004
-        return []
+    if n < 2 or new_from >= n:  # noqa: PLR2004
+        return _collect([], [])
+    if not _cuda_available():
+        return cpu_near_pairs(matrix, threshold, chunk_size, new_from)
+
+    import torch  # noqa: PLC0415  # lazy: only the CUDA path needs the ML stack
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    dtype = torch.float16 if device == "cuda" else torch.float32
     # ``np.ascontiguousarray`` because the caller may hand over a memmap slice;
     # ``from_numpy`` needs a contiguous buffer and would otherwise raise.
-    x = torch.from_numpy(np.ascontiguousarray(matrix)).to(device=device, dtype=dtype)
+    x = torch.from_numpy(np.ascontiguousarray(matrix)).to(device="cuda", dtype=torch.float16)
     # The stored siglip2 vectors are already L2-normalised, but normalise again
     # so cosine similarity == dot product holds exactly regardless of source.
     x = torch.nn.functional.normalize(x, dim=1)
     sim_threshold = 1.0 - threshold
 
-    pairs: list[list[int]] = []
-    for start in range(0, n, chunk_size):
+    found: list[np.ndarray] = []
+    found_sims: list[np.ndarray] = []
+    for start in range(new_from, n, chunk_size):
         end = min(start + chunk_size, n)
         block = x[start:end] @ x.T  # (chunk, n) cosine similarities
-        hits = (block >= sim_threshold).nonzero(as_tuple=False)
-        if hits.numel() == 0:
-            continue
-        for local_row, col in hits.cpu().numpy():
-            gi = start + int(local_row)
-            j = int(col)
-            if j > gi:  # upper triangle only (drops self + lower mirror)
-                pairs.append([gi, j])
-    return pairs
+        local, cols = (block >= sim_threshold).nonzero(as_tuple=True)
+        sims = block[local, cols]
+        rows = local + start
+        # Upper triangle only (drops self + lower mirror) — except that an old
+        # row's own pass never ran this time, so its pair with a new row is
+        # only ever seen from the new side and is kept, mirrored below.
+        keep = (cols > rows) | (cols < new_from)
+        rows, cols = rows[keep], cols[keep]
+        found.append(torch.stack([torch.minimum(rows, cols), torch.maximum(rows, cols)], dim=1).cpu().numpy())
+        found_sims.append(sims[keep].float().cpu().numpy())
+    return _collect(found, found_sims)
+
+
+def _cuda_available() -> bool:
+    """Whether the CUDA path can run, without importing torch just to find out.
+
+    Importing torch costs seconds and a few hundred MB of RSS, all wasted when
+    the answer is "no" and the pass goes to NumPy anyway. So torch is only
+    asked if it is already loaded, or if it is installed and an NVIDIA driver
+    is there to answer (the kernel module's ``/proc`` entry on Linux,
+    ``nvidia-smi`` on the ``PATH`` elsewhere).
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        if not _nvidia_driver_present() or importlib.util.find_spec("torch") is None:
+            return False
+        import torch  # noqa: PLC0415  # lazy: a driver is present, so torch decides
+    return torch.cuda.is_available()
+
+
+@cache
+def _nvidia_driver_present() -> bool:
+    return Path("/proc/driver/nvidia").exists() or shutil.which("nvidia-smi") is not None
+
+
+def cpu_near_pairs(
+    matrix: np.ndarray,
+    threshold: float,
+    tile: int,
+    new_from: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """:func:`find_near_pairs` without a GPU: square tiles of the upper triangle.
+
+    The CUDA path copies the whole matrix to the device and multiplies
+    ``(chunk, n)`` blocks, throwing away the lower half of each. On CPU the
+    same shape cost a full fp32 host copy of the matrix (1 GB at 223k rows)
+    and twice the FLOPs. Here both operands are ``(tile, dim)`` slices read
+    and normalised straight off the memmap, one ``(tile, tile)`` similarity
+    block at a time, and only blocks on or above the diagonal are computed.
+    The working set is two tiles and a block (~14 MB at 1024 x 1152) whatever
+    ``n`` is. Every block is one float32 GEMM, so NumPy's BLAS supplies the
+    threads; cap them with ``OPENBLAS_NUM_THREADS`` / ``MKL_NUM_THREADS``.
+
+    With ``new_from``, a row tile among the new rows also meets every old
+    column tile. Those hits are the old-new pairs, and they are stored as
+    ``[old, new]``.
+    """
+    n = matrix.shape[0]
+    sim_threshold = np.float32(1.0 - threshold)
+    found: list[np.ndarray] = []
+    found_sims: list[np.ndarray] = []
+    for a in range(new_from, n, tile):
+        a_end = min(a + tile, n)
+        rows = _unit_rows(matrix, a, a_end)
+        spans = [(b, min(b + tile, new_from)) for b in range(0, new_from, tile)]
+        spans += [(b, min(b + tile, n)) for b in range(a, n, tile)]
+        for b, b_end in spans:
+            cols = rows if b == a else _unit_rows(matrix, b, b_end)
+            block = rows @ cols.T
+            i, j = np.nonzero(block >= sim_threshold)
+            sims = block[i, j]
+            i += a
+            j += b
+            if b == a:  # the diagonal block: drop self-pairs and the lower mirror
+                keep = j > i
+                i, j, sims = i[keep], j[keep], sims[keep]
+            found.append(np.stack([np.minimum(i, j), np.maximum(i, j)], axis=1))
+            found_sims.append(sims)
+    return _collect(found, found_sims)
+
+
+#: Signature width of one LSH table, in random hyperplanes (at most 62).
+LSH_BITS = 16
+
+#: LSH tables; a pair is a candidate if it shares a bucket in any of them.
+LSH_TABLES = 12
+
+#: Most rows of a bucket checked pair by pair. A fuller bucket is split.
+LSH_MAX_BUCKET = 64
+
+#: Hyperplanes one split adds to an oversized bucket, and how many times it
+#: may split before the rest is only checked between nearby rows.
+LSH_SPLIT_BITS = 4
+LSH_SPLITS = 4
+
+
+def lsh_recall(threshold: float, bits: int = LSH_BITS, tables: int = LSH_TABLES) -> float:
+    """Chance that a pair exactly ``threshold`` apart lands in one bucket of at least one table.
+
+    One random hyperplane separates two vectors at angle ``theta`` with
+    probability ``theta / pi``. A table keys on ``bits`` of them, so the pair
+    collides in it with ``p ** bits``, and misses every table with
+    ``(1 - p ** bits) ** tables``. Closer pairs do better. The defaults give
+    0.9996 at ``DEDUP_THRESHOLD`` (0.01).
+
+    That is for vectors spread evenly around the origin. :func:`lsh_near_pairs`
+    hashes the rows after subtracting their mean, which widens the angle of a
+    near pair when the library shares a common direction, so its real recall
+    is somewhat lower there (0.994 at a mean cosine of 0.5).
+    """
+    p = 1.0 - math.acos(1.0 - threshold) / math.pi
+    return 1.0 - (1.0 - p**bits) ** tables
+
+
+def lsh_near_pairs(  # noqa: PLR0913
+    matrix: np.ndarray,
+    threshold: float,
+    tile: int,
+    new_from: int = 0,
+    *,
+    bits: int = LSH_BITS,
+    tables: int = LSH_TABLES,
+    max_bucket: int = LSH_MAX_BUCKET,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """:func:`find_near_pairs` in roughly linear time, at the cost of a little recall.
+
+    Exact all-pairs work is ``n^2 * dim``: minutes on a GPU at 223k rows,
+    hours at a million, and out of reach on CPU. Here every row gets
+    ``tables`` random-hyperplane signatures of ``bits`` bits each (see
+    :func:`lsh_candidates`). Rows sharing a signature in any table become
+    candidates, and each candidate is then checked with its exact cosine.
+    Every pair returned is truly within ``threshold``. A near pair is missed
+    only if no table put both rows in one bucket; :func:`lsh_recall` gives the
+    odds, and ``scripts/bench_dedup.py --lsh`` measures it against the exact
+    engine.
+
+    Candidates are checked as each table produces them and only the pairs
+    that pass are kept, so memory follows the near pairs, not the candidates.
+    A pair found by several tables is reported once. ``new_from`` keeps only
+    candidates with a new row, as in the exact engines, but the signatures
+    still cover the whole library, so a small increment is cheaper exact.
+    """
+    n = matrix.shape[0]
+    if n < 2 or new_from >= n:  # noqa: PLR2004
+        return _collect([], [])
+
+    found: list[np.ndarray] = []
+    found_sims: list[np.ndarray] = []
+    sim_threshold = np.float32(1.0 - threshold)
+    candidates = lsh_candidates(matrix, tile, new_from, bits=bits, tables=tables, max_bucket=max_bucket, seed=seed)
+    for i, j in candidates:
+        for start in range(0, len(i), tile):
+            a, b = i[start : start + tile], j[start : start + tile]
+            sims = np.einsum("kd,kd->k", _unit(matrix[a]), _unit(matrix[b]))
+            keep = sims >= sim_threshold
+            found.append(a[keep] * n + b[keep])
+            found_sims.append(sims[keep])
+    if not found:
+        return _collect([], [])
+    codes, first = np.unique(np.concatenate(found), return_index=True)
+    return _collect([np.stack(np.divmod(codes, n), axis=1)], [np.concatenate(found_sims)[first]])
+
+
+def lsh_candidates(  # noqa: PLR0913
+    matrix: np.ndarray,
+    tile: int,
+    new_from: int = 0,
+    *,
+    bits: int = LSH_BITS,
+    tables: int = LSH_TABLES,
+    max_bucket: int = LSH_MAX_BUCKET,
+    seed: int = 0,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """The pairs :func:`lsh_near_pairs` checks, as int64 ``(i, j)`` chunks with ``i < j`` and ``j >= new_from``.
+
+    The signatures are the signs of ``tables * bits`` random projections (one
+    GEMM per tile of the memmap) of each unit row *minus the mean row*.
+    Hyperplanes through the origin split SigLIP vectors badly: they share a
+    strong common direction, so most planes leave nearly every row on the
+    same side and the buckets fill up. Centring puts the planes through the
+    middle of the data instead.
+
+    Tables are walked one at a time, so a pair two tables share comes out
+    twice rather than the whole candidate set being held to drop it. A
+    bucket of more than ``max_bucket`` rows (a large variant set, a style
+    the collection is full of) is split on ``LSH_SPLIT_BITS`` more
+    hyperplanes, up to ``LSH_SPLITS`` times. Whatever still overflows, such
+    as a thousand copies of one image which no plane can tell apart, pairs
+    each row only with the ``max_bucket - 1`` after it. That keeps each such
+    bucket connected, and it bounds the output at ``max_bucket - 1`` pairs
+    per row and table.
+    """
+    dim = matrix.shape[1]
+    rng = np.random.default_rng(seed)
+    centre = _mean_row(matrix, tile)
+    planes = rng.standard_normal((dim, bits * tables)).astype(np.float32)
+    keys = _signatures(matrix, None, centre, planes, bits, tile)
+    for key in keys.T:
+        yield from _bucket_pairs(matrix, key, centre=centre, new_from=new_from, tile=tile, max_bucket=max_bucket, rng=rng)
+
+
+def _bucket_pairs(  # noqa: PLR0913
+    matrix: np.ndarray,
+    key: np.ndarray,
+    *,
+    centre: np.ndarray,
+    new_from: int,
+    tile: int,
+    max_bucket: int,
+    rng: np.random.Generator,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Pairs of rows with equal ``key``, splitting buckets past ``max_bucket`` (see :func:`lsh_candidates`).
+
+    Sorting puts each bucket in a run. Each round passes the runs that fit on
+    to :func:`_run_pairs` and re-keys the rows of the ones that do not by
+    their run plus ``LSH_SPLIT_BITS`` fresh hyperplanes. A run of old rows
+    only has no pair to report and is dropped.
+    """
+    dim = matrix.shape[1]
+    rows = np.arange(len(key))
+    for depth in range(LSH_SPLITS + 1):
+        order = np.argsort(key, kind="stable")
+        rows, key = rows[order], key[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        sizes = np.diff(np.r_[starts, len(key)])
+        fresh = np.maximum.reduceat(rows, starts) >= new_from
+        over = fresh & (sizes > max_bucket) if depth < LSH_SPLITS else np.zeros_like(fresh)
+        take = fresh & ~over
+        yield from _run_pairs(rows[np.repeat(take, sizes)], sizes[take], new_from, max_bucket)
+        if not over.any():
+            return
+        rows = rows[np.repeat(over, sizes)]
+        bucket = np.repeat(np.arange(over.sum(), dtype=np.int64), sizes[over])
+        planes = rng.standard_normal((dim, LSH_SPLIT_BITS)).astype(np.float32)
+        key = (bucket << LSH_SPLIT_BITS) | _signatures(matrix, rows, centre, planes, LSH_SPLIT_BITS, tile)[:, 0]
+
+
+def _run_pairs(
+    rows: np.ndarray,
+    sizes: np.ndarray,
+    new_from: int,
+    max_bucket: int,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Pairs within consecutive runs of ``sizes`` rows, each row with at most the ``max_bucket - 1`` after it.
+
+    Offset ``k`` pairs every position with the one ``k`` after it while both
+    are in the same run, and a position drops out once its run is exhausted.
+    That makes the work the number of pairs rather than a Python loop over
+    buckets, and each offset is one chunk.
+    """
+    run_end = np.repeat(np.cumsum(sizes), sizes)
+    active = np.flatnonzero(np.arange(1, len(rows) + 1) < run_end)
+    offset = 1
+    while active.size and offset < max_bucket:
+        a, b = rows[active], rows[active + offset]
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        keep = hi >= new_from
+        if keep.any():
+            yield lo[keep], hi[keep]
+        offset += 1
+        active = active[active + offset < run_end[active]]
+
+
+def _mean_row(matrix: np.ndarray, tile: int) -> np.ndarray:
+    """The mean of the L2-normalised rows, summed a tile at a time."""
+    total = np.zeros(matrix.shape[1], dtype=np.float64)
+    for a in range(0, matrix.shape[0], tile):
+        total += _unit_rows(matrix, a, a + tile).sum(axis=0)
+    return (total / matrix.shape[0]).astype(np.float32)
+
+
+def _signatures(  # noqa: PLR0913, PLR0917
+    matrix: np.ndarray,
+    rows: np.ndarray | None,
+    centre: np.ndarray,
+    planes: np.ndarray,
+    bits: int,
+    tile: int,
+) -> np.ndarray:
+    """Bucket keys of the centred unit ``rows``: one int64 per ``bits`` consecutive ``planes``, ``(len(rows), tables)``.
+
+    Bit ``k`` of a key is which side of its ``k``-th plane the row falls on.
+    ``None`` is every row, read in slices; an index array reads just those.
+    """
+    count = matrix.shape[0] if rows is None else len(rows)
+    tables = planes.shape[1] // bits
+    weights = np.left_shift(np.int64(1), np.arange(bits, dtype=np.int64))
+    keys = np.empty((count, tables), dtype=np.int64)
+    for a in range(0, count, tile):
+        block = _unit_rows(matrix, a, a + tile) if rows is None else _unit(matrix[rows[a : a + tile]])
+        signs = ((block - centre) @ planes > 0).reshape(len(block), tables, bits)
+        keys[a : a + len(block)] = signs @ weights
+    return keys
+
+
+def _collect(found: list[np.ndarray], found_sims: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Join per-block hits into one int32 ``(k, 2)`` array and one float32 ``(k,)`` array."""
+    if not found:
+        return np.empty((0, 2), dtype=np.int32), np.empty(0, dtype=np.float32)
+    return np.concatenate(found).astype(np.int32), np.concatenate(found_sims).astype(np.float32)
+
+
+def _unit_rows(matrix: np.ndarray, start: int, end: int) -> np.ndarray:
+    """An owned, L2-normalised float32 copy of ``matrix[start:end]``."""
+    return _unit(np.array(matrix[start:end], dtype=np.float32))
+
+
+def _unit(rows: np.ndarray) -> np.ndarray:
+    """``rows`` (an owned float32 array) L2-normalised in place."""
+    rows /= np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+    return rows
 
 
 def load_matrix(path: Path, count: int, dim: int) -> np.ndarray:
@@ -19,25 +19,44 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 
 from scorers import SCORERS
-from worker.codec import decode_vector, encode_vector
-from worker.ladder import run_with_fallback
+from worker.admission import admit
+from worker.coalesce import Coalescer
+from worker.codec import check_encoding, decode_batch, encode_batch, encode_vector
+from worker.ladder import run_pipelined
+from worker.preflight import preflight
+from worker.quarantine import QUARANTINE
+from worker.sidecar import SIDECAR_DIRNAME, SIDECAR_KEY, is_sidecar, read_sidecar, spill
+from worker.tag_vocab import VOCAB_DIRNAME, TagVocab, load_display_names, vocab_texts
+from worker.text_cache import CACHE_DIRNAME, TextEmbedCache, normalize_prompt
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Sequence
+
+    from PIL import Image
 
 log = logging.getLogger("worker.handlers")
 
 
 async def handle_silva(payload: dict[str, Any]) -> dict[str, Any]:
-    """Score stored SigLIP2 embeddings with one of the SILVA heads.
+    """Score stored SigLIP2 embeddings with one or more of the SILVA heads.
 
-    Payload is ``{scorer, items: [{postId, embedding}]}`` where ``embedding`` is
-    the base64 float32 of the vector already stored in ``post_vectors_siglip2``
-    — the worker does not read it back itself. Returns
-    ``{scores: [{postId, score}]}`` in the same order; TS writes the rows.
+    Payload is ``{scorers, embeddings: {postIds, vectors, encoding?}}`` where
+    ``vectors`` is one base64 blob of the ``[N, 1152]`` vectors already stored in
+    ``post_vectors_siglip2`` (see ``worker.codec.encode_batch``) — the worker
+    does not read it back itself. Returns ``{scores: [{postId, scorer, score}]}``,
+    post-major in payload order; TS writes the rows.
+
+    Every head reads the same ``[N, 1152]`` input, so the vectors cross the
+    queue and are decoded once however many heads the batch asks for.
 
     The vectors travel with the payload rather than being re-read here because
     of §D1: an exception for "this worker may read the DB" is exactly the kind
@@ -47,37 +66,82 @@ async def handle_silva(payload: dict[str, Any]) -> dict[str, Any]:
     # 用注册表本身校验，而不是手抄一份名单：payload 跨进程而来，是输入不是常量，
     # 任意字符串不能进文件系统路径。手抄的那份会是第三处要同步的地方，漏掉的表现
     # 是任务提交成功、worker 运行时才拒。
-    scorer = payload["scorer"]
-    if scorer not in SCORERS:
-        msg = f"unknown scorer: {scorer!r}"
+    # ``scorer`` (one name) is the payload shape before ``scorers``; tasks
+    # submitted by an older API can still be sitting in tasks.sqlite.
+    requested = payload["scorers"] if "scorers" in payload else [payload["scorer"]]
+    scorers: list[str] = list(dict.fromkeys(requested))
+    unknown = [s for s in scorers if s not in SCORERS]
+    if unknown:
+        msg = f"unknown scorer(s): {unknown!r}"
         raise ValueError(msg)
 
-    items = payload["items"]
-    if not items:
+    batch = payload["embeddings"]
+    post_ids: list[int] = batch["postIds"]
+    if not post_ids or not scorers:
         return {"scores": []}
 
     # Imported here rather than at module scope so an empty batch — and the
-    # connectivity check that submits one — costs nothing: torch and the head
-    # weights are seconds and gigabytes of VRAM.
+    # connectivity check that submits one — costs nothing. The head itself is
+    # NumPy (``ai.silva_head``): no torch import unless its ``.npz`` is missing.
     from ai.silva_scorer import score_embeddings  # noqa: PLC0415
 
-    # Stacked into one [N, 1152] array rather than handed over as a list of
-    # arrays: that is the shape the head wants anyway, and it makes the width
-    # check in decode_vector the only place a ragged payload can fail.
-    embeddings = np.stack([decode_vector(item["embedding"]) for item in items])
+    # One frombuffer + reshape straight into the [N, 1152] the head wants (widened
+    # to float32 if TS sent f16/i8); the size check in decode_batch is the only
+    # place a short payload can fail.
+    embeddings = decode_batch(batch["vectors"], len(post_ids), encoding=batch.get("encoding", "f32"))
+
+    def _score_all() -> dict[str, list[float]]:
+        return {scorer: score_embeddings(embeddings, scorer) for scorer in scorers}
+
     # ``to_thread`` rather than a straight call: cairnq runs handlers on its own
     # event loop, and that loop is also what renews this task's lease. A
     # multi-second forward blocking it would let the lease expire and the task
     # be handed to another worker while this one is still computing it.
-    scores = await asyncio.to_thread(score_embeddings, embeddings, scorer)
+    by_scorer = await asyncio.to_thread(_score_all)
     return {
         "scores": [
-            {"postId": item["postId"], "score": float(score)}
-            for item, score in zip(items, scores, strict=True)
+            {"postId": pid, "scorer": scorer, "score": float(by_scorer[scorer][i])}
+            for i, pid in enumerate(post_ids)
+            for scorer in scorers
         ],
     }
 
 
+async def handle_silva_rescore(payload: dict[str, Any]) -> dict[str, Any]:
+    """Rescore the whole library with one or more SILVA heads from a matrix file.
+
+    The bulk sibling of ``handle_silva``, on ``handle_dedup``'s file channel:
+    ``{matrixPath, count, dim, scorers, chunkSize}`` names the exported raw
+    float32 matrix, and the scores go to a second raw file next to it (see
+    ``worker.rescore``) rather than back through the queue. Returns
+    ``{scoresPath, scorers, count}``; column ``j`` of that file is
+    ``scorers[j]``, row ``i`` is matrix row ``i``. TS reads it and deletes it.
+    """
+    from worker.dedup import load_matrix  # noqa: PLC0415
+    from worker.rescore import rescore_matrix, scores_path  # noqa: PLC0415
+
+    scorers: list[str] = list(dict.fromkeys(payload["scorers"]))
+    unknown = [s for s in scorers if s not in SCORERS]
+    if unknown:
+        msg = f"unknown scorer(s): {unknown!r}"
+        raise ValueError(msg)
+
+    chunk_size = int(payload["chunkSize"])
+    if chunk_size <= 0:
+        # Checked here, not left to ``range`` to reject inside the worker thread.
+        msg = f"chunkSize must be positive, got {chunk_size}"
+        raise ValueError(msg)
+
+    path = _resolve_inside(payload["matrixPath"])
+    count = int(payload["count"])
+    dim = int(payload["dim"])
+    out = scores_path(path)
+    # An empty matrix file cannot be memory-mapped; an empty scores file is the answer.
+    matrix = load_matrix(path, count, dim) if count else np.empty((0, dim), dtype=np.float32)
+    await asyncio.to_thread(rescore_matrix, matrix, scorers, chunk_size, out)
+    return {"scoresPath": str(out), "scorers": scorers, "count": count}
+
+
 #: Root every payload path must live under. Set once by ``main.py``; a handler
 #: refuses to touch anything outside it.
 #:
@@ -126,6 +190,31 @@ def _resolve_inside(raw: str) -> Path:
     return path
 
 
+def sidecar_dir() -> Path:
+    """Oversized payloads and results. Mirrors ``paths.ts``'s ``sidecarDir``."""
+    return pictoria_dir() / SIDECAR_DIRNAME
+
+
+def with_sidecars(
+    handler: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]],
+) -> Callable[[Any, dict[str, Any]], Awaitable[Any]]:
+    """Adapt a handler to cairnq, reading and writing sidecar files around it.
+
+    Every registration in ``main.py`` goes through this, so no handler knows
+    whether its payload came inline or from a file (see ``worker.sidecar``).
+    The file work runs off the loop: hashing a large batch would otherwise
+    stall the lease renewals.
+    """
+
+    async def serve(_ctx: Any, payload: dict[str, Any]) -> Any:
+        if is_sidecar(payload):
+            payload = await asyncio.to_thread(read_sidecar, payload[SIDECAR_KEY], _resolve_inside)
+        result = await handler(payload)
+        return await asyncio.to_thread(spill, result, sidecar_dir())
+
+    return serve
+
+
 def _resolve_items(
     items_in: list[dict[str, Any]],
 ) -> tuple[list[tuple[int, Path]], list[dict[str, Any]]]:
@@ -142,6 +231,11 @@ def _resolve_items(
     read as "this batch did work" and spin the scheduler loop without sleeping.
     So the count is logged here, and ``scheduler.ts`` treats an all-empty result
     as "no progress" and backs off.
+
+    Present files are then screened (:func:`_screen`), so a file already known
+    to be unreadable, or one whose header says it will be, fails here instead of
+    failing a whole GPU batch. Reads every file's header, so callers run this
+    off-loop.
     """
     items: list[tuple[int, Path]] = []
     failures: list[dict[str, Any]] = []
@@ -158,9 +252,40 @@ def _resolve_items(
             missing += 1
     if missing:
         log.warning("%d/%d item(s) no longer on disk, dropped from this batch", missing, len(items_in))
+    items, rejected = _screen(items)
+    failures += [{"postId": pid, "error": err} for pid, err in rejected]
     return items, failures
 
 
+def _screen(items: list[tuple[int, Path]]) -> tuple[list[tuple[int, Path]], list[tuple[int, str]]]:
+    """Quarantine first, then :func:`worker.preflight.preflight` on the rest.
+
+    A quarantine hit costs one ``stat``; preflight reads the header. Preflight
+    rejections are quarantined too, so the next model's batch skips even that.
+    Those are all about the content: a file preflight could not read for an OS
+    reason (``EMFILE``, ``EIO``) is not rejected, it goes on to the ladder and
+    is tried again by the next task.
+    """
+    unknown: list[tuple[int, Path]] = []
+    quarantined: list[tuple[int, str]] = []
+    for pid, path in items:
+        reason = QUARANTINE.check(path)
+        if reason is None:
+            unknown.append((pid, path))
+        else:
+            quarantined.append((pid, f"quarantined: {reason}"))
+    passed, rejected = preflight(unknown)
+    paths = dict(unknown)
+    for pid, reason in rejected:
+        QUARANTINE.add(paths[pid], reason)
+    if quarantined or rejected:
+        log.warning(
+            "%d item(s) quarantined, %d failed preflight (quarantine: %s)",
+            len(quarantined), len(rejected), QUARANTINE.stats(),
+        )
+    return passed, quarantined + rejected
+
+
 async def handle_waifu(payload: dict[str, Any]) -> dict[str, Any]:
     """Score images with the CLIP-backed waifu scorer.
 
@@ -178,14 +303,14 @@ async def handle_waifu(payload: dict[str, Any]) -> dict[str, Any]:
     if not items_in:
         return {"scores": [], "failures": []}
 
-    from ai.waifu_scorer import get_waifu_scorer  # noqa: PLC0415  # lazy: defer the ML stack
+    from ai.waifu_scorer import get_waifu_scorer, preprocess_images, score_pixel_values  # noqa: PLC0415  # lazy: defer the ML stack
 
-    items, failures = _resolve_items(items_in)
+    items, failures = await asyncio.to_thread(_resolve_items, items_in)
 
     # The loader itself touches disk and VRAM, so it goes off-loop too — see
     # the note in handle_silva about the lease.
-    scorer = await asyncio.to_thread(get_waifu_scorer)
-    successes, ladder_failures = await run_with_fallback(scorer, items, label="waifu")
+    await asyncio.to_thread(get_waifu_scorer)
+    successes, ladder_failures = await run_pipelined(preprocess_images, score_pixel_values, items, label="waifu")
     return {
         "scores": [{"postId": pid, "score": float(score)} for pid, score in successes],
         "failures": failures + [{"postId": pid, "error": err} for pid, err in ladder_failures],
@@ -217,56 +342,200 @@ async def handle_tagger(payload: dict[str, Any]) -> dict[str, Any]:
     if not items_in:
         return {"results": [], "failures": []}
 
-    from services.wd_tagging import get_tagger  # noqa: PLC0415  # lazy: defer the ML stack
+    from services.wd_tagging import get_tagger, preprocess_images, tag_tensors  # noqa: PLC0415  # lazy: defer the ML stack
 
-    items, failures = _resolve_items(items_in)
+    items, failures = await asyncio.to_thread(_resolve_items, items_in)
 
-    tagger = await asyncio.to_thread(get_tagger)
-    successes, ladder_failures = await run_with_fallback(
-        tagger.tag, items, label="tagger", reject_reason=_no_tags,
+    await asyncio.to_thread(get_tagger)
+    successes, ladder_failures = await run_pipelined(
+        preprocess_images, tag_tensors, items, label="tagger", reject_reason=_no_tags,
     )
     return {
-        "results": [
-            {
-                "postId": pid,
-                "generalTags": list(resp.general_tags),
-                "characterTags": list(resp.character_tags),
-                "rating": resp.rating or "",
-            }
-            for pid, resp in successes
-        ],
+        "results": [_tagger_row(pid, resp) for pid, resp in successes],
         "failures": failures + [{"postId": pid, "error": err} for pid, err in ladder_failures],
     }
 
 
+def _tagger_row(pid: int, resp: Any) -> dict[str, Any]:
+    """One ``TaggerResult`` — shared by ``handle_tagger`` and ``handle_analyze``."""
+    return {
+        "postId": pid,
+        "generalTags": list(resp.general_tags),
+        "characterTags": list(resp.character_tags),
+        "rating": resp.rating or "",
+    }
+
+
 async def handle_embedding(payload: dict[str, Any]) -> dict[str, Any]:
     """Encode images into SigLIP 2 retrieval embeddings.
 
-    Vectors go back base64'd (same encoding ``handle_silva`` consumes) and TS
-    writes them into the vec0 table. The initial draft made this the one
+    Vectors go back as one base64 blob, ``{embeddings: {postIds, vectors,
+    encoding}}`` (the same batch encoding ``handle_silva`` consumes, in the
+    payload's optional ``vectorEncoding``), and TS writes them into the vec0
+    table. The initial draft made this the one
     exception to §D1 — "vectors are too big, let the worker write vec0" — and
     that exception was measured away: at the real batch size the queue round
     trip costs ~12 ms against seconds of GPU encoding.
     """
     items_in = payload["items"]
+    # Checked before any work: an unknown encoding after a batch of GPU encoding
+    # would throw the vectors away.
+    encoding = check_encoding(payload.get("vectorEncoding", "f32"))
     if not items_in:
-        return {"embeddings": [], "failures": []}
+        return {"embeddings": _vector_batch([], encoding), "failures": []}
 
-    from ai.siglip_embed import calculate_image_features_batch  # noqa: PLC0415  # lazy: defer the ML stack
+    from ai.siglip_embed import encode_pixel_values, preprocess_images  # noqa: PLC0415  # lazy: defer the ML stack
 
-    items, failures = _resolve_items(items_in)
+    items, failures = await asyncio.to_thread(_resolve_items, items_in)
 
-    def _encode(paths: list[Path]) -> list[np.ndarray]:
-        features = calculate_image_features_batch(paths)
-        return list(features.cpu().numpy().astype(np.float32))
+    def _encode(pixel_values: Any) -> np.ndarray:
+        # The [B, D] array itself, not a list of row copies: its rows are views,
+        # and encode_batch stacks them once for the whole payload.
+        return encode_pixel_values(pixel_values).cpu().numpy().astype(np.float32)
 
-    successes, ladder_failures = await run_with_fallback(_encode, items, label="embedding")
+    successes, ladder_failures = await run_pipelined(preprocess_images, _encode, items, label="embedding")
     return {
-        "embeddings": [{"postId": pid, "embedding": encode_vector(emb)} for pid, emb in successes],
+        "embeddings": _vector_batch(successes, encoding),
         "failures": failures + [{"postId": pid, "error": err} for pid, err in ladder_failures],
     }
 
 
+def _vector_batch(rows: Sequence[tuple[int, np.ndarray]], encoding: str) -> dict[str, Any]:
+    """``(post_id, vector)`` pairs → ``{postIds, vectors, encoding}``, the vectors as one blob."""
+    return {
+        "postIds": [pid for pid, _ in rows],
+        "vectors": encode_batch([vec for _, vec in rows], encoding),
+        "encoding": encoding,
+    }
+
+
+#: The models ``handle_analyze`` can fan one decode out to, in the order they
+#: run. Same names as the standalone task types, so a payload reads the same
+#: either way and TS can key its failure buckets off them.
+ANALYZE_MODELS = ("embedding", "tagger", "waifu")
+
+
+@dataclass(frozen=True)
+class _Analyzer:
+    """One model as ``handle_analyze`` drives it.
+
+    ``prepare`` turns the shared decoded images into the model's input tensor,
+    applying the model's own colour/orientation handling, so an analyze result
+    is the same one the standalone task would have produced. ``forward`` runs
+    the model over that tensor. ``input_size`` is how far the shared decode may
+    shrink an image before this model stops being able to use it.
+    """
+
+    input_size: int
+    prepare: Callable[[list[Image.Image]], Any]
+    forward: Callable[[Any], Sequence[Any]]
+
+
+def _load_analyzers(models: list[str]) -> dict[str, _Analyzer]:
+    """Load the requested models, off the event loop, rather than inside the first batch."""
+    analyzers: dict[str, _Analyzer] = {}
+    if "embedding" in models:
+        from ai import siglip_embed  # noqa: PLC0415  # lazy: defer the ML stack
+
+        def _embed(pixel_values: Any) -> np.ndarray:
+            return siglip_embed.encode_pixel_values(pixel_values).cpu().numpy().astype(np.float32)
+
+        siglip_embed.get_model()
+        analyzers["embedding"] = _Analyzer(siglip_embed.IMAGE_SIZE, siglip_embed.preprocess_images, _embed)
+    if "tagger" in models:
+        from services import wd_tagging  # noqa: PLC0415  # lazy: defer the ML stack
+
+        wd_tagging.get_tagger()
+        analyzers["tagger"] = _Analyzer(wd_tagging.INPUT_SIZE, wd_tagging.preprocess_images, wd_tagging.tag_tensors)
+    if "waifu" in models:
+        from ai import waifu_scorer  # noqa: PLC0415  # lazy: defer the ML stack
+
+        waifu_scorer.get_waifu_scorer()
+        analyzers["waifu"] = _Analyzer(waifu_scorer.INPUT_SIZE, waifu_scorer.preprocess_images, waifu_scorer.score_pixel_values)
+    return analyzers
+
+
+async def handle_analyze(payload: dict[str, Any]) -> dict[str, Any]:
+    """Decode each image once and run every requested image model over it.
+
+    Payload is ``{models, items: [{postId, path}], vectorEncoding?}`` with
+    ``models`` a subset of :data:`ANALYZE_MODELS`. The standalone ``embedding`` / ``tagger`` / ``waifu``
+    tasks each open and decode the same original, so a fresh import paid three
+    full-resolution decodes per image; here the pixels are decoded once and
+    handed to each model in turn.
+
+    The result carries the same rows the standalone tasks return — ``embeddings``,
+    ``results`` (tagger) and ``scores`` (waifu), only for the models asked for —
+    plus ``failures`` keyed by model name. An item the ladder isolates as
+    unreadable fails for *every* requested model; an empty tagger response fails
+    for ``tagger`` only, and that post's embedding and score still come back.
+    TS records each list under the matching ``post_process_failures`` bucket.
+    """
+    models = list(dict.fromkeys(payload["models"]))
+    unknown = [m for m in models if m not in ANALYZE_MODELS]
+    if unknown or not models:
+        msg = f"analyze needs a non-empty subset of {ANALYZE_MODELS}, got {payload['models']!r}"
+        raise ValueError(msg)
+    models.sort(key=ANALYZE_MODELS.index)
+    encoding = check_encoding(payload.get("vectorEncoding", "f32"))
+
+    items_in = payload["items"]
+    if not items_in:
+        return _analyze_result(models, [], [], encoding)
+
+    items, failures = await asyncio.to_thread(_resolve_items, items_in)
+    analyzers = await asyncio.to_thread(_load_analyzers, models)
+
+    from ai.image_io import close_images, decode_images  # noqa: PLC0415  # lazy: PIL is not free to import
+
+    # One decode serves every model, so it may only shrink as far as the
+    # hungriest of them allows.
+    min_side = max(a.input_size for a in analyzers.values())
+
+    def _prepare(paths: list[Path]) -> dict[str, Any]:
+        images = decode_images(paths, min_side)
+        try:
+            return {name: a.prepare(images) for name, a in analyzers.items()}
+        finally:
+            close_images(images, paths)
+
+    def _forward(prepared: dict[str, Any]) -> list[dict[str, Any]]:
+        outputs = {name: list(analyzers[name].forward(inputs)) for name, inputs in prepared.items()}
+        count = len(next(iter(outputs.values())))
+        return [{name: out[i] for name, out in outputs.items()} for i in range(count)]
+
+    successes, ladder_failures = await run_pipelined(_prepare, _forward, items, label="analyze")
+    return _analyze_result(
+        models,
+        successes,
+        failures + [{"postId": pid, "error": err} for pid, err in ladder_failures],
+        encoding,
+    )
+
+
+def _analyze_result(
+    models: list[str],
+    successes: list[tuple[int, dict[str, Any]]],
+    failures: list[dict[str, Any]],
+    encoding: str,
+) -> dict[str, Any]:
+    """Shape ``handle_analyze``'s output: per-model rows plus per-model failures."""
+    result: dict[str, Any] = {"failures": {m: list(failures) for m in models}}
+    if "embedding" in models:
+        result["embeddings"] = _vector_batch([(pid, out["embedding"]) for pid, out in successes], encoding)
+    if "waifu" in models:
+        result["scores"] = [{"postId": pid, "score": float(out["waifu"])} for pid, out in successes]
+    if "tagger" in models:
+        result["results"] = []
+        for pid, out in successes:
+            reason = _no_tags(pid, out["tagger"])
+            if reason is None:
+                result["results"].append(_tagger_row(pid, out["tagger"]))
+            else:
+                result["failures"]["tagger"].append({"postId": pid, "error": reason})
+    return result
+
+
 async def handle_dedup(payload: dict[str, Any]) -> dict[str, Any]:
     """Find every near-duplicate pair in the whole library at once.
 
@@ -275,28 +544,145 @@ async def handle_dedup(payload: dict[str, Any]) -> dict[str, Any]:
     per-post vec0 KNN — is ~48h at library scale. §D1 still holds; a file is not
     a database, and this process still opens no SQL connection.
 
-    Returns ``{pairs: [[i, j], ...]}`` of **row indices**, not post ids: the
-    matrix file has no ids in it. TS holds the parallel id array and does the
+    The output takes the same channel back: the pairs go to a binary file next
+    to the matrix (``worker.dedup.PAIR_DTYPE`` records — two **row indices**,
+    not post ids, and their similarity) and the result is just
+    ``{pairsPath, count}``. A library full of variant sets has millions of
+    pairs, far too many for a JSON row. The matrix file has no ids in it; TS
+    holds the parallel id array, reads the file, deletes it and does the
     greedy canonical assignment.
+
+    An optional ``newFrom`` marks the tail rows as new; then only pairs that
+    involve one of them are computed and returned (see ``find_near_pairs``).
+
+    ``mode: "components"`` (full pass only) keeps the pairs on this side:
+    they go through ``connected_components`` and the file next to the matrix
+    (``<matrix>.labels``) holds one int32 label per row, the smallest row of
+    its component, followed by an int32 ``(root, edges)`` record per
+    non-singleton component. The result is ``{mode, labelsPath, count,
+    components}``. The file is O(rows) however dense the variant sets are,
+    and TS only has to point each row at its label. Note that components are
+    transitive where the greedy assignment is not: a chain of near pairs
+    lands in one group even when its ends are not near each other.
+
+    ``engine: "lsh"`` swaps the exact all-pairs engine for ``lsh_near_pairs``:
+    random-hyperplane buckets, then an exact check of each candidate. It does
+    roughly linear work where the exact engine does quadratic work, and it
+    misses a near pair with the small probability ``lsh_recall`` gives. It never
+    returns a pair that is not near. The default is ``"exact"``.
     """
-    from worker.dedup import find_near_pairs, load_matrix  # noqa: PLC0415  # lazy: pulls torch
+    from worker.dedup import (  # noqa: PLC0415  # lazy: pulls torch
+        connected_components,
+        find_near_pairs,
+        labels_path,
+        load_matrix,
+        lsh_near_pairs,
+        pairs_path,
+        write_components,
+        write_pairs,
+    )
 
     path = _resolve_inside(payload["matrixPath"])
     count = int(payload["count"])
     dim = int(payload["dim"])
-    if count < 2:  # noqa: PLR2004
-        return {"pairs": []}
+    new_from = int(payload.get("newFrom", 0))
+    if not 0 <= new_from <= count:
+        msg = f"newFrom {new_from} is outside the {count}-row matrix"
+        raise ValueError(msg)
+    mode = payload.get("mode", "pairs")
+    if mode not in {"pairs", "components"}:
+        msg = f"unknown dedup mode {mode!r}"
+        raise ValueError(msg)
+    if mode == "components" and new_from:
+        msg = "components mode needs the full pass (newFrom 0)"
+        raise ValueError(msg)
+    engines = {"exact": find_near_pairs, "lsh": lsh_near_pairs}
+    engine = payload.get("engine", "exact")
+    if engine not in engines:
+        msg = f"unknown dedup engine {engine!r}"
+        raise ValueError(msg)
 
-    matrix = load_matrix(path, count, dim)
-    # Off-loop like every other GPU call here: the loop that runs this handler
-    # is also the one renewing its lease, and a full-library matmul is minutes.
-    pairs = await asyncio.to_thread(
-        find_near_pairs,
-        matrix,
-        float(payload["threshold"]),
-        int(payload["chunkSize"]),
-    )
-    return {"pairs": pairs}
+    if count < 2 or new_from == count:  # noqa: PLR2004
+        pairs, sims = np.empty((0, 2), dtype=np.int32), np.empty(0, dtype=np.float32)
+    else:
+        matrix = load_matrix(path, count, dim)
+        # Off-loop like every other GPU call here: the loop that runs this handler
+        # is also the one renewing its lease, and a full-library matmul is minutes.
+        pairs, sims = await asyncio.to_thread(
+            engines[engine],
+            matrix,
+            float(payload["threshold"]),
+            int(payload["chunkSize"]),
+            new_from,
+        )
+    if mode == "components":
+        labels, roots, edges = await asyncio.to_thread(connected_components, count, pairs)
+        out = labels_path(path)
+        await asyncio.to_thread(write_components, labels, roots, edges, out)
+        return {"mode": mode, "labelsPath": str(out), "count": count, "components": len(roots)}
+    out = pairs_path(path)
+    await asyncio.to_thread(write_pairs, pairs, sims, out)
+    return {"mode": mode, "pairsPath": str(out), "count": len(pairs)}
+
+
+#: How long the first prompt of a burst waits for others to share its forward.
+#: A few ms is noise next to the HTTP round trip, and a keystroke-driven UI
+#: fires well inside it.
+TEXT_EMBED_WINDOW_S = float(os.environ.get("PICTORIA_TEXT_EMBED_WINDOW_MS", "5")) / 1000
+
+#: Prompts per coalesced forward. Matches the interactive Worker's
+#: concurrency — more could never be in flight at once.
+TEXT_EMBED_MAX_BATCH = 32
+
+_text_embedder: Coalescer[str, np.ndarray] | None = None
+_text_cache: TextEmbedCache | None = None
+_tag_vocab: TagVocab | None = None
+#: Held while ``_text_cache`` / ``_tag_vocab`` are opened. Both getters run on
+#: ``asyncio.to_thread``, so two concurrent first tasks would otherwise each
+#: open one and the loser's appends would go to an orphaned instance.
+_open_lock = threading.Lock()
+
+#: Vocabulary texts per forward in ``tag-vocab``. Short texts, so this is
+#: bounded by the padded batch, not by the prompt length.
+TAG_VOCAB_FORWARD_BATCH = 256
+
+
+def _encode_prompts(prompts: list[str]) -> list[np.ndarray]:
+    """One forward for a coalesced batch; duplicate prompts are encoded once."""
+    from ai.siglip_embed import calculate_text_features  # noqa: PLC0415  # lazy: defer the ML stack
+
+    unique = list(dict.fromkeys(prompts))
+    features = calculate_text_features(unique).cpu().numpy().astype(np.float32)
+    by_prompt = dict(zip(unique, features, strict=True))
+    return [by_prompt[p] for p in prompts]
+
+
+def _get_text_embedder() -> Coalescer[str, np.ndarray]:
+    global _text_embedder  # noqa: PLW0603 — one coalescer per process, like the model it feeds
+    if _text_embedder is None:
+        _text_embedder = Coalescer(_encode_prompts, window_s=TEXT_EMBED_WINDOW_S, max_batch=TEXT_EMBED_MAX_BATCH)
+    return _text_embedder
+
+
+def _get_text_cache() -> TextEmbedCache:
+    """Open the prompt cache on first use — the library root is only known after ``set_root``."""
+    from ai.siglip_embed import MODEL_ID  # noqa: PLC0415  # lazy: defer the ML stack
+
+    global _text_cache  # noqa: PLW0603 — one cache per process, like the coalescer behind it
+    with _open_lock:
+        if _text_cache is None:
+            _text_cache = TextEmbedCache(pictoria_dir() / CACHE_DIRNAME, MODEL_ID)
+    return _text_cache
+
+
+def _get_tag_vocab() -> TagVocab:
+    from ai.siglip_embed import MODEL_ID  # noqa: PLC0415  # lazy: defer the ML stack
+
+    global _tag_vocab  # noqa: PLW0603 — one vocabulary per process; ``tag-vocab`` appends to it in place
+    with _open_lock:
+        if _tag_vocab is None:
+            _tag_vocab = TagVocab(pictoria_dir() / VOCAB_DIRNAME, MODEL_ID)
+    return _tag_vocab
 
 
 async def handle_text_embed(payload: dict[str, Any]) -> dict[str, Any]:
@@ -306,21 +692,229 @@ async def handle_text_embed(payload: dict[str, Any]) -> dict[str, Any]:
     response — which is why it lives on its own queue with a tight poll
     interval rather than behind the backfill batches.
 
+    Prompts that arrive together share one forward: the interactive Worker
+    runs several of these tasks at once, and each submits to the same
+    :class:`~worker.coalesce.Coalescer` instead of encoding alone.
+
     ``scale`` / ``bias`` ride along with the vector because computing them
     touches torch, and the TS side is the one place that must not. They are
     constants once the model is loaded, so this costs a float each way.
+
+    A prompt seen before skips all of that: :mod:`worker.text_cache` answers
+    from memory, or from disk after a restart, and keeps ``scale`` / ``bias``
+    beside the vectors so a fully cached search never loads the model. A tag
+    name is answered from the precomputed vocabulary (:mod:`worker.tag_vocab`)
+    even the first time it is searched.
     """
-    prompt = payload["prompt"]
+    # Normalized once, up front: the cache and vocabulary key on this form, so
+    # the vector they store must be the one *this* text encodes to — not that
+    # of whichever spelling (extra spaces, full-width letters) came first.
+    prompt = normalize_prompt(payload["prompt"])
+    cache = _text_cache or await asyncio.to_thread(_get_text_cache)
+    vocab = _tag_vocab or await asyncio.to_thread(_get_tag_vocab)
+
+    vec = cache.get_memory(prompt)
+    if vec is None:
+        vec = vocab.lookup(prompt)
+    if vec is None:
+        vec = await asyncio.to_thread(cache.get_disk, prompt)
+    if vec is None:
+        vec = await _get_text_embedder().submit(prompt)
+        await asyncio.to_thread(cache.put, prompt, vec)
+
+    scale_bias = cache.scale_bias
+    if scale_bias is None:
+        from ai.siglip_embed import get_logit_scale_bias  # noqa: PLC0415  # lazy: defer the ML stack
+
+        scale_bias = await asyncio.to_thread(get_logit_scale_bias)
+        await asyncio.to_thread(cache.set_scale_bias, *scale_bias)
+    scale, bias = scale_bias
+    return {"embedding": encode_vector(vec), "scale": scale, "bias": bias}
 
-    from ai.siglip_embed import calculate_text_features, get_logit_scale_bias  # noqa: PLC0415  # lazy: defer the ML stack
 
-    def _encode() -> tuple[np.ndarray, float, float]:
-        features = calculate_text_features(prompt).cpu().numpy()[0].astype(np.float32)
-        scale, bias = get_logit_scale_bias()
-        return features, scale, bias
+async def handle_tag_vocab(payload: dict[str, Any]) -> dict[str, Any]:
+    """Precompute text embeddings for tag names and their display names.
 
-    vec, scale, bias = await asyncio.to_thread(_encode)
-    return {"embedding": encode_vector(vec), "scale": scale, "bias": bias}
+    TS sends the tags with ``rowid`` above the vocabulary's ``through`` (the
+    result reports it; an empty ``tags`` list just asks) together with the
+    ``through`` they reach. Anything already in the vocabulary is skipped, so a
+    re-sent chunk is cheap and the matrix only ever grows by what is new.
+    ``langs`` picks the ``data/tag.<lang>.json`` tables whose display names are
+    encoded too.
+
+    It also records ``scale`` / ``bias`` in the prompt cache while the model is
+    loaded anyway, so the first tag search after a restart needs no model.
+    """
+    tags: list[str] = payload["tags"]
+    vocab = await asyncio.to_thread(_get_tag_vocab)
+    texts: list[str] = []
+    if tags:
+        tables = await asyncio.to_thread(load_display_names, payload.get("langs", []))
+        texts = vocab.missing(vocab_texts(tags, tables))
+    if texts:
+        await _extend_vocab(vocab, texts)
+        await _scale_bias()
+        log.info("tag vocabulary: %d new texts for %d tags, %d rows", len(texts), len(tags), len(vocab))
+    if "through" in payload:
+        await asyncio.to_thread(vocab.advance, int(payload["through"]))
+    return {"added": len(texts), "rows": len(vocab), "through": vocab.through}
+
+
+async def _extend_vocab(vocab: TagVocab, texts: list[str]) -> None:
+    """Encode ``texts`` (normalized, not yet in ``vocab``) and append them."""
+    for start in range(0, len(texts), TAG_VOCAB_FORWARD_BATCH):
+        chunk = texts[start : start + TAG_VOCAB_FORWARD_BATCH]
+        # One forward per chunk, each off the loop, so the lease keeps renewing
+        # through a first build of the whole vocabulary.
+        vectors = await asyncio.to_thread(_encode_prompts, chunk)
+        await asyncio.to_thread(vocab.append, chunk, np.stack(vectors))
+
+
+async def _scale_bias() -> tuple[float, float]:
+    """SigLIP's logit scale / bias, from the prompt cache when it has them."""
+    cache = _text_cache or await asyncio.to_thread(_get_text_cache)
+    scale_bias = cache.scale_bias
+    if scale_bias is None:
+        from ai.siglip_embed import get_logit_scale_bias  # noqa: PLC0415  # lazy: defer the ML stack
+
+        scale_bias = await asyncio.to_thread(get_logit_scale_bias)
+        await asyncio.to_thread(cache.set_scale_bias, *scale_bias)
+    return scale_bias
+
+
+#: Matrix rows per ``zero-shot-tags`` task. Every row comes back as JSON in the
+#: one result, which lands in a single ``tasks.sqlite`` row (or sidecar file) —
+#: a whole-library payload would be hundreds of MB. TS splits above this.
+ZERO_SHOT_MAX_POSTS = 4096
+
+#: Upper bound on ``chunkSize``: the ``(chunk, labels)`` probability matrix is
+#: what has to fit in VRAM, and the caller does not know how many labels
+#: there are per GB.
+ZERO_SHOT_MAX_CHUNK = 8192
+
+
+async def handle_zero_shot_tags(payload: dict[str, Any]) -> dict[str, Any]:
+    """Suggest tags and a rating for every post from its stored SigLIP 2 vector.
+
+    Same file-channel shape as ``handle_dedup``: the payload names the exported
+    ``(count, dim)`` float32 matrix, and results come back per **row index**.
+    The label side is the tag vocabulary — each tag is scored by its spaced
+    form (``green eyes``), the text SigLIP reads best — plus one prompt per
+    rating. Tags not in the vocabulary yet are encoded and added first; the
+    rating prompts are sentences no one searches for, so they go through the
+    prompt cache instead and stay out of the vocabulary.
+
+    Returns ``{tags: [[[tagIndex, p], ...], ...], ratings: [...]}``, one entry
+    per matrix row; ``tagIndex`` indexes the payload's ``tags``. A tag that
+    normalizes to nothing has no vector and is never suggested.
+    """
+    from worker.dedup import load_matrix  # noqa: PLC0415  # lazy: pulls torch
+    from worker.zero_shot import suggest_labels  # noqa: PLC0415  # lazy: pulls torch
+
+    path = _resolve_inside(payload["matrixPath"])
+    count = int(payload["count"])
+    dim = int(payload["dim"])
+    chunk_size = int(payload["chunkSize"])
+    tags: list[str] = payload["tags"]
+    rating_prompts: dict[str, str] = payload["ratingPrompts"]
+    if count > ZERO_SHOT_MAX_POSTS:
+        msg = f"{count} posts in one zero-shot-tags task; split them into chunks of at most {ZERO_SHOT_MAX_POSTS}"
+        raise ValueError(msg)
+    if chunk_size <= 0:
+        msg = f"chunkSize must be positive, got {chunk_size}"
+        raise ValueError(msg)
+    top_k = payload["topK"]
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k <= 0:
+        msg = f"topK must be a positive integer, got {top_k!r}"
+        raise ValueError(msg)
+
+    vocab = await asyncio.to_thread(_get_tag_vocab)
+    _check_vocab_dim(vocab, dim)
+    # Payload index of each tag that has a text to look up.
+    scored: list[int] = []
+    tag_texts: list[str] = []
+    for index, tag in enumerate(tags):
+        text = normalize_prompt(tag.replace("_", " "))
+        if text:
+            scored.append(index)
+            tag_texts.append(text)
+    missing = vocab.missing(tag_texts)
+    if missing:
+        await _extend_vocab(vocab, missing)
+    _check_vocab_dim(vocab, dim)
+    tag_vectors = vocab.vectors(tag_texts).reshape(len(tag_texts), dim)
+    rating_vectors = await _prompt_vectors(list(rating_prompts.values()), dim)
+    scale, bias = await _scale_bias()
+
+    matrix = load_matrix(path, count, dim)
+    suggestions, best = await asyncio.to_thread(
+        suggest_labels,
+        matrix,
+        tag_vectors,
+        rating_vectors,
+        scale,
+        bias,
+        top_k=min(top_k, len(tag_texts)),
+        threshold=float(payload["threshold"]),
+        chunk_size=min(chunk_size, ZERO_SHOT_MAX_CHUNK),
+    )
+    names = list(rating_prompts)
+    return {
+        "tags": [[(scored[row], p) for row, p in row_tags] for row_tags in suggestions],
+        "ratings": [names[i] if i >= 0 else "" for i in best],
+    }
+
+
+def _check_vocab_dim(vocab: TagVocab, dim: int) -> None:
+    """Fail on an image matrix the vocabulary cannot be compared with.
+
+    Vectors from another model (or a stale export) would otherwise either die
+    in a reshape with an unhelpful message or, at a coincidentally equal
+    width, score against the wrong space without complaint.
+    """
+    if vocab.dim is not None and vocab.dim != dim:
+        msg = f"image vectors are {dim}-d but the tag vocabulary is {vocab.dim}-d ({vocab.model_id})"
+        raise ValueError(msg)
+
+
+async def _prompt_vectors(prompts: list[str], dim: int) -> np.ndarray:
+    """``(len(prompts), dim)`` text vectors through the prompt cache; misses share one forward."""
+    cache = _text_cache or await asyncio.to_thread(_get_text_cache)
+    texts = [normalize_prompt(p) for p in prompts]
+    found = {t: v for t in dict.fromkeys(texts) if (v := cache.get_memory(t)) is not None}
+    for text in dict.fromkeys(t for t in texts if t not in found):
+        if (vec := await asyncio.to_thread(cache.get_disk, text)) is not None:
+            found[text] = vec
+    missing = [t for t in dict.fromkeys(texts) if t not in found]
+    if missing:
+        for text, vec in zip(missing, await asyncio.to_thread(_encode_prompts, missing), strict=True):
+            await asyncio.to_thread(cache.put, text, vec)
+            found[text] = vec
+    if not texts:
+        return np.empty((0, dim), dtype=np.float32)
+    vectors = np.stack([found[t] for t in texts])
+    if vectors.shape[1] != dim:
+        msg = f"image vectors are {dim}-d but the text encoder gives {vectors.shape[1]}-d"
+        raise ValueError(msg)
+    return vectors
+
+
+async def handle_worker_stats(_payload: dict[str, Any]) -> dict[str, Any]:
+    """In-process counters the worker keeps and TS cannot see any other way.
+
+    Nothing here is persisted — it all resets with the process — so it is read
+    live over the interactive queue rather than written anywhere.
+    """
+    from ai.registry import REGISTRY  # noqa: PLC0415  # lazy: registry imports no torch, but ai.* stays off the startup path
+
+    # Off the loop: the registry lock is short-held, but it is still a thread lock.
+    models = await asyncio.to_thread(REGISTRY.stats)
+    return {
+        "quarantine": QUARANTINE.stats(),
+        "models": models,
+        "textEmbedCache": _text_cache.stats() if _text_cache is not None else None,
+        "tagVocab": _tag_vocab.stats() if _tag_vocab is not None else None,
+    }
 
 
 async def handle_thumbnail(payload: dict[str, Any]) -> dict[str, Any]:
@@ -341,7 +935,8 @@ async def handle_thumbnail(payload: dict[str, Any]) -> dict[str, Any]:
     thumbnail = _resolve_inside(payload["thumbnailPath"])
     thumbnail.parent.mkdir(parents=True, exist_ok=True)
     try:
-        await asyncio.to_thread(create_thumbnail, original, thumbnail)
+        async with admit(original):
+            await asyncio.to_thread(create_thumbnail, original, thumbnail)
     except (UnidentifiedImageError, OSError) as exc:
         return {"ok": False, "error": str(exc)}
     return {"ok": True}
@@ -378,7 +973,8 @@ async def handle_rotate(payload: dict[str, Any]) -> dict[str, Any]:
             "arthash": calculate_arthash(image),
         }
 
-    return await asyncio.to_thread(_rotate)
+    async with admit(original):
+        return await asyncio.to_thread(_rotate)
 
 
 async def handle_caption(payload: dict[str, Any]) -> dict[str, Any]:
@@ -467,7 +1063,7 @@ def _compute_basics(item: dict[str, Any], thumbs_root: Path) -> dict[str, Any]:
 
 
 async def handle_basics(payload: dict[str, Any]) -> dict[str, Any]:
-    """Compute basics for a batch, one image per thread.
+    """Compute basics for a batch, one image per thread, within the decode budget.
 
     Failures are per-item and come back as data: one unreadable file must not
     cost the other 31 in the batch. A successful decode whose palette step
@@ -482,7 +1078,10 @@ async def handle_basics(payload: dict[str, Any]) -> dict[str, Any]:
 
     async def _one(item: dict[str, Any]) -> dict[str, Any] | BaseException:
         try:
-            return await asyncio.to_thread(_compute_basics, item, thumbs)
+            # The gather below starts every item at once; admission is what
+            # keeps a batch of huge scans from all decoding together.
+            async with admit(_resolve_inside(item["path"])):
+                return await asyncio.to_thread(_compute_basics, item, thumbs)
         except BaseException as exc:  # reported per item, never fails the whole batch
             return exc
 
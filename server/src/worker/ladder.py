@@ -16,9 +16,14 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import TYPE_CHECKING, TypeVar
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal, TypeVar
 
 from PIL import UnidentifiedImageError
+from PIL.Image import DecompressionBombError
+
+from worker.quarantine import QUARANTINE
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Sequence
@@ -29,6 +34,11 @@ log = logging.getLogger("worker.ladder")
 #: Result a worker's batch function produces (a score, an embedding, a tagger
 #: response, ...) — the ladder is generic over it.
 R = TypeVar("R")
+#: Whatever a pipelined ``prepare_fn`` hands its ``forward_fn`` — usually a
+#: stacked pixel tensor.
+P = TypeVar("P")
+T = TypeVar("T")
+U = TypeVar("U")
 
 #: When the full GPU batch crashes (typically one unreadable image in the
 #: collate), shrink to this before going single-image. Mid-size batches keep the
@@ -39,6 +49,61 @@ FALLBACK_MINI_BATCH_SIZE = 4
 Outcome = tuple[list[tuple[int, R]], list[tuple[int, str]]]
 """``(successes, failures)`` — ``(post_id, result)`` and ``(post_id, message)``."""
 
+Strategy = Literal["bisect", "chunks"]
+"""How a failed batch is narrowed down to its bad items.
+
+``bisect`` (the default) halves the failing set until each failure is a single
+item: one bad image in 64 costs ``1 + 2*log2(64) = 13`` forwards. ``chunks``
+is the original fixed ladder — :data:`FALLBACK_MINI_BATCH_SIZE` groups, then
+per-image inside whichever group failed: ``1 + 16 + 4 = 21`` for the same
+batch. Each extra bad item costs bisection its own log-depth path, though,
+and with four scattered bad images in 64 it is already behind (39 forwards
+vs 33). A backfill batch almost always holds zero or one bad file, hence the
+default; ``chunks`` is kept for the libraries where that is not true.
+"""
+
+
+@dataclass
+class LadderStats:
+    """How many batch attempts the ladder made.
+
+    One per ``batch_fn`` call; in :func:`run_pipelined`, one per chunk plus one
+    per fallback ``prepare`` → ``forward`` round. A decode error fails the
+    attempt before the model runs, but it costs the decode all the same.
+    """
+
+    forward_passes: int = 0
+
+
+def _counted(fn: Callable[[T], U], stats: LadderStats | None) -> Callable[[T], U]:
+    if stats is None:
+        return fn
+
+    def _run(arg: T) -> U:
+        stats.forward_passes += 1
+        return fn(arg)
+
+    return _run
+
+
+def _check_rows(results: Sequence[R], expected: int) -> Sequence[R]:
+    """``results``, if there is one per item; else a ``ValueError`` the ladder falls back on.
+
+    A forward that drops or repeats a row cannot be matched to its items, so
+    the batch counts as failed rather than raising out of :func:`_classify`.
+    """
+    if len(results) != expected:
+        msg = f"batch of {expected} produced {len(results)} result(s)"
+        raise ValueError(msg)
+    return results
+
+
+def _checked(fn: Callable[[list[Path]], Sequence[R]]) -> Callable[[list[Path]], Sequence[R]]:
+    def _run(paths: list[Path]) -> Sequence[R]:
+        return _check_rows(fn(paths), len(paths))
+
+    return _run
+
 
 def _classify(
     chunk: Sequence[tuple[int, Path]],
@@ -61,6 +126,38 @@ def _classify(
     return succ, fail
 
 
+def is_decode_error(exc: BaseException) -> bool:
+    """Whether ``exc`` says the file's *content* cannot decode, so retrying it is pointless.
+
+    PIL reports a corrupt or truncated stream as a bare ``OSError`` with no
+    errno ("broken data stream", "image file is truncated"). An ``OSError``
+    that carries an errno came from the OS instead: too many open files, an
+    I/O error on a flaky disk, a network share that dropped. Those can clear
+    up on their own, so they must not be quarantined.
+    """
+    if isinstance(exc, UnidentifiedImageError | DecompressionBombError | SyntaxError):
+        return True
+    return isinstance(exc, OSError) and exc.errno is None
+
+
+def _single_failure(label: str, pid: int, path: Path, exc: Exception) -> tuple[int, str]:
+    """The failure row for one image that raised on its own.
+
+    A file whose content does not decode is also quarantined, so the next
+    batch that selects it fails it up front instead of rediscovering it here.
+    I/O errors are not: the next task gets to try the file again.
+    """
+    message = f"{type(exc).__name__}: {exc}"
+    if is_decode_error(exc):
+        log.warning("[%s] unreadable %s (%s): %s", label, pid, path, exc)
+        QUARANTINE.add(path, message)
+    elif isinstance(exc, OSError):
+        log.warning("[%s] I/O error on %s (%s), not quarantined: %s", label, pid, path, exc)
+    else:
+        log.error("[%s] post %s (%s)", label, pid, path, exc_info=exc)
+    return pid, message
+
+
 async def _retry_per_image(
     batch_fn: Callable[[list[Path]], Sequence[R]],
     chunk: Sequence[tuple[int, Path]],
@@ -74,12 +171,8 @@ async def _retry_per_image(
     for pid, path in chunk:
         try:
             single = await asyncio.to_thread(batch_fn, [path])
-        except (UnidentifiedImageError, OSError) as exc:
-            log.warning("[%s] unreadable %s (%s): %s", label, pid, path, exc)
-            failures.append((pid, f"{type(exc).__name__}: {exc}"))
         except Exception as exc:
-            log.exception("[%s] post %s (%s)", label, pid, path)
-            failures.append((pid, f"{type(exc).__name__}: {exc}"))
+            failures.append(_single_failure(label, pid, path, exc))
         else:
             reason = reject_reason(pid, single[0]) if reject_reason is not None else None
             if reason is None:
@@ -89,19 +182,21 @@ async def _retry_per_image(
     return successes, failures
 
 
-async def run_with_fallback(
+async def run_with_fallback(  # noqa: PLR0913 — the batch function plus the ladder's knobs
     batch_fn: Callable[[list[Path]], Sequence[R]],
     items: Sequence[tuple[int, Path]],
     *,
     label: str,
     reject_reason: Callable[[int, R], str | None] | None = None,
+    strategy: Strategy = "bisect",
+    stats: LadderStats | None = None,
 ) -> Outcome:
-    """Run ``batch_fn`` over ``items``, shrinking the batch on failure.
+    """Run ``batch_fn`` over ``items``, narrowing the batch on failure.
 
-    Full batch first; on exception, retry in groups of
-    :data:`FALLBACK_MINI_BATCH_SIZE` so one corrupt image does not drop the rest
-    to single-image inference (which leaves the GPU ~80% idle between PIL
-    decodes). Only the mini-batch holding the bad image falls all the way down.
+    Full batch first; on exception, isolate the bad items per ``strategy`` (see
+    :data:`Strategy`) so one corrupt image does not drop the rest to
+    single-image inference (which leaves the GPU ~80% idle between PIL
+    decodes). Pass ``stats`` to count the forward passes that took.
 
     Persists nothing. ``failures`` is returned for the caller to write, so a
     persistence error can't masquerade as a bad image.
@@ -109,17 +204,73 @@ async def run_with_fallback(
     if not items:
         return [], []
 
+    batch_fn = _checked(_counted(batch_fn, stats))
     paths = [p for _, p in items]
     try:
         results = await asyncio.to_thread(batch_fn, paths)
     except Exception as exc:
-        log.warning(
-            "[%s] full batch failed (%s); retrying in mini-batches of %d",
-            label, exc, FALLBACK_MINI_BATCH_SIZE,
-        )
-    else:
-        return _classify(items, results, reject_reason)
+        log.warning("[%s] full batch of %d failed (%s); isolating by %s", label, len(items), exc, strategy)
+        return await _fall_back(batch_fn, items, exc, label=label, reject_reason=reject_reason, strategy=strategy)
+    return _classify(items, results, reject_reason)
+
+
+async def _fall_back(  # noqa: PLR0913 — the failed group plus the ladder's knobs
+    batch_fn: Callable[[list[Path]], Sequence[R]],
+    items: Sequence[tuple[int, Path]],
+    exc: Exception,
+    *,
+    label: str,
+    reject_reason: Callable[[int, R], str | None] | None,
+    strategy: Strategy,
+) -> Outcome:
+    """Isolate the bad items of a group that already failed whole with ``exc``."""
+    if strategy == "bisect":
+        return await _bisect(batch_fn, items, exc, label=label, reject_reason=reject_reason)
+    return await _mini_batches(batch_fn, items, label=label, reject_reason=reject_reason)
+
+
+async def _bisect(
+    batch_fn: Callable[[list[Path]], Sequence[R]],
+    items: Sequence[tuple[int, Path]],
+    exc: Exception,
+    *,
+    label: str,
+    reject_reason: Callable[[int, R], str | None] | None,
+) -> Outcome:
+    """Halve a failed group until every failure is one item.
+
+    A single item that failed is reported with the error it raised *alone* —
+    never inferred from its neighbours — so a batch-level fault (an OOM at the
+    full size) cannot blame an innocent image. Both halves always run: a
+    passing left half does not prove the right one bad.
+    """
+    if len(items) == 1:
+        pid, path = items[0]
+        return [], [_single_failure(label, pid, path, exc)]
 
+    successes: list[tuple[int, R]] = []
+    failures: list[tuple[int, str]] = []
+    mid = len(items) // 2
+    for half in (items[:mid], items[mid:]):
+        try:
+            results = await asyncio.to_thread(batch_fn, [p for _, p in half])
+        except Exception as half_exc:
+            succ, fail = await _bisect(batch_fn, half, half_exc, label=label, reject_reason=reject_reason)
+        else:
+            succ, fail = _classify(half, results, reject_reason)
+        successes += succ
+        failures += fail
+    return successes, failures
+
+
+async def _mini_batches(
+    batch_fn: Callable[[list[Path]], Sequence[R]],
+    items: Sequence[tuple[int, Path]],
+    *,
+    label: str,
+    reject_reason: Callable[[int, R], str | None] | None,
+) -> Outcome:
+    """The fixed mini-batch → per-image ladder, for a group that already failed whole."""
     successes: list[tuple[int, R]] = []
     failures: list[tuple[int, str]] = []
     for start in range(0, len(items), FALLBACK_MINI_BATCH_SIZE):
@@ -135,3 +286,146 @@ async def run_with_fallback(
         successes += succ
         failures += fail
     return successes, failures
+
+
+#: Chunk size for :func:`run_pipelined`. Small enough that a backfill batch
+#: (16-32 items) splits into a few chunks — overlap needs at least two — and
+#: large enough that each forward still amortizes its launch overhead.
+PIPELINE_CHUNK_SIZE = 8
+
+
+@dataclass
+class PipelineTimings:
+    """Where :func:`run_pipelined` spent its time, summed over every chunk.
+
+    ``prepare_s`` is the CPU stage (decode, RGB conversion, processor resize),
+    ``forward_s`` the model stage. The two run concurrently, so with perfect
+    overlap ``wall_s`` approaches the larger of them rather than their sum;
+    :attr:`overlap_s` is how much of the smaller one was hidden.
+    """
+
+    prepare_s: float = 0.0
+    forward_s: float = 0.0
+    wall_s: float = 0.0
+    chunks: int = 0
+
+    @property
+    def overlap_s(self) -> float:
+        return max(0.0, self.prepare_s + self.forward_s - self.wall_s)
+
+
+def _timed(fn: Callable[[T], U]) -> Callable[[T], tuple[U, float]]:
+    def _run(arg: T) -> tuple[U, float]:
+        started = time.perf_counter()
+        out = fn(arg)
+        return out, time.perf_counter() - started
+
+    return _run
+
+
+async def _discard(task: asyncio.Task[T]) -> None:
+    """Cancel ``task`` if it is still running, then wait for it and drop its outcome.
+
+    For the prepare :func:`run_pipelined` starts one chunk ahead: when the
+    loop exits early (a cancellation, say), that task must not outlive the
+    call with its exception never retrieved. Its worker thread cannot be
+    interrupted, only abandoned.
+    """
+    if not task.done():
+        task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def run_pipelined(  # noqa: PLR0913 — two stage functions plus the ladder's knobs
+    prepare_fn: Callable[[list[Path]], P],
+    forward_fn: Callable[[P], Sequence[R]],
+    items: Sequence[tuple[int, Path]],
+    *,
+    label: str,
+    reject_reason: Callable[[int, R], str | None] | None = None,
+    chunk_size: int = PIPELINE_CHUNK_SIZE,
+    timings: PipelineTimings | None = None,
+    strategy: Strategy = "bisect",
+    stats: LadderStats | None = None,
+) -> Outcome:
+    """:func:`run_with_fallback`, with the CPU stage of chunk N+1 overlapping the forward of chunk N.
+
+    ``prepare_fn`` turns paths into model-ready inputs (decoded, converted,
+    resized, stacked into a tensor); ``forward_fn`` runs the model over them.
+    Run back to back on one thread, the model idles during decode and the CPU
+    idles during the forward; here the two stages run on separate threads with
+    exactly one prepared chunk buffered ahead, so host memory holds at most two
+    chunks of tensors.
+
+    A chunk whose prepare *or* forward raises, or whose forward returns the
+    wrong number of rows, drops into the same fallback
+    ``run_with_fallback`` uses (``strategy``), with the two stages composed
+    back into one call — so failure semantics are identical, only the happy
+    path is pipelined. Pass ``timings`` to get the per-stage totals back; they
+    are logged either way.
+    """
+    if not items:
+        return [], []
+
+    def batch_fn(paths: list[Path]) -> Sequence[R]:
+        return forward_fn(prepare_fn(paths))
+
+    # Each chunk's happy-path attempt starts with its prepare, so count there;
+    # fallback rounds go through batch_fn and are counted there.
+    batch_fn = _checked(_counted(batch_fn, stats))
+    prepare, forward = _timed(_counted(prepare_fn, stats)), _timed(forward_fn)
+    chunks = [items[start : start + chunk_size] for start in range(0, len(items), chunk_size)]
+    clock = timings if timings is not None else PipelineTimings()
+    started = time.perf_counter()
+
+    def _start_prepare(chunk: Sequence[tuple[int, Path]]) -> asyncio.Task[tuple[P, float]]:
+        return asyncio.create_task(asyncio.to_thread(prepare, [p for _, p in chunk]))
+
+    successes: list[tuple[int, R]] = []
+    failures: list[tuple[int, str]] = []
+    pending = _start_prepare(chunks[0])
+    try:
+        for index, chunk in enumerate(chunks):
+            error: Exception | None = None
+            try:
+                prepared, prepare_s = await pending
+            except Exception as exc:
+                prepared, prepare_s, error = None, 0.0, exc
+                log.warning("[%s] prepare failed for chunk %d (%s); falling back", label, index, exc)
+            clock.prepare_s += prepare_s
+            # Start the next chunk's CPU stage *before* this chunk's forward, so the
+            # two run concurrently on separate threads.
+            if index + 1 < len(chunks):
+                pending = _start_prepare(chunks[index + 1])
+
+            results: Sequence[R] | None = None
+            if prepared is not None:
+                try:
+                    results, forward_s = await asyncio.to_thread(forward, prepared)
+                    _check_rows(results, len(chunk))
+                except Exception as exc:
+                    error = exc
+                    log.warning("[%s] forward failed for chunk %d (%s); falling back", label, index, exc)
+                else:
+                    clock.forward_s += forward_s
+            # Drop this chunk's tensors before the next chunk's arrive.
+            prepared = None
+            outcome = (
+                _classify(chunk, results, reject_reason)
+                if error is None
+                else await _fall_back(
+                    batch_fn, chunk, error, label=label, reject_reason=reject_reason, strategy=strategy,
+                )
+            )
+            successes += outcome[0]
+            failures += outcome[1]
+            clock.chunks += 1
+    finally:
+        await _discard(pending)
+
+    clock.wall_s += time.perf_counter() - started
+    log.info(
+        "[%s] %d chunk(s): prepare %.2fs, forward %.2fs, wall %.2fs (%.2fs overlapped)",
+        label, clock.chunks, clock.prepare_s, clock.forward_s, clock.wall_s, clock.overlap_s,
+    )
+    return successes, failures
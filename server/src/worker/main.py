@@ -3,6 +3,7 @@
 Run it next to the API:
 
     cd server && uv run ./src/worker/main.py
+    cd server && uv run ./src/worker/main.py --warm embedding,text-embed   # preload in the background
 
 The library root comes from `$PICTORIA_TARGET_DIR` (same variable, same default,
 same repo-root anchor as `paths.ts`) so the API and this process cannot be pointed
@@ -36,19 +37,27 @@ from cairnq import SQLiteStore, Worker
 from dotenv import load_dotenv
 
 from worker.handlers import (
+    handle_analyze,
     handle_basics,
     handle_caption,
     handle_dedup,
     handle_embedding,
     handle_rotate,
     handle_silva,
+    handle_silva_rescore,
+    handle_tag_vocab,
     handle_tagger,
     handle_text_embed,
     handle_thumbnail,
     handle_waifu,
+    handle_worker_stats,
+    handle_zero_shot_tags,
+    pictoria_dir,
     set_root,
+    with_sidecars,
 )
 from worker.importers import handle_danbooru_import, handle_url_download, handle_url_scan
+from worker.warmup import WARMERS, parse_warm, warm_in_background
 
 #: The importers need DANBOORU_API_KEY / DANBOORU_USER_NAME out of server/.env —
 #: the same file bootstrap.py loads for the API process.
@@ -72,12 +81,24 @@ GPU_QUEUE = "gpu"
 #: human is waiting on the response (§4.6).
 INTERACTIVE_QUEUE = "gpu-interactive"
 INTERACTIVE_POLL_MS = 20
+#: Above 1 so concurrent searches can be in flight together and share one
+#: forward (``handle_text_embed`` coalesces them). The GPU still sees one text
+#: batch at a time; the coalescer serializes the forwards.
+INTERACTIVE_CONCURRENCY = 32
 
 #: Queue for work that touches CPU and disk but never the GPU (thumbnails).
 #: It gets its own Worker so it neither waits on a model batch nor makes one
 #: wait, and unlike the GPU queue its concurrency can exceed 1.
 IO_QUEUE = "io"
-IO_CONCURRENCY = 4
+#: An upper bound on in-flight ``io`` tasks, not the memory control: decodes
+#: are admitted against ``worker.admission.DECODE_BUDGET`` by their estimated
+#: size, so small thumbnails use all of these slots and huge scans serialize.
+#: Imports and URL downloads share the queue and mostly wait on the network.
+IO_CONCURRENCY = 8
+
+#: How often to unload models idle past ``PICTORIA_MODEL_IDLE_MINUTES``. Coarse
+#: on purpose: the idle window is minutes, and a check is one lock and a scan.
+MODEL_REAP_INTERVAL_S = 60
 
 
 #: Repo root, derived from this file's location rather than the cwd -- same
@@ -128,6 +149,15 @@ def tasks_db_path(root: Path) -> Path:
     return (_REPO_ROOT / override).resolve() if override else root / ".pictoria" / "tasks.sqlite"
 
 
+async def reap_idle_models() -> None:
+    """Unload models nothing has used for a while; see ``ai.registry``."""
+    from ai.registry import REGISTRY  # noqa: PLC0415  # lazy: keeps ai.* out of startup
+
+    while True:
+        await asyncio.sleep(MODEL_REAP_INTERVAL_S)
+        await asyncio.to_thread(REGISTRY.evict_idle)
+
+
 async def main() -> None:
     parser = argparse.ArgumentParser(description="pictoria cairnq worker")
     parser.add_argument(
@@ -137,7 +167,16 @@ async def main() -> None:
         help=f"image library root; overrides $PICTORIA_TARGET_DIR (default: {_DEFAULT_TARGET_DIR})",
     )
     parser.add_argument("--tasks_db", type=Path, default=None, help="override the tasks.sqlite path")
+    parser.add_argument(
+        "--warm",
+        default=os.environ.get("PICTORIA_WARM_MODELS"),
+        help=f"comma-separated models to preload in the background, or 'all' ({', '.join(WARMERS)}); overrides $PICTORIA_WARM_MODELS",
+    )
     args = parser.parse_args()
+    try:
+        warm = parse_warm(args.warm)
+    except ValueError as exc:
+        parser.error(str(exc))
 
     # The flag resolves against the cwd (that is what a user typing a path
     # expects); the env var resolves against the repo root, because that is
@@ -156,7 +195,7 @@ async def main() -> None:
     interactive = Worker(
         store,
         queues=[INTERACTIVE_QUEUE],
-        concurrency=1,
+        concurrency=INTERACTIVE_CONCURRENCY,
         poll_interval_ms=INTERACTIVE_POLL_MS,
     )
     io_worker = Worker(
@@ -168,34 +207,60 @@ async def main() -> None:
 
     # Payload paths are resolved inside this root and nowhere else.
     set_root(root)
+    # Exported SILVA heads are per library, like every other derived file.
+    from ai.silva_head import NPZ_DIRNAME, set_npz_dir  # noqa: PLC0415  # lazy: NumPy only, but ai.* stays out of the import block
+
+    set_npz_dir(pictoria_dir() / NPZ_DIRNAME)
+
+    # Every handler is wrapped in ``with_sidecars``: a payload or result too big
+    # for a queue row travels as a file under .pictoria/sidecar/ instead.
 
     # ``silva`` and ``silva_luna`` are the same code path with different learnt
     # weights, so one handler serves both names and the payload says which head.
-    worker.task("silva")(lambda _ctx, payload: handle_silva(payload))
-    worker.task("waifu")(lambda _ctx, payload: handle_waifu(payload))
-    worker.task("tagger")(lambda _ctx, payload: handle_tagger(payload))
-    worker.task("embedding")(lambda _ctx, payload: handle_embedding(payload))
+    worker.task("silva")(with_sidecars(handle_silva))
+    # The whole library through those heads at once, off the exported matrix file.
+    worker.task("silva-rescore")(with_sidecars(handle_silva_rescore))
+    worker.task("waifu")(with_sidecars(handle_waifu))
+    worker.task("tagger")(with_sidecars(handle_tagger))
+    worker.task("embedding")(with_sidecars(handle_embedding))
+    # embedding + tagger + waifu off one decode per image; see handle_analyze.
+    worker.task("analyze")(with_sidecars(handle_analyze))
     # dedup is not a backfill worker — it is one whole-library pass, kicked off by
     # /v2/cmd/group-duplicates or by the embedding scheduler after it writes new
     # vectors. Same queue on purpose: it wants the GPU exclusively.
-    worker.task("dedup")(lambda _ctx, payload: handle_dedup(payload))
-    interactive.task("text-embed")(lambda _ctx, payload: handle_text_embed(payload))
-    io_worker.task("thumbnail")(lambda _ctx, payload: handle_thumbnail(payload))
-    io_worker.task("rotate")(lambda _ctx, payload: handle_rotate(payload))
-    io_worker.task("caption")(lambda _ctx, payload: handle_caption(payload))
-    io_worker.task("basics")(lambda _ctx, payload: handle_basics(payload))
-    io_worker.task("danbooru-import")(lambda _ctx, payload: handle_danbooru_import(payload))
-    io_worker.task("url-scan")(lambda _ctx, payload: handle_url_scan(payload))
-    io_worker.task("url-download")(lambda _ctx, payload: handle_url_download(payload))
+    worker.task("dedup")(with_sidecars(handle_dedup))
+    # The tag vocabulary's text embeddings; text-embed reads them, this writes them.
+    worker.task("tag-vocab")(with_sidecars(handle_tag_vocab))
+    # Re-tag from stored vectors: one matmul against that vocabulary, no decode.
+    worker.task("zero-shot-tags")(with_sidecars(handle_zero_shot_tags))
+    interactive.task("text-embed")(with_sidecars(handle_text_embed))
+    # Counters only, no model: it rides the fast queue so it never waits on a batch.
+    interactive.task("worker-stats")(with_sidecars(handle_worker_stats))
+    io_worker.task("thumbnail")(with_sidecars(handle_thumbnail))
+    io_worker.task("rotate")(with_sidecars(handle_rotate))
+    io_worker.task("caption")(with_sidecars(handle_caption))
+    io_worker.task("basics")(with_sidecars(handle_basics))
+    io_worker.task("danbooru-import")(with_sidecars(handle_danbooru_import))
+    io_worker.task("url-scan")(with_sidecars(handle_url_scan))
+    io_worker.task("url-download")(with_sidecars(handle_url_download))
 
     log.info(
-        "worker up: silva, waifu, tagger, embedding, dedup on %s; text-embed on %s; thumbnail + rotate + caption + basics + import on %s  db=%s",
+        "worker up: silva, silva-rescore, waifu, tagger, embedding, analyze, dedup, tag-vocab, zero-shot-tags on %s; text-embed + worker-stats on %s; "
+        "thumbnail + rotate + caption + basics + import on %s  db=%s",
         GPU_QUEUE,
         INTERACTIVE_QUEUE,
         IO_QUEUE,
         db_path,
     )
-    await asyncio.gather(worker.run(), interactive.run(), io_worker.run())
+    if warm:
+        log.info("warming in the background: %s", ", ".join(warm))
+    await asyncio.gather(
+        worker.run(),
+        interactive.run(),
+        io_worker.run(),
+        reap_idle_models(),
+        warm_in_background(warm),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+"""Header-only checks that keep unreadable files out of GPU batches.
+
+Almost every full-batch failure in the ladder is one file that was never going
+to decode: a 0-byte leftover from an interrupted download, an HTML error page
+saved as ``.jpg``, a header PIL does not recognize. Each one costs a failed
+forward plus the bisection to find it. The checks here read only a file's size,
+its first bytes and its header, so an item that fails them goes straight to
+``failures`` and the batch the model sees is one that will decode.
+
+They are cheap gates, not a decode: a file that passes can still fail inside
+the ladder, which stays the authority. And a *truncated* file passes by
+default — ``LOAD_TRUNCATED_IMAGES`` is on deliberately, so a partial download
+decodes as far as it goes and gets scored. ``PICTORIA_PREFLIGHT_TRAILER=1``
+additionally requires JPEG/PNG files to end with their end-of-image marker,
+for libraries that would rather fail those than score half an image.
+
+Only the *content* is judged here. An ``OSError`` with an errno is the OS
+talking (too many open files, a flaky disk, a file deleted since it was
+listed), which says nothing about the file and may clear up by the next task;
+see :func:`preflight` for where those go.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+log = logging.getLogger("worker.preflight")
+
+#: Require a JPEG/PNG trailer; see the module docstring for why it is off.
+CHECK_TRAILER = os.environ.get("PICTORIA_PREFLIGHT_TRAILER", "0") == "1"
+
+#: How far from the end the trailer may sit. Writers routinely append a few
+#: bytes of padding (or a whole second JPEG, for some phone "motion photos")
+#: after the real end-of-image marker.
+TRAILER_WINDOW = 4096
+
+_JPEG = b"\xff\xd8\xff"
+_PNG = b"\x89PNG\r\n\x1a\n"
+_TRAILERS = {"JPEG": b"\xff\xd9", "PNG": b"IEND"}
+
+# Content that is certainly not an image, however the file is named — what a
+# failed download leaves behind.
+_NOT_IMAGES = (b"<!DOCTYPE", b"<!doctype", b"<html", b"<HTML", b"{", b"PK\x03\x04")
+
+
+def sniff(head: bytes) -> str | None:
+    """The format named by ``head``'s magic bytes, for the trailer check."""
+    if head.startswith(_JPEG):
+        return "JPEG"
+    if head.startswith(_PNG):
+        return "PNG"
+    return None
+
+
+def check_image(path: Path, *, check_trailer: bool = CHECK_TRAILER) -> str | None:
+    """Why ``path`` cannot decode, or ``None`` if it is worth a batch slot.
+
+    Formats without a sniffed signature are not rejected for it: PIL reads far
+    more than JPEG and PNG, and its header parse is the real test. An
+    ``OSError`` that carries an errno is raised, not returned as a reason.
+    """
+    from PIL import Image, UnidentifiedImageError  # noqa: PLC0415  # lazy: PIL is not free to import
+
+    # For the side effect: no pixel cap, as in every decode after this one. On a
+    # fresh worker nothing has imported it yet, and PIL's default cap would
+    # reject a 16k scan here that the model path decodes fine.
+    import utils  # noqa: F401, PLC0415
+
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            return "preflight: empty file"
+        with path.open("rb") as f:
+            head = f.read(16)
+            if head.lstrip().startswith(_NOT_IMAGES):
+                return f"preflight: not an image (starts with {head[:9]!r})"
+            fmt = sniff(head)
+            if check_trailer and fmt is not None:
+                f.seek(max(0, size - TRAILER_WINDOW))
+                if _TRAILERS[fmt] not in f.read():
+                    return f"preflight: truncated {fmt} (no end-of-image marker)"
+        with Image.open(path) as img:
+            width, height = img.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as exc:
+        # PIL reports bad content as an errno-less OSError (``UnidentifiedImageError``
+        # is one); an errno means the read itself failed.
+        if isinstance(exc, OSError) and exc.errno is not None:
+            raise
+        return f"preflight: {type(exc).__name__}: {exc}"
+    if width <= 0 or height <= 0:
+        return f"preflight: bad dimensions {width}x{height}"
+    return None
+
+
+def preflight(items: list[tuple[int, Path]]) -> tuple[list[tuple[int, Path]], list[tuple[int, str]]]:
+    """Split ``(post_id, path)`` items into the ones that pass and ``(post_id, message)`` failures.
+
+    A file that vanished since it was listed is dropped, as the caller drops
+    a missing path. One the OS could not read is passed on: the ladder decodes
+    it for real, and it does not quarantine an I/O error either.
+    """
+    passed: list[tuple[int, Path]] = []
+    failed: list[tuple[int, str]] = []
+    for pid, path in items:
+        try:
+            reason = check_image(path)
+        except FileNotFoundError:
+            log.warning("%s is no longer on disk, dropped from this batch", path)
+            continue
+        except OSError as exc:
+            log.warning("could not preflight %s, leaving it to the ladder: %s", path, exc)
+            reason = None
+        if reason is None:
+            passed.append((pid, path))
+        else:
+            failed.append((pid, reason))
+    return passed, failed
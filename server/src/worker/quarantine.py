@@ -0,0 +1,101 @@
+"""Process-wide memory of files that failed to decode.
+
+The ladder isolates an unreadable image and hands the failure back to TS. But
+the same file comes straight back: another model's backfill selects it (the
+blacklist is per model), a retried task carries it again after a timeout, an
+``analyze`` batch picks it up next to the ``embedding`` one. Each time it costs
+a failed full batch and a bisection to find it again.
+
+So failures the worker has *proven* — a decode that raised on that one file
+alone, or a preflight rejection — are remembered here, and ``_resolve_items``
+fails a remembered file before it is batched. The key is ``(path, size,
+mtime)``: a file that is rewritten (re-downloaded, repaired, rotated) is a new
+key and gets a fresh chance. In-process and bounded — a restart forgets it all,
+which is the right amount of forgiveness for a cache of *decode* failures.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+#: How many bad files to remember. Entries are a path and a message, so this
+#: is tiny next to anything else the worker holds.
+QUARANTINE_SIZE = int(os.environ.get("PICTORIA_QUARANTINE_SIZE", "4096"))
+
+_Key = tuple[str, int, int]
+
+
+def _key(path: Path) -> _Key | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return str(path), st.st_size, st.st_mtime_ns
+
+
+class Quarantine:
+    """A thread-safe LRU of ``(path, size, mtime) -> failure message``.
+
+    Thread-safe because its callers are: ``_resolve_items`` runs under
+    ``asyncio.to_thread`` and the ladder records from its worker threads.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._entries: OrderedDict[_Key, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.evicted = 0
+
+    def add(self, path: Path, reason: str) -> None:
+        key = _key(path)
+        if key is None:
+            return
+        with self._lock:
+            if key not in self._entries:
+                self.added += 1
+            self._entries[key] = reason
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def check(self, path: Path) -> str | None:
+        """The remembered failure for ``path`` as it is on disk now, if any."""
+        key = _key(path)
+        with self._lock:
+            reason = self._entries.get(key) if key is not None else None
+            if reason is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return reason
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.added = self.evicted = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "added": self.added,
+                "evicted": self.evicted,
+            }
+
+
+#: The one quarantine every handler shares.
+QUARANTINE = Quarantine(QUARANTINE_SIZE)
@@ -0,0 +1,54 @@
+"""Whole-library SILVA rescoring straight off the exported vector matrix.
+
+After a head is re-published, every post needs a new score. Through the
+``silva`` task that is ``SILVA_TASK_BATCH = 64`` vectors per payload — ~3,500
+queue round trips and ~1.3 GB of base64 for 220k posts. ``silva-rescore``
+takes the same raw float32 matrix file ``dedup`` does, streams it through the
+heads in large chunks, and writes the scores as a second raw file next to it:
+``(count, len(scorers))`` float32, row-major, rows parallel to the matrix (and
+so to the id array TS kept when exporting it).
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+
+#: Suffix of the scores file written next to the matrix.
+SCORES_SUFFIX = ".scores.f32"
+
+
+def scores_path(matrix_path: Path) -> Path:
+    return matrix_path.with_name(matrix_path.name + SCORES_SUFFIX)
+
+
+def rescore_matrix(matrix: np.ndarray, scorers: Sequence[str], chunk_size: int, out: Path) -> None:
+    """Score every row of ``matrix`` with each of ``scorers`` into ``out``.
+
+    ``matrix`` is usually a read-only memmap: each chunk is read once and
+    handed to every head, and the output goes through a writable memmap, so
+    neither side is ever fully resident. Written to a temporary name and
+    renamed, so a reader never sees a half-written file under ``out``.
+    """
+    from ai.silva_scorer import load_head  # noqa: PLC0415  # lazy: loads the heads
+
+    heads = [load_head(scorer) for scorer in scorers]
+    count = matrix.shape[0]
+    tmp = out.with_name(out.name + ".tmp")
+    if count == 0 or not heads:
+        tmp.write_bytes(b"")
+    else:
+        result = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(count, len(heads)))
+        for start in range(0, count, chunk_size):
+            chunk = np.array(matrix[start : start + chunk_size], dtype=np.float32)
+            for j, head in enumerate(heads):
+                result[start : start + len(chunk), j] = head.score(chunk)
+        result.flush()
+        # Drop the map before the rename: Windows will not replace a mapped file.
+        del result
+    tmp.replace(out)
@@ -0,0 +1,90 @@
+"""Sidecar files: large task payloads and results kept out of ``tasks.sqlite``.
+
+``dedup`` and ``silva-rescore`` already pass their matrices by path, but every
+other task still moved its data as a JSON row in the queue database: an
+embedding batch's vectors, a danbooru import's ``importedIds``, a tagger
+batch's results. ``tasks.sqlite`` admits one writer at a time, and each of
+those rows was written once on submit, once on completion and then sat in
+the table until retention swept it.
+
+Above ``SIDECAR_THRESHOLD`` bytes of JSON, the value is written instead to
+``.pictoria/sidecar/<sha256>.json`` and the queue carries only a reference::
+
+    {"$sidecar": {"path": "<absolute path>", "sha256": "<hex>", "bytes": 123}}
+
+Both directions use the same shape. TS spills payloads and reads results;
+this process reads payloads and spills results (``handlers.with_sidecars``).
+The reader resolves the path inside the library root and checks the size and
+hash before parsing, so a reference can neither point outside the library nor
+hand back another task's file. Cleanup is the API's: it deletes a file once
+its task has been acknowledged, and it sweeps anything orphaned by a timeout
+or crash (``apps/api/src/sidecar.ts``). This process never deletes one.
+Retries re-read the same payload file.
+
+The threshold is read from ``PICTORIA_SIDECAR_THRESHOLD``. ``sidecar.ts``
+reads the same variable for payloads, with the same default.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+#: Under ``.pictoria/``. Mirrors ``paths.ts``'s ``sidecarDir``.
+SIDECAR_DIRNAME = "sidecar"
+
+#: The envelope key. A ``$`` cannot start a payload field any handler reads.
+SIDECAR_KEY = "$sidecar"
+
+#: JSON bytes above which a value goes to a file. A text embedding (~6 KB) or
+#: a thumbnail result stays inline. A 64-image embedding batch (~300 KB of
+#: base64) or a full ``importedIds`` list does not.
+SIDECAR_THRESHOLD = int(os.environ.get("PICTORIA_SIDECAR_THRESHOLD", str(256 * 1024)))
+
+# Compact and non-ASCII-preserving, like cairnq's own row encoding, so the
+# size compared against the threshold is the size the row would have had.
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def is_sidecar(value: object) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and SIDECAR_KEY in value
+
+
+def read_sidecar(ref: dict[str, Any], resolve: Callable[[str], Path]) -> Any:
+    """Load the value ``ref`` points at. ``resolve`` is the library-root guard."""
+    path = resolve(ref["path"])
+    data = path.read_bytes()
+    if len(data) != ref["bytes"] or hashlib.sha256(data).hexdigest() != ref["sha256"]:
+        msg = f"sidecar {path.name} does not match its reference"
+        raise ValueError(msg)
+    return json.loads(data)
+
+
+def spill(value: Any, directory: Path, threshold: int | None = None) -> Any:
+    """``value`` itself if it is small, else a reference to a file holding it.
+
+    The file name is the content hash, so a second identical value reuses the
+    file. Its mtime is refreshed so the API's age sweep counts from the latest
+    task that refers to it.
+    """
+    data = _ENCODER.encode(value).encode()
+    if len(data) <= (SIDECAR_THRESHOLD if threshold is None else threshold):
+        return value
+    sha = hashlib.sha256(data).hexdigest()
+    path = directory / f"{sha}.json"
+    if path.exists():
+        os.utime(path)
+    else:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Per process and thread: two handlers may spill identical results at once.
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+    return {SIDECAR_KEY: {"path": str(path), "sha256": sha, "bytes": len(data)}}
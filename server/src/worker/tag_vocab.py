@@ -0,0 +1,237 @@
+"""Precomputed SigLIP text embeddings for the tag vocabulary.
+
+Most text searches are a tag name — ``green_eyes``, ``hatsune_miku`` — or its
+localized display name, and every first search for one paid a text forward
+(plus the model load after a restart). The ``tag-vocab`` task encodes the
+vocabulary ahead of time; ``handle_text_embed`` then answers those prompts
+with a dict lookup and one row read.
+
+On disk, under ``.pictoria/tag-vocab/<model-id hash>/``:
+
+* ``vectors.f32`` — the rows, raw float32, ``dim`` wide, read through a memmap;
+* ``index.txt``   — one normalized prompt per line, row ``i`` on line ``i``;
+* ``meta.json``   — ``{modelId, dim}``;
+* ``through.txt`` — the ``tags.rowid`` the scheduler has sent up to (see
+  :meth:`TagVocab.advance`).
+
+Both data files are append-only: new tags add rows, nothing is rewritten. The
+vectors are written before the index lines, so a crash mid-append leaves at
+worst some trailing rows the index does not point at, which the next open
+ignores. A new ``MODEL_ID`` gets a fresh directory, like the prompt cache — and with it
+``through`` back at 0, so the scheduler re-sends every tag for the new model
+without having to notice the change itself.
+
+Every row is the forward of exactly the text it is indexed under, so a lookup
+returns what a forward would — the vocabulary only decides *which* texts are
+worth precomputing: the tag name, its space-separated form (what people type),
+and its display name in each ``data/tag.<lang>.json`` table.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import shutil
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from worker.text_cache import normalize_prompt
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+log = logging.getLogger("worker.tag_vocab")
+
+VOCAB_DIRNAME = "tag-vocab"
+
+#: ``server/data`` — the i18n tables ``scripts/tags/build_tag_i18n.py`` writes.
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+#: Same rule as ``apps/api/src/tag-i18n.ts``: ``lang`` becomes part of a path.
+_LANG = re.compile(r"^[a-z]{2,3}(?:-[A-Za-z]+)*$")
+
+
+def load_display_names(langs: Iterable[str], data_dir: Path = DATA_DIR) -> list[dict[str, str]]:
+    """The ``tag.<lang>.json`` tables for ``langs``; a missing or bad name is skipped.
+
+    Parsed once per file version: every ``tag-vocab`` task asks for the same
+    few tables, each several MB of JSON. Treat the dicts as read-only — they
+    are shared between calls.
+    """
+    tables: list[dict[str, str]] = []
+    for lang in langs:
+        path = data_dir / f"tag.{lang}.json"
+        if not _LANG.match(lang) or not path.is_file():
+            log.warning("no tag display names for %r", lang)
+            continue
+        tables.append(_read_table(path, path.stat().st_mtime_ns))
+    return tables
+
+
+@lru_cache(maxsize=8)
+def _read_table(path: Path, _mtime_ns: int) -> dict[str, str]:
+    """``path`` parsed; the mtime is only part of the key, so a rebuilt table is re-read."""
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def vocab_texts(tags: Iterable[str], tables: list[dict[str, str]]) -> list[str]:
+    """Every prompt worth precomputing for ``tags``, normalized and deduplicated."""
+    texts: dict[str, None] = {}
+    for tag in tags:
+        for text in (tag, tag.replace("_", " "), *(t[tag] for t in tables if tag in t)):
+            key = normalize_prompt(text)
+            if key:
+                texts[key] = None
+    return list(texts)
+
+
+class TagVocab:
+    """The on-disk vocabulary matrix and its prompt → row index."""
+
+    def __init__(self, root: Path, model_id: str) -> None:
+        self.model_id = model_id
+        self.dir = root / hashlib.sha256(model_id.encode()).hexdigest()[:16]
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._count = 0
+        self._matrix: np.ndarray | None = None
+        self.dim: int | None = None
+        self.through = 0
+        self.hits = 0
+        self._open(root)
+
+    @property
+    def _vectors(self) -> Path:
+        return self.dir / "vectors.f32"
+
+    @property
+    def _index(self) -> Path:
+        return self.dir / "index.txt"
+
+    @property
+    def _through(self) -> Path:
+        return self.dir / "through.txt"
+
+    def _open(self, root: Path) -> None:
+        root.mkdir(parents=True, exist_ok=True)
+        for other in root.iterdir():
+            if other.is_dir() and other != self.dir:
+                log.info("dropping tag vocabulary of a previous model: %s", other.name)
+                shutil.rmtree(other, ignore_errors=True)
+        self.dir.mkdir(exist_ok=True)
+        if self._through.exists():
+            self.through = int(self._through.read_text().strip() or 0)
+        meta = self.dir / "meta.json"
+        if not meta.exists():
+            return
+        self.dim = int(json.loads(meta.read_text())["dim"])
+        stored = self._vectors.stat().st_size // (4 * self.dim) if self._vectors.exists() else 0
+        text = self._index.read_text(encoding="utf-8") if self._index.exists() else ""
+        lines = text.splitlines()
+        if not text.endswith("\n") and lines:
+            lines.pop()  # a line cut short by a crash: its text is not the one encoded
+        if len(lines) > stored:
+            lines = lines[:stored]
+        if "".join(f"{line}\n" for line in lines) != text:
+            log.warning("tag vocabulary index was cut short; keeping %d rows", len(lines))
+            self._index.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+        self._rows = {line: i for i, line in enumerate(lines)}
+        self._count = len(lines)
+        self._remap()
+
+    def _remap(self) -> None:
+        rows = self._count
+        self._matrix = np.memmap(self._vectors, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def lookup(self, prompt: str) -> np.ndarray | None:
+        """The precomputed vector for ``prompt``, or ``None`` if it is not a vocabulary text."""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None or self._matrix is None:
+                return None
+            self.hits += 1
+            return np.array(self._matrix[row])
+
+    def vectors(self, texts: list[str]) -> np.ndarray:
+        """Rows for ``texts`` as one ``(len(texts), dim)`` array — all must be present.
+
+        For bulk use (``zero-shot-tags``), so it does not count as search hits.
+        """
+        with self._lock:
+            rows = [self._rows[normalize_prompt(t)] for t in texts]
+            if not rows:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return np.array(self._matrix[rows])
+
+    def missing(self, texts: Iterable[str]) -> list[str]:
+        """The normalized ``texts`` that have no row yet, in order."""
+        with self._lock:
+            return [t for t in dict.fromkeys(normalize_prompt(t) for t in texts) if t and t not in self._rows]
+
+    def append(self, texts: list[str], vectors: np.ndarray) -> None:
+        """Add rows for ``texts`` (normalized). Vectors first, then the index.
+
+        A text that gained a row since :meth:`missing` (two builds racing) is
+        skipped rather than stored twice.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape[0] != len(texts):
+            msg = f"{len(texts)} texts but {vectors.shape[0]} vectors"
+            raise ValueError(msg)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                (self.dir / "meta.json").write_text(json.dumps({"modelId": self.model_id, "dim": self.dim}))
+            elif vectors.shape[1] != self.dim:
+                msg = f"vectors are {vectors.shape[1]}-d, vocabulary is {self.dim}-d"
+                raise ValueError(msg)
+            keep: list[int] = []
+            taken: set[str] = set()
+            for i, text in enumerate(texts):
+                if text not in self._rows and text not in taken:
+                    taken.add(text)
+                    keep.append(i)
+            if not keep:
+                return
+            # Trailing rows from a crashed append have no index line; write over
+            # them. The map is dropped first — Windows refuses to resize a mapped file.
+            self._matrix = None
+            with self._vectors.open("ab") as f:
+                f.truncate(self._count * 4 * self.dim)
+                f.write(vectors[keep].tobytes())
+            with self._index.open("a", encoding="utf-8") as f:
+                f.writelines(f"{texts[i]}\n" for i in keep)
+            for i in keep:
+                self._rows[texts[i]] = self._count
+                self._count += 1
+            self._remap()
+
+    def advance(self, through: int) -> None:
+        """Record that every tag up to ``tags.rowid == through`` is encoded.
+
+        The scheduler's cursor, kept here rather than in the API process so it
+        survives a restart and goes away with the rows it describes. Call it only
+        after :meth:`append` returned: a crash in between re-sends one chunk,
+        which :meth:`missing` then skips. Never moves backwards.
+        """
+        with self._lock:
+            if through <= self.through:
+                return
+            tmp = self._through.with_suffix(".tmp")
+            tmp.write_text(str(through))
+            tmp.replace(self._through)
+            self.through = through
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"modelId": self.model_id, "rows": len(self._rows), "hits": self.hits, "through": self.through}
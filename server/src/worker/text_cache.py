@@ -0,0 +1,168 @@
+"""Two-level cache of SigLIP text embeddings: an in-memory LRU over files on disk.
+
+Search prompts repeat — the same tag query from the same user, a saved search,
+a UI that re-runs the last query on every page load — and each repeat paid a
+full text-tower forward on the interactive path, plus the model load after
+every restart. A cached prompt now comes back from memory in microseconds,
+or from one small file read after a restart, without touching the model.
+
+Keys are ``(model id, normalized prompt)``. The disk store lives under
+``.pictoria/text-embed-cache/<model-id hash>/``, one raw float32 file per
+prompt plus a ``meta.json`` holding the model's logit ``scale`` / ``bias``
+(so a hit needs no model for those either). Changing ``MODEL_ID`` therefore
+lands in a fresh directory; the old model's directories are deleted when the
+cache opens. A file is a cache, not a database — §D1 still holds.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+log = logging.getLogger("worker.text_cache")
+
+#: Prompts held in memory. One entry is a 1152-d float32 vector (4.5 KB).
+MEMORY_ENTRIES = int(os.environ.get("PICTORIA_TEXT_CACHE_ENTRIES", "2048"))
+
+#: Prompt files kept on disk (~4.5 KB each). Past this the least recently
+#: *used* files go — a hit refreshes its file's mtime.
+DISK_ENTRIES = int(os.environ.get("PICTORIA_TEXT_CACHE_DISK_ENTRIES", "20000"))
+
+CACHE_DIRNAME = "text-embed-cache"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """NFKC plus collapsed whitespace: what the user cannot see, the key ignores.
+
+    Not lowercased — the SigLIP 2 tokenizer is case-sensitive, so ``Saber`` and
+    ``saber`` are different inputs with different vectors.
+    """
+    return " ".join(unicodedata.normalize("NFKC", prompt).split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextEmbedCache:
+    """Thread-safe two-level cache for one model's text embeddings."""
+
+    def __init__(self, root: Path, model_id: str, *, memory_entries: int = MEMORY_ENTRIES, disk_entries: int = DISK_ENTRIES) -> None:
+        self.model_id = model_id
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.dir = root / _digest(model_id)[:16]
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._scale_bias: tuple[float, float] | None = None
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._open(root)
+
+    def _open(self, root: Path) -> None:
+        root.mkdir(parents=True, exist_ok=True)
+        for other in root.iterdir():
+            if other.is_dir() and other != self.dir:
+                log.info("dropping text-embed cache of a previous model: %s", other.name)
+                shutil.rmtree(other, ignore_errors=True)
+        self.dir.mkdir(exist_ok=True)
+        meta = self.dir / "meta.json"
+        if meta.exists():
+            data = json.loads(meta.read_text())
+            if data.get("modelId") == self.model_id and "scale" in data:
+                self._scale_bias = (float(data["scale"]), float(data["bias"]))
+        self._prune()
+
+    # ── lookups ──────────────────────────────────────────────────────────
+
+    def get_memory(self, prompt: str) -> np.ndarray | None:
+        """The in-memory level only — cheap enough to call on the event loop."""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vec
+
+    def get_disk(self, prompt: str) -> np.ndarray | None:
+        """The on-disk level; promotes a hit into memory. Counts a miss if absent."""
+        key = normalize_prompt(prompt)
+        path = self.dir / f"{_digest(key)}.f32"
+        try:
+            vec = np.fromfile(path, dtype=np.float32)
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, vec)
+        return vec
+
+    @property
+    def scale_bias(self) -> tuple[float, float] | None:
+        return self._scale_bias
+
+    # ── writes ───────────────────────────────────────────────────────────
+
+    def put(self, prompt: str, vec: np.ndarray) -> None:
+        key = normalize_prompt(prompt)
+        vec = np.ascontiguousarray(vec, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+            self._writes += 1
+            prune = self._writes % 256 == 0
+        path = self.dir / f"{_digest(key)}.f32"
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        vec.tofile(tmp)
+        tmp.replace(path)
+        if prune:
+            self._prune()
+
+    def set_scale_bias(self, scale: float, bias: float) -> None:
+        if self._scale_bias == (scale, bias):
+            return
+        self._scale_bias = (scale, bias)
+        tmp = self.dir / "meta.json.tmp"
+        tmp.write_text(json.dumps({"modelId": self.model_id, "scale": scale, "bias": bias}))
+        tmp.replace(self.dir / "meta.json")
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self) -> None:
+        files = list(self.dir.glob("*.f32"))
+        excess = len(files) - self.disk_entries
+        if excess <= 0:
+            return
+        for path in sorted(files, key=lambda p: p.stat().st_mtime_ns)[:excess]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "modelId": self.model_id,
+                "memoryEntries": len(self._memory),
+                "memoryHits": self.memory_hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,123 @@
+"""Optional model preloading at worker start.
+
+The first GPU task after a restart pays for the torch import and the weight
+load — tens of seconds, which is most of why ``scheduler.ts`` gives each call a
+5-minute budget — and the first text search after a restart pays the same for
+SigLIP. ``--warm`` / ``PICTORIA_WARM_MODELS`` moves that cost to startup: the
+named models load on a background thread while the Workers are already
+polling. A task that arrives mid-warm-up and needs the model being warmed
+waits on that model's load gate in ``ai.registry`` and then reuses it instead
+of loading it a second time; a task for any other model (already resident, or
+one it loads itself) goes ahead — the registry never holds its global lock
+across a load, so warm-up blocks nothing but the one model it is loading.
+
+Warm-up runs off the event loop, so lease renewals and heartbeats keep going
+(the loop only stalls for the GIL-heavy moments of the torch import itself,
+well inside a lease). Warmed models go through ``ai.registry`` like any
+other, so an idle timeout still unloads them later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+log = logging.getLogger("worker.warmup")
+
+
+def _embedding() -> None:
+    from ai import siglip_embed  # noqa: PLC0415  # lazy: defer the ML stack
+
+    siglip_embed.get_model()
+    siglip_embed.get_processor()
+
+
+def _text_embed() -> None:
+    from ai import siglip_embed  # noqa: PLC0415  # lazy: defer the ML stack
+
+    _embedding()
+    siglip_embed.get_logit_scale_bias()
+
+
+def _tagger() -> None:
+    from services.wd_tagging import get_tagger  # noqa: PLC0415  # lazy: defer the ML stack
+
+    get_tagger()
+
+
+def _waifu() -> None:
+    from ai.waifu_scorer import get_waifu_scorer  # noqa: PLC0415  # lazy: defer the ML stack
+
+    get_waifu_scorer()
+
+
+def _silva(scorer: str) -> Callable[[], None]:
+    def _load() -> None:
+        from ai.silva_scorer import load_head  # noqa: PLC0415  # lazy: defer the ML stack
+
+        load_head(scorer)
+
+    return _load
+
+
+#: Warm-up targets, named after the task that uses them. ``text-embed`` is the
+#: SigLIP model ``embedding`` loads, plus the text-side processor and scale.
+WARMERS: dict[str, Callable[[], None]] = {
+    "embedding": _embedding,
+    "text-embed": _text_embed,
+    "tagger": _tagger,
+    "waifu": _waifu,
+    "silva": _silva("silva"),
+    "silva_luna": _silva("silva_luna"),
+}
+
+
+def parse_warm(spec: str | None) -> list[str]:
+    """``"tagger, waifu"`` → ``["tagger", "waifu"]``; ``all`` is every target.
+
+    Raises ``ValueError`` on an unknown name — a typo in a startup flag should
+    stop the worker, not silently warm nothing.
+    """
+    if not spec:
+        return []
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    if names == ["all"]:
+        return list(WARMERS)
+    unknown = [n for n in names if n not in WARMERS]
+    if unknown:
+        msg = f"unknown warm-up target(s) {unknown}; choose from {sorted(WARMERS)} or 'all'"
+        raise ValueError(msg)
+    return list(dict.fromkeys(names))
+
+
+def warm_models(names: Sequence[str]) -> dict[str, float]:
+    """Load each named target in turn; returns seconds per target.
+
+    A target that fails to load is logged and skipped — its first real task
+    will hit the same error and report it the usual way.
+    """
+    timings: dict[str, float] = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            WARMERS[name]()
+        except Exception:
+            log.exception("warm-up of %s failed", name)
+            continue
+        timings[name] = time.perf_counter() - started
+        log.info("warmed %s in %.1fs", name, timings[name])
+    if timings:
+        log.info("warm-up done: %s", ", ".join(f"{n} {s:.1f}s" for n, s in timings.items()))
+    return timings
+
+
+async def warm_in_background(names: Sequence[str]) -> dict[str, float]:
+    """:func:`warm_models` on a worker thread, so the event loop keeps renewing leases."""
+    if not names:
+        return {}
+    return await asyncio.to_thread(warm_models, names)
@@ -0,0 +1,80 @@
+"""Zero-shot tag and rating suggestions from stored SigLIP 2 image vectors.
+
+WDTagger needs every image decoded and a ViT-L forward per post. Every post
+already has an L2-normalised SigLIP 2 vector, and SigLIP's text and image
+towers share one space — so scoring the whole library against a label
+vocabulary is a single ``(posts, dim) @ (dim, labels)`` matmul, chunked over
+posts, with the model's own sigmoid recipe turning similarities into
+probabilities:
+
+    p = sigmoid(scale * cos(image, text) + bias)
+
+No image is opened. Quality is SigLIP's zero-shot quality, not a trained
+tagger's, which is why these are *suggestions* with probabilities attached.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def suggest_labels(  # noqa: PLR0913 — two label sets, the sigmoid recipe, and the knobs
+    images: np.ndarray,
+    tags: np.ndarray,
+    ratings: np.ndarray,
+    scale: float,
+    bias: float,
+    *,
+    top_k: int,
+    threshold: float,
+    chunk_size: int,
+) -> tuple[list[list[tuple[int, float]]], list[int]]:
+    """Score every image against the tag and rating label matrices in one pass.
+
+    Returns ``(suggestions, rating)``. ``suggestions[i]`` is the image's
+    top-``top_k`` tags with ``p >= threshold`` as ``(tag row, p)``, best first.
+    ``rating[i]`` is the row of the most probable rating label, with no
+    threshold: every post has *some* rating. With no rating labels it is all
+    ``-1``. Same device policy as ``worker.dedup``: CUDA in fp16 when
+    available, else CPU in fp32.
+    """
+    import torch  # noqa: PLC0415  # lazy: defer the ML stack
+
+    n = images.shape[0]
+    n_tags = tags.shape[0]
+    if n_tags + ratings.shape[0] == 0:
+        return [[] for _ in range(n)], [-1] * n
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dtype = torch.float16 if device == "cuda" else torch.float32
+
+    def _labels(matrix: np.ndarray) -> torch.Tensor:
+        # A copy, not a view: the image side is a read-only memmap, which
+        # ``from_numpy`` only takes with a warning.
+        t = torch.from_numpy(np.array(matrix, dtype=np.float32)).to(device=device, dtype=dtype)
+        return torch.nn.functional.normalize(t, dim=1)
+
+    # Tags and ratings share one matmul; the split is by column afterwards.
+    text = _labels(np.concatenate([tags, ratings]))
+    k = min(top_k, n_tags)
+
+    suggestions: list[list[tuple[int, float]]] = []
+    rating: list[int] = []
+    for start in range(0, n, chunk_size):
+        # One chunk of the (possibly memmapped) matrix at a time: the whole
+        # library never has to sit in VRAM, only the label matrix does.
+        chunk = _labels(images[start : start + chunk_size])
+        # The sigmoid in fp32: scale is ~100, and fp16 logits lose the tail.
+        probs = torch.sigmoid(scale * (chunk @ text.T).float() + bias)
+        if ratings.shape[0]:
+            rating += probs[:, n_tags:].argmax(dim=1).cpu().tolist()
+        else:
+            rating += [-1] * probs.shape[0]
+        if k == 0:
+            suggestions += [[] for _ in range(probs.shape[0])]
+            continue
+        top_p, top_i = probs[:, :n_tags].topk(k, dim=1)
+        for row_p, row_i in zip(top_p.cpu().numpy(), top_i.cpu().numpy(), strict=True):
+            keep = row_p >= threshold
+            suggestions.append([(int(i), round(float(p), 4)) for i, p in zip(row_i[keep], row_p[keep], strict=True)])
+    return suggestions, rating
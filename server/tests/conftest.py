@@ -0,0 +1,49 @@
+"""Fixtures shared by the worker tests that need an unconfigured PIL."""
+
+from __future__ import annotations
+
+import os
+import struct
+import subprocess
+import sys
+import textwrap
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+@pytest.fixture
+def huge_png(tmp_path) -> Path:
+    """A header-only 14000 x 14000 PNG (196 MP): past PIL's default pixel cap, yet a few bytes."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    side = 14000
+    ihdr = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    path = tmp_path / "scan.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IEND", b""))
+    return path
+
+
+@pytest.fixture
+def fresh_process() -> Callable[[str], str]:
+    """Runs a script in a new interpreter (nothing imported yet, PIL at its defaults) and returns its stdout."""
+    src = Path(__file__).resolve().parent.parent / "src"
+
+    def run(script: str) -> str:
+        done = subprocess.run(  # noqa: S603
+            [sys.executable, "-c", textwrap.dedent(script)],
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": str(src)},
+        )
+        return done.stdout.strip()
+
+    return run
@@ -0,0 +1,64 @@
+"""``ai.image_io`` — the shared decode pool in front of every image model."""
+
+from __future__ import annotations
+
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from ai.image_io import decode_images, fit_size, load_image
+
+
+def test_fit_size_keeps_the_shorter_side_at_least_min_side() -> None:
+    assert fit_size((1000, 800), 224) == (280, 224)
+    assert fit_size((800, 1000), 224) == (224, 280)
+    # Never upscales.
+    assert fit_size((100, 50), 224) == (100, 50)
+
+
+def test_decode_images_preserves_order_and_shrinks(tmp_path) -> None:
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"{i}.png"
+        Image.new("RGB", (400 + i, 300), (i * 40, 0, 0)).save(path)
+        paths.append(path)
+
+    decoded = decode_images(paths, min_side=30)
+    assert [img.getpixel((0, 0))[0] for img in decoded] == [i * 40 for i in range(5)]
+    assert all(min(img.size) == 30 for img in decoded)
+
+
+def test_palette_transparency_survives_as_alpha(tmp_path) -> None:
+    path = tmp_path / "p.png"
+    image = Image.new("P", (64, 64), 0)
+    image.info["transparency"] = 0
+    image.save(path, transparency=0)
+    assert load_image(path, min_side=16).mode == "RGBA"
+
+
+def test_one_bad_image_fails_the_batch(tmp_path) -> None:
+    good = tmp_path / "good.png"
+    Image.new("RGB", (8, 8)).save(good)
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"not an image")
+    with pytest.raises(OSError, match="cannot identify"):
+        decode_images([good, bad])
+
+
+def test_jpeg_draft_still_covers_min_side(monkeypatch, tmp_path) -> None:
+    # 1/8 scale would be 250x200 — under 224, so draft must stop at 1/4.
+    drafted: list[tuple[int, int]] = []
+    draft = JpegImagePlugin.JpegImageFile.draft
+
+    def _spy(self, mode, size):
+        result = draft(self, mode, size)
+        drafted.append(self.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", _spy)
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (2000, 1600), (200, 30, 30)).save(path, exif=Image.Exif())
+    image = load_image(path, min_side=224)
+    # The decoder really ran at 1/4 scale, then resize took it the rest of the way.
+    assert drafted == [(500, 400)]
+    assert image.size == (280, 224)
+    assert image.getpixel((140, 112))[0] > 180
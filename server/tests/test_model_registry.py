@@ -0,0 +1,132 @@
+"""``ai.registry`` — model residency under a byte budget and an idle timeout."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import torch
+
+from ai.registry import ModelRegistry
+
+# float32 Linear(16, 16) with bias: 16*16*4 + 16*4 bytes.
+LINEAR_BYTES = 16 * 16 * 4 + 16 * 4
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _linear() -> torch.nn.Module:
+    return torch.nn.Linear(16, 16)
+
+
+def test_loads_once_and_measures_footprint() -> None:
+    registry = ModelRegistry()
+    calls = []
+
+    def _load():
+        calls.append(1)
+        return _linear()
+
+    first = registry.get("a", _load)
+    assert registry.get("a", _load) is first
+    assert calls == [1]
+    assert registry.resident_bytes == LINEAR_BYTES
+    assert [e.kind for e in registry.events] == ["load"]
+
+
+def test_budget_evicts_least_recently_used() -> None:
+    registry = ModelRegistry(budget_bytes=2 * LINEAR_BYTES)
+    registry.get("a", _linear)
+    registry.get("b", _linear)
+    registry.get("a", _linear)  # b is now the LRU
+    registry.get("c", _linear)
+
+    assert [r["name"] for r in registry.stats()["resident"]] == ["a", "c"]
+    evict = registry.events[-1]
+    assert (evict.kind, evict.name, evict.reason) == ("evict", "b", "budget")
+
+
+def test_oversize_model_still_loads_alone() -> None:
+    registry = ModelRegistry(budget_bytes=LINEAR_BYTES // 2)
+    registry.get("a", _linear)
+    registry.get("b", _linear)
+    assert [r["name"] for r in registry.stats()["resident"]] == ["b"]
+
+
+def test_idle_models_are_evicted() -> None:
+    clock = _Clock()
+    registry = ModelRegistry(idle_seconds=60, clock=clock)
+    registry.get("a", _linear)
+    clock.now = 30
+    registry.get("b", _linear)
+    clock.now = 70
+    assert registry.evict_idle() == ["a"]
+    assert [r["name"] for r in registry.stats()["resident"]] == ["b"]
+
+
+def test_dependency_is_shared_and_evicts_its_dependents() -> None:
+    clock = _Clock()
+    registry = ModelRegistry(idle_seconds=60, clock=clock)
+    backbone = registry.get("clip", _linear)
+    registry.get("waifu", lambda: SimpleNamespace(clip=backbone, mlp=_linear()), requires=("clip",))
+    # The backbone's tensors count once, under clip.
+    assert registry.resident_bytes == 2 * LINEAR_BYTES
+
+    # Using waifu keeps its backbone warm too.
+    clock.now = 50
+    registry.get("waifu", _linear)
+    clock.now = 100
+    assert registry.evict_idle() == []
+
+    assert registry.evict("clip")
+    assert registry.stats()["resident"] == []
+    assert [(e.name, e.reason) for e in registry.events if e.kind == "evict"] == [
+        ("waifu", "requires clip"),
+        ("clip", "manual"),
+    ]
+
+
+def test_a_slow_load_blocks_neither_hits_nor_stats() -> None:
+    registry = ModelRegistry()
+    registry.get("a", _linear)
+    loading = threading.Event()
+    release = threading.Event()
+
+    def _slow():
+        loading.set()
+        assert release.wait(5)
+        return _linear()
+
+    with ThreadPoolExecutor(2) as pool:
+        slow = pool.submit(registry.get, "b", _slow)
+        assert loading.wait(5)
+        # Both would have waited out the whole load under one global lock.
+        assert pool.submit(registry.get, "a", _linear).result(timeout=1) is not None
+        assert [r["name"] for r in pool.submit(registry.stats).result(timeout=1)["resident"]] == ["a"]
+        release.set()
+        slow.result(timeout=5)
+
+
+def test_concurrent_gets_for_one_model_load_it_once() -> None:
+    registry = ModelRegistry()
+    calls = []
+    release = threading.Event()
+
+    def _load():
+        calls.append(1)
+        assert release.wait(5)
+        return _linear()
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(registry.get, "a", _load) for _ in range(4)]
+        release.set()
+        values = {id(f.result(timeout=5)) for f in futures}
+    assert calls == [1]
+    assert len(values) == 1
@@ -0,0 +1,79 @@
+"""``ai.silva_head`` — the NumPy SILVA forward against the torch model it replaces."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ai import silva_head
+from ai.silva_head import SilvaHead, export_head
+
+torch = pytest.importorskip("torch")
+aesthetic = pytest.importorskip("silva.models.aesthetic")
+
+
+def _random_head(*, hidden_dims: list[int], n_residual_blocks: int, calibrated: bool):
+    torch.manual_seed(0)
+    head = aesthetic.EmbeddingAestheticModel(64, hidden_dims=hidden_dims, n_residual_blocks=n_residual_blocks)
+    with torch.no_grad():
+        for p in head.parameters():
+            p.normal_(0.0, 0.2)
+    if calibrated:
+        lat = torch.linspace(-3.0, 3.0, aesthetic.N_CAL_KNOTS)
+        head.set_calibration(lat, torch.sigmoid(lat) ** 1.5)
+    return head.eval()
+
+
+def _vectors(n: int = 500) -> np.ndarray:
+    x = np.random.default_rng(1).standard_normal((n, 64)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize(
+    ("hidden_dims", "n_residual_blocks", "calibrated"),
+    [([], 0, True), ([128, 32], 0, True), ([48], 2, True), ([48], 1, False)],
+)
+def test_matches_the_torch_calibrated_score(tmp_path, hidden_dims, n_residual_blocks, calibrated) -> None:
+    head = _random_head(hidden_dims=hidden_dims, n_residual_blocks=n_residual_blocks, calibrated=calibrated)
+    path = tmp_path / "head.npz"
+    export_head(head, path, repo_id="test/head")
+
+    x = _vectors()
+    with torch.inference_mode():
+        expected = head(torch.from_numpy(x))["calibrated_score"].numpy()
+    got = SilvaHead.load(path).score(x)
+    np.testing.assert_allclose(got, expected, atol=1e-5, rtol=0)
+
+
+def test_loading_and_scoring_never_imports_torch(tmp_path) -> None:
+    path = tmp_path / "head.npz"
+    export_head(_random_head(hidden_dims=[32], n_residual_blocks=1, calibrated=True), path, repo_id="test/head")
+    script = textwrap.dedent(f"""
+        import sys
+        import numpy as np
+        from ai.silva_head import SilvaHead
+        from ai.registry import REGISTRY
+        head = REGISTRY.get("h", lambda: SilvaHead.load({str(path)!r}))
+        head.score(np.ones((2, 64), dtype=np.float32))
+        REGISTRY.clear()
+        assert "torch" not in sys.modules, "torch was imported"
+    """)
+    src = Path(__file__).resolve().parent.parent / "src"
+    subprocess.run([sys.executable, "-c", script], check=True, env={**os.environ, "PYTHONPATH": str(src)})  # noqa: S603
+
+
+def test_heads_live_in_the_configured_library(monkeypatch, tmp_path) -> None:
+    monkeypatch.delenv("PICTORIA_SILVA_NPZ_DIR", raising=False)
+    monkeypatch.setattr(silva_head, "_npz_dir", None)
+    with pytest.raises(RuntimeError, match="not configured"):
+        silva_head.npz_path("silva")
+    silva_head.set_npz_dir(tmp_path / ".pictoria" / silva_head.NPZ_DIRNAME)
+    assert silva_head.npz_path("silva") == tmp_path / ".pictoria" / "silva" / "silva.npz"
+    monkeypatch.setenv("PICTORIA_SILVA_NPZ_DIR", str(tmp_path / "shared"))
+    assert silva_head.npz_path("silva_luna") == tmp_path / "shared" / "silva_luna.npz"
@@ -0,0 +1,91 @@
+"""``worker.admission`` — decodes admitted against a byte budget, not a count."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from PIL import Image
+
+from worker.admission import MIN_FOOTPRINT, WORKING_COPIES, MemoryBudget, estimate_footprint
+
+
+async def _run(budget: MemoryBudget, sizes: list[int]) -> int:
+    """Run one reservation per size; return the peak number held at once."""
+    running = 0
+    peak = 0
+
+    async def _one(nbytes: int) -> None:
+        nonlocal running, peak
+        async with budget.reserve(nbytes):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[_one(n) for n in sizes])
+    return peak
+
+
+async def test_small_items_run_wide() -> None:
+    assert await _run(MemoryBudget(100), [10] * 8) == 8
+
+
+async def test_large_items_serialize() -> None:
+    budget = MemoryBudget(100)
+    assert await _run(budget, [60] * 4) == 1
+    assert budget.in_use == 0
+
+
+async def test_oversize_item_is_clamped_and_runs_alone() -> None:
+    budget = MemoryBudget(100)
+    # Would wait forever if 500 were not clamped to the whole budget.
+    assert await asyncio.wait_for(_run(budget, [500, 10, 10]), timeout=5) == 2
+    assert budget.in_use == 0
+
+
+async def test_admission_is_fifo() -> None:
+    budget = MemoryBudget(100)
+    order: list[str] = []
+
+    async def _hold(name: str, nbytes: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        async with budget.reserve(nbytes):
+            order.append(name)
+            await asyncio.sleep(0.02)
+
+    # "big" queues behind "first"; "small" would fit alongside "first" but
+    # must not overtake the big one already waiting.
+    await asyncio.gather(_hold("first", 50, 0), _hold("big", 80, 0.005), _hold("small", 10, 0.01))
+    assert order == ["first", "big", "small"]
+
+
+async def test_cancelled_waiter_frees_its_place() -> None:
+    budget = MemoryBudget(100)
+    async with budget.reserve(100):
+        waiter = asyncio.create_task(_run(budget, [100]))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    assert budget.in_use == 0
+    assert await _run(budget, [50, 50]) == 2
+
+
+def test_estimate_from_header(tmp_path) -> None:
+    path = tmp_path / "big.png"
+    Image.new("RGB", (2000, 1000)).save(path)
+    assert estimate_footprint(path) == 2000 * 1000 * 4 * WORKING_COPIES
+
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"not an image")
+    assert estimate_footprint(bad) == MIN_FOOTPRINT
+
+
+def test_huge_scan_is_estimated_on_a_fresh_worker(huge_png, fresh_process) -> None:
+    out = fresh_process(f"""
+        from pathlib import Path
+        from worker.admission import estimate_footprint
+        print(estimate_footprint(Path({str(huge_png)!r})))
+    """)
+    assert int(out) == 14000 * 14000 * 4 * WORKING_COPIES
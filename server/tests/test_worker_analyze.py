@@ -0,0 +1,114 @@
+"""``handle_analyze`` — one decode fanned out to several models.
+
+The models are swapped for fakes that record what they were handed, so these
+pin the *plumbing*: each image decoded once and shared, per-model result rows,
+and failures landing in the right model's bucket.
+"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from worker import handlers
+from worker.codec import decode_batch
+
+
+@pytest.fixture
+def library(tmp_path):
+    handlers.set_root(tmp_path)
+    for i in range(3):
+        Image.new("RGB", (32, 24), (i * 60, 10, 10)).save(tmp_path / f"{i}.png")
+    (tmp_path / "bad.png").write_bytes(b"not an image")
+    return tmp_path
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    seen: dict[str, list[list[int]]] = {"embedding": [], "tagger": [], "waifu": []}
+
+    def _prepare(name):
+        # The "tensor" handed to forward: each image's red channel and width.
+        def _run(images):
+            seen[name].append([id(img) for img in images])
+            return [(img.getpixel((0, 0))[0], img.size[0]) for img in images]
+
+        return _run
+
+    def _embed(pixels):
+        return [np.full(4, red, dtype=np.float32) for red, _ in pixels]
+
+    def _tag(pixels):
+        # The black image gets no tags — the tagger's one reject case.
+        return [SimpleNamespace(general_tags=("red",) if red else (), character_tags=(), rating="general") for red, _ in pixels]
+
+    def _waifu(pixels):
+        return [float(width) for _, width in pixels]
+
+    fns = {"embedding": _embed, "tagger": _tag, "waifu": _waifu}
+    monkeypatch.setattr(
+        handlers,
+        "_load_analyzers",
+        lambda models: {m: handlers._Analyzer(16, _prepare(m), fns[m]) for m in models},
+    )
+    return seen
+
+
+def _item(root, name: str, pid: int) -> dict:
+    return {"postId": pid, "path": str(root / name)}
+
+
+async def test_every_model_sees_the_same_decoded_images(library, fakes) -> None:
+    items = [_item(library, f"{i}.png", i) for i in range(3)]
+    result = await handlers.handle_analyze({"models": ["waifu", "embedding", "tagger"], "items": items})
+
+    assert fakes["embedding"] == fakes["tagger"] == fakes["waifu"]
+    assert result["embeddings"]["postIds"] == [0, 1, 2]
+    assert decode_batch(result["embeddings"]["vectors"], 3, dim=4)[:, 0].tolist() == [0, 60, 120]
+    # Decoded once, shrunk to the 16px short side the fakes ask for: 32x24 -> 22x16.
+    assert [s["score"] for s in result["scores"]] == [22.0, 22.0, 22.0]
+    # Post 0 is black: its tagger row is a failure, its other rows still come back.
+    assert [r["postId"] for r in result["results"]] == [1, 2]
+    assert result["failures"] == {
+        "embedding": [],
+        "tagger": [{"postId": 0, "error": "no auto tags produced"}],
+        "waifu": [],
+    }
+
+
+async def test_embeddings_come_back_in_the_requested_encoding(library, fakes) -> None:
+    items = [_item(library, f"{i}.png", i) for i in range(3)]
+    result = await handlers.handle_analyze({"models": ["embedding"], "items": items, "vectorEncoding": "f16"})
+
+    batch = result["embeddings"]
+    assert batch["encoding"] == "f16"
+    assert decode_batch(batch["vectors"], 3, dim=4, encoding="f16")[:, 0].tolist() == [0, 60, 120]
+    with pytest.raises(ValueError, match="unknown vector encoding"):
+        await handlers.handle_analyze({"models": ["embedding"], "items": items, "vectorEncoding": "f64"})
+    assert len(fakes["embedding"]) == 1
+
+
+async def test_only_requested_models_run_and_report(library, fakes) -> None:
+    result = await handlers.handle_analyze({"models": ["waifu"], "items": [_item(library, "1.png", 1)]})
+
+    assert set(result) == {"scores", "failures"}
+    assert result["failures"] == {"waifu": []}
+    assert fakes["embedding"] == fakes["tagger"] == []
+
+
+async def test_unreadable_image_fails_for_every_model(library, fakes) -> None:
+    items = [_item(library, "1.png", 1), _item(library, "bad.png", 9)]
+    result = await handlers.handle_analyze({"models": ["embedding", "waifu"], "items": items})
+
+    assert result["embeddings"]["postIds"] == [1]
+    assert [s["postId"] for s in result["scores"]] == [1]
+    for model in ("embedding", "waifu"):
+        assert [f["postId"] for f in result["failures"][model]] == [9]
+
+
+async def test_unknown_model_is_rejected(library, fakes) -> None:
+    with pytest.raises(ValueError, match="analyze needs"):
+        await handlers.handle_analyze({"models": ["silva"], "items": []})
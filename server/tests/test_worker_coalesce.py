@@ -0,0 +1,133 @@
+"""``worker.coalesce`` — concurrent requests sharing one batch call."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from worker import handlers
+from worker.coalesce import Coalescer
+
+
+def _upper(batches: list[list[str]]):
+    def _run(items: list[str]) -> list[str]:
+        batches.append(items)
+        return [s.upper() for s in items]
+
+    return _run
+
+
+async def test_concurrent_submits_share_one_batch() -> None:
+    batches: list[list[str]] = []
+    c = Coalescer(_upper(batches), window_s=0.05, max_batch=32)
+    results = await asyncio.gather(*[c.submit(s) for s in "abcde"])
+    assert results == list("ABCDE")
+    assert batches == [list("abcde")]
+
+
+async def test_max_batch_splits_and_flushes_early() -> None:
+    batches: list[list[str]] = []
+    # A window this long would time the test out if a full batch waited for it.
+    c = Coalescer(_upper(batches), window_s=30, max_batch=4)
+    results = await asyncio.wait_for(asyncio.gather(*[c.submit(s) for s in "abcdefgh"]), timeout=5)
+    assert results == list("ABCDEFGH")
+    assert batches == [list("abcd"), list("efgh")]
+
+
+async def test_a_failed_batch_fails_every_caller_in_it() -> None:
+    def _boom(_items: list[str]) -> list[str]:
+        msg = "CUDA error"
+        raise RuntimeError(msg)
+
+    c = Coalescer(_boom, window_s=0.01, max_batch=8)
+    results = await asyncio.gather(c.submit("a"), c.submit("b"), return_exceptions=True)
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    # The coalescer is still usable afterwards.
+    c.batch_fn = _upper([])
+    assert await c.submit("c") == "C"
+
+
+async def test_a_short_result_fails_the_batch_instead_of_hanging() -> None:
+    c = Coalescer(lambda items: [s.upper() for s in items[:-1]], window_s=0.01, max_batch=2)
+    # "c" lands in the second batch, queued behind the broken one.
+    results = await asyncio.wait_for(
+        asyncio.gather(*[c.submit(s) for s in "abc"], return_exceptions=True),
+        timeout=5,
+    )
+    assert [type(r) for r in results] == [ValueError, ValueError, ValueError]
+    assert "returned 1 results for 2 items" in str(results[0])
+
+
+async def test_text_embed_coalesces_and_dedupes(monkeypatch, tmp_path) -> None:
+    seen: list[list[str]] = []
+
+    def _features(prompts: list[str]):
+        import torch  # noqa: PLC0415
+
+        seen.append(prompts)
+        return torch.tensor([[float(len(p)), 0.0] for p in prompts])
+
+    import ai.siglip_embed  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.siglip_embed, "calculate_text_features", _features)
+    monkeypatch.setattr(ai.siglip_embed, "get_logit_scale_bias", lambda: (10.0, -1.0))
+    monkeypatch.setattr(handlers, "_text_embedder", None)
+    monkeypatch.setattr(handlers, "_text_cache", None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+
+    prompts = ["cat", "a dog", "cat"]
+    results = await asyncio.gather(*[handlers.handle_text_embed({"prompt": p}) for p in prompts])
+
+    # One forward, duplicates folded. The order inside it is whichever cache
+    # miss reached the coalescer first, so it is not part of the contract.
+    assert [sorted(batch) for batch in seen] == [["a dog", "cat"]]
+    vectors = [np.frombuffer(base64.b64decode(r["embedding"]), dtype=np.float32) for r in results]
+    assert [v[0] for v in vectors] == [3.0, 5.0, 3.0]
+    assert results[0]["scale"] == pytest.approx(10.0)
+
+
+async def test_text_embed_encodes_the_normalized_prompt(monkeypatch, tmp_path) -> None:
+    seen: list[list[str]] = []
+
+    def _features(prompts: list[str]):
+        import torch  # noqa: PLC0415
+
+        seen.append(prompts)
+        return torch.tensor([[float(len(p)), 0.0] for p in prompts])
+
+    import ai.siglip_embed  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.siglip_embed, "calculate_text_features", _features)
+    monkeypatch.setattr(ai.siglip_embed, "get_logit_scale_bias", lambda: (10.0, -1.0))
+    monkeypatch.setattr(handlers, "_text_embedder", None)
+    monkeypatch.setattr(handlers, "_text_cache", None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+
+    # Both spellings share a cache key; the vector stored under it must be
+    # the normalized text's, whichever spelling arrived first.
+    first = await handlers.handle_text_embed({"prompt": "  a\u3000dog "})
+    again = await handlers.handle_text_embed({"prompt": "a dog"})
+    assert seen == [["a dog"]]
+    assert first["embedding"] == again["embedding"]
+
+
+def test_concurrent_first_tasks_open_one_cache(monkeypatch, tmp_path) -> None:
+    opened: list[object] = []
+
+    class _SlowCache:
+        def __init__(self, *_args: object) -> None:
+            time.sleep(0.05)
+            opened.append(self)
+
+    monkeypatch.setattr(handlers, "TextEmbedCache", _SlowCache)
+    monkeypatch.setattr(handlers, "_text_cache", None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+    with ThreadPoolExecutor(4) as pool:
+        caches = list(pool.map(lambda _: handlers._get_text_cache(), range(4)))
+    assert len(opened) == 1
+    assert all(c is opened[0] for c in caches)
@@ -1,6 +1,6 @@
 """Cross-language vector codec — the twin of ``packages/contracts/src/codec.test.ts``.
 
-Same seven numbers, same base64 string. If either side changes byte order or
+Same seven numbers, same base64 strings (one vector, and one two-row batch). If either side changes byte order or
 encoding, both suites go red instead of one of them silently agreeing with
 itself.
 """
@@ -10,10 +10,17 @@ from __future__ import annotations
 import numpy as np
 import pytest
 
-from worker.codec import SIGLIP2_DIM, decode_vector, encode_vector
+from worker.codec import SIGLIP2_DIM, VECTOR_ENCODINGS, decode_batch, decode_vector, encode_batch, encode_vector
 
 FIXTURE = np.array([0, 1, -1, 0.5, -0.5, 3.4028235e38, 1.1754944e-38], dtype=np.float32)
 FIXTURE_B64 = "AAAAAAAAgD8AAIC/AAAAPwAAAL///39/AACAAA=="
+#: The fixture plus a trailing 2.0, as a 2x4 batch: the rows are back to back.
+BATCH = np.append(FIXTURE, np.float32(2)).reshape(2, 4)
+BATCH_B64 = "AAAAAAAAgD8AAIC/AAAAPwAAAL///39/AACAAAAAAEA="
+#: Reduced-precision fixtures (``REDUCED`` in ``codec.test.ts``): 0.1 is not a
+#: half, 0.0078125 falls below one int8 step of its row.
+REDUCED = np.array([[0.1, -0.25, 0.5, 1.0], [3.0, -1.5, 0.0078125, -3.0]], dtype=np.float32)
+REDUCED_B64 = {"f16": "Zi4AtAA4ADwAQgC+ACAAwg==", "i8": "BAIBPAaDwTwN4EB/f8AAgQ=="}
 
 
 def test_fixture_matches_the_typescript_side() -> None:
@@ -35,3 +42,66 @@ def test_truncated_payload_raises_rather_than_reshaping() -> None:
     short = encode_vector(np.zeros(64, dtype=np.float32))
     with pytest.raises(ValueError, match="expected a 1152-d vector"):
         decode_vector(short)
+
+
+def test_batch_fixture_matches_the_typescript_side() -> None:
+    assert encode_batch(BATCH) == BATCH_B64
+    assert encode_batch(list(BATCH)) == BATCH_B64
+
+
+def test_batch_round_trip_is_bit_exact_and_copy_free() -> None:
+    decoded = decode_batch(BATCH_B64, 2, dim=4)
+    assert np.array_equal(decoded, BATCH)
+    # A view over the decoded bytes, not a stack of per-row copies.
+    assert decoded.base is not None
+    assert not decoded.flags.writeable
+
+
+def test_empty_batch_is_the_empty_string() -> None:
+    assert encode_batch([]) == ""
+    assert decode_batch("", 0).shape == (0, SIGLIP2_DIM)
+
+
+@pytest.mark.parametrize(("count", "dim"), [(3, 4), (2, 3), (1, 4)])
+def test_batch_size_mismatch_raises_rather_than_reshaping(count: int, dim: int) -> None:
+    with pytest.raises(ValueError, match=f"expected {count} {dim}-d f32 vectors"):
+        decode_batch(BATCH_B64, count, dim=dim)
+
+
+@pytest.mark.parametrize("encoding", ["f16", "i8"])
+def test_reduced_fixtures_match_the_typescript_side(encoding: str) -> None:
+    b64 = encode_batch(REDUCED, encoding)
+    assert b64 == REDUCED_B64[encoding]
+    decoded = decode_batch(b64, 2, dim=4, encoding=encoding)
+    assert decoded.dtype == np.float32
+    # Within half an int8 step of each row (f16 is far tighter than that).
+    assert (np.abs(decoded - REDUCED) <= np.abs(REDUCED).max(axis=1, keepdims=True) / 254).all()
+
+
+def test_int8_is_per_vector_scaled() -> None:
+    decoded = decode_batch(REDUCED_B64["i8"], 2, dim=4, encoding="i8")
+    # Each row's peak survives exactly; the small row is not crushed by the big one.
+    assert decoded[0, 3] == 1.0
+    assert decoded[1, 0] == 3.0
+    assert decoded[0, 0] == pytest.approx(13 / 127)
+
+
+@pytest.mark.parametrize("encoding", VECTOR_ENCODINGS)
+def test_unit_vectors_keep_their_direction(encoding: str) -> None:
+    x = np.random.default_rng(0).standard_normal((64, SIGLIP2_DIM)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    y = decode_batch(encode_batch(x, encoding), 64, encoding=encoding)
+    cos = (x * y).sum(axis=1) / np.linalg.norm(y, axis=1)
+    assert 1 - cos.min() < 1e-4
+
+
+def test_zero_vector_round_trips_through_int8() -> None:
+    zero = np.zeros((1, 4), dtype=np.float32)
+    assert np.array_equal(decode_batch(encode_batch(zero, "i8"), 1, dim=4, encoding="i8"), zero)
+
+
+def test_size_is_checked_for_the_encoding_and_unknown_encodings_raise() -> None:
+    with pytest.raises(ValueError, match="f32"):
+        decode_batch(REDUCED_B64["i8"], 2, dim=4, encoding="f32")
+    with pytest.raises(ValueError, match="unknown vector encoding"):
+        encode_batch(REDUCED, "bf16")
@@ -0,0 +1,248 @@
+"""``dedup`` — near pairs off the exported matrix, full and incremental."""
+
+from __future__ import annotations
+
+import sys
+
+import numpy as np
+import pytest
+
+from worker import dedup, handlers
+from worker.dedup import (
+    PAIR_DTYPE,
+    connected_components,
+    cpu_near_pairs,
+    find_near_pairs,
+    load_matrix,
+    lsh_candidates,
+    lsh_near_pairs,
+    lsh_recall,
+)
+
+
+def _clustered(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    """``n`` unit rows where each group of three is a tight cluster."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n // 3 + 1, dim))
+    rows = np.repeat(centers, 3, axis=0)[:n] + rng.standard_normal((n, dim)) * 0.01
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _pairs(found: tuple[np.ndarray, np.ndarray]) -> list[tuple[int, int]]:
+    pairs, sims = found
+    assert pairs.dtype == np.int32
+    assert sims.dtype == np.float32
+    assert pairs.shape == (len(sims), 2)
+    return [tuple(p) for p in pairs.tolist()]
+
+
+def test_full_pass_finds_each_cluster_once() -> None:
+    matrix = _clustered(9)
+    pairs, sims = find_near_pairs(matrix, threshold=0.01, chunk_size=4)
+    assert sorted(_pairs((pairs, sims))) == [(0, 1), (0, 2), (1, 2), (3, 4), (3, 5), (4, 5), (6, 7), (6, 8), (7, 8)]
+    np.testing.assert_allclose(sims, (matrix[pairs[:, 0]] * matrix[pairs[:, 1]]).sum(axis=1), atol=1e-5)
+
+
+@pytest.mark.parametrize("new_from", [0, 1, 4, 7, 11, 12])
+def test_incremental_pass_is_the_full_pass_restricted_to_new_rows(new_from: int) -> None:
+    matrix = _clustered(12)
+    full = set(_pairs(find_near_pairs(matrix, 0.01, 5)))
+    incremental = _pairs(find_near_pairs(matrix, 0.01, 5, new_from))
+
+    assert all(i < j for i, j in incremental)
+    assert len(incremental) == len(set(incremental))
+    assert set(incremental) == {(i, j) for i, j in full if j >= new_from}
+
+
+def _brute_force(matrix: np.ndarray, threshold: float, new_from: int = 0) -> set[tuple[int, int]]:
+    sim = matrix.astype(np.float64) @ matrix.T.astype(np.float64)
+    i, j = np.nonzero(np.triu(sim >= 1.0 - threshold, k=1))
+    return {(a, b) for a, b in zip(i.tolist(), j.tolist(), strict=True) if b >= new_from}
+
+
+@pytest.mark.parametrize(("tile", "new_from"), [(1, 0), (4, 0), (5, 0), (64, 0), (4, 10), (7, 3), (5, 20)])
+def test_cpu_tiles_cover_exactly_the_upper_triangle(tmp_path, tile: int, new_from: int) -> None:
+    matrix = _clustered(20, seed=1)
+    path = tmp_path / "m.f32"
+    matrix.tofile(path)
+
+    pairs = _pairs(cpu_near_pairs(load_matrix(path, 20, 32), 0.01, tile, new_from))
+    assert all(i < j for i, j in pairs)
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == _brute_force(matrix, 0.01, new_from)
+
+
+def test_cpu_pass_never_imports_torch_without_a_driver(monkeypatch) -> None:
+    # ``None`` in sys.modules makes ``import torch`` raise, so reaching for it fails the test.
+    monkeypatch.setitem(sys.modules, "torch", None)
+    monkeypatch.setattr(dedup, "_nvidia_driver_present", lambda: False)
+    matrix = _clustered(9)
+    assert _pairs(find_near_pairs(matrix, 0.01, 4)) == _pairs(cpu_near_pairs(matrix, 0.01, 4))
+
+
+def test_cpu_tiles_normalise_and_survive_zero_rows() -> None:
+    matrix = _clustered(6) * np.array([[1], [3], [0.5], [2], [1], [9]], dtype=np.float32)
+    matrix[5] = 0
+    assert sorted(_pairs(cpu_near_pairs(matrix, 0.01, 4))) == [(0, 1), (0, 2), (1, 2), (3, 4)]
+
+
+async def test_handler_writes_pair_records_next_to_the_matrix(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    path = tmp_path / "dedup-vectors-test.f32"
+    _clustered(6).tofile(path)
+    payload = {"matrixPath": str(path), "count": 6, "dim": 32, "threshold": 0.01, "chunkSize": 4}
+
+    result = await handlers.handle_dedup({**payload, "newFrom": 5})
+    assert result == {"mode": "pairs", "pairsPath": str(path.resolve()) + ".pairs", "count": 2}
+    records = np.fromfile(result["pairsPath"], dtype=PAIR_DTYPE)
+    assert PAIR_DTYPE.itemsize == 12
+    assert sorted(zip(records["i"].tolist(), records["j"].tolist(), strict=True)) == [(3, 5), (4, 5)]
+    assert (records["sim"] > 0.99).all()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+async def test_handler_checks_new_from_and_writes_empty_files(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    path = tmp_path / "dedup-vectors-test.f32"
+    _clustered(6).tofile(path)
+    payload = {"matrixPath": str(path), "count": 6, "dim": 32, "threshold": 0.01, "chunkSize": 4}
+
+    result = await handlers.handle_dedup({**payload, "newFrom": 6})
+    assert result["count"] == 0
+    assert np.fromfile(result["pairsPath"], dtype=PAIR_DTYPE).size == 0
+    with pytest.raises(ValueError, match="newFrom"):
+        await handlers.handle_dedup({**payload, "newFrom": 7})
+
+
+def test_components_label_each_row_with_its_smallest_member() -> None:
+    # 0-3-5 is a chain (0 and 5 never meet), 2-4 a pair, 1 and 6 alone.
+    pairs = np.array([[3, 5], [2, 4], [0, 3]], dtype=np.int32)
+    labels, roots, edges = connected_components(7, pairs)
+    assert labels.tolist() == [0, 1, 2, 0, 2, 0, 6]
+    assert roots.tolist() == [0, 2]
+    assert edges.tolist() == [2, 1]
+
+
+def test_components_match_a_scalar_union_find() -> None:
+    rng = np.random.default_rng(3)
+    n = 500
+    pairs = np.sort(rng.integers(0, n, size=(400, 2)), axis=1).astype(np.int32)
+    pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for i, j in pairs.tolist():
+        a, b = find(i), find(j)
+        parent[max(a, b)] = min(a, b)
+    labels, roots, edges = connected_components(n, pairs)
+    assert labels.tolist() == [find(r) for r in range(n)]
+    assert edges.sum() == len(pairs)
+    assert set(roots.tolist()) == {find(i) for i in pairs[:, 0].tolist()}
+
+
+async def test_handler_components_mode_writes_labels_then_component_records(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    path = tmp_path / "dedup-vectors-test.f32"
+    _clustered(7).tofile(path)
+    payload = {"matrixPath": str(path), "count": 7, "dim": 32, "threshold": 0.01, "chunkSize": 4}
+
+    result = await handlers.handle_dedup({**payload, "mode": "components"})
+    assert result == {"mode": "components", "labelsPath": str(path.resolve()) + ".labels", "count": 7, "components": 2}
+    data = np.fromfile(result["labelsPath"], dtype="<i4")
+    assert data[:7].tolist() == [0, 0, 0, 3, 3, 3, 6]
+    assert data[7:].reshape(-1, 2).tolist() == [[0, 3], [3, 3]]
+    assert not list(tmp_path.glob("*.pairs"))
+    with pytest.raises(ValueError, match="full pass"):
+        await handlers.handle_dedup({**payload, "mode": "components", "newFrom": 3})
+    with pytest.raises(ValueError, match="unknown dedup mode"):
+        await handlers.handle_dedup({**payload, "mode": "greedy"})
+
+
+def _spread_pairs(n_pairs: int, distance: float, dim: int = 64, seed: int = 0) -> np.ndarray:
+    """``2 * n_pairs`` unit rows; rows ``2k`` and ``2k + 1`` are ``distance`` apart in cosine, the rest unrelated."""
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n_pairs, dim))
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    side = rng.standard_normal((n_pairs, dim))
+    side -= (side * base).sum(axis=1, keepdims=True) * base
+    side /= np.linalg.norm(side, axis=1, keepdims=True)
+    angle = np.arccos(1.0 - distance)
+    rows = np.empty((2 * n_pairs, dim))
+    rows[0::2] = base
+    rows[1::2] = np.cos(angle) * base + np.sin(angle) * side
+    return rows.astype(np.float32)
+
+
+@pytest.mark.parametrize("new_from", [0, 9])
+def test_lsh_returns_only_verified_pairs(tmp_path, new_from: int) -> None:
+    matrix = _clustered(30, seed=2)
+    path = tmp_path / "m.f32"
+    matrix.tofile(path)
+
+    pairs, sims = lsh_near_pairs(load_matrix(path, 30, 32), 0.01, 7, new_from)
+    found = _pairs((pairs, sims))
+    assert all(i < j for i, j in found)
+    assert len(found) == len(set(found))
+    # Tight clusters collide in every table, so recall is total here.
+    assert set(found) == _brute_force(matrix, 0.01, new_from)
+    np.testing.assert_allclose(sims, (matrix[pairs[:, 0]] * matrix[pairs[:, 1]]).sum(axis=1), atol=1e-5)
+
+
+def test_lsh_recall_matches_the_collision_odds() -> None:
+    # One narrow table, pairs sitting right at the threshold: the miss rate is
+    # large enough to measure, and must agree with ``lsh_recall``.
+    matrix = _spread_pairs(2000, 0.009)
+    pairs = _pairs(lsh_near_pairs(matrix, 0.01, 512, bits=8, tables=1))
+    planted = sum(j == i + 1 and i % 2 == 0 for i, j in pairs)
+    assert abs(planted / 2000 - lsh_recall(0.009, bits=8, tables=1)) < 0.04
+    # The default tables find them all.
+    assert len(_pairs(lsh_near_pairs(matrix, 0.01, 512))) >= 1995
+    assert lsh_recall(0.01) > 0.999
+
+
+async def test_handler_switches_engines(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    path = tmp_path / "dedup-vectors-test.f32"
+    _clustered(9).tofile(path)
+    payload = {"matrixPath": str(path), "count": 9, "dim": 32, "threshold": 0.01, "chunkSize": 4}
+
+    exact = await handlers.handle_dedup(payload)
+    exact_records = np.fromfile(exact["pairsPath"], dtype=PAIR_DTYPE)
+    lsh = await handlers.handle_dedup({**payload, "engine": "lsh"})
+    lsh_records = np.fromfile(lsh["pairsPath"], dtype=PAIR_DTYPE)
+    assert lsh["count"] == exact["count"] == 9
+    assert sorted(lsh_records[["i", "j"]].tolist()) == sorted(exact_records[["i", "j"]].tolist())
+    with pytest.raises(ValueError, match="unknown dedup engine"):
+        await handlers.handle_dedup({**payload, "engine": "faiss"})
+
+
+def test_lsh_centres_rows_that_share_a_direction() -> None:
+    # Unrelated rows at a mean cosine of 0.9: planes through the origin would
+    # leave most of them on one side (~3.9M candidates of 4.5M pairs here).
+    rng = np.random.default_rng(3)
+    shared = rng.standard_normal(32)
+    shared *= np.sqrt(32 * 0.9) / np.linalg.norm(shared)
+    matrix = _clustered(3000) * np.sqrt(32 * 0.1) + shared
+    matrix = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+    candidates = sum(len(i) for i, _ in lsh_candidates(matrix, 512))
+    assert candidates < 20 * len(matrix)
+    assert set(_pairs(lsh_near_pairs(matrix, 0.01, 512))) == _brute_force(matrix, 0.01, 0)
+
+
+def test_lsh_caps_buckets_no_plane_can_split() -> None:
+    # 200 copies of one image share every signature, however often the bucket splits.
+    matrix = np.concatenate([np.repeat(_clustered(1), 200, axis=0), _clustered(100, seed=5)])
+
+    for i, j in lsh_candidates(matrix, 64, max_bucket=8):
+        assert (i < j).all()
+    per_table = sum(len(i) for i, _ in lsh_candidates(matrix, 64, max_bucket=8, tables=1))
+    assert per_table <= len(matrix) * 7
+    # Each copy still meets the next few, so the copies stay one group.
+    pairs, _ = lsh_near_pairs(matrix, 0.01, 64, max_bucket=8)
+    labels, _, _ = connected_components(len(matrix), pairs)
+    assert (labels[:200] == 0).all()
@@ -0,0 +1,165 @@
+"""The batch → mini-batch → per-image ladder, with fake batch functions.
+
+No model and no image decode: a "path" whose name starts with ``bad`` makes any
+batch containing it raise, which is exactly how one unreadable file behaves in
+a real collate.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+from worker.ladder import LadderStats, PipelineTimings, run_pipelined, run_with_fallback
+
+
+def _items(names: list[str]) -> list[tuple[int, Path]]:
+    return [(i, Path(name)) for i, name in enumerate(names)]
+
+
+def _check(paths: list[Path]) -> list[Path]:
+    if any(p.name.startswith("bad") for p in paths):
+        msg = "cannot identify image file"
+        raise OSError(msg)
+    return paths
+
+
+def _batch(paths: list[Path]) -> list[str]:
+    return [p.name.upper() for p in _check(paths)]
+
+
+async def test_clean_batch_succeeds_whole() -> None:
+    succ, fail = await run_with_fallback(_batch, _items(["a", "b", "c"]), label="t")
+    assert succ == [(0, "A"), (1, "B"), (2, "C")]
+    assert fail == []
+
+
+async def test_one_bad_item_is_isolated() -> None:
+    names = ["a", "b", "bad", "c", "d", "e"]
+    succ, fail = await run_with_fallback(_batch, _items(names), label="t")
+    assert [pid for pid, _ in succ] == [0, 1, 3, 4, 5]
+    assert [pid for pid, _ in fail] == [2]
+
+
+async def test_reject_reason_applies_to_successes() -> None:
+    succ, fail = await run_with_fallback(
+        _batch,
+        _items(["a", "b"]),
+        label="t",
+        reject_reason=lambda _pid, r: "no" if r == "B" else None,
+    )
+    assert succ == [(0, "A")]
+    assert fail == [(1, "no")]
+
+
+async def test_pipelined_matches_the_ladder() -> None:
+    names = ["a", "b", "bad", "c", "d", "e", "f", "g", "h"]
+    timings = PipelineTimings()
+    succ, fail = await run_pipelined(_check, lambda ps: [p.name.upper() for p in ps], _items(names), label="t", chunk_size=4, timings=timings)
+    assert succ == [(i, n.upper()) for i, n in enumerate(names) if n != "bad"]
+    assert [pid for pid, _ in fail] == [2]
+    assert timings.chunks == 3
+
+
+async def test_pipelined_prepares_next_chunk_during_forward() -> None:
+    # The forward of chunk 0 blocks until chunk 1's prepare has started: it only
+    # returns if the two stages really run concurrently.
+    second_prepare_started = threading.Event()
+    prepared: list[list[str]] = []
+
+    def prepare(paths: list[Path]) -> list[str]:
+        prepared.append([p.name for p in paths])
+        if len(prepared) == 2:
+            second_prepare_started.set()
+        return [p.name for p in paths]
+
+    def forward(names: list[str]) -> list[str]:
+        if names == ["a", "b"]:
+            assert second_prepare_started.wait(timeout=5)
+        return names
+
+    succ, fail = await run_pipelined(prepare, forward, _items(["a", "b", "c", "d"]), label="t", chunk_size=2)
+    assert [r for _, r in succ] == ["a", "b", "c", "d"]
+    assert fail == []
+
+
+def _batch_of(n: int, bad: set[int]) -> list[tuple[int, Path]]:
+    return _items([f"bad{i}" if i in bad else f"ok{i}" for i in range(n)])
+
+
+@pytest.mark.parametrize("strategy", ["bisect", "chunks"])
+@pytest.mark.parametrize("bad", [set(), {37}, {0, 17, 40, 63}], ids=["0-bad", "1-bad", "k-bad"])
+async def test_fallback_strategies_agree(strategy, bad) -> None:
+    items = _batch_of(64, bad)
+    succ, fail = await run_with_fallback(_batch, items, label="t", strategy=strategy)
+    assert [pid for pid, _ in succ] == [i for i in range(64) if i not in bad]
+    assert [pid for pid, _ in fail] == sorted(bad)
+    assert all(msg.startswith("OSError") for _, msg in fail)
+
+
+@pytest.mark.parametrize(
+    ("bad", "bisect_passes", "chunks_passes"),
+    [
+        (set(), 1, 1),
+        ({37}, 1 + 2 * 6, 1 + 16 + 4),
+        # Scattered bad items each cost bisection a log-depth path: chunks wins here.
+        ({0, 17, 40, 63}, 1 + 2 + 4 + 8 + 8 + 8 + 8, 1 + 16 + 4 * 4),
+    ],
+    ids=["0-bad", "1-bad", "k-bad"],
+)
+async def test_forward_pass_counts(bad, bisect_passes, chunks_passes) -> None:
+    for strategy, expected in (("bisect", bisect_passes), ("chunks", chunks_passes)):
+        stats = LadderStats()
+        await run_with_fallback(_batch, _batch_of(64, bad), label="t", strategy=strategy, stats=stats)
+        assert stats.forward_passes == expected, strategy
+
+
+async def test_pipelined_counts_chunks_and_bisects() -> None:
+    stats = LadderStats()
+    items = _batch_of(16, {5})
+    succ, fail = await run_pipelined(_check, lambda ps: [p.name for p in ps], items, label="t", chunk_size=8, stats=stats)
+    assert [pid for pid, _ in fail] == [5]
+    assert len(succ) == 15
+    # Two chunk attempts, then 2 * log2(8) to isolate post 5 inside the first.
+    assert stats.forward_passes == 2 + 2 * 3
+
+
+async def test_a_forward_short_of_rows_falls_back() -> None:
+    # Drops the last row of anything bigger than a pair: the chunk of 4 fails
+    # as a batch, and its halves go through.
+    def forward(names: list[str]) -> list[str]:
+        return names[:-1] if len(names) > 2 else names
+
+    names = ["a", "b", "c", "d", "e", "f"]
+    succ, fail = await run_pipelined(lambda ps: [p.name for p in ps], forward, _items(names), label="t", chunk_size=4)
+    assert [r for _, r in succ] == names
+    assert fail == []
+    succ, fail = await run_with_fallback(forward, _items(names[:3]), label="t")
+    assert [pid for pid, _ in succ] == [0, 1, 2]
+
+
+async def test_cancelled_run_leaves_no_prepare_behind() -> None:
+    forwarding = threading.Event()
+    release = threading.Event()
+
+    def prepare(paths: list[Path]) -> list[str]:
+        if paths[0].name == "c":
+            release.wait(5)
+        return [p.name for p in paths]
+
+    def forward(names: list[str]) -> list[str]:
+        forwarding.set()
+        release.wait(5)
+        return names
+
+    run = asyncio.create_task(run_pipelined(prepare, forward, _items(["a", "b", "c", "d"]), label="t", chunk_size=2))
+    assert await asyncio.to_thread(forwarding.wait, 5)
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    # The prepare of the second chunk, started ahead, went with it.
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    release.set()
@@ -0,0 +1,86 @@
+"""``worker.preflight`` — header-only rejection before a GPU batch."""
+
+from __future__ import annotations
+
+import errno
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from worker.preflight import check_image, preflight
+
+
+def _jpeg_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (10, 200, 30)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_good_files_pass(tmp_path) -> None:
+    png = tmp_path / "a.png"
+    Image.new("RGBA", (8, 8)).save(png)
+    jpg = tmp_path / "b.jpg"
+    # Padding after the end-of-image marker is common and harmless.
+    jpg.write_bytes(_jpeg_bytes() + b"\x00" * 100)
+    assert check_image(png, check_trailer=True) is None
+    assert check_image(jpg, check_trailer=True) is None
+
+
+def test_obviously_bad_files_fail(tmp_path) -> None:
+    empty = tmp_path / "empty.jpg"
+    empty.write_bytes(b"")
+    html = tmp_path / "page.jpg"
+    html.write_bytes(b"<!DOCTYPE html><html>403 Forbidden</html>")
+    garbage = tmp_path / "garbage.png"
+    garbage.write_bytes(b"\x01\x02\x03 definitely not pixels")
+
+    assert check_image(empty) == "preflight: empty file"
+    assert check_image(html).startswith("preflight: not an image")
+    assert check_image(garbage).startswith("preflight: UnidentifiedImageError")
+
+
+def test_truncated_jpeg_fails_only_with_trailer_check(tmp_path) -> None:
+    # LOAD_TRUNCATED_IMAGES is on, so by default a partial download still scores.
+    path = tmp_path / "cut.jpg"
+    path.write_bytes(_jpeg_bytes()[:-40])
+    assert check_image(path) is None
+    assert check_image(path, check_trailer=True) == "preflight: truncated JPEG (no end-of-image marker)"
+
+
+def test_preflight_splits_items(tmp_path) -> None:
+    good = tmp_path / "good.png"
+    Image.new("RGB", (4, 4)).save(good)
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"")
+    passed, failed = preflight([(1, good), (2, bad), (3, good)])
+    assert passed == [(1, good), (3, good)]
+    assert failed == [(2, "preflight: empty file")]
+
+
+def test_io_errors_are_not_reasons(tmp_path, monkeypatch) -> None:
+    good = tmp_path / "good.png"
+    Image.new("RGB", (4, 4)).save(good)
+    gone = tmp_path / "gone.png"
+
+    def _emfile(*_args, **_kwargs):
+        raise OSError(errno.EMFILE, "Too many open files")
+
+    # Deleted between listing and preflight: dropped, neither passed nor failed.
+    assert preflight([(1, good), (2, gone)]) == ([(1, good)], [])
+    with monkeypatch.context() as m:
+        m.setattr(Path, "open", _emfile)
+        with pytest.raises(OSError, match="Too many open files"):
+            check_image(good)
+        # The ladder gets to try it instead.
+        assert preflight([(1, good)]) == ([(1, good)], [])
+
+
+def test_huge_scan_passes_on_a_fresh_worker(huge_png, fresh_process) -> None:
+    out = fresh_process(f"""
+        from pathlib import Path
+        from worker.preflight import check_image
+        print(check_image(Path({str(huge_png)!r})))
+    """)
+    assert out == "None"
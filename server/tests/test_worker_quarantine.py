@@ -0,0 +1,112 @@
+"""``worker.quarantine`` — known-bad files fail before they are batched."""
+
+from __future__ import annotations
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from worker import handlers
+from worker.quarantine import QUARANTINE, Quarantine
+
+
+@pytest.fixture(autouse=True)
+def _fresh_quarantine():
+    QUARANTINE.clear()
+    yield
+    QUARANTINE.clear()
+
+
+def test_lru_evicts_oldest(tmp_path) -> None:
+    q = Quarantine(2)
+    paths = [tmp_path / f"{i}.png" for i in range(3)]
+    for p in paths:
+        p.write_bytes(b"x")
+        q.add(p, "bad")
+    assert q.check(paths[0]) is None
+    assert q.check(paths[2]) == "bad"
+    assert q.stats() == {"size": 2, "capacity": 2, "hits": 1, "misses": 1, "added": 3, "evicted": 1}
+
+
+def test_rewritten_file_gets_a_fresh_chance(tmp_path) -> None:
+    q = Quarantine(8)
+    path = tmp_path / "a.png"
+    path.write_bytes(b"broken")
+    q.add(path, "bad")
+    Image.new("RGB", (4, 4)).save(path)
+    os.utime(path, ns=(1, 1))
+    assert q.check(path) is None
+
+
+async def test_ladder_failure_is_quarantined_for_the_next_task(tmp_path, monkeypatch) -> None:
+    handlers.set_root(tmp_path)
+    good = tmp_path / "good.png"
+    Image.new("RGB", (4, 4)).save(good)
+    # Passes preflight (valid PNG header) but fails in the model's decode.
+    cursed = tmp_path / "cursed.png"
+    Image.new("RGB", (4, 4)).save(cursed)
+    calls: list[list[str]] = []
+
+    def _prepare(paths):
+        calls.append([p.name for p in paths])
+        if any(p.name == "cursed.png" for p in paths):
+            msg = "broken data stream"
+            raise OSError(msg)
+        return paths
+
+    items = [(1, good), (2, cursed)]
+    await handlers.run_pipelined(_prepare, lambda ps: [0.0] * len(ps), items, label="t")
+    assert QUARANTINE.check(cursed) == "OSError: broken data stream"
+
+    kept, failures = handlers._resolve_items([{"postId": 1, "path": str(good)}, {"postId": 2, "path": str(cursed)}])
+    assert kept == [(1, good)]
+    assert failures == [{"postId": 2, "error": "quarantined: OSError: broken data stream"}]
+
+
+def test_preflight_rejection_is_quarantined(tmp_path) -> None:
+    handlers.set_root(tmp_path)
+    empty = tmp_path / "empty.png"
+    empty.write_bytes(b"")
+    handlers._resolve_items([{"postId": 3, "path": str(empty)}])
+    _, failures = handlers._resolve_items([{"postId": 3, "path": str(empty)}])
+    assert failures == [{"postId": 3, "error": "quarantined: preflight: empty file"}]
+    assert QUARANTINE.stats()["hits"] == 1
+
+
+async def test_worker_stats_reports_counters() -> None:
+    stats = await handlers.handle_worker_stats({})
+    assert stats["quarantine"]["size"] == 0
+
+
+@pytest.mark.parametrize("exc", [OSError(errno.EMFILE, "Too many open files"), OSError(errno.EIO, "I/O error")])
+async def test_io_errors_are_not_quarantined(tmp_path, exc: OSError) -> None:
+    handlers.set_root(tmp_path)
+    flaky = tmp_path / "flaky.png"
+    Image.new("RGB", (4, 4)).save(flaky)
+
+    def _prepare(paths):
+        raise exc
+
+    _, failures = await handlers.run_pipelined(_prepare, lambda ps: [0.0] * len(ps), [(1, flaky)], label="t")
+    assert [pid for pid, _ in failures] == [1]
+    assert QUARANTINE.check(flaky) is None
+
+
+def test_preflight_io_errors_are_not_quarantined(tmp_path, monkeypatch) -> None:
+    handlers.set_root(tmp_path)
+    image = tmp_path / "a.png"
+    Image.new("RGB", (4, 4)).save(image)
+
+    def _emfile(*_args, **_kwargs):
+        raise OSError(errno.EMFILE, "Too many open files")
+
+    with monkeypatch.context() as m:
+        m.setattr(Path, "open", _emfile)
+        kept, failures = handlers._resolve_items([{"postId": 1, "path": str(image)}])
+    # Not a failure TS would blacklist, and not remembered once the OS recovers.
+    assert (kept, failures) == ([(1, image)], [])
+    assert QUARANTINE.check(image) is None
+    assert handlers._resolve_items([{"postId": 1, "path": str(image)}]) == ([(1, image)], [])
@@ -0,0 +1,113 @@
+"""``silva-rescore`` — whole-library SILVA scores off the exported matrix file."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from worker import handlers
+from worker.rescore import scores_path
+
+
+class _Head:
+    """Scores a row as its first component plus ``offset``; records chunk sizes."""
+
+    def __init__(self, offset: float, seen: list[int]) -> None:
+        self.offset = offset
+        self.seen = seen
+
+    def score(self, x: np.ndarray) -> np.ndarray:
+        self.seen.append(len(x))
+        return x[:, 0] + self.offset
+
+
+@pytest.fixture
+def heads(monkeypatch, tmp_path) -> list[int]:
+    import ai.silva_scorer  # noqa: PLC0415
+
+    seen: list[int] = []
+    offsets = {"silva": 0.0, "silva_luna": 0.5}
+    monkeypatch.setattr(ai.silva_scorer, "load_head", lambda scorer: _Head(offsets[scorer], seen))
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    return seen
+
+
+def _matrix(tmp_path, count: int, dim: int = 4):
+    matrix = np.zeros((count, dim), dtype=np.float32)
+    matrix[:, 0] = np.arange(count, dtype=np.float32) / 10
+    path = tmp_path / "rescore-vectors-test.f32"
+    matrix.tofile(path)
+    return path, matrix
+
+
+async def test_scores_land_in_a_file_parallel_to_the_matrix(tmp_path, heads) -> None:
+    path, matrix = _matrix(tmp_path, 5)
+    result = await handlers.handle_silva_rescore(
+        {
+            "matrixPath": str(path),
+            "count": 5,
+            "dim": 4,
+            "scorers": ["silva_luna", "silva", "silva_luna"],
+            "chunkSize": 2,
+        },
+    )
+
+    assert result == {"scoresPath": str(scores_path(path.resolve())), "scorers": ["silva_luna", "silva"], "count": 5}
+    scores = np.fromfile(result["scoresPath"], dtype=np.float32).reshape(5, 2)
+    np.testing.assert_allclose(scores[:, 0], matrix[:, 0] + 0.5)
+    np.testing.assert_allclose(scores[:, 1], matrix[:, 0])
+    # Each chunk is read once and handed to both heads.
+    assert heads == [2, 2, 2, 2, 1, 1]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+async def test_empty_library_writes_an_empty_file(tmp_path, heads) -> None:
+    path = tmp_path / "rescore-vectors-empty.f32"
+    path.write_bytes(b"")
+    result = await handlers.handle_silva_rescore(
+        {
+            "matrixPath": str(path),
+            "count": 0,
+            "dim": 4,
+            "scorers": ["silva"],
+            "chunkSize": 8,
+        },
+    )
+    assert result["count"] == 0
+    assert scores_path(path.resolve()).read_bytes() == b""
+    assert heads == []
+
+
+async def test_unknown_scorers_short_files_and_empty_chunks_are_rejected(tmp_path, heads) -> None:
+    path, _ = _matrix(tmp_path, 3)
+    with pytest.raises(ValueError, match="nope"):
+        await handlers.handle_silva_rescore(
+            {
+                "matrixPath": str(path),
+                "count": 3,
+                "dim": 4,
+                "scorers": ["nope"],
+                "chunkSize": 8,
+            },
+        )
+    with pytest.raises(ValueError, match="expected"):
+        await handlers.handle_silva_rescore(
+            {
+                "matrixPath": str(path),
+                "count": 4,
+                "dim": 4,
+                "scorers": ["silva"],
+                "chunkSize": 8,
+            },
+        )
+    with pytest.raises(ValueError, match="chunkSize must be positive"):
+        await handlers.handle_silva_rescore(
+            {
+                "matrixPath": str(path),
+                "count": 3,
+                "dim": 4,
+                "scorers": ["silva"],
+                "chunkSize": 0,
+            },
+        )
+    assert heads == []
@@ -0,0 +1,72 @@
+"""Sidecar files — oversized payloads and results travel by reference."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+import pytest
+
+from worker import handlers
+from worker.sidecar import SIDECAR_KEY, is_sidecar, read_sidecar, spill
+
+
+@pytest.fixture
+def root(monkeypatch, tmp_path):
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path.resolve())
+    return tmp_path.resolve()
+
+
+def test_small_values_stay_inline(tmp_path) -> None:
+    value = {"ids": [1, 2, 3]}
+    assert spill(value, tmp_path, threshold=1024) is value
+    assert not list(tmp_path.iterdir())
+
+
+def test_large_values_round_trip_through_a_content_addressed_file(root) -> None:
+    value = {"importedIds": [str(i) for i in range(200)], "tag": "ねこ"}
+    ref = spill(value, handlers.sidecar_dir(), threshold=64)
+
+    assert is_sidecar(ref)
+    path = handlers.sidecar_dir() / f"{ref[SIDECAR_KEY]['sha256']}.json"
+    assert ref[SIDECAR_KEY]["path"] == str(path)
+    assert ref[SIDECAR_KEY]["bytes"] == path.stat().st_size
+    assert read_sidecar(ref[SIDECAR_KEY], handlers._resolve_inside) == value
+    # Same content, same file — and no temp file left behind.
+    assert spill(dict(value), handlers.sidecar_dir(), threshold=64) == ref
+    assert [p.name for p in handlers.sidecar_dir().iterdir()] == [path.name]
+
+
+def test_references_are_checked_before_parsing(root) -> None:
+    ref = spill({"x": "y" * 100}, handlers.sidecar_dir(), threshold=16)[SIDECAR_KEY]
+    path = handlers.sidecar_dir() / f"{ref['sha256']}.json"
+    path.write_text(json.dumps({"x": "z" * 100}, separators=(",", ":")))
+    with pytest.raises(ValueError, match="does not match"):
+        read_sidecar(ref, handlers._resolve_inside)
+
+    outside = root.parent / "elsewhere.json"
+    data = b'{"x":1}'
+    outside_ref = {"path": str(outside), "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+    with pytest.raises(ValueError, match="escapes"):
+        read_sidecar(outside_ref, handlers._resolve_inside)
+
+
+async def test_with_sidecars_unwraps_payloads_and_spills_results(root, monkeypatch) -> None:
+    import worker.sidecar  # noqa: PLC0415
+
+    monkeypatch.setattr(worker.sidecar, "SIDECAR_THRESHOLD", 64)
+    seen: list[dict] = []
+
+    async def _handler(payload: dict) -> dict:
+        seen.append(payload)
+        return {"echo": payload["items"] * 2}
+
+    payload = {"items": list(range(50))}
+    envelope = spill(payload, handlers.sidecar_dir(), threshold=64)
+    result = await handlers.with_sidecars(_handler)(None, envelope)
+
+    assert seen == [payload]
+    assert is_sidecar(result)
+    assert read_sidecar(result[SIDECAR_KEY], handlers._resolve_inside) == {"echo": list(range(50)) * 2}
+    # Inline stays inline both ways.
+    assert await handlers.with_sidecars(_handler)(None, {"items": [1]}) == {"echo": [1, 1]}
@@ -0,0 +1,71 @@
+"""``handle_silva`` — several SILVA heads over one decoded batch."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from worker import handlers
+from worker.codec import encode_batch
+
+
+def _batch(*values: float, encoding: str = "f32") -> dict[str, object]:
+    rows = [np.full(1152, v, dtype=np.float32) for v in values]
+    return {"postIds": list(range(1, len(values) + 1)), "vectors": encode_batch(rows, encoding), "encoding": encoding}
+
+
+async def test_every_head_scores_the_same_stacked_batch(monkeypatch) -> None:
+    calls: list[tuple[str, tuple[int, ...]]] = []
+
+    def _score(embeddings: np.ndarray, scorer: str) -> list[float]:
+        calls.append((scorer, embeddings.shape))
+        offset = 0.5 if scorer == "silva_luna" else 0.0
+        return [float(row[0]) + offset for row in embeddings]
+
+    import ai.silva_scorer  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.silva_scorer, "score_embeddings", _score)
+    result = await handlers.handle_silva({"scorers": ["silva", "silva_luna", "silva"], "embeddings": _batch(0.1, 0.2)})
+
+    assert calls == [("silva", (2, 1152)), ("silva_luna", (2, 1152))]
+    assert [(r["postId"], r["scorer"]) for r in result["scores"]] == [
+        (1, "silva"),
+        (1, "silva_luna"),
+        (2, "silva"),
+        (2, "silva_luna"),
+    ]
+    assert result["scores"][3]["score"] == pytest.approx(0.7)
+
+
+@pytest.mark.parametrize("encoding", ["f16", "i8"])
+async def test_reduced_precision_batches_are_widened_for_the_heads(monkeypatch, encoding: str) -> None:
+    import ai.silva_scorer  # noqa: PLC0415
+
+    seen: list[np.dtype] = []
+
+    def _score(embeddings: np.ndarray, scorer: str) -> list[float]:
+        seen.append(embeddings.dtype)
+        return [float(row[0]) for row in embeddings]
+
+    monkeypatch.setattr(ai.silva_scorer, "score_embeddings", _score)
+    result = await handlers.handle_silva({"scorers": ["silva"], "embeddings": _batch(0.1, 0.2, encoding=encoding)})
+    assert seen == [np.float32]
+    assert [r["score"] for r in result["scores"]] == pytest.approx([0.1, 0.2], abs=1e-3)
+
+
+async def test_unknown_scorers_are_rejected_before_any_work() -> None:
+    with pytest.raises(ValueError, match="nope"):
+        await handlers.handle_silva({"scorers": ["silva", "nope"], "embeddings": _batch(0.1)})
+
+
+async def test_empty_batch_or_no_heads_is_free() -> None:
+    assert await handlers.handle_silva({"scorers": ["silva"], "embeddings": _batch()}) == {"scores": []}
+    assert await handlers.handle_silva({"scorers": [], "embeddings": _batch(0.1)}) == {"scores": []}
+
+
+async def test_a_legacy_single_scorer_payload_still_runs(monkeypatch) -> None:
+    import ai.silva_scorer  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.silva_scorer, "score_embeddings", lambda embeddings, scorer: [0.3] * len(embeddings))
+    result = await handlers.handle_silva({"scorer": "silva_luna", "embeddings": _batch(0.1)})
+    assert result["scores"] == [{"postId": 1, "scorer": "silva_luna", "score": pytest.approx(0.3)}]
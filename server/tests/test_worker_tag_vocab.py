@@ -0,0 +1,119 @@
+"""``worker.tag_vocab`` — precomputed text embeddings for tag names."""
+
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from worker import handlers
+from worker.tag_vocab import TagVocab, load_display_names, vocab_texts
+
+
+def _rows(*values: float) -> np.ndarray:
+    return np.array([[v, -v, 0.0] for v in values], dtype=np.float32)
+
+
+def test_vocab_texts_covers_name_spaced_form_and_display_names() -> None:
+    tables = [{"green_eyes": "绿眼睛"}, {"green_eyes": "緑の目"}]
+    assert vocab_texts(["green_eyes", "1girl"], tables) == ["green_eyes", "green eyes", "绿眼睛", "緑の目", "1girl"]
+
+
+def test_load_display_names_skips_unknown_and_unsafe_langs(tmp_path) -> None:
+    (tmp_path / "tag.zh-Hans.json").write_text(json.dumps({"cat": "猫"}), encoding="utf-8")
+    assert load_display_names(["zh-Hans", "ja", "../etc"], tmp_path) == [{"cat": "猫"}]
+
+
+def test_append_lookup_and_reopen(tmp_path) -> None:
+    vocab = TagVocab(tmp_path, "m")
+    assert vocab.lookup("cat") is None
+    vocab.append(["cat", "dog"], _rows(1, 2))
+    vocab.append(["fox"], _rows(3))
+    np.testing.assert_array_equal(vocab.lookup(" dog "), _rows(2)[0])
+
+    reopened = TagVocab(tmp_path, "m")
+    assert len(reopened) == 3
+    np.testing.assert_array_equal(reopened.lookup("fox"), _rows(3)[0])
+    assert reopened.missing(["cat", "owl", "owl "]) == ["owl"]
+
+
+def test_append_skips_texts_that_already_have_rows(tmp_path) -> None:
+    vocab = TagVocab(tmp_path, "m")
+    vocab.append(["cat"], _rows(1))
+    vocab.append(["cat", "dog", "dog"], _rows(9, 2, 8))
+    assert len(vocab) == 2
+    np.testing.assert_array_equal(vocab.lookup("cat"), _rows(1)[0])
+    np.testing.assert_array_equal(vocab.lookup("dog"), _rows(2)[0])
+
+
+def test_a_crash_between_vectors_and_index_is_recovered(tmp_path) -> None:
+    vocab = TagVocab(tmp_path, "m")
+    vocab.append(["cat", "dog"], _rows(1, 2))
+    # Rows written, index line half written: the cut line must not claim a row.
+    with (vocab.dir / "vectors.f32").open("ab") as f:
+        f.write(_rows(3).tobytes())
+    with (vocab.dir / "index.txt").open("a", encoding="utf-8") as f:
+        f.write("fo")
+
+    reopened = TagVocab(tmp_path, "m")
+    assert len(reopened) == 2
+    assert reopened.lookup("fo") is None
+    reopened.append(["fox"], _rows(4))
+    np.testing.assert_array_equal(TagVocab(tmp_path, "m").lookup("fox"), _rows(4)[0])
+
+
+def test_a_new_model_id_starts_empty(tmp_path) -> None:
+    old = TagVocab(tmp_path, "a")
+    old.append(["cat"], _rows(1))
+    old.advance(7)
+    assert TagVocab(tmp_path, "a").through == 7
+    fresh = TagVocab(tmp_path, "b")
+    assert len(fresh) == 0
+    # The scheduler's cursor goes with the rows: the new model gets every tag again.
+    assert fresh.through == 0
+
+
+def test_display_names_are_parsed_once_per_version(tmp_path, monkeypatch) -> None:
+    table = tmp_path / "tag.ja.json"
+    table.write_text('{"cat": "猫"}', encoding="utf-8")
+    reads: list[str] = []
+    real = json.loads
+    monkeypatch.setattr(json, "loads", lambda text: reads.append(text) or real(text))
+    assert load_display_names(["ja"], tmp_path) == load_display_names(["ja"], tmp_path) == [{"cat": "猫"}]
+    assert len(reads) == 1
+
+    table.write_text('{"cat": "ねこ"}', encoding="utf-8")
+    os.utime(table, ns=(1, 1))
+    assert load_display_names(["ja"], tmp_path) == [{"cat": "ねこ"}]
+
+
+async def test_build_then_text_embed_answers_by_lookup(monkeypatch, tmp_path) -> None:
+    forwards: list[list[str]] = []
+
+    def _features(prompts: list[str]):
+        import torch  # noqa: PLC0415
+
+        forwards.append(prompts)
+        return torch.tensor([[float(len(p)), 1.0] for p in prompts])
+
+    import ai.siglip_embed  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.siglip_embed, "calculate_text_features", _features)
+    monkeypatch.setattr(ai.siglip_embed, "get_logit_scale_bias", lambda: (10.0, -1.0))
+    for name in ("_text_embedder", "_text_cache", "_tag_vocab"):
+        monkeypatch.setattr(handlers, name, None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+
+    assert await handlers.handle_tag_vocab({"tags": [], "langs": []}) == {"added": 0, "rows": 0, "through": 0}
+    built = await handlers.handle_tag_vocab({"tags": ["green_eyes", "cat"], "langs": [], "through": 2})
+    assert built == {"added": 3, "rows": 3, "through": 2}
+    resent = await handlers.handle_tag_vocab({"tags": ["cat"], "langs": [], "through": 1})
+    assert resent == {"added": 0, "rows": 3, "through": 2}
+
+    forwards.clear()
+    result = await handlers.handle_text_embed({"prompt": "green eyes"})
+    assert forwards == []
+    assert result["scale"] == 10.0
+    stats = await handlers.handle_worker_stats({})
+    assert stats["tagVocab"]["hits"] == 1
@@ -0,0 +1,106 @@
+"""``worker.text_cache`` — the prompt → SigLIP text vector cache."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from worker import handlers
+from worker.text_cache import TextEmbedCache, normalize_prompt
+
+
+def _vec(x: float) -> np.ndarray:
+    return np.full(4, x, dtype=np.float32)
+
+
+def test_normalize_collapses_width_and_whitespace_but_keeps_case() -> None:
+    assert normalize_prompt("  silver\u3000hair \n girl ") == "silver hair girl"
+    assert normalize_prompt("\uff21\uff22\uff23") == "ABC"
+    assert normalize_prompt("Saber") != normalize_prompt("saber")
+
+
+def test_memory_then_disk_then_miss(tmp_path) -> None:
+    cache = TextEmbedCache(tmp_path, "model-a")
+    assert cache.get_memory("cat") is None
+    assert cache.get_disk("cat") is None
+    cache.put("cat", _vec(1.0))
+
+    assert cache.get_memory("  cat ") is not None
+    # A fresh instance is a restarted worker: memory is empty, disk is not.
+    reopened = TextEmbedCache(tmp_path, "model-a")
+    assert reopened.get_memory("cat") is None
+    np.testing.assert_array_equal(reopened.get_disk("cat"), _vec(1.0))
+    assert reopened.get_memory("cat") is not None
+    stats = reopened.stats()
+    assert (stats["memoryHits"], stats["diskHits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_memory_level_is_lru(tmp_path) -> None:
+    cache = TextEmbedCache(tmp_path, "m", memory_entries=2)
+    cache.put("a", _vec(1))
+    cache.put("b", _vec(2))
+    cache.get_memory("a")
+    cache.put("c", _vec(3))
+    assert cache.get_memory("b") is None
+    assert cache.get_memory("a") is not None
+    assert cache.get_memory("c") is not None
+
+
+def test_a_new_model_id_drops_the_old_store(tmp_path) -> None:
+    old = TextEmbedCache(tmp_path, "model-a")
+    old.put("cat", _vec(1.0))
+    old.set_scale_bias(10.0, -1.0)
+
+    new = TextEmbedCache(tmp_path, "model-b")
+    assert new.get_disk("cat") is None
+    assert new.scale_bias is None
+    assert [p.name for p in tmp_path.iterdir()] == [new.dir.name]
+
+
+def test_scale_bias_survive_a_restart(tmp_path) -> None:
+    TextEmbedCache(tmp_path, "m").set_scale_bias(10.0, -1.0)
+    assert TextEmbedCache(tmp_path, "m").scale_bias == (10.0, -1.0)
+
+
+def test_disk_level_is_bounded(tmp_path) -> None:
+    cache = TextEmbedCache(tmp_path, "m", disk_entries=3)
+    for i in range(5):
+        cache.put(f"p{i}", _vec(i))
+    # Pruning runs periodically on write and always on open.
+    TextEmbedCache(tmp_path, "m", disk_entries=3)
+    assert len(list(cache.dir.glob("*.f32"))) == 3
+
+
+async def test_handler_serves_repeats_without_the_model(monkeypatch, tmp_path) -> None:
+    calls: list[list[str]] = []
+
+    def _features(prompts: list[str]):
+        import torch  # noqa: PLC0415
+
+        calls.append(prompts)
+        return torch.tensor([[float(len(p)), 0.0] for p in prompts])
+
+    def _scale_bias() -> tuple[float, float]:
+        calls.append(["scale"])
+        return 10.0, -1.0
+
+    import ai.siglip_embed  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.siglip_embed, "calculate_text_features", _features)
+    monkeypatch.setattr(ai.siglip_embed, "get_logit_scale_bias", _scale_bias)
+    monkeypatch.setattr(handlers, "_text_embedder", None)
+    monkeypatch.setattr(handlers, "_text_cache", None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+
+    first = await handlers.handle_text_embed({"prompt": "cat"})
+    again = await handlers.handle_text_embed({"prompt": " cat"})
+    assert calls == [["cat"], ["scale"]]
+    assert again == first
+
+    # Restart: nothing in memory, but neither the vector nor scale/bias needs the model.
+    monkeypatch.setattr(handlers, "_text_cache", None)
+    assert await handlers.handle_text_embed({"prompt": "cat"}) == first
+    assert len(calls) == 2
+    stats = (await handlers.handle_worker_stats({}))["textEmbedCache"]
+    assert stats["diskHits"] == 1
+    assert first["scale"] == pytest.approx(10.0)
@@ -0,0 +1,66 @@
+"""``worker.warmup`` — background preloading at start."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from ai.registry import ModelRegistry
+from worker import warmup
+
+
+def test_parse_warm() -> None:
+    assert warmup.parse_warm(None) == []
+    assert warmup.parse_warm("tagger, waifu,tagger") == ["tagger", "waifu"]
+    assert warmup.parse_warm("all") == list(warmup.WARMERS)
+    with pytest.raises(ValueError, match="unknown warm-up"):
+        warmup.parse_warm("tagger,clip")
+
+
+async def test_warm_runs_off_the_loop_and_reports_times(monkeypatch) -> None:
+    loop_thread = threading.get_ident()
+    ran_on: list[int] = []
+
+    def _ok() -> None:
+        ran_on.append(threading.get_ident())
+
+    def _broken() -> None:
+        msg = "no weights"
+        raise RuntimeError(msg)
+
+    monkeypatch.setattr(warmup, "WARMERS", {"ok": _ok, "broken": _broken})
+    timings = await warmup.warm_in_background(["broken", "ok"])
+
+    assert list(timings) == ["ok"]
+    assert len(ran_on) == 1
+    assert ran_on[0] != loop_thread
+
+
+async def test_warm_up_blocks_only_the_model_it_is_loading(monkeypatch) -> None:
+    registry = ModelRegistry()
+    registry.get("resident", lambda: SimpleNamespace(nbytes=1))
+    loading = threading.Event()
+    release = threading.Event()
+    loads: list[str] = []
+
+    def _slow_load() -> SimpleNamespace:
+        loads.append("slow")
+        loading.set()
+        assert release.wait(5)
+        return SimpleNamespace(nbytes=1)
+
+    monkeypatch.setattr(warmup, "WARMERS", {"slow": lambda: registry.get("slow", _slow_load)})
+    warming = asyncio.create_task(warmup.warm_in_background(["slow"]))
+    assert await asyncio.to_thread(loading.wait, 5)
+
+    # A task for another model runs while the warm-up is mid-load...
+    await asyncio.wait_for(asyncio.to_thread(registry.get, "resident", _slow_load), 1)
+    # ...and one for the model being warmed waits for it instead of loading again.
+    same = asyncio.create_task(asyncio.to_thread(registry.get, "slow", _slow_load))
+    release.set()
+    await warming
+    assert (await same).nbytes == 1
+    assert loads == ["slow"]
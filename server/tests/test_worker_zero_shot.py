@@ -0,0 +1,109 @@
+"""``worker.zero_shot`` — tag / rating suggestions from stored image vectors."""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+from worker import handlers
+from worker.zero_shot import suggest_labels
+
+# Three orthogonal directions: image i points along axis i.
+EYE = np.eye(3, dtype=np.float32)
+
+
+def _p(cos: float, scale: float = 10.0, bias: float = -5.0) -> float:
+    return 1 / (1 + math.exp(-(scale * cos + bias)))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 64])
+def test_top_k_above_threshold_per_image(chunk_size: int) -> None:
+    tags = np.array([[1, 0, 0], [0.8, 0.6, 0], [0, 0, 1]], dtype=np.float32)
+    suggestions, rating = suggest_labels(
+        EYE,
+        tags,
+        EYE[:2],
+        10.0,
+        -5.0,
+        top_k=2,
+        threshold=0.5,
+        chunk_size=chunk_size,
+    )
+    assert [[i for i, _ in row] for row in suggestions] == [[0, 1], [1], [2]]
+    assert suggestions[0][1][1] == pytest.approx(_p(0.8), abs=1e-4)
+    assert rating == [0, 1, 0]
+
+
+def test_without_rating_labels_rating_is_minus_one() -> None:
+    suggestions, rating = suggest_labels(
+        EYE,
+        EYE,
+        np.empty((0, 3), dtype=np.float32),
+        10.0,
+        -5.0,
+        top_k=1,
+        threshold=0.0,
+        chunk_size=8,
+    )
+    assert [row[0][0] for row in suggestions] == [0, 1, 2]
+    assert rating == [-1, -1, -1]
+
+
+async def test_handler_fills_the_vocabulary_and_maps_ratings(monkeypatch, tmp_path) -> None:
+    directions = {"cat": [1.0, 0.0, 0.0], "dog": [0.0, 1.0, 0.0], "safe": [0.0, 0.0, 1.0], "nsfw": [1.0, 0.0, 0.0]}
+    encoded: list[str] = []
+
+    def _features(prompts: list[str]):
+        import torch  # noqa: PLC0415
+
+        encoded.extend(prompts)
+        return torch.tensor([directions[p] for p in prompts])
+
+    import ai.siglip_embed  # noqa: PLC0415
+
+    monkeypatch.setattr(ai.siglip_embed, "calculate_text_features", _features)
+    monkeypatch.setattr(ai.siglip_embed, "get_logit_scale_bias", lambda: (10.0, -5.0))
+    for name in ("_text_embedder", "_text_cache", "_tag_vocab"):
+        monkeypatch.setattr(handlers, name, None)
+    monkeypatch.setattr(handlers, "_ROOT", tmp_path)
+
+    matrix = tmp_path / "vectors.f32"
+    EYE[:2].tofile(matrix)
+    payload = {
+        "matrixPath": str(matrix),
+        "count": 2,
+        "dim": 3,
+        "tags": ["cat", "dog"],
+        "ratingPrompts": {"general": "safe", "explicit": "nsfw"},
+        "topK": 5,
+        "threshold": 0.5,
+        "chunkSize": 1,
+    }
+    result = await handlers.handle_zero_shot_tags(payload)
+    assert [[i for i, _ in row] for row in result["tags"]] == [[0], [1]]
+    assert result["ratings"] == ["explicit", "general"]
+
+    # Rating prompts are not tag names: text search must not find them.
+    vocab = handlers._get_tag_vocab()
+    assert vocab.missing(["safe", "nsfw", "cat"]) == ["safe", "nsfw"]
+
+    # Second run: every label is already in the vocabulary or the prompt cache.
+    encoded.clear()
+    assert await handlers.handle_zero_shot_tags(payload) == result
+    assert encoded == []
+
+    with pytest.raises(ValueError, match="4-d but the tag vocabulary is 3-d"):
+        await handlers.handle_zero_shot_tags({**payload, "dim": 4})
+    with pytest.raises(ValueError, match="split them into chunks"):
+        await handlers.handle_zero_shot_tags({**payload, "count": handlers.ZERO_SHOT_MAX_POSTS + 1})
+    with pytest.raises(ValueError, match="chunkSize must be positive"):
+        await handlers.handle_zero_shot_tags({**payload, "chunkSize": 0})
+    for top_k in (0, -1, 2.5, "5", True):
+        with pytest.raises(ValueError, match="topK must be a positive integer"):
+            await handlers.handle_zero_shot_tags({**payload, "topK": top_k})
+
+    # A tag with no text is skipped; the others keep their payload index.
+    result = await handlers.handle_zero_shot_tags({**payload, "tags": ["_", "cat", " ", "dog"]})
+    assert [[i for i, _ in row] for row in result["tags"]] == [[1], [3]]